@@ -1,11 +1,11 @@
 import streamlit as st
-import oracledb
-import hashlib
-import base64
-from pathlib import Path
-import os
 from dotenv import load_dotenv
 
+from sssihms import assets, auth
+from sssihms.instrumentation import set_context
+
+set_context(page="login")
+
 # Page config
 st.set_page_config(
     page_title="🏥 SSSIHMS Dashboard Login",
@@ -16,53 +16,15 @@ st.set_page_config(
 # Load environment variables
 load_dotenv()
 
-# Oracle client init from .env
-oracle_client_path = os.getenv("ORACLE_CLIENT_PATH")
-if oracle_client_path:
-    oracledb.init_oracle_client(lib_dir=oracle_client_path)
-
-def get_connection():
-    return oracledb.connect(
-        user=os.getenv("DB_USER", "hisapp"),
-        password=os.getenv("DB_PASSWORD", "his@2025"),
-        dsn=os.getenv("DB_DSN", "192.168.21.6:1521/hisdb")
-    )
-
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest().lower()
 
 def verify_user_from_db(staffid, password):
+    # Pooled lookup (sssihms.auth): the Oracle client is initialised once per
+    # process when the login pool is created, not on every script run
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-        encrypted = hash_password(password)
-        query = """
-            SELECT STAFFNAME, LOGINOK, ACCESS_ROLE, HOSPITALID
-            FROM STAFFMASTER
-            WHERE STAFFID = :staffid
-              AND TXTPASSWD = :pwd
-        """
-        cur.execute(query, {"staffid": staffid, "pwd": encrypted})
-        row = cur.fetchone()
-        if row is None:
-            return None
-        staffname, loginok, access_role, hospitalid = row
-        if loginok != "Y":
-            return "NOT_ACTIVE"
-        role = "admin" if access_role == "A" else "staff"
-        return {
-            "staffname": staffname, 
-            "role": role,
-            "hospitalid": hospitalid
-        }
+        return auth.verify_user(auth.get_login_pool(), staffid, password)
     except Exception as e:
         st.error(f"Database error: {e}")
         return None
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
 
 # Session defaults
 if "authenticated" not in st.session_state:
@@ -72,228 +34,15 @@ if "authenticated" not in st.session_state:
     st.session_state.role = "staff"
     st.session_state.hospitalid = None
 
-# CSS with HIDDEN SIDEBAR
-st.markdown("""
-    <style>
-    /* ========== HIDE SIDEBAR NAVIGATION ========== */
-    [data-testid="stSidebar"] {
-        display: none;
-    }
-    
-    button[kind="header"] {
-        display: none;
-    }
-    /* ============================================== */
-    
-    /* Global Styles */
-    .stApp {
-        background: linear-gradient(135deg, #0a0a0a 0%, #1a1a2e 50%, #0f3460 100%);
-        overflow: hidden;
-    }
-    
-    /* Hide Streamlit branding */
-    #MainMenu {visibility: hidden;}
-    footer {visibility: hidden;}
-    header {visibility: hidden;}
-    
-    /* Main container - Fit to viewport */
-    .main .block-container {
-        padding: 1.5rem 1rem;
-        max-width: 480px;
-        display: flex;
-        flex-direction: column;
-        justify-content: center;
-        min-height: 100vh;
-    }
-    
-    /* Outer container - More Compact */
-    .login-outer-container {
-        background: rgba(26, 32, 46, 0.85);
-        padding-top: 40 px !important; 
-        backdrop-filter: blur(20px);
-        padding: 1.5rem 2.5rem 1.8rem 2.5rem;
-        border-radius: 20px;
-        box-shadow: 
-            0 15px 45px rgba(0, 0, 0, 0.5),
-            inset 0 1px 0 rgba(255, 255, 255, 0.1);
-        border: 1px solid rgba(255, 255, 255, 0.08);
-    }
-    
-    /* Logo container - Smaller */
-     /* Logo container - smaller + nudged upward (strong overrides) */
-.logo-container {
-    background: white !important;
-    padding: 0.35rem !important;            /* smaller padding */
-    border-radius: 8px !important;
-    display: inline-block !important;
-    margin-bottom: 0.45rem !important;      /* small space below */
-    margin-top: -1px !important;
-    box-shadow: 0 3px 10px rgba(0, 0, 0, 0.15) !important;
-    transform: scale(0.78) !important;      /* scale down */
-    position: relative !important;
-    top: -14px !important;                  /* move upward */
-    z-index: 5 !important;
-}
-
-/* Make the image smaller */
-.logo-img {
-    max-width: 350px !important;             /* very small logo */
-    height: auto !important;
-    display: block !important;
-}
-
-/* Slightly tighten header spacing so logo sits closer to the form */
-.login-header {
-    margin-bottom: 0.6rem !important;
-    padding-top: 0.2rem !important;
-}
-
-
-    
-    .hospital-icon {
-        font-size: 3rem;
-    }
-    
-    /* Header section - More Compact */
-    .login-header {
-        text-align: center;
-        margin-bottom: 1.2rem;
-    }
-    
-    .login-title {
-        color: #ffffff;
-        font-size: 1.8rem;
-        font-weight: 700;
-        margin-bottom: 0.25rem;
-        text-shadow: 0 2px 8px rgba(255, 255, 255, 0.15);
-        letter-spacing: -0.5px;
-    }
-    
-    .login-subtitle {
-        color: #b8c5d6;
-        font-size: 0.95rem;
-        font-weight: 400;
-    }
-    
-    /* Divider - More Subtle */
-    .divider {
-        height: 1px;
-        background: linear-gradient(to right, transparent, rgba(255, 255, 255, 0.12), transparent);
-        margin: 1.2rem 0 1rem 0;
-    }
-    
-    /* Input labels - Soft */
-    .stTextInput > label {
-        color: #cbd5e0 !important;
-        font-weight: 600 !important;
-        font-size: 1.1rem !important;
-        margin-bottom: 0.5rem !important;
-    }
-    
-    /* Input fields - Soft dark */
-    .stTextInput > div > div > input {
-        background: rgba(15, 20, 30, 0.6) !important;
-        border: 1.5px solid rgba(100, 116, 139, 0.3) !important;
-        border-radius: 10px !important;
-        padding: 0.9rem 1.1rem !important;
-        font-size: 1.1rem !important;
-        color: #e2e8f0 !important;
-        transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1) !important;
-        backdrop-filter: blur(10px) !important;
-    }
-    
-    .stTextInput > div > div > input::placeholder {
-        color: #64748b !important;
-    }
-    
-    .stTextInput > div > div > input:focus {
-        border-color: rgba(96, 165, 250, 0.6) !important;
-        background: rgba(15, 20, 30, 0.8) !important;
-        outline: none !important;
-        box-shadow: 0 0 0 3px rgba(96, 165, 250, 0.15) !important;
-    }
-    
-    /* Login button - Compact */
-    .stButton > button {
-        background: linear-gradient(135deg, #60a5fa 0%, #3b82f6 100%) !important;
-        color: white !important;
-        border: none !important;
-        border-radius: 10px !important;
-        padding: 0.85rem 1.5rem !important;
-        font-size: 1.1rem !important;
-        font-weight: 600 !important;
-        transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1) !important;
-        margin-top: 0.8rem !important;
-        box-shadow: 0 4px 16px rgba(96, 165, 250, 0.3) !important;
-        letter-spacing: 0.3px !important;
-    }
-    
-    .stButton > button:hover {
-        transform: translateY(-1px) !important;
-        box-shadow: 0 6px 24px rgba(96, 165, 250, 0.4) !important;
-        background: linear-gradient(135deg, #3b82f6 0%, #2563eb 100%) !important;
-    }
-    
-    .stButton > button:active {
-        transform: translateY(0) !important;
-    }
-    
-    /* Alert messages - Soft */
-    .stAlert {
-        border-radius: 10px !important;
-        font-size: 0.95rem !important;
-        padding: 0.9rem !important;
-        border: none !important;
-        backdrop-filter: blur(10px) !important;
-    }
-    
-    /* Info badge - Soft */
-    .info-badge {
-        background: rgba(96, 165, 250, 0.12);
-        border: 1px solid rgba(96, 165, 250, 0.25);
-        border-radius: 8px;
-        padding: 0.65rem 1rem;
-        text-align: center;
-        color: #93c5fd;
-        font-weight: 600;
-        font-size: 0.95rem;
-        margin-top: 0.8rem;
-    }
-    
-    /* Footer - More Compact */
-    .footer-text {
-        text-align: center;
-        color: #64748b;
-        font-size: 0.8rem;
-        margin-top: 1.2rem;
-    }
-    
-    /* Spinner */
-    .stSpinner > div {
-        border-top-color: #60a5fa !important;
-    }
-    
-    /* Remove extra spacing */
-    .stTextInput {
-        margin-bottom: 0.7rem !important;
-    }
-    
-    /* Tighter input spacing */
-    .stTextInput > div {
-        margin-bottom: 0 !important;
-    }
-    </style>
-""", unsafe_allow_html=True)
-
-# Logo loading
-def get_base64_image(image_path):
-    with open(image_path, "rb") as img_file:
-        return base64.b64encode(img_file.read()).decode()
+# CSS with HIDDEN SIDEBAR (static/login.css, cached by the browser)
+st.markdown(assets.stylesheet("login.css", st.get_option("server.enableStaticServing")),
+            unsafe_allow_html=True)
 
+# Logo: a cached static file, or a data: URI encoded once per process
 try:
-    logo_base64 = get_base64_image("assets/hospital_logo.png")
-    logo_html = f'<div class="logo-container"><img src="data:image/png;base64,{logo_base64}" class="logo-img" alt="SSSIHMS Logo"></div>'
-except:
+    logo_src = assets.image_src("hospital_logo.png", st.get_option("server.enableStaticServing"))
+    logo_html = f'<div class="logo-container"><img src="{logo_src}" class="logo-img" alt="SSSIHMS Logo"></div>'
+except OSError:
     logo_html = '<div class="logo-container"><div class="hospital-icon">🏥</div></div>'
 
 # Login UI
@@ -323,7 +72,7 @@ if login_button:
             result = verify_user_from_db(username, password)
             if result is None:
                 st.error("❌ Invalid Staff ID or Password")
-            elif result == "NOT_ACTIVE":
+            elif result == auth.NOT_ACTIVE:
                 st.error("🚫 Your login is not yet activated. Please contact admin.")
             else:
                 st.session_state.authenticated = True
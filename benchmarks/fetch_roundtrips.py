@@ -0,0 +1,120 @@
+"""
+Round-trip benchmark for the fetch profiles in sssihms.db
+
+Generates a synthetic result set on the server (CONNECT BY LEVEL, no tables
+needed) and fetches it with the driver defaults and with each fetch profile,
+reporting elapsed time and SQL*Net round trips for the session.
+
+Round trips are read from V$MYSTAT ('SQL*Net roundtrips to/from client'),
+which needs SELECT on V$MYSTAT / V$STATNAME. Without that grant, or with
+--estimate (no database at all), the expected count is computed from
+arraysize/prefetchrows instead.
+
+    python -m benchmarks.fetch_roundtrips --rows 200000
+    python -m benchmarks.fetch_roundtrips --rows 1 --rows 200000 --estimate
+"""
+import argparse
+import math
+import os
+import time
+
+from dotenv import load_dotenv
+
+from sssihms.db import FETCH_PROFILES, FetchProfile, configure_cursor
+
+DEFAULT_PROFILE = FetchProfile("driver default", arraysize=100, prefetchrows=2)
+
+SYNTHETIC_SQL = """
+    SELECT LEVEL AS ID,
+           'MRN' || TO_CHAR(LEVEL, 'FM0000000') AS MRN,
+           TRUNC(SYSDATE) - MOD(LEVEL, 365) AS SURGERYDATE,
+           RPAD('PROCEDURE ', 40, 'X') AS PROCEDURE_NAME,
+           MOD(LEVEL, 97) * 1.5 AS AMOUNT
+    FROM DUAL
+    CONNECT BY LEVEL <= :n
+"""
+
+ROUNDTRIP_SQL = """
+    SELECT s.VALUE
+    FROM V$MYSTAT s
+    JOIN V$STATNAME n ON n.STATISTIC# = s.STATISTIC#
+    WHERE n.NAME = 'SQL*Net roundtrips to/from client'
+"""
+
+
+def estimate_roundtrips(rows, profile):
+    """Execute (+ prefetched rows) plus one fetch per arraysize batch of the rest"""
+    if rows < profile.prefetchrows:
+        return 1  # end-of-data was already seen by the prefetch
+    # the fetch that discovers end-of-data costs a trip of its own
+    return 1 + math.ceil((rows - profile.prefetchrows + 1) / profile.arraysize)
+
+
+def _session_roundtrips(conn):
+    try:
+        cur = conn.cursor()
+        cur.execute(ROUNDTRIP_SQL)
+        value = cur.fetchone()[0]
+        cur.close()
+        return value
+    except Exception:
+        return None
+
+
+def measure(conn, rows, profile, repeat=3):
+    best = None
+    trips = None
+    for _ in range(repeat):
+        before = _session_roundtrips(conn)
+        start = time.perf_counter()
+        cur = configure_cursor(conn.cursor(), profile)
+        cur.execute(SYNTHETIC_SQL, n=rows)
+        fetched = len(cur.fetchall())
+        cur.close()
+        elapsed = time.perf_counter() - start
+        after = _session_roundtrips(conn)
+        if before is not None and after is not None:
+            # the V$MYSTAT read itself costs one trip
+            trips = after - before - 1
+        best = elapsed if best is None else min(best, elapsed)
+    assert fetched == rows
+    return best, trips
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, action="append", help="result size (repeatable), default 1 and 200000")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--estimate", action="store_true", help="print computed round trips only (no database)")
+    args = parser.parse_args()
+    sizes = args.rows or [1, 200000]
+    profiles = [DEFAULT_PROFILE] + [p for p in FETCH_PROFILES.values() if not p.lobs_inline]
+
+    conn = None
+    if not args.estimate:
+        import oracledb
+        load_dotenv()
+        conn = oracledb.connect(
+            user=os.getenv("DB_USER", "hisapp"),
+            password=os.getenv("DB_PASSWORD", "his@2025"),
+            dsn=os.getenv("DB_DSN", "192.168.21.6:1521/hisdb")
+        )
+
+    print(f"{'rows':>10}  {'profile':<15} {'arraysize':>9} {'prefetch':>8} {'trips':>8} {'est.':>8} {'best s':>9}")
+    for rows in sizes:
+        for profile in profiles:
+            est = estimate_roundtrips(rows, profile)
+            if conn is None:
+                print(f"{rows:>10}  {profile.name:<15} {profile.arraysize:>9} {profile.prefetchrows:>8} {'-':>8} {est:>8} {'-':>9}")
+                continue
+            elapsed, trips = measure(conn, rows, profile, args.repeat)
+            print(f"{rows:>10}  {profile.name:<15} {profile.arraysize:>9} {profile.prefetchrows:>8} "
+                  f"{trips if trips is not None else '?':>8} {est:>8} {elapsed:>9.3f}")
+        print()
+
+    if conn is not None:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
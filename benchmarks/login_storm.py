@@ -0,0 +1,164 @@
+"""
+Login-storm benchmark for the login path (sssihms.auth)
+
+Simulates the shift-change burst: --logins attempts (every tenth with a
+wrong password) from --concurrency browsers at once against a stand-in
+database (benchmarks.suite generates bench/his_<rows>.db on first use), and
+compares
+
+  connect per login   the old path: a new connection for every attempt
+  login pool          sssihms.auth.verify_user on the dedicated login pool
+
+SQLite connects in microseconds, so the part that hurts on Oracle is
+modelled: every new physical connection waits --connect-ms for a listener
+that handles --listener-slots handshakes at a time. Reported per mode:
+throughput, latency percentiles, failed attempts, physical connects and the
+most sessions open at once.
+
+    python -m benchmarks.login_storm
+    python -m benchmarks.login_storm --logins 1000 --concurrency 200 --connect-ms 80
+"""
+import argparse
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sssihms import auth, standin
+from sssihms.standin import StandInPool
+
+from benchmarks.suite import ensure_database
+
+
+class Listener:
+    """Stand-in connects that queue for a handshake slot, with session counts"""
+
+    def __init__(self, connect_ms, slots):
+        self.connect_ms = connect_ms
+        self._slots = threading.Semaphore(slots)
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.open = 0
+        self.peak = 0
+
+    def connect(self, path):
+        with self._slots:
+            time.sleep(self.connect_ms / 1000)
+        conn = standin.connect(path, read_only=True)
+        with self._lock:
+            self.connects += 1
+            self.open += 1
+            self.peak = max(self.peak, self.open)
+        return conn
+
+    def disconnect(self, conn):
+        conn.close()
+        with self._lock:
+            self.open -= 1
+
+
+def credentials(path, logins):
+    """(staffid, password, expect_ok) per attempt; synthetic passwords are the lower-cased ID"""
+    conn = standin.connect(path, read_only=True)
+    try:
+        ids = [r[0] for r in conn.execute(
+            "SELECT STAFFID FROM STAFFMASTER WHERE STAFFID <> 'BENCH' ORDER BY STAFFID FETCH FIRST 1000 ROWS ONLY"
+        ).fetchall()]
+    finally:
+        conn.close()
+    attempts = []
+    for i in range(logins):
+        staffid = ids[i % len(ids)]
+        wrong = i % 10 == 9
+        attempts.append((staffid, "wrong" if wrong else staffid.lower(), not wrong))
+    return attempts
+
+
+def connect_per_login(path, listener):
+    def login(staffid, password):
+        conn = listener.connect(path)
+        try:
+            return auth.lookup_staff(conn, staffid, password)
+        finally:
+            listener.disconnect(conn)
+    return login, lambda: None
+
+
+def login_pool(path, listener, pool_min, pool_max, wait_ms):
+    pool = StandInPool(path, max=pool_max, min=pool_min, wait_timeout=wait_ms, opener=listener.connect)
+    return (lambda staffid, password: auth.verify_user(pool, staffid, password)), pool.close
+
+
+def run(mode, login, attempts, concurrency):
+    latencies = []
+    failed = 0
+    wrong_result = 0
+
+    def attempt(args):
+        staffid, password, expect_ok = args
+        start = time.perf_counter()
+        try:
+            ok = login(staffid, password) is not None
+            error = False
+        except Exception:
+            ok, error = False, True
+        return (time.perf_counter() - start) * 1000, error, ok == expect_ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for ms, error, correct in executor.map(attempt, attempts):
+            latencies.append(ms)
+            failed += error
+            wrong_result += not error and not correct
+    wall = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "mode": mode,
+        "logins": len(attempts),
+        "failed": failed,
+        "wrong": wrong_result,
+        "wall_s": wall,
+        "per_s": len(attempts) / wall if wall else 0.0,
+        "p50": statistics.median(latencies),
+        "p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        "max": latencies[-1],
+    }
+
+
+def main():
+    pool_min, pool_max, wait_ms = auth.pool_settings()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000, help="stand-in database scale")
+    parser.add_argument("--logins", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=100, help="browsers logging in at once")
+    parser.add_argument("--connect-ms", type=float, default=50.0, help="modelled cost of one new connection")
+    parser.add_argument("--listener-slots", type=int, default=4, help="handshakes the listener serves at once")
+    parser.add_argument("--pool-min", type=int, default=pool_min)
+    parser.add_argument("--pool-max", type=int, default=pool_max)
+    parser.add_argument("--wait-ms", type=int, default=wait_ms, help="login pool wait timeout")
+    args = parser.parse_args()
+
+    path = str(ensure_database(args.rows))
+    attempts = credentials(path, args.logins)
+    modes = {
+        "connect per login": lambda listener: connect_per_login(path, listener),
+        "login pool": lambda listener: login_pool(path, listener, args.pool_min, args.pool_max, args.wait_ms),
+    }
+
+    print(f"{args.logins} logins from {args.concurrency} browsers, connect {args.connect_ms:.0f} ms, "
+          f"{args.listener_slots} listener slots, pool {args.pool_min}..{args.pool_max}")
+    print(f"{'mode':<18} {'failed':>6} {'wrong':>5} {'wall s':>7} {'logins/s':>9} {'p50 ms':>8} "
+          f"{'p95 ms':>8} {'max ms':>8} {'connects':>8} {'peak sess':>9}")
+    for mode, setup in modes.items():
+        listener = Listener(args.connect_ms, args.listener_slots)
+        login, teardown = setup(listener)
+        try:
+            r = run(mode, login, attempts, args.concurrency)
+        finally:
+            teardown()
+        print(f"{r['mode']:<18} {r['failed']:>6} {r['wrong']:>5} {r['wall_s']:>7.2f} {r['per_s']:>9.1f} "
+              f"{r['p50']:>8.1f} {r['p95']:>8.1f} {r['max']:>8.1f} {listener.connects:>8} {listener.peak:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+"""
+Benchmark suite for the dashboard's data paths
+
+One benchmark per data function, run against the synthetic stand-in database
+(sssihms.synthetic / sssihms.standin) at several data scales. Each benchmark
+is timed over --repeat runs (min and median wall time) and run once more
+under tracemalloc for its peak Python heap (pandas/numpy buffers included;
+SQLite's own page cache is not).
+
+The day-partition result cache (sssihms.daycache) is off for the query
+benchmarks, so they keep measuring the database path; the daycache.*
+benchmarks measure ranges served from a warm cache. Likewise the query
+benchmarks read the base tables, and the summary.* benchmarks the summary
+tables (sssihms.summaries) provisioned into each database.
+
+Results are compared with benchmarks/baseline.json. A benchmark regresses
+when its median is more than --tolerance slower than the baseline (and by
+more than --min-delta-ms, so sub-millisecond noise does not fail the run),
+or its peak memory grows by more than --tolerance. Any regression makes the
+run exit with status 1, so it can gate a deployment.
+
+    python -m benchmarks.suite                              # compare with baseline
+    python -m benchmarks.suite --scales 10000 --only beds   # subset
+    python -m benchmarks.suite --save-baseline              # record a new baseline
+
+Databases are generated on first use as bench/his_<rows>.db with a fixed
+date window and seed, so every machine benchmarks the same data. Timings
+are machine-specific: record the baseline on the machine that runs the
+comparison.
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from sssihms import analytics, standin, synthetic
+from sssihms.daycache import get_day_cache
+from sssihms.summaries import get_router, provision
+from sssihms.exports import excel_bytes
+
+ROOT = Path(__file__).resolve().parent.parent
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+BENCH_DIR = ROOT / "bench"
+
+DEFAULT_SCALES = [10_000, 100_000, 1_000_000]
+
+# Fixed data window so databases (and baselines) are reproducible
+DATA_END = date(2025, 12, 31)
+DATA_START = DATA_END - timedelta(days=3 * 365)
+SEED = 42
+
+# Filter window the benchmarks query: the last quarter, and the last year for
+# the category hierarchy (it is usually viewed over longer ranges)
+FROM_DATE = date(2025, 10, 1)
+TO_DATE = DATA_END
+YEAR_FROM = date(2025, 1, 1)
+
+METRIC_QUERY = """
+    SELECT d.DEPTNAME AS DEPARTMENT, COUNT(*) AS PATIENT_COUNT
+    FROM INPATIENT i
+    JOIN DEPARTMENT d ON i.DEPTCODE = d.DEPTCODE
+    WHERE i.DOA BETWEEN TO_DATE('{from_date}', 'YYYY-MM-DD')
+                    AND TO_DATE('{to_date}', 'YYYY-MM-DD')
+    GROUP BY d.DEPTNAME
+    ORDER BY PATIENT_COUNT DESC
+    FETCH FIRST 10 ROWS ONLY
+"""
+
+
+@dataclass
+class Result:
+    name: str
+    min_ms: float
+    median_ms: float
+    peak_mb: float
+    size: int = None     # rows/items returned, as a sanity check across scales
+
+
+def db_path(rows):
+    return BENCH_DIR / f"his_{rows}.db"
+
+
+def ensure_database(rows):
+    path = db_path(rows)
+    if not path.exists():
+        print(f"Generating stand-in database {path.name} (~{rows:,} rows)")
+        synthetic.generate(str(path), rows=rows, seed=SEED, start=DATA_START, end=DATA_END,
+                           progress=lambda msg: print(msg))
+    conn = standin.connect(str(path))
+    try:
+        created = provision(conn)
+        if created:
+            print(f"Provisioned summary tables in {path.name}: {', '.join(created)}")
+    finally:
+        conn.close()
+    return path
+
+
+def _size(value):
+    if value is None:
+        return None
+    if isinstance(value, tuple):
+        value = value[-1]
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    try:
+        return len(value)
+    except TypeError:
+        return 1
+
+
+class Context:
+    """One stand-in connection plus the fixture values the benchmarks query"""
+
+    def __init__(self, path, metrics_dir):
+        self.conn = standin.connect(str(path), read_only=True)
+        self.metrics = analytics.CustomMetricsManager(config_dir=metrics_dir)
+
+        first = lambda sql: self.conn.execute(sql).fetchone()[0]
+        self.category = first("SELECT CATEGORY FROM STATS_DETAILS GROUP BY CATEGORY ORDER BY COUNT(*) DESC")
+        self.subcatg = first(
+            f"SELECT SUBCATG FROM STATS_DETAILS WHERE CATEGORY = '{self.category}' "
+            "GROUP BY SUBCATG ORDER BY COUNT(*) DESC")
+        self.mrn = first("SELECT MRN FROM NOTESDATA GROUP BY MRN ORDER BY COUNT(*) DESC")
+        self._register = None
+
+    def register(self):
+        """The surgery register frame (fetched once; leaderboards reuse it)"""
+        if self._register is None:
+            self._register = self.register_query()
+        return self._register
+
+    def register_query(self):
+        return analytics.load_surgery_register(self.conn, FROM_DATE, TO_DATE, analytics.ALL_HOSPITALS)
+
+    def close(self):
+        self.conn.close()
+
+
+def with_day_cache(func):
+    """func run with the day-partition cache switched on (it is off otherwise)"""
+    def run():
+        cache = get_day_cache()
+        cache.enabled = True
+        try:
+            return func()
+        finally:
+            cache.enabled = False
+    return run
+
+
+def with_summaries(func):
+    """func run with summary routing switched on (it is off otherwise)"""
+    def run():
+        router = get_router()
+        router.enabled = True
+        try:
+            return func()
+        finally:
+            router.enabled = False
+    return run
+
+
+def benchmarks(ctx):
+    """name -> zero-argument callable; one per dashboard data path"""
+    a, conn = analytics, ctx.conn
+    return {
+        "load_inpatients": lambda: a.load_inpatients(conn, FROM_DATE, TO_DATE, "All"),
+        "load_outpatients": lambda: a.load_outpatients(conn, FROM_DATE, TO_DATE, "All"),
+        "category.level1": lambda: a.get_category_metrics(conn, YEAR_FROM, TO_DATE, "All", "All"),
+        "category.level2": lambda: a.get_subcatg_metrics(conn, ctx.category, YEAR_FROM, TO_DATE, "All"),
+        "category.level3": lambda: a.get_subcatgl2_metrics(
+            conn, ctx.category, ctx.subcatg, YEAR_FROM, TO_DATE, "All"),
+        "beds.occupancy": lambda: a.calculate_bed_occupancy(conn, FROM_DATE, TO_DATE),
+        "beds.by_department": lambda: a.get_department_occupancy_breakdown(conn, FROM_DATE, TO_DATE),
+        "beds.by_location": lambda: a.get_location_occupancy_breakdown(conn, FROM_DATE, TO_DATE),
+        "demographics.age": lambda: a.compute_age_distribution(conn),
+        "state_stats.range": lambda: a.state_stats_aggregate(conn, YEAR_FROM, TO_DATE),
+        "state_stats.year_month": lambda: a.state_stats_aggregate(
+            conn, FROM_DATE, TO_DATE, use_year_month=True, sel_year=TO_DATE.year, sel_month=TO_DATE.month),
+        "reports.search_mrns": lambda: a.search_mrns(conn, ctx.mrn[:8]),
+        "reports.fetch_for_mrn": lambda: a.fetch_reports_for_mrn(conn, ctx.mrn),
+        "surgery.register": ctx.register_query,
+        "surgery.leaderboards": lambda: a.leaderboards(ctx.register()),
+        "export.category_pdf": lambda: a.build_category_pdf(conn, ctx.category, YEAR_FROM, TO_DATE, "All"),
+        "export.excel": lambda: excel_bytes(ctx.register()),
+        "daycache.category_level1": with_day_cache(
+            lambda: a.get_category_metrics(conn, YEAR_FROM, TO_DATE, "All", "All")),
+        "daycache.register": with_day_cache(ctx.register_query),
+        "summary.category_level1": with_summaries(
+            lambda: a.get_category_metrics(conn, YEAR_FROM, TO_DATE, "All", "All")),
+        "summary.beds_by_department": with_summaries(
+            lambda: a.get_department_occupancy_breakdown(conn, FROM_DATE, TO_DATE)),
+        "summary.state_stats_range": with_summaries(lambda: a.state_stats_aggregate(conn, YEAR_FROM, TO_DATE)),
+        "custom_metric.table": lambda: ctx.metrics.execute_metric_query(
+            METRIC_QUERY, conn, FROM_DATE, TO_DATE, "All Hospitals", "All", metric_id="bench"),
+    }
+
+
+def run_one(name, func, repeat):
+    func()  # warm-up: statement translation, SQLite page cache, imports
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = func()
+        times.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    try:
+        func()
+        _current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return Result(name, min(times), statistics.median(times), peak / (1024 * 1024), _size(value))
+
+
+def run_scale(rows, repeat, only=None):
+    path = ensure_database(rows)
+    with tempfile.TemporaryDirectory() as metrics_dir:
+        ctx = Context(path, metrics_dir)
+        try:
+            # in-memory only: closed days left on disk by earlier runs would skew the cold numbers
+            get_day_cache().enabled = False
+            get_day_cache().directory = None
+            # the data window is fixed, so summaries built at any time stay complete
+            get_router().enabled = False
+            get_router().max_age = timedelta.max
+            # the leaderboards and Excel export reuse the register frame
+            ctx.register()
+            results = []
+            for name, func in benchmarks(ctx).items():
+                if only and not any(o in name for o in only):
+                    continue
+                result = run_one(name, func, repeat)
+                results.append(result)
+                print(f"  {name:<26} {result.min_ms:>10.1f} {result.median_ms:>10.1f} "
+                      f"{result.peak_mb:>9.1f} {result.size if result.size is not None else '-':>9}")
+            return results
+        finally:
+            ctx.close()
+
+
+def compare(scale, results, baseline, tolerance, min_delta_ms):
+    """Return a list of regression messages for one scale"""
+    reference = baseline.get("scales", {}).get(str(scale), {})
+    problems = []
+    for r in results:
+        ref = reference.get(r.name)
+        if not ref:
+            continue
+        slower = r.median_ms - ref["median_ms"]
+        if r.median_ms > ref["median_ms"] * (1 + tolerance) and slower > min_delta_ms:
+            problems.append(f"{scale:>9,} {r.name}: median {r.median_ms:.1f} ms vs baseline "
+                            f"{ref['median_ms']:.1f} ms (+{slower / ref['median_ms']:.0%})")
+        if r.peak_mb > ref["peak_mb"] * (1 + tolerance) and r.peak_mb - ref["peak_mb"] > 1:
+            problems.append(f"{scale:>9,} {r.name}: peak {r.peak_mb:.1f} MB vs baseline "
+                            f"{ref['peak_mb']:.1f} MB")
+    return problems
+
+
+def load_baseline(path):
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+
+def save_baseline(path, all_results, baseline):
+    baseline.setdefault("scales", {})
+    for scale, results in all_results.items():
+        entry = baseline["scales"].setdefault(str(scale), {})
+        for r in results:
+            entry[r.name] = {"median_ms": round(r.median_ms, 2), "min_ms": round(r.min_ms, 2),
+                             "peak_mb": round(r.peak_mb, 2), "size": r.size}
+    baseline["recorded"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    baseline["machine"] = f"{platform.machine()} / {platform.system()} / Python {platform.python_version()}"
+    path.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES,
+                        help="approximate total rows of each stand-in database")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", nargs="+", help="run benchmarks whose name contains any of these")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="write results to the baseline file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown/growth (0.25 = 25%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0,
+                        help="ignore slowdowns smaller than this many milliseconds")
+    args = parser.parse_args()
+
+    baseline = load_baseline(args.baseline)
+    all_results = {}
+    problems = []
+    for scale in args.scales:
+        print(f"\n== {scale:,} rows ==")
+        ensure_database(scale)
+        print(f"  {'benchmark':<26} {'min ms':>10} {'median ms':>10} {'peak MB':>9} {'size':>9}")
+        results = run_scale(scale, args.repeat, args.only)
+        all_results[scale] = results
+        if baseline and not args.save_baseline:
+            problems += compare(scale, results, baseline, args.tolerance, args.min_delta_ms)
+
+    if args.save_baseline:
+        save_baseline(args.baseline, all_results, baseline)
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+    if not baseline:
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to record one.")
+        return 0
+    if problems:
+        print(f"\n{len(problems)} regression(s) against the baseline recorded {baseline.get('recorded', '?')}:")
+        for p in problems:
+            print(f"  {p}")
+        return 1
+    print("\nNo regressions against the baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,8 @@
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path('', views.index, name='api-index'),
+    path('<str:endpoint>/', views.figures, name='api-figures'),
+]
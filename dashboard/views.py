@@ -0,0 +1,148 @@
+"""
+Read-only JSON API over the dashboard analytics (sssihms.payloads)
+
+    GET /api/                endpoint list
+    GET /api/kpis/           General KPIs
+    GET /api/occupancy/      bed occupancy, daily series, per department
+                             (&hospital=: that hospital's wards, no series)
+    GET /api/categories/     category hierarchy (&category=, &subcatg= to drill down)
+    GET /api/states/         patients per state
+    GET /api/surgery/        surgery aggregates (&surgeon= for one surgeon's share)
+
+Filters are the dashboard's: from, to (YYYY-MM-DD, default the current month
+to date), hospital, dept, ordering_dept.
+
+Every request needs an Authorization: Bearer header carrying one of
+API_TOKENS. With no token configured the API stays closed (503), so patient
+figures are never served to the network by default.
+
+Responses are kept in Django's cache (CACHES['default'], shared by every
+worker) under the endpoint and normalised filters, with an ETag that hashes
+the body. A poll sending If-None-Match gets 304 Not Modified from the cache
+entry without touching the database. Entries for settled ranges live
+API_CACHE_SETTLED_TTL seconds, others API_CACHE_TTL; a recomputed body with
+the same figures has the same ETag, so clients keep getting 304.
+"""
+import hashlib
+import hmac
+import json
+import os
+import threading
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views.decorators.http import require_safe
+
+from sssihms import analytics, payloads
+from sssihms.db import acquire, create_pool
+from sssihms.instrumentation import set_context
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Process-wide session pool for API queries"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = create_pool()
+        return _pool
+
+
+def _date(value, default, name):
+    if not value:
+        return default
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"'{name}' must be a date as YYYY-MM-DD, not {value!r}")
+
+
+def parse_filters(params, today=None):
+    """payloads.Filters from query parameters (raises ValueError on bad input)"""
+    today = today or date.today()
+    from_date = _date(params.get('from'), date(today.year, today.month, 1), 'from')
+    to_date = _date(params.get('to'), today, 'to')
+    if from_date > to_date:
+        raise ValueError("'from' is after 'to'")
+    hospital = params.get('hospital') or analytics.ALL_HOSPITALS
+    if hospital.lower() in ('all', analytics.ALL_HOSPITALS.lower()):
+        hospital = analytics.ALL_HOSPITALS
+    return payloads.Filters(
+        from_date=from_date,
+        to_date=to_date,
+        hospital=hospital,
+        dept=params.get('dept') or analytics.ALL,
+        ordering_dept=params.get('ordering_dept') or analytics.ALL,
+        category=params.get('category') or None,
+        subcatg=params.get('subcatg') or None,
+        surgeon=params.get('surgeon') or None,
+    )
+
+
+def _authorized(request):
+    # header only: a token in the query string would end up in access logs
+    header = request.headers.get('Authorization', '')
+    if not header.startswith('Bearer '):
+        return False
+    token = header[7:]
+    return any(hmac.compare_digest(token, allowed) for allowed in settings.API_TOKENS)
+
+
+def cached_body(endpoint, filters):
+    """(etag, JSON body) of one endpoint and filter set, from the shared cache or computed now"""
+    database = os.getenv('STANDIN_DB') or os.getenv('DB_DSN', '')
+    key_src = json.dumps([endpoint, database, filters.as_dict()], sort_keys=True)
+    key = 'api:' + hashlib.sha256(key_src.encode('utf-8')).hexdigest()
+    entry = cache.get(key)
+    if entry is None:
+        conn = acquire(get_pool(), 'api.acquire')
+        try:
+            data = payloads.BUILDERS[endpoint](conn, filters)
+        finally:
+            conn.close()
+        body = json.dumps({'endpoint': endpoint, 'filters': filters.as_dict(), 'data': data},
+                          sort_keys=True, separators=(',', ':'), default=str).encode('utf-8')
+        entry = ('"%s"' % hashlib.sha256(body).hexdigest()[:32], body)
+        ttl = settings.API_CACHE_SETTLED_TTL if filters.settled() else settings.API_CACHE_TTL
+        cache.set(key, entry, ttl)
+    return entry
+
+
+@require_safe
+def index(request):
+    return JsonResponse({
+        'endpoints': {name: request.build_absolute_uri(f'{name}/') for name in payloads.BUILDERS},
+        'filters': ['from', 'to', 'hospital', 'dept', 'ordering_dept', 'category', 'subcatg', 'surgeon'],
+    })
+
+
+@require_safe
+def figures(request, endpoint):
+    set_context(page=f'api.{endpoint}')
+    if endpoint not in payloads.BUILDERS:
+        return JsonResponse({'error': f"unknown endpoint '{endpoint}'"}, status=404)
+    if not settings.API_TOKENS:
+        return JsonResponse({'error': 'API disabled: no API_TOKENS configured'}, status=503)
+    if not _authorized(request):
+        return JsonResponse({'error': 'missing or invalid API token'}, status=401)
+    try:
+        filters = parse_filters(request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    try:
+        etag, body = cached_body(endpoint, filters)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    # clients may keep the body but must revalidate it (a cheap 304) before reuse
+    patch_cache_control(response, no_cache=True)
+    return response
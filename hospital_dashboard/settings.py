@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -84,6 +85,24 @@ DATABASES = {
     }
 }
 
+# Cache
+# Shared by every worker process, so the JSON API (dashboard app) computes a
+# response once for all of them
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('API_CACHE_DIR', str(BASE_DIR / '.cache' / 'api')),
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    }
+}
+
+# JSON API: seconds a response is reused for ranges still open / settled,
+# and the bearer tokens clients must send (none: the API refuses every request)
+API_CACHE_TTL = int(os.getenv('API_CACHE_TTL', '300'))
+API_CACHE_SETTLED_TTL = int(os.getenv('API_CACHE_SETTLED_TTL', '86400'))
+API_TOKENS = [t for t in os.getenv('API_TOKENS', '').split(',') if t]
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
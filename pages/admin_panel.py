@@ -1,8 +1,14 @@
 import streamlit as st
 import oracledb
 import hashlib
+import os
+import numpy as np
 import pandas as pd
 
+from sssihms import standin, staff
+from sssihms.instrumentation import timed, set_context, POOL
+from sssihms.db import init_oracle_client
+
 # =====================================================
 # STREAMLIT CONFIG
 # =====================================================
@@ -46,16 +52,21 @@ st.markdown("""
 # =====================================================
 # ORACLE CLIENT INIT
 # =====================================================
-oracledb.init_oracle_client(
-    lib_dir=r"C:\Users\sumir\Downloads\instantclient-basic-windows.x64-23.9.0.25.07\instantclient_23_9"
-)
+if not os.getenv("STANDIN_DB"):
+    init_oracle_client(
+        lib_dir=r"C:\Users\sumir\Downloads\instantclient-basic-windows.x64-23.9.0.25.07\instantclient_23_9"
+    )
 
 def get_connection():
-    return oracledb.connect(
-        user="hisapp",
-        password="his@2025",
-        dsn="192.168.21.6:1521/hisdb"
-    )
+    if os.getenv("STANDIN_DB"):
+        # Offline runs against the synthetic stand-in database (sssihms.synthetic)
+        return standin.connect(os.getenv("STANDIN_DB"))
+    with timed("admin.connect", kind=POOL):
+        return oracledb.connect(
+            user="hisapp",
+            password="his@2025",
+            dsn="192.168.21.6:1521/hisdb"
+        )
 
 # =====================================================
 # PASSWORD HASH (SHA-256)
@@ -72,17 +83,21 @@ if "authenticated" not in st.session_state or not st.session_state.authenticated
     st.warning("🔒 Please log in first.")
     st.stop()
 
+set_context(page="admin_panel", user=st.session_state.get("username"))
+
 # -- Strong DB role verification
 def fetch_role(staffid: str):
     try:
         conn = get_connection()
         cur = conn.cursor()
-        cur.execute("""
-            SELECT ACCESS_ROLE 
-            FROM STAFFMASTER 
-            WHERE STAFFID = :id
-        """, {"id": staffid})
-        row = cur.fetchone()
+        with timed("admin.fetch_role") as t:
+            cur.execute("""
+                SELECT ACCESS_ROLE 
+                FROM STAFFMASTER 
+                WHERE STAFFID = :id
+            """, {"id": staffid})
+            row = cur.fetchone()
+            t.rows = int(row is not None)
         cur.close()
         conn.close()
         return row[0] if row else None
@@ -113,44 +128,62 @@ with col2:
     # Admin panel is current page, show as disabled or highlighted
     st.button("⚙️ Admin", use_container_width=True, disabled=True, key="nav_admin_current")
 
+if st.sidebar.button("⚡ Performance", use_container_width=True, key="nav_performance"):
+    st.switch_page("pages/performance.py")
+
 st.sidebar.markdown("---")
 st.sidebar.info(f"👤 **{st.session_state.get('staffname', 'Admin')}**\n🏥 {st.session_state.get('hospitalid', 'N/A')}")
 
 # =====================================================
 # DB OPERATIONS
 # =====================================================
-def fetch_all_staff():
+@st.cache_data(ttl=300, show_spinner=False)
+def staff_filter_options():
+    """Hospital and department choices for the grid filters (refreshed every 5 minutes)"""
     try:
         conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT STAFFID, STAFFNAME, DEPTNAME, DESIGNATION, 
-                   HOSPITALID, DEPTCODE, ATHMAID, LOGINOK, ACCESS_ROLE
-            FROM STAFFMASTER
-            ORDER BY STAFFID
-        """)
-        rows = cur.fetchall()
-        cols = [d[0] for d in cur.description]
-        cur.close()
-        conn.close()
-        return pd.DataFrame(rows, columns=cols)
-
+        try:
+            return staff.staff_filter_options(conn)
+        finally:
+            conn.close()
     except Exception as e:
-        st.error(f"Database error while fetching staff: {e}")
-        return pd.DataFrame(columns=[
-            "STAFFID","STAFFNAME","DEPTNAME","DESIGNATION",
-            "HOSPITALID","DEPTCODE","ATHMAID","LOGINOK","ACCESS_ROLE"
-        ])
+        st.error(f"Database error while loading filter options: {e}")
+        return {"hospitals": [], "depts": []}
+
+def role_styles(df):
+    """Admin rows highlighted, computed for the whole page at once (Styler.apply axis=None)"""
+    is_admin = (df["ACCESS_ROLE"] == "A").to_numpy()[:, None]
+    css = np.where(is_admin, "background-color: #ffe6e6", "")
+    return pd.DataFrame(np.broadcast_to(css, df.shape), index=df.index, columns=df.columns)
+
+def staff_picker(conn, label, key):
+    """Type-ahead staff selection: matches for the typed ID/name prefix, looked up on the server"""
+    text = st.text_input(label, key=f"{key}_search", placeholder="Type a staff ID or name prefix")
+    if not text.strip():
+        return None
+    try:
+        matches = staff.search_staff(conn, text)
+    except Exception as e:
+        st.error(f"Database error while searching staff: {e}")
+        return None
+    if matches.empty:
+        st.caption("No staff match that prefix.")
+        return None
+    names = dict(zip(matches["STAFFID"], matches["STAFFNAME"]))
+    hint = f" (first {staff.SEARCH_LIMIT}; type more to narrow)" if len(matches) == staff.SEARCH_LIMIT else ""
+    return st.selectbox(f"Matching staff{hint}", list(names), key=f"{key}_select",
+                        format_func=lambda sid: f"{sid} — {names[sid]}")
 
 def update_loginok(staffid: str, value: str):
     try:
         conn = get_connection()
         cur = conn.cursor()
-        cur.execute("""
-            UPDATE STAFFMASTER 
-            SET LOGINOK = :val 
-            WHERE STAFFID = :sid
-        """, {"val": value, "sid": staffid})
+        with timed("admin.update_loginok"):
+            cur.execute("""
+                UPDATE STAFFMASTER 
+                SET LOGINOK = :val 
+                WHERE STAFFID = :sid
+            """, {"val": value, "sid": staffid})
         conn.commit()
         cur.close()
         conn.close()
@@ -162,11 +195,12 @@ def update_access_role(staffid: str, role: str):
     try:
         conn = get_connection()
         cur = conn.cursor()
-        cur.execute("""
-            UPDATE STAFFMASTER 
-            SET ACCESS_ROLE = :role 
-            WHERE STAFFID = :sid
-        """, {"role": role, "sid": staffid})
+        with timed("admin.update_access_role"):
+            cur.execute("""
+                UPDATE STAFFMASTER 
+                SET ACCESS_ROLE = :role 
+                WHERE STAFFID = :sid
+            """, {"role": role, "sid": staffid})
         conn.commit()
         cur.close()
         conn.close()
@@ -179,11 +213,12 @@ def reset_password(staffid: str, new_password: str):
         enc = hash_password(new_password)
         conn = get_connection()
         cur = conn.cursor()
-        cur.execute("""
-            UPDATE STAFFMASTER 
-            SET TXTPASSWD = :pwd 
-            WHERE STAFFID = :sid
-        """, {"pwd": enc, "sid": staffid})
+        with timed("admin.reset_password"):
+            cur.execute("""
+                UPDATE STAFFMASTER 
+                SET TXTPASSWD = :pwd 
+                WHERE STAFFID = :sid
+            """, {"pwd": enc, "sid": staffid})
         conn.commit()
         cur.close()
         conn.close()
@@ -199,26 +234,27 @@ def add_staff(staffid, staffname, deptname, designation,
         conn = get_connection()
         cur = conn.cursor()
 
-        cur.execute("""
-            INSERT INTO STAFFMASTER
-            (STAFFID, STAFFNAME, DEPTNAME, DESIGNATION, HOSPITALID,
-             DEPTCODE, ATHMAID, TXTPASSWD, LOGINOK, ACCESS_ROLE)
-            VALUES (
-             :sid, :sname, :dname, :desig, :hid,
-             :dcode, :ath, :pwd, :loginok, :acc_role
-            )
-        """, {
-            "sid": staffid,
-            "sname": staffname,
-            "dname": deptname,
-            "desig": designation,
-            "hid": hospitalid,
-            "dcode": deptcode,
-            "ath": athmaid,
-            "pwd": enc,
-            "loginok": loginok,
-            "acc_role": access_role
-        })
+        with timed("admin.add_staff"):
+            cur.execute("""
+                INSERT INTO STAFFMASTER
+                (STAFFID, STAFFNAME, DEPTNAME, DESIGNATION, HOSPITALID,
+                 DEPTCODE, ATHMAID, TXTPASSWD, LOGINOK, ACCESS_ROLE)
+                VALUES (
+                 :sid, :sname, :dname, :desig, :hid,
+                 :dcode, :ath, :pwd, :loginok, :acc_role
+                )
+            """, {
+                "sid": staffid,
+                "sname": staffname,
+                "dname": deptname,
+                "desig": designation,
+                "hid": hospitalid,
+                "dcode": deptcode,
+                "ath": athmaid,
+                "pwd": enc,
+                "loginok": loginok,
+                "acc_role": access_role
+            })
 
         conn.commit()
         cur.close()
@@ -234,10 +270,11 @@ def delete_staff(staffid: str):
     try:
         conn = get_connection()
         cur = conn.cursor()
-        cur.execute("""
-            DELETE FROM STAFFMASTER 
-            WHERE STAFFID = :sid
-        """, {"sid": staffid})
+        with timed("admin.delete_staff"):
+            cur.execute("""
+                DELETE FROM STAFFMASTER 
+                WHERE STAFFID = :sid
+            """, {"sid": staffid})
         conn.commit()
         cur.close()
         conn.close()
@@ -255,25 +292,124 @@ st.markdown("Manage hospital staff, roles, and login permissions.")
 # SHOW ALL STAFF
 # ===============================
 st.subheader("📋 Current Staff Records")
-df = fetch_all_staff()
+
+# One connection for this rerun's reads (grid page, count, type-ahead lookups)
+try:
+    conn = get_connection()
+except Exception as e:
+    st.error(f"Failed to connect to Oracle DB: {e}")
+    st.stop()
+
+options = staff_filter_options()
+f1, f2, f3, f4, f5 = st.columns([1, 2, 1, 1, 2])
+grid_hospital = f1.selectbox("Hospital", ["All"] + options["hospitals"], key="grid_hospital")
+grid_dept = f2.selectbox("Department", ["All"] + options["depts"], key="grid_dept")
+grid_role = f3.selectbox("Role", ["All", "A", "U"], key="grid_role",
+                         format_func=lambda x: {"A": "🛡️ Admin", "U": "👤 Staff"}.get(x, x))
+grid_loginok = f4.selectbox("Login", ["All", "Y", "N"], key="grid_loginok",
+                            format_func=lambda x: {"Y": "✅ Active", "N": "🔴 Inactive"}.get(x, x))
+grid_prefix = f5.text_input("Name starts with", key="grid_prefix")
+
+grid_filter = staff.StaffFilter(
+    hospital=None if grid_hospital == "All" else grid_hospital,
+    dept=None if grid_dept == "All" else grid_dept,
+    role=None if grid_role == "All" else grid_role,
+    loginok=None if grid_loginok == "All" else grid_loginok,
+    name_prefix=grid_prefix.strip() or None,
+)
+
+# Keyset pagination: the STAFFID each visited page starts after; new filters restart at page 1
+if st.session_state.get("grid_filter") != grid_filter:
+    st.session_state.grid_filter = grid_filter
+    st.session_state.grid_cursors = [None]
+cursors = st.session_state.grid_cursors
+
+try:
+    df, has_more = staff.fetch_staff_page(conn, grid_filter, after=cursors[-1])
+    total = staff.count_staff(conn, grid_filter)
+except Exception as e:
+    st.error(f"Database error while fetching staff: {e}")
+    df, has_more, total = pd.DataFrame(columns=staff.STAFF_COLUMNS), False, 0
 
 if not df.empty:
-    # Add color coding for roles
-    def highlight_role(row):
-        if row['ACCESS_ROLE'] == 'A':
-            return ['background-color: #ffe6e6'] * len(row)
-        return [''] * len(row)
-    
-    st.dataframe(
-        df.style.apply(highlight_role, axis=1),
+    grid = st.dataframe(
+        df.style.apply(role_styles, axis=None),
         use_container_width=True,
-        height=400
+        height=400,
+        on_select="rerun",
+        selection_mode="multi-row",
+        key=f"grid_page_{len(cursors)}"
     )
-    
-    st.caption("💡 Admin users (ACCESS_ROLE='A') are highlighted in red")
+    grid_selected = df["STAFFID"].iloc[grid.selection.rows].tolist()
+
+    first = (len(cursors) - 1) * staff.PAGE_SIZE + 1
+    p1, p2, p3 = st.columns([1, 3, 1])
+    if p1.button("⬅️ Previous", use_container_width=True, disabled=len(cursors) == 1, key="grid_prev"):
+        cursors.pop()
+        st.rerun()
+    p2.caption(f"Showing {first:,}–{first + len(df) - 1:,} of {total:,} staff · "
+               "💡 Admin users (ACCESS_ROLE='A') are highlighted in red")
+    if p3.button("Next ➡️", use_container_width=True, disabled=not has_more, key="grid_next"):
+        cursors.append(df["STAFFID"].iloc[-1])
+        st.rerun()
 else:
+    grid_selected = []
     st.info("No staff records found.")
 
+# ===============================
+# BULK ACTIONS
+# ===============================
+def show_bulk_result(result):
+    if result.committed and result.applied:
+        st.success(f"✅ {result.operation}: {result.applied} of {result.attempted} row(s) applied.")
+    elif result.errors and not result.committed:
+        st.error(f"❌ {result.operation}: nothing applied ({len(result.errors)} row(s) failed).")
+    if result.errors:
+        st.warning(f"⚠️ {len(result.errors)} row(s) could not be applied:")
+        st.dataframe(result.error_frame(), use_container_width=True, hide_index=True)
+
+def run_bulk(origin, operation, *args, **kwargs):
+    """Run a sssihms.staff bulk operation; its result is shown under `origin` after the rerun"""
+    try:
+        st.session_state[f"{origin}_result"] = operation(conn, *args, **kwargs)
+    except Exception as e:
+        conn.rollback()
+        st.error(f"❌ Bulk operation failed, nothing was changed: {e}")
+        return
+    staff_filter_options.clear()
+    st.rerun()
+
+with st.expander("🧰 Bulk Actions", expanded=bool(grid_selected)):
+    scope = st.radio("Apply to", ["Selected rows on this page", "All staff matching the filters"],
+                     horizontal=True, key="bulk_scope")
+    if scope == "Selected rows on this page":
+        targets = grid_selected
+        st.caption(f"{len(targets)} row(s) selected (tick rows in the grid above).")
+    else:
+        targets = None
+        st.caption(f"{total:,} staff match the current filters.")
+
+    # admins cannot deactivate or demote themselves in bulk either
+    me = st.session_state.username
+
+    def target_ids():
+        ids = targets if targets is not None else staff.staff_ids(conn, grid_filter)
+        return [sid for sid in ids if sid != me]
+
+    all_or_nothing = st.checkbox("Apply only if every row succeeds", value=False, key="bulk_all_or_nothing")
+    b1, b2, b3, b4 = st.columns([1, 1, 1, 1])
+    if b1.button("✅ Activate", use_container_width=True, key="bulk_activate"):
+        run_bulk("bulk", staff.bulk_set, target_ids(), "LOGINOK", "Y", all_or_nothing=all_or_nothing)
+    if b2.button("🔴 Deactivate", use_container_width=True, key="bulk_deactivate"):
+        run_bulk("bulk", staff.bulk_set, target_ids(), "LOGINOK", "N", all_or_nothing=all_or_nothing)
+    bulk_role = b3.selectbox("Role", ["U", "A"], label_visibility="collapsed", key="bulk_role",
+                             format_func=lambda x: "🛡️ Admin (A)" if x == "A" else "👤 Staff (U)")
+    if b4.button("🔐 Set Role", use_container_width=True, key="bulk_set_role"):
+        run_bulk("bulk", staff.bulk_set, target_ids(), "ACCESS_ROLE", bulk_role, all_or_nothing=all_or_nothing)
+
+if "bulk_result" in st.session_state:
+    show_bulk_result(st.session_state.pop("bulk_result"))
+
 st.markdown("---")
 
 # ===============================
@@ -281,17 +417,16 @@ st.markdown("---")
 # ===============================
 st.subheader("👨‍⚕️ Staff Actions")
 
-staff_list = df["STAFFID"].tolist() if not df.empty else []
-selected = st.selectbox("Select STAFFID", [""] + staff_list, key="staff_select")
+selected = staff_picker(conn, "Find staff (STAFFID or name)", "staff")
 
 if selected:
     # Show selected staff info
-    staff_info = df[df["STAFFID"] == selected].iloc[0]
+    staff_info = staff.fetch_staff(conn, selected) or {}
     st.info(f"""
-    **Name:** {staff_info['STAFFNAME']}  
-    **Department:** {staff_info['DEPTNAME']}  
-    **Role:** {'🛡️ Admin' if staff_info['ACCESS_ROLE'] == 'A' else '👤 Staff'}  
-    **Status:** {'✅ Active' if staff_info['LOGINOK'] == 'Y' else '🔴 Inactive'}
+    **Name:** {staff_info.get('STAFFNAME')}  
+    **Department:** {staff_info.get('DEPTNAME')}  
+    **Role:** {'🛡️ Admin' if staff_info.get('ACCESS_ROLE') == 'A' else '👤 Staff'}  
+    **Status:** {'✅ Active' if staff_info.get('LOGINOK') == 'Y' else '🔴 Inactive'}
     """)
 
 col1, col2, col3 = st.columns(3)
@@ -338,6 +473,29 @@ st.markdown("---")
 # ===============================
 st.subheader("➕ Add New Staff")
 
+with st.expander("📥 Import Staff from CSV", expanded=False):
+    st.caption("One row per new staff member. Required: " + ", ".join(staff.CSV_REQUIRED)
+               + ". LOGINOK defaults to N and ACCESS_ROLE to U.")
+    st.download_button("⬇️ CSV template", staff.csv_template(), file_name="staff_import_template.csv",
+                       mime="text/csv", key="import_template")
+    upload = st.file_uploader("Staff CSV", type=["csv"], key="import_csv")
+    if upload is not None:
+        try:
+            import_df = staff.read_staff_csv(upload.getvalue())
+        except Exception as e:
+            st.error(f"❌ Cannot read the CSV: {e}")
+        else:
+            st.dataframe(import_df.drop(columns=["PASSWORD"]).head(20), use_container_width=True, hide_index=True)
+            st.caption(f"{len(import_df):,} row(s) in the file" + (" (first 20 shown)" if len(import_df) > 20 else ""))
+            import_all_or_nothing = st.checkbox("Import only if every row is valid", value=True,
+                                                key="import_all_or_nothing")
+            if st.button(f"📥 Import {len(import_df):,} Staff", type="primary", use_container_width=True,
+                         key="import_button"):
+                run_bulk("import", staff.import_staff, import_df, all_or_nothing=import_all_or_nothing)
+
+if "import_result" in st.session_state:
+    show_bulk_result(st.session_state.pop("import_result"))
+
 with st.expander("➕ Add New Staff Member", expanded=False):
     with st.form("add_staff_form", clear_on_submit=True):
         c1, c2 = st.columns(2)
@@ -390,13 +548,14 @@ st.markdown("---")
 st.subheader("🗑️ Delete Staff")
 
 with st.expander("⚠️ Delete Staff Member", expanded=False):
-    del_staff = st.selectbox("Select staff to delete", [""] + staff_list, key="del_select")
+    del_staff = staff_picker(conn, "Find staff to delete", "del")
     
     # Check if trying to delete self
     is_self_delete = del_staff == st.session_state.username
     
     if del_staff:
-        staff_to_delete = df[df["STAFFID"] == del_staff].iloc[0]
+        staff_to_delete = staff.fetch_staff(conn, del_staff) or {"STAFFID": del_staff, "STAFFNAME": None,
+                                                                 "ACCESS_ROLE": None}
         
         if is_self_delete:
             st.error(f"""
@@ -429,6 +588,12 @@ with st.expander("⚠️ Delete Staff Member", expanded=False):
             delete_staff(del_staff)
             st.rerun()
 
+# Close DB connection
+try:
+    conn.close()
+except Exception:
+    pass
+
 st.markdown("---")
 st.caption("🛡️ Admins (A) have full access | 👤 Staff (U) have limited access")
 st.caption("Roles are controlled by ACCESS_ROLE in STAFFMASTER table")
\ No newline at end of file
@@ -2,6 +2,10 @@ import streamlit as st
 import oracledb
 import hashlib
 
+from sssihms import assets
+from sssihms.db import init_oracle_client
+from sssihms.instrumentation import timed, set_context, POOL
+
 # =====================================================
 # STREAMLIT CONFIG
 # =====================================================
@@ -14,95 +18,23 @@ st.set_page_config(
 # =====================================================
 # HIDE SIDEBAR NAVIGATION + ADD STYLING
 # =====================================================
-st.markdown("""
-    <style>
-    /* Hide Streamlit page navigation */
-    [data-testid="stSidebarNav"] {
-        display: none;
-    }
-    
-    /* Modern styling */
-    .main {
-        background: linear-gradient(135deg, #f8f9fa 0%, #e9ecef 100%);
-    }
-    
-    .stButton button {
-        border-radius: 8px;
-        font-weight: 600;
-        transition: all 0.3s;
-    }
-    
-    .stButton button:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 4px 12px rgba(0,0,0,0.15);
-    }
-    
-    /* Password strength indicator */
-    .password-strength {
-        padding: 10px;
-        border-radius: 8px;
-        margin: 10px 0;
-        font-weight: 600;
-    }
-    
-    .strength-weak {
-        background-color: #fee;
-        color: #c00;
-        border-left: 4px solid #c00;
-    }
-    
-    .strength-medium {
-        background-color: #fef6e6;
-        color: #f57c00;
-        border-left: 4px solid #f57c00;
-    }
-    
-    .strength-strong {
-        background-color: #e8f5e9;
-        color: #2e7d32;
-        border-left: 4px solid #2e7d32;
-    }
-    
-    /* Info card */
-    .info-card {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        padding: 20px;
-        border-radius: 12px;
-        box-shadow: 0 4px 12px rgba(0,0,0,0.2);
-        margin: 20px 0;
-        color: white;
-    }
-    
-    .info-card h4 {
-        color: white !important;
-        margin: 0 !important;
-    }
-    
-    .info-card p {
-        color: rgba(255, 255, 255, 0.95) !important;
-        margin: 5px 0 !important;
-    }
-    
-    .info-card strong {
-        color: rgba(255, 255, 255, 0.85);
-        font-weight: 600;
-    }
-    </style>
-""", unsafe_allow_html=True)
+st.markdown(assets.stylesheet("change_password.css", st.get_option("server.enableStaticServing")),
+            unsafe_allow_html=True)
 
 # =====================================================
 # ORACLE CLIENT INIT
 # =====================================================
-oracledb.init_oracle_client(
+init_oracle_client(
     lib_dir=r"C:\Users\sumir\Downloads\instantclient-basic-windows.x64-23.9.0.25.07\instantclient_23_9"
 )
 
 def get_connection():
-    return oracledb.connect(
-        user="hisapp",
-        password="his@2025",
-        dsn="192.168.21.6:1521/hisdb"
-    )
+    with timed("change_password.connect", kind=POOL):
+        return oracledb.connect(
+            user="hisapp",
+            password="his@2025",
+            dsn="192.168.21.6:1521/hisdb"
+        )
 
 # =====================================================
 # PASSWORD HASH (SHA-256)
@@ -118,6 +50,8 @@ if "authenticated" not in st.session_state or not st.session_state.authenticated
     st.warning("🔒 Please log in first.")
     st.stop()
 
+set_context(page="change_password", user=st.session_state.get("username"))
+
 # =====================================================
 # SIDEBAR NAVIGATION BUTTONS
 # =====================================================
@@ -157,13 +91,15 @@ def verify_old_password(staffid: str, old_password: str) -> bool:
         
         encrypted_old = hash_password(old_password)
         
-        cur.execute("""
-            SELECT TXTPASSWD 
-            FROM STAFFMASTER 
-            WHERE STAFFID = :sid
-        """, {"sid": staffid})
+        with timed("change_password.verify_old_password") as t:
+            cur.execute("""
+                SELECT TXTPASSWD 
+                FROM STAFFMASTER 
+                WHERE STAFFID = :sid
+            """, {"sid": staffid})
         
-        row = cur.fetchone()
+            row = cur.fetchone()
+            t.rows = int(row is not None)
         cur.close()
         conn.close()
         
@@ -183,11 +119,12 @@ def update_password(staffid: str, new_password: str) -> bool:
         
         encrypted_new = hash_password(new_password)
         
-        cur.execute("""
-            UPDATE STAFFMASTER 
-            SET TXTPASSWD = :pwd 
-            WHERE STAFFID = :sid
-        """, {"pwd": encrypted_new, "sid": staffid})
+        with timed("change_password.update_password"):
+            cur.execute("""
+                UPDATE STAFFMASTER 
+                SET TXTPASSWD = :pwd 
+                WHERE STAFFID = :sid
+            """, {"pwd": encrypted_new, "sid": staffid})
         
         conn.commit()
         cur.close()
@@ -4,203 +4,28 @@ Hospital Dashboard
 """
 import streamlit as st
 import pandas as pd
-import oracledb
 import altair as alt
-import io
-import zipfile
 import streamlit.components.v1 as components
-import json
-import os
 
 from datetime import date, datetime, timedelta
 from pathlib import Path
 from dotenv import load_dotenv
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_CENTER, TA_RIGHT
+
+from sssihms import analytics, assets, chartdata
+from sssihms.analytics import CustomMetricsManager
+from sssihms.metric_store import MetricConflictError, MetricSeedError
+from sssihms.exports import excel_bytes, csv_bytes
+from sssihms.export_jobs import get_export_manager, export_key, DONE as EXPORT_DONE, FAILED as EXPORT_FAILED
+from sssihms.db import FRAME_CAP, STREAM_CHUNK_ROWS, FrameTooLarge, acquire, create_pool, frame_bytes
+from sssihms.prefetch import get_prefetcher
+from sssihms.instrumentation import PageTimer
+from sssihms.cancellation import QueryCancelled, QueryTimeout, streamlit_superseded, watch_session
 
 # CSS 
 def inject_modern_css():
-    """Inject modern, professional CSS styling"""
-    st.markdown("""
-    <style>
-    /* ========== HIDE SIDEBAR PAGE NAVIGATION ========== */
-    [data-testid="stSidebarNav"] {
-        display: none;
-    }
-    
-    /* Hide the divider line after nav */
-    section[data-testid="stSidebar"] > div:first-child > div:first-child {
-        padding-top: 0rem;
-    }
-    /* ================================================== */
-    
-    
-    /* Global */
-    .main { 
-        background: linear-gradient(135deg, #f8f9fa 0%, #e9ecef 100%); 
-    }
-    
-    /* Enhanced KPI Cards */
-    .kpi-card {
-        padding: 24px 20px;
-        border-radius: 16px;
-        color: white;
-        text-align: center;
-        transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
-        margin-bottom: 16px;
-        box-shadow: 0 4px 12px rgba(0,0,0,0.15);
-        position: relative;
-        overflow: hidden;
-        backdrop-filter: blur(10px);
-    }
-    
-    .kpi-card::before {
-        content: '';
-        position: absolute;
-        top: -50%;
-        right: -50%;
-        width: 200%;
-        height: 200%;
-        background: radial-gradient(circle, rgba(255,255,255,0.2) 0%, transparent 70%);
-        pointer-events: none;
-    }
-    
-    .kpi-card:hover {
-        transform: translateY(-8px) scale(1.02);
-        box-shadow: 0 16px 32px rgba(0,0,0,0.25);
-    }
-    
-    .kpi-icon {
-        font-size: 36px;
-        margin-bottom: 10px;
-        filter: drop-shadow(0 2px 4px rgba(0,0,0,0.2));
-    }
-    
-    .kpi-title {
-        font-size: 13px;
-        font-weight: 600;
-        opacity: 0.95;
-        margin-bottom: 12px;
-        text-transform: uppercase;
-        letter-spacing: 0.8px;
-    }
-    
-    .kpi-value {
-        font-size: 38px;
-        font-weight: 800;
-        margin: 10px 0;
-        text-shadow: 0 2px 8px rgba(0,0,0,0.2);
-        line-height: 1;
-    }
-    
-    .kpi-sub {
-        font-size: 12px;
-        opacity: 0.9;
-        margin-top: 10px;
-        font-weight: 500;
-    }
-    
-    /* Modern Gradients */
-    .kpi-grad-1 { background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); }
-    .kpi-grad-2 { background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%); }
-    .kpi-grad-3 { background: linear-gradient(135deg, #4facfe 0%, #00f2fe 100%); }
-    .kpi-grad-4 { background: linear-gradient(135deg, #43e97b 0%, #38f9d7 100%); }
-    .kpi-grad-5 { background: linear-gradient(135deg, #fa709a 0%, #fee140 100%); }
-    .kpi-grad-6 { background: linear-gradient(135deg, #30cfd0 0%, #330867 100%); }
-    .kpi-grad-7 { background: linear-gradient(135deg, #a8edea 0%, #fed6e3 100%); }
-    .kpi-grad-8 { background: linear-gradient(135deg, #ff9a9e 0%, #fecfef 100%); }
-    
-    /* Section Headers */
-    .section-header {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white;
-        padding: 24px 28px;
-        border-radius: 14px;
-        margin: 28px 0 20px 0;
-        box-shadow: 0 6px 20px rgba(102, 126, 234, 0.4);
-    }
-    
-    .section-header h2 {
-        margin: 0;
-        font-size: 26px;
-        font-weight: 700;
-        letter-spacing: 0.5px;
-    }
-    
-    /* Breadcrumb */
-    .breadcrumb {
-        background: white;
-        padding: 14px 24px;
-        border-radius: 10px;
-        margin: 18px 0;
-        box-shadow: 0 2px 8px rgba(0,0,0,0.08);
-        font-size: 14px;
-        font-weight: 500;
-        color: #495057;
-        border-left: 4px solid #667eea;
-    }
-    
-    /* Enhanced Buttons */
-    .stButton button {
-        border-radius: 10px;
-        font-weight: 600;
-        transition: all 0.3s;
-        border: none;
-    }
-    
-    .stButton button:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 6px 16px rgba(0,0,0,0.2);
-    }
-    
-    /* Data Cards */
-    .data-card {
-        background: white;
-        padding: 24px;
-        border-radius: 14px;
-        box-shadow: 0 4px 12px rgba(0,0,0,0.1);
-        margin: 16px 0;
-        border-left: 4px solid #667eea;
-    }
-    
-    /* Metrics */
-    div[data-testid="metric-container"] {
-        background: white;
-        padding: 16px;
-        border-radius: 10px;
-        box-shadow: 0 2px 8px rgba(0,0,0,0.08);
-    }
-    
-    /* Info/Warning Boxes */
-    .stAlert {
-        border-radius: 10px;
-        border-left: 4px solid;
-    }
-    
-    /* Sidebar - Keep default styling */
-    /* Removed custom sidebar styling to preserve default filters appearance */
-    
-    /* Tables */
-    .dataframe {
-        border-radius: 10px !important;
-        overflow: hidden;
-        box-shadow: 0 4px 12px rgba(0,0,0,0.1);
-    }
-    
-    /* Charts */
-    .chart-container {
-        background: white;
-        padding: 24px;
-        border-radius: 14px;
-        box-shadow: 0 4px 12px rgba(0,0,0,0.1);
-        margin: 20px 0;
-    }
-    </style>
-    """, unsafe_allow_html=True)
+    """Link the dashboard stylesheet (static/dashboard.css, cached by the browser)"""
+    st.markdown(assets.stylesheet("dashboard.css", st.get_option("server.enableStaticServing")),
+                unsafe_allow_html=True)
 
 # Updated kpi_card_html function with modern styling
 def kpi_card_html(title, value, subtext, grad_class="kpi-grad-1", icon="📊"):
@@ -213,6 +38,20 @@ def kpi_card_html(title, value, subtext, grad_class="kpi-grad-1", icon="📊"):
         <div class="kpi-sub">{subtext}</div>
     </div>
     """
+
+# Leaderboard bar colour per surgery register role column
+ROLE_COLORS = {
+    "SURGEON_NAME": "#ff6b6b",
+    "ANAESTHETIST_NAME": "#4ecdc4",
+    "ASST_SURGEON_NAME": "#f39c12",
+    "ASST_ANAESTHETIST_NAME": "#9b59b6",
+    "PERFUSIONIST_NAME": "#e74c3c",
+    "RNURSE_NAME": "#1abc9c",
+    "SCNURSE_NAME": "#3498db",
+    "NURSE_NAME": "#16a085",
+    "TECHNICIAN_NAME": "#34495e",
+}
+
 # -------------------------
 # Page config (must be first Streamlit call)
 # -------------------------
@@ -336,6 +175,12 @@ if "authenticated" not in st.session_state or not st.session_state.authenticated
     st.warning("🔒 Please log in from the main page.")
     st.stop()
 
+# Render timing for the admin Performance page; also tags every query below
+# with this page and user
+page_timer = PageTimer("dashboard", user=st.session_state.get("username"))
+# Queries still running when a filter change replaces this run are cancelled
+watch_session(streamlit_superseded())
+
 # -------------------------
 # Oracle connection helper with connection pooling
 # -------------------------
@@ -348,49 +193,35 @@ load_dotenv()
 def init_connection_pool():
     """Initialize Oracle connection pool for better performance"""
     try:
-        pool = oracledb.create_pool(
-            user=os.getenv("DB_USER", "hisapp"),
-            password=os.getenv("DB_PASSWORD", "his@2025"),
-            dsn=os.getenv("DB_DSN", "192.168.21.6:1521/hisdb"),
-            min=2,
-            max=10,
-            increment=1,
-            getmode=oracledb.POOL_GETMODE_WAIT
-        )
-        return pool
+        # the stand-in database's pool with STANDIN_DB set (sssihms.synthetic)
+        return create_pool()
     except Exception as e:
         st.error(f"Failed to create connection pool: {e}")
         st.stop()
 
 # Get connection from pool
 def get_conn():
-    """Get connection from pool"""
+    """Get connection from pool (time spent waiting for a session is recorded)"""
     pool = init_connection_pool()
-    return pool.acquire()
+    return acquire(pool)
+
+# A run replaced mid-way (filter change, st.rerun) never reaches the close at
+# the bottom of the page; hand its session back before taking a new one
+stale_conn = st.session_state.pop("dashboard_conn", None)
+if stale_conn is not None:
+    try:
+        stale_conn.close()
+    except Exception:
+        pass
 
 # Initialize main connection
 try:
     conn = get_conn()
+    st.session_state.dashboard_conn = conn
 except Exception as e:
     st.error(f"Failed to connect to Oracle DB: {e}")
     st.stop()
 
-# -------------------------
-# Utilities
-# -------------------------
-def safe_sql(v):
-    if v is None:
-        return ""
-    return str(v).replace("'", "''")
-
-def build_hospital_where(alias_list):
-    if selected_hospital in (None, "", "All Hospitals"):
-        return "1=1"
-    safe = safe_sql(selected_hospital)
-    parts = [f"{a}.HOSPITALID = '{safe}'" for a in alias_list]
-    parts.append(f"HOSPITALID = '{safe}'")
-    return "(" + " OR ".join(parts) + ")"
-
 # -------------------------
 # Sidebar Navigation (matching admin panel design)
 # -------------------------
@@ -454,18 +285,18 @@ else:
 
 # Department dropdown
 try:
-    dept_df = pd.read_sql("SELECT DISTINCT DEPTNAME, DEPTCODE, HOSPITALID FROM DEPARTMENT ORDER BY DEPTNAME", conn)
-    dept_list = ["All"] + dept_df["DEPTNAME"].dropna().tolist()
+    dept_df = analytics.load_departments(conn)
 except Exception:
-    dept_list = ["All"]
+    dept_df = pd.DataFrame(columns=["DEPTNAME", "DEPTCODE", "HOSPITALID"])
+dept_list = ["All"] + dept_df["DEPTNAME"].dropna().tolist()
 selected_dept = st.sidebar.selectbox("Department", dept_list, index=0)
 
 # Hospital dropdown - default to user's hospital from STAFFMASTER.HOSPITALID
 try:
-    hosp_df = pd.read_sql("SELECT DISTINCT HOSPITALID FROM DEPARTMENT ORDER BY HOSPITALID", conn)
-    hosp_list = ["All Hospitals"] + hosp_df["HOSPITALID"].dropna().tolist()
+    hosp_df = analytics.load_hospitals(conn)
 except Exception:
-    hosp_list = ["All Hospitals"]
+    hosp_df = pd.DataFrame(columns=["HOSPITALID"])
+hosp_list = ["All Hospitals"] + hosp_df["HOSPITALID"].dropna().tolist()
 
 # Get user's hospital from session state (set during login from STAFFMASTER)
 user_hospital = st.session_state.get("hospitalid", None)
@@ -475,16 +306,22 @@ if user_hospital and user_hospital in hosp_list:
     
 selected_hospital = st.sidebar.selectbox("Hospital", hosp_list, index=default_index)
 
+# Side-by-side comparison of several hospitals (only meaningful across hospitals)
+compare_hospitals = []
+if selected_hospital == "All Hospitals" and len(hosp_list) > 2:
+    if st.sidebar.checkbox("🏥 Compare hospitals side by side", value=False, key="compare_hospitals_toggle"):
+        compare_hospitals = st.sidebar.multiselect(
+            "Hospitals to compare", hosp_list[1:], default=hosp_list[1:], key="compare_hospitals_select"
+        )
+
 # =================================================================================
 # Ordering dept for radiology
-ordering_dept_options = ["All"] + (dept_df["DEPTNAME"].dropna().tolist() if 'dept_df' in globals() else [])
+ordering_dept_options = ["All"] + dept_df["DEPTNAME"].dropna().tolist()
 selected_ordering_dept = st.sidebar.selectbox("Ordering Dept (for Radiology)", ordering_dept_options, index=0)
 
 # Radiology modality filter
 try:
-    category_base_q = "SELECT DISTINCT CATEGORY FROM STATS_DETAILS WHERE CATEGORY IS NOT NULL ORDER BY CATEGORY"
-    category_options_df = pd.read_sql(category_base_q, conn)
-    category_options = ["All"] + category_options_df["CATEGORY"].dropna().tolist()
+    category_options = ["All"] + analytics.load_categories(conn)["CATEGORY"].dropna().tolist()
 except Exception:
     category_options = ["All"]
 
@@ -493,16 +330,6 @@ selected_category = st.sidebar.selectbox("Category", category_options, index=0)
 # ======================== SURGEON FILTER ========================
 st.sidebar.subheader("Surgeon Filter")
 
-# ←←← MAKE SURE safe_sql() IS DEFINED BEFORE THIS BLOCK ←←←
-# (It is defined later in our file — so we define a tiny local version here if missing)
-try:
-    _ = safe_sql  # Test if already exists
-except NameError:
-    def safe_sql(v):
-        if v is None:
-            return ""
-        return str(v).replace("'", "''")
-
 # Checkbox: Lifetime vs Current Period
 use_lifetime = st.sidebar.checkbox(
     "Show surgeons by total lifetime surgeries (not just selected period)",
@@ -510,46 +337,8 @@ use_lifetime = st.sidebar.checkbox(
     help="Uncheck to show only surgeons active in the selected date range"
 )
 
-# Safe hospital condition
-hospital_condition = "1=1"
-if selected_hospital and selected_hospital not in ("", "All Hospitals"):
-    hospital_condition = f"sp.HOSPITALID = '{safe_sql(selected_hospital)}'"
-
-# Build query
-if use_lifetime:
-    surgeon_q = f"""
-    SELECT 
-        sp.STAFFID,
-        NVL(sm.STAFFNAME, sp.STAFFID || ' (Name Missing)') AS STAFFNAME,
-        COUNT(*) AS TOTAL_SURGERIES
-    FROM SURGERY_PERSONNEL sp
-    LEFT JOIN STAFFMASTER sm ON sp.STAFFID = sm.STAFFID
-    WHERE sp.STAFFROLE = 'SURGEON'
-      AND {hospital_condition}
-    GROUP BY sp.STAFFID, sm.STAFFNAME
-    HAVING COUNT(*) > 0
-    ORDER BY TOTAL_SURGERIES DESC, STAFFNAME
-    """
-else:
-    surgeon_q = f"""
-    SELECT 
-        sp.STAFFID,
-        NVL(sm.STAFFNAME, sp.STAFFID || ' (Name Missing)') AS STAFFNAME,
-        COUNT(*) AS TOTAL_SURGERIES
-    FROM SURGERY_PERSONNEL sp
-    LEFT JOIN STAFFMASTER sm ON sp.STAFFID = sm.STAFFID
-    JOIN SURGERY s ON sp.SURGERYID = s.SURGERYID
-    WHERE sp.STAFFROLE = 'SURGEON'
-      AND s.SURGERYDATE BETWEEN TO_DATE('{from_date}', 'YYYY-MM-DD') 
-                            AND TO_DATE('{to_date}', 'YYYY-MM-DD') + 0.99999
-      AND {hospital_condition}
-    GROUP BY sp.STAFFID, sm.STAFFNAME
-    HAVING COUNT(*) > 0
-    ORDER BY TOTAL_SURGERIES DESC, STAFFNAME
-    """
-
 try:
-    surgeons_df = pd.read_sql(surgeon_q, conn)
+    surgeons_df = analytics.load_surgeons(conn, selected_hospital, from_date, to_date, lifetime=use_lifetime)
     if not surgeons_df.empty:
         surgeons_df["DISPLAY"] = surgeons_df.apply(
             lambda r: f"{r['STAFFNAME']} ({r['TOTAL_SURGERIES']} surgeries)", axis=1
@@ -579,23 +368,10 @@ selected_surgeon_name = surgeon_name_map.get(selected_doctor_label, None)
 # Show count in current period
 if selected_surgeon_id and not use_lifetime:
     try:
-        cnt_q = f"""
-        SELECT COUNT(*) FROM SURGERY s
-        JOIN SURGERY_PERSONNEL sp ON s.SURGERYID = sp.SURGERYID
-        WHERE sp.STAFFROLE = 'SURGEON' 
-          AND sp.STAFFID = '{safe_sql(selected_surgeon_id)}'
-          AND s.SURGERYDATE BETWEEN TO_DATE('{from_date}', 'YYYY-MM-DD') 
-                                AND TO_DATE('{to_date}', 'YYYY-MM-DD') + 0.99999
-          AND (s.HOSPITALID = '{safe_sql(selected_hospital)}' OR '{selected_hospital}' = 'All Hospitals')
-        """
-        cnt = pd.read_sql(cnt_q, conn).iloc[0,0]
+        cnt = analytics.surgeon_surgery_count(conn, selected_surgeon_id, from_date, to_date, selected_hospital)
         st.sidebar.success(f"Selected period: **{cnt}** surgeries")
     except Exception as e:
         st.sidebar.warning(f"Count failed: {e}")
-        cnt = pd.read_sql(cnt_q, conn).iloc[0,0]
-        st.sidebar.success(f"Selected period: **{cnt}** surgeries")
-    except:
-        pass
 
 # Update the sidebar display (around line 174):
 st.sidebar.markdown(f"**Range:** {from_date} → {to_date}")
@@ -662,910 +438,104 @@ def validate_filters(hospital, dept, from_date, to_date):
 # Data Export Functions
 # -------------------------
 def create_excel_download(df, filename, sheet_name='Data'):
-    """Create formatted Excel file for download"""
-    buffer = io.BytesIO()
-    
+    """Create formatted Excel file for download (streamed, constant-memory engine)"""
     try:
-        with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-            df.to_excel(writer, sheet_name=sheet_name, index=False)
-            
-            workbook = writer.book
-            worksheet = writer.sheets[sheet_name]
-            
-            # Add formatting
-            header_format = workbook.add_format({
-                'bold': True,
-                'bg_color': '#0ea77c',
-                'font_color': 'white',
-                'border': 1
-            })
-            
-            # Format header row
-            for col_num, value in enumerate(df.columns.values):
-                worksheet.write(0, col_num, value, header_format)
-                
-                # Auto-adjust column width
-                column_len = max(df[value].astype(str).str.len().max(), len(value)) + 2
-                worksheet.set_column(col_num, col_num, min(column_len, 50))
-        
-        buffer.seek(0)
-        return buffer.getvalue()
+        return excel_bytes(df, sheet_name=sheet_name)
     except Exception as e:
         st.error(f"Failed to create Excel file: {e}")
         return None
 
 def create_csv_download(df):
     """Create CSV for download"""
-    return df.to_csv(index=False).encode('utf-8')
+    return csv_bytes(df)
 
-def export_data_options(df, base_filename):
-    """Unified export UI component"""
-    st.markdown("#### 📥 Export Data")
-    col1, col2 = st.columns(2)
+def deferred_download_button(label, dataset, filters, fmt, build, file_name, key, wait_seconds=3):
+    """
+    Download button whose file is only built when the user asks for it.
+    The build runs in the background export pool and the result is cached by
+    (dataset, filters, format), so reruns no longer serialize unused downloads.
+    """
+    manager = get_export_manager()
+    job = manager.get(export_key(dataset, filters, fmt))
     
-    with col1:
-        csv_data = create_csv_download(df)
+    if job is None:
+        if not st.button(f"⚙️ Prepare {label}", key=f"prep_{key}", use_container_width=True):
+            return
+        job = manager.submit(dataset, filters, fmt, build)
+        with st.spinner(f"Preparing {label}..."):
+            job.wait(wait_seconds)
+    
+    if job.status == EXPORT_DONE:
         st.download_button(
-            label="📄 Download CSV",
-            data=csv_data,
-            file_name=f"{base_filename}.csv",
-            mime="text/csv",
+            label=f"📥 {label}",
+            data=job.data,
+            file_name=file_name,
+            mime=job.mime,
+            key=f"dl_{key}",
+            on_click="ignore",
             use_container_width=True
         )
-    
-    with col2:
-        excel_data = create_excel_download(df, base_filename)
-        if excel_data:
-            st.download_button(
-                label="📊 Download Excel",
-                data=excel_data,
-                file_name=f"{base_filename}.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                use_container_width=True
-            )
-
-# -------------------------
-# Data functions
-# -------------------------
-
-# Inpatients Function 
-def load_inpatients(from_date, to_date, dept_name):
-    # Build department filter
-    if dept_name in (None, "", "All"):
-        dept_filter = "1=1"
-    else:
-        # Get the department code for the selected department name
-        try:
-            dept_code_q = f"SELECT DEPTCODE FROM DEPARTMENT WHERE DEPTNAME = '{safe_sql(dept_name)}' AND ROWNUM = 1"
-            dept_code_df = pd.read_sql(dept_code_q, conn)
-            if not dept_code_df.empty:
-                dept_code = dept_code_df['DEPTCODE'].iloc[0]
-                dept_filter = f"I.DEPTCODE = '{safe_sql(dept_code)}'"
-            else:
-                dept_filter = "1=1"  # If dept not found, show all
-        except:
-            dept_filter = "1=1"
-    
-    # Hospital filter
-    if selected_hospital in (None, "", "All Hospitals"):
-        hosp_filter = "1=1"
-    else:
-        hosp_filter = f"I.HOSPITALID = '{safe_sql(selected_hospital)}'"
-    
-    q = (
-        "SELECT I.INPATIENTID, I.MRN, I.DAYSCARED, I.ADMISSIONTYPE, I.DOA, P.DEATHDATE, I.DEPTCODE, I.HOSPITALID "
-        "FROM INPATIENT I "
-        "JOIN PATIENT P ON I.MRN = P.MRN "
-        f"WHERE {dept_filter} AND {hosp_filter} "
-        f"AND I.DOA BETWEEN TO_DATE('{from_date}', 'YYYY-MM-DD') AND TO_DATE('{to_date}', 'YYYY-MM-DD')"
-    )
-    try:
-        return pd.read_sql(q, conn)
-    except Exception as e:
-        st.error(f"Error loading inpatients: {e}")
-        return pd.DataFrame()
-
-# Outpatients Function
-def load_outpatients(from_date, to_date, dept_name):
-    # Build department filter
-    if dept_name in (None, "", "All"):
-        dept_filter = "1=1"
-    else:
-        dept_filter = f"O.DEPTNAME = '{safe_sql(dept_name)}'"
-    
-    # Hospital filter
-    if selected_hospital in (None, "", "All Hospitals"):
-        hosp_filter = "1=1"
-    else:
-        hosp_filter = f"O.HOSPITALID = '{safe_sql(selected_hospital)}'"
-    
-    q = (
-        "SELECT O.OUTPATIENTID, O.MRN, O.DOV, O.DEPTNAME, O.HOSPITALID "
-        "FROM OUTPATIENT O "
-        f"WHERE {dept_filter} AND {hosp_filter} "
-        f"AND O.DOV BETWEEN TO_DATE('{from_date}', 'YYYY-MM-DD') AND TO_DATE('{to_date}', 'YYYY-MM-DD')"
-    )
-    try:
-        return pd.read_sql(q, conn)
-    except Exception as e:
-        st.error(f"Error loading outpatients: {e}")
-        return pd.DataFrame()
-    
-# Operational Efficiency Functions
-def get_category_metrics(from_date, to_date, category_filter, ordering_dept):
-    """
-    Level 1: Get metrics for each CATEGORY.
-    Returns list of dicts with CATEGORY, TOTAL, AVG_PER_DAY, MAX_ENTRY
-    """
-    sd_date_cond = f"THEDATE BETWEEN TO_DATE('{from_date}', 'YYYY-MM-DD') AND TO_DATE('{to_date}', 'YYYY-MM-DD')"
-    sd_hosp_cond = "1=1" if selected_hospital in (None, "", "All Hospitals") else f"SD.HOSPITALID = '{safe_sql(selected_hospital)}'"
-
-    sd_ordering_cond = "1=1"
-    if ordering_dept not in (None, "", "All"):
-        try:
-            map_q = f"SELECT DEPTCODE FROM DEPARTMENT WHERE DEPTNAME = '{safe_sql(ordering_dept)}' AND ROWNUM = 1"
-            mapped = pd.read_sql(map_q, conn)
-            if not mapped.empty and mapped['DEPTCODE'].iloc[0] is not None:
-                deptcode_val = mapped['DEPTCODE'].iloc[0]
-                sd_ordering_cond = f"(SD.ORDERING_DEPT = '{safe_sql(ordering_dept)}' OR SD.ORDERING_DEPT = '{safe_sql(deptcode_val)}')"
-            else:
-                sd_ordering_cond = f"SD.ORDERING_DEPT = '{safe_sql(ordering_dept)}'"
-        except Exception:
-            sd_ordering_cond = f"SD.ORDERING_DEPT = '{safe_sql(ordering_dept)}'"
-
-    # Build CATEGORY filter
-    if category_filter in (None, "", "All"):
-        category_cond = "SD.CATEGORY IS NOT NULL"
+    elif job.status == EXPORT_FAILED:
+        st.error(f"❌ Export failed: {job.error}")
+        if st.button("🔁 Retry", key=f"retry_{key}"):
+            manager.submit(dataset, filters, fmt, build)
+            st.rerun()
     else:
-        category_cond = f"SD.CATEGORY = '{safe_sql(category_filter)}'"
+        st.caption(f"⏳ Preparing {label}...")
+        if st.button("🔄 Check status", key=f"check_{key}"):
+            st.rerun()
 
-    try:
-        # Get distinct categories
-        category_q = (
-            "SELECT DISTINCT CATEGORY FROM STATS_DETAILS SD "
-            f"WHERE {sd_date_cond} AND {sd_hosp_cond} AND {category_cond} AND {sd_ordering_cond} "
-            "AND CATEGORY IS NOT NULL "
-            "ORDER BY CATEGORY"
-        )
-        category_df = pd.read_sql(category_q, conn)
-        category_list = category_df["CATEGORY"].dropna().tolist() if not category_df.empty else []
-    except Exception:
-        category_list = []
-
-    metrics = []
-    for category in category_list:
-        s_category = safe_sql(category)
-        try:
-            agg_q = (
-                "SELECT SUM(NVL(THEVALUE,0)) AS TOTAL_CNT, MAX(NVL(THEVALUE,0)) AS MAX_ENTRY "
-                "FROM STATS_DETAILS SD "
-                f"WHERE SD.CATEGORY = '{s_category}' AND {sd_date_cond} AND {sd_hosp_cond} AND {sd_ordering_cond}"
-            )
-            agg_df = pd.read_sql(agg_q, conn)
-            total_cnt = int(agg_df["TOTAL_CNT"].iloc[0]) if agg_df["TOTAL_CNT"].iloc[0] is not None else 0
-            max_entry = int(agg_df["MAX_ENTRY"].iloc[0]) if agg_df["MAX_ENTRY"].iloc[0] is not None else 0
-        except Exception:
-            total_cnt = 0
-            max_entry = 0
-        
-        days_range = (to_date - from_date).days + 1
-        avg_per_day = (total_cnt / days_range) if days_range > 0 else 0.0
-        metrics.append({
-            "CATEGORY": category, 
-            "TOTAL": total_cnt, 
-            "AVG_PER_DAY": avg_per_day, 
-            "MAX_ENTRY": max_entry
-        })
-
-    return metrics
-
-
-def get_subcatg_metrics(category, from_date, to_date, ordering_dept):
+def export_data_options(frame, base_filename, filters, dataset=None):
     """
-    Level 2: Get SUBCATG breakdown for a specific CATEGORY.
-    Returns list of dicts with SUBCATG, TOTAL, AVG_PER_DAY, MAX_ENTRY
+    Unified export UI component (files built on demand).
+    `frame` returns the DataFrame to export and only runs when a file is
+    built. `dataset` + `filters` identify the data in the process-wide export
+    cache, so `filters` must hold everything that produced it: identical
+    exports are then shared across reruns, and never served for other data.
     """
-    sd_date_cond = f"THEDATE BETWEEN TO_DATE('{from_date}', 'YYYY-MM-DD') AND TO_DATE('{to_date}', 'YYYY-MM-DD')"
-    sd_hosp_cond = "1=1" if selected_hospital in (None, "", "All Hospitals") else f"SD.HOSPITALID = '{safe_sql(selected_hospital)}'"
+    dataset = dataset or base_filename
     
-    sd_ordering_cond = "1=1"
-    if ordering_dept not in (None, "", "All"):
-        try:
-            map_q = f"SELECT DEPTCODE FROM DEPARTMENT WHERE DEPTNAME = '{safe_sql(ordering_dept)}' AND ROWNUM = 1"
-            mapped = pd.read_sql(map_q, conn)
-            if not mapped.empty and mapped['DEPTCODE'].iloc[0] is not None:
-                deptcode_val = mapped['DEPTCODE'].iloc[0]
-                sd_ordering_cond = f"(SD.ORDERING_DEPT = '{safe_sql(ordering_dept)}' OR SD.ORDERING_DEPT = '{safe_sql(deptcode_val)}')"
-            else:
-                sd_ordering_cond = f"SD.ORDERING_DEPT = '{safe_sql(ordering_dept)}'"
-        except Exception:
-            sd_ordering_cond = f"SD.ORDERING_DEPT = '{safe_sql(ordering_dept)}'"
-
-    try:
-        q = (
-            "SELECT SUBCATG, SUM(NVL(THEVALUE,0)) AS TOTAL_CNT, MAX(NVL(THEVALUE,0)) AS MAX_ENTRY "
-            "FROM STATS_DETAILS SD "
-            f"WHERE SD.CATEGORY = '{safe_sql(category)}' "
-            f"AND {sd_date_cond} AND {sd_hosp_cond} AND {sd_ordering_cond} "
-            "AND SUBCATG IS NOT NULL "
-            "GROUP BY SUBCATG "
-            "ORDER BY TOTAL_CNT DESC"
-        )
-        df = pd.read_sql(q, conn)
-        
-        days_range = (to_date - from_date).days + 1
-        metrics = []
-        for _, row in df.iterrows():
-            total = int(row["TOTAL_CNT"])
-            max_entry = int(row["MAX_ENTRY"])
-            avg_per_day = (total / days_range) if days_range > 0 else 0.0
-            metrics.append({
-                "SUBCATG": row["SUBCATG"],
-                "TOTAL": total,
-                "AVG_PER_DAY": avg_per_day,
-                "MAX_ENTRY": max_entry
-            })
-        return metrics
-    except Exception:
-        return []
-
-
-def get_subcatgl2_metrics(category, subcatg, from_date, to_date, ordering_dept):
-    """
-    Level 3: Get SUBCATGL2 breakdown for a specific CATEGORY and SUBCATG.
-    Returns list of dicts with SUBCATGL2, TOTAL, AVG_PER_DAY
-    """
-    sd_date_cond = f"THEDATE BETWEEN TO_DATE('{from_date}', 'YYYY-MM-DD') AND TO_DATE('{to_date}', 'YYYY-MM-DD')"
-    sd_hosp_cond = "1=1" if selected_hospital in (None, "", "All Hospitals") else f"SD.HOSPITALID = '{safe_sql(selected_hospital)}'"
+    st.markdown("#### 📥 Export Data")
+    col1, col2 = st.columns(2)
     
-    sd_ordering_cond = "1=1"
-    if ordering_dept not in (None, "", "All"):
-        try:
-            map_q = f"SELECT DEPTCODE FROM DEPARTMENT WHERE DEPTNAME = '{safe_sql(ordering_dept)}' AND ROWNUM = 1"
-            mapped = pd.read_sql(map_q, conn)
-            if not mapped.empty and mapped['DEPTCODE'].iloc[0] is not None:
-                deptcode_val = mapped['DEPTCODE'].iloc[0]
-                sd_ordering_cond = f"(SD.ORDERING_DEPT = '{safe_sql(ordering_dept)}' OR SD.ORDERING_DEPT = '{safe_sql(deptcode_val)}')"
-            else:
-                sd_ordering_cond = f"SD.ORDERING_DEPT = '{safe_sql(ordering_dept)}'"
-        except Exception:
-            sd_ordering_cond = f"SD.ORDERING_DEPT = '{safe_sql(ordering_dept)}'"
-
-    try:
-        q = (
-            "SELECT SUBCATGL2, SUM(NVL(THEVALUE,0)) AS TOTAL_CNT "
-            "FROM STATS_DETAILS SD "
-            f"WHERE SD.CATEGORY = '{safe_sql(category)}' "
-            f"AND SD.SUBCATG = '{safe_sql(subcatg)}' "
-            f"AND {sd_date_cond} AND {sd_hosp_cond} AND {sd_ordering_cond} "
-            "AND SUBCATGL2 IS NOT NULL "
-            "GROUP BY SUBCATGL2 "
-            "ORDER BY TOTAL_CNT DESC"
+    with col1:
+        deferred_download_button(
+            "CSV", dataset, filters, "csv",
+            build=lambda: create_csv_download(frame()),
+            file_name=f"{base_filename}.csv",
+            key=f"{dataset}_csv"
         )
-        df = pd.read_sql(q, conn)
-        
-        days_range = (to_date - from_date).days + 1
-        metrics = []
-        for _, row in df.iterrows():
-            total = int(row["TOTAL_CNT"])
-            avg_per_day = (total / days_range) if days_range > 0 else 0.0
-            metrics.append({
-                "SUBCATGL2": row["SUBCATGL2"],
-                "TOTAL": total,
-                "AVG_PER_DAY": avg_per_day
-            })
-        return metrics
-    except Exception:
-        return []
     
-def build_category_pdf(category, from_date, to_date, ordering_dept):
-    """Generate multi-page PDF: one section per SUBCATG with full SUBCATGL2 table"""
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, leftMargin=0.6*inch, rightMargin=0.6*inch,
-                            topMargin=0.8*inch, bottomMargin=0.8*inch)
-    styles = getSampleStyleSheet()
-    styles.add(ParagraphStyle(name='Center', alignment=TA_CENTER, fontSize=16, leading=18, spaceAfter=12))
-    styles.add(ParagraphStyle(name='SubHeader', fontSize=12, leading=14, spaceBefore=10, spaceAfter=6))
-    styles.add(ParagraphStyle(name='Right', alignment=TA_RIGHT, fontSize=10))
-
-    elements = []
-
-    # Title
-    title = Paragraph(f"<b>Operational Efficiency Report – CATEGORY: {category}</b>", styles['Center'])
-    subtitle = Paragraph(f"<b>Date Range:</b> {from_date} to {to_date} | <b>Generated:</b> {datetime.now().strftime('%Y-%m-%d %H:%M')}", styles['Normal'])
-    elements.extend([title, subtitle, Spacer(1, 0.3*inch)])
-
-    # Get SUBCATG list
-    subcatg_metrics = get_subcatg_metrics(category, from_date, to_date, ordering_dept)
-    if not subcatg_metrics:
-        elements.append(Paragraph("No data available for this category.", styles['Normal']))
-    else:
-        days = (to_date - from_date).days + 1
-
-        for idx, sub in enumerate(subcatg_metrics):
-            subcatg_name = sub['SUBCATG']
-            total_sub = sub['TOTAL']
-            avg_sub = sub['AVG_PER_DAY']
-
-            # SUBCATG Header
-            elements.append(Paragraph(f"<b>SUBCATG:</b> {subcatg_name}", styles['SubHeader']))
-            elements.append(Paragraph(f"Total: <b>{total_sub:,}</b> | Avg/Day: <b>{avg_sub:.2f}</b>", styles['Normal']))
-            elements.append(Spacer(1, 0.15*inch))
-
-            # SUBCATGL2 Table
-            subcatgl2 = get_subcatgl2_metrics(category, subcatg_name, from_date, to_date, ordering_dept)
-            if not subcatgl2:
-                elements.append(Paragraph("<i>No SUBCATGL2 details available.</i>", styles['Normal']))
-            else:
-                df_sub = pd.DataFrame(subcatgl2)
-                df_sub['AVG_PER_DAY'] = df_sub['AVG_PER_DAY'].round(2)
-                df_sub = df_sub.sort_values('TOTAL', ascending=False).reset_index(drop=True)
-                df_sub.insert(0, 'Rank', range(1, len(df_sub) + 1))
-
-                data = [['Rank', 'SUBCATGL2', 'Total', 'Avg/Day']]
-                for _, row in df_sub.iterrows():
-                    data.append([
-                        str(row['Rank']),
-                        str(row['SUBCATGL2']),
-                        f"{row['TOTAL']:,}",
-                        f"{row['AVG_PER_DAY']:.2f}"
-                    ])
-
-                table = Table(data, colWidths=[0.6*inch, 2.8*inch, 1.0*inch, 1.0*inch])
-                table.setStyle(TableStyle([
-                    ('BACKGROUND', (0,0), (-1,0), colors.HexColor('#0ea77c')),
-                    ('TEXTCOLOR', (0,0), (-1,0), colors.white),
-                    ('ALIGN', (0,0), (-1,-1), 'CENTER'),
-                    ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-                    ('GRID', (0,0), (-1,-1), 0.5, colors.lightgrey),
-                    ('FONTSIZE', (0,0), (-1,-1), 9),
-                ]))
-                elements.append(table)
-
-            # Page break (except last)
-            if idx < len(subcatg_metrics) - 1:
-                elements.append(PageBreak())
-
-    # Footer: Page Numbers
-    def add_page_number(canvas, doc):
-        canvas.saveState()
-        page_num = Paragraph(f"Page {doc.page}", styles['Right'])
-        page_num.wrap(doc.width, doc.bottomMargin)
-        page_num.drawOn(canvas, doc.leftMargin, 0.4*inch)
-        canvas.restoreState()
-
-    doc.build(elements, onFirstPage=add_page_number, onLaterPages=add_page_number)
-    buffer.seek(0)
-    return buffer.getvalue()
-    
-# Bed Occupancy Analysis Functions
-def calculate_bed_occupancy(from_date, to_date, dept_name=None, location_filter=None):
-    """Calculate bed occupancy with proper department filtering"""
-    try:
-        # Build bed query with filters
-        bed_query = """
-            SELECT 
-                SPECIALITY,
-                LOCATION,
-                NVL(BEDSTRENGTH, 0) AS BEDSTRENGTH
-            FROM BEDMASTER
-            WHERE STATUS = 'A'
-        """
-        
-        bed_conditions = []
-        
-        # Department filter - map DEPTNAME to SPECIALITY in BEDMASTER
-        if dept_name and dept_name not in (None, "", "All"):
-            bed_conditions.append(f"SPECIALITY = '{safe_sql(dept_name)}'")
-        
-        # Location filter
-        if location_filter and location_filter not in (None, "", "All"):
-            bed_conditions.append(f"LOCATION = '{safe_sql(location_filter)}'")
-        
-        if bed_conditions:
-            bed_query += " AND " + " AND ".join(bed_conditions)
-        
-        bed_df = pd.read_sql(bed_query, conn)
-        total_beds = int(bed_df['BEDSTRENGTH'].sum()) if not bed_df.empty else 0
-        
-        if total_beds == 0:
-            return 0.0, 0.0, 0, pd.DataFrame()
-        
-        # Rest of the function remains the same...
-        
-        # Build census query with matching logic
-        # CENSUSDATA.SPECIALITY should match BEDMASTER.LOCATION
-        census_query = f"""
-            SELECT 
-                THEDATE,
-                SPECIALITY,
-                NVL(OPBAL, 0) AS OPBAL,
-                NVL(ADMIT, 0) AS ADMIT,
-                NVL(DISCH, 0) AS DISCH,
-                NVL(TRIN, 0) AS TRIN,
-                NVL(TROUT, 0) AS TROUT,
-                NVL(DEATH, 0) AS DEATH,
-                (NVL(OPBAL, 0) + NVL(ADMIT, 0) - NVL(DISCH, 0) + NVL(TRIN, 0) - NVL(TROUT, 0) - NVL(DEATH, 0)) AS DAILY_OCCUPANCY
-            FROM CENSUSDATA
-            WHERE THEDATE BETWEEN TO_DATE('{from_date}', 'YYYY-MM-DD') 
-                              AND TO_DATE('{to_date}', 'YYYY-MM-DD')
-        """
-        
-        census_conditions = []
-        
-        # Match CENSUSDATA.SPECIALITY with BEDMASTER.LOCATION
-        if location_filter and location_filter not in (None, "", "All"):
-            census_conditions.append(f"SPECIALITY = '{safe_sql(location_filter)}'")
-        elif dept_name and dept_name not in (None, "", "All"):
-            # Get all locations for this department
-            dept_locations = bed_df[bed_df['SPECIALITY'] == dept_name]['LOCATION'].tolist()
-            if dept_locations:
-                location_list = "', '".join([safe_sql(loc) for loc in dept_locations])
-                census_conditions.append(f"SPECIALITY IN ('{location_list}')")
-        
-        if census_conditions:
-            census_query += " AND " + " AND ".join(census_conditions)
-        
-        census_query += " ORDER BY THEDATE, SPECIALITY"
-        
-        census_df = pd.read_sql(census_query, conn)
-        
-        if census_df.empty:
-            return 0.0, 0.0, total_beds, pd.DataFrame()
-        
-        # Calculate metrics
-        total_patient_days = census_df['DAILY_OCCUPANCY'].sum()
-        days_in_period = (to_date - from_date).days + 1
-        available_bed_days = total_beds * days_in_period
-        
-        occupancy_rate = (total_patient_days / available_bed_days * 100) if available_bed_days > 0 else 0.0
-        avg_daily_census = total_patient_days / days_in_period if days_in_period > 0 else 0.0
-        
-        # Return detail dataframe for drill-down
-        return round(occupancy_rate, 2), round(avg_daily_census, 1), total_beds, census_df
-        
-    except Exception as e:
-        st.error(f"Error calculating bed occupancy: {e}")
-        return 0.0, 0.0, 0, pd.DataFrame()
-
-def get_department_occupancy_breakdown(from_date, to_date):
-    """Get bed occupancy breakdown by department"""
-    try:
-        # Get all departments from BEDMASTER
-        dept_query = """
-            SELECT DISTINCT SPECIALITY
-            FROM BEDMASTER
-            WHERE STATUS = 'A' AND SPECIALITY IS NOT NULL
-            ORDER BY SPECIALITY
-        """
-        dept_df = pd.read_sql(dept_query, conn)
-        
-        results = []
-        for dept in dept_df['SPECIALITY']:
-            rate, avg_census, beds, _ = calculate_bed_occupancy(from_date, to_date, dept_name=dept)
-            results.append({
-                'DEPARTMENT': dept,
-                'TOTAL_BEDS': beds,
-                'AVG_CENSUS': avg_census,
-                'OCCUPANCY_RATE': rate
-            })
-        
-        return pd.DataFrame(results)
-    except Exception as e:
-        st.error(f"Error getting department breakdown: {e}")
-        return pd.DataFrame()
-
-def get_location_occupancy_breakdown(from_date, to_date, dept_name=None):
-    """Get bed occupancy breakdown by location (ward/ICU level)"""
-    try:
-        # Get locations from BEDMASTER
-        loc_query = """
-            SELECT 
-                SPECIALITY AS DEPARTMENT,
-                LOCATION,
-                BEDSTRENGTH
-            FROM BEDMASTER
-            WHERE STATUS = 'A'
-        """
-        
-        if dept_name and dept_name not in (None, "", "All"):
-            loc_query += f" AND SPECIALITY = '{safe_sql(dept_name)}'"
-        
-        loc_query += " ORDER BY SPECIALITY, LOCATION"
-        
-        loc_df = pd.read_sql(loc_query, conn)
-        
-        results = []
-        for _, row in loc_df.iterrows():
-            rate, avg_census, beds, _ = calculate_bed_occupancy(
-                from_date, to_date, 
-                dept_name=row['DEPARTMENT'], 
-                location_filter=row['LOCATION']
-            )
-            results.append({
-                'DEPARTMENT': row['DEPARTMENT'],
-                'LOCATION': row['LOCATION'],
-                'TOTAL_BEDS': row['BEDSTRENGTH'],
-                'AVG_CENSUS': avg_census,
-                'OCCUPANCY_RATE': rate
-            })
-        
-        return pd.DataFrame(results)
-    except Exception as e:
-        st.error(f"Error getting location breakdown: {e}")
-        return pd.DataFrame()
-    
-# Stats Age Distribution Function
-def compute_age_distribution():
-    try:
-        q = "SELECT TRUNC(MONTHS_BETWEEN(SYSDATE, DOB) / 12) AS AGE FROM PATIENT WHERE DOB IS NOT NULL"
-        df = pd.read_sql(q, conn)
-        if df.empty:
-            return None, pd.DataFrame(columns=['AGE_GROUP','CNT'])
-        avg_age = df['AGE'].mean()
-        bins = [0,20,40,60,80,200]
-        labels = ['0-19','20-39','40-59','60-79','80+']
-        df['AGE_GROUP'] = pd.cut(df['AGE'], bins=bins, labels=labels, right=False)
-        age_dist = df.groupby('AGE_GROUP').size().reset_index(name='CNT')
-        return avg_age, age_dist
-    except Exception:
-        return None, pd.DataFrame(columns=['AGE_GROUP','CNT'])
-
-# Stats Admission Type Breakdown Functions
-def admission_type_breakdown(from_date, to_date, dept_name):
-    # Build department filter
-    if dept_name in (None, "", "All"):
-        dept_filter = "1=1"
-    else:
-        try:
-            dept_code_q = f"SELECT DEPTCODE FROM DEPARTMENT WHERE DEPTNAME = '{safe_sql(dept_name)}' AND ROWNUM = 1"
-            dept_code_df = pd.read_sql(dept_code_q, conn)
-            if not dept_code_df.empty:
-                dept_code = dept_code_df['DEPTCODE'].iloc[0]
-                dept_filter = f"I.DEPTCODE = '{safe_sql(dept_code)}'"
-            else:
-                dept_filter = "1=1"
-        except:
-            dept_filter = "1=1"
-    
-    # Hospital filter
-    if selected_hospital in (None, "", "All Hospitals"):
-        hosp_filter = "1=1"
-    else:
-        hosp_filter = f"I.HOSPITALID = '{safe_sql(selected_hospital)}'"
-    
-    q = (
-        "SELECT NVL(ADMISSIONTYPE,'UNKNOWN') AS ADMISSIONTYPE, COUNT(*) AS CNT "
-        "FROM INPATIENT I "
-        f"WHERE {dept_filter} AND {hosp_filter} "
-        f"AND I.DOA BETWEEN TO_DATE('{from_date}', 'YYYY-MM-DD') AND TO_DATE('{to_date}', 'YYYY-MM-DD') "
-        "GROUP BY NVL(ADMISSIONTYPE,'UNKNOWN') ORDER BY CNT DESC"
-    )
-    try:
-        return pd.read_sql(q, conn)
-    except Exception:
-        return pd.DataFrame(columns=['ADMISSIONTYPE','CNT'])
-
-# Stats State Metrics Function
-def state_stats_aggregate(from_date, to_date, use_year_month=False, sel_year=None, sel_month=None):
-    base_where = "1=1"
-    if selected_hospital not in (None, '', 'All Hospitals'):
-        base_where = f"HOSPITALID = '{safe_sql(selected_hospital)}'"
-
-    if use_year_month:
-        year = sel_year
-        month = sel_month
-        ss_q = (
-            "SELECT STATE, SUM(CNT) AS CNT FROM STATESTATS "
-            f"WHERE {base_where} AND THEYR = {year} AND THEMNTH = {month} "
-            "GROUP BY STATE ORDER BY CNT DESC"
+    with col2:
+        deferred_download_button(
+            "Excel", dataset, filters, "xlsx",
+            build=lambda: excel_bytes(frame()),
+            file_name=f"{base_filename}.xlsx",
+            key=f"{dataset}_xlsx"
         )
-        try:
-            ss_df = pd.read_sql(ss_q, conn)
-            return ss_df
-        except Exception:
-            return pd.DataFrame(columns=['STATE','CNT'])
-    else:
-        try:
-            ss_q = f"SELECT THEYR, THEMNTH, STATE, CNT FROM STATESTATS WHERE {base_where}"
-            ss_df = pd.read_sql(ss_q, conn)
-            if ss_df.empty:
-                return pd.DataFrame(columns=['STATE','CNT'])
-            ss_df['THEDATE'] = pd.to_datetime(ss_df['THEYR'].astype(int).astype(str) + '-' + ss_df['THEMNTH'].astype(int).astype(str) + '-01')
-            mask = (ss_df['THEDATE'].dt.date >= pd.to_datetime(from_date).date()) & (ss_df['THEDATE'].dt.date <= pd.to_datetime(to_date).date())
-            ss_df = ss_df.loc[mask]
-            state_agg = ss_df.groupby('STATE', as_index=False)['CNT'].sum().sort_values('CNT', ascending=False)
-            return state_agg
-        except Exception:
-            return pd.DataFrame(columns=['STATE','CNT'])
-
-def read_staff_patient_ratio():
-    candidates = ["STAFF_PATIENT_RATIO", "STAFF_PATIENT"]
-    for tab in candidates:
-        try:
-            q = f"SELECT * FROM {tab} FETCH FIRST 1 ROWS ONLY"
-            df = pd.read_sql(q, conn)
-            if not df.empty:
-                return df
-        except Exception:
-            continue
-    return None
-
-# Reports tab functions
-def search_mrns(prefix: str, limit: int = 100):
-    """Return up to `limit` MRNs from NOTESDATA that match the prefix (case-insensitive)."""
-    if prefix is None:
-        return []
-    safe_prefix = safe_sql(prefix.strip())
-    if safe_prefix == "":
-        return []
-    like_val = f"%{safe_prefix}%"
-    q = f"SELECT DISTINCT MRN FROM NOTESDATA WHERE MRN LIKE '{like_val}' AND ROWNUM <= {limit} ORDER BY MRN"
-    try:
-        df = pd.read_sql(q, conn)
-        return df['MRN'].dropna().tolist() if not df.empty else []
-    except Exception:
-        return []
-
-def fetch_reports_for_mrn(mrn: str):
-    """Return DataFrame of reports for a given MRN."""
-    if not mrn:
-        return pd.DataFrame()
-    safe_mrn = safe_sql(mrn)
-    q = (
-        "SELECT ACCESSION_NUM, NOTENAME, VISITTYPE, VISITDATE, DONEBY, DEPTNAME, NOTEDATA "
-        "FROM NOTESDATA "
-        f"WHERE MRN = '{safe_mrn}' "
-        "ORDER BY NVL(VISITDATE, TO_DATE('1900-01-01','YYYY-MM-DD')) DESC"
-    )
-    try:
-        df = pd.read_sql(q, conn)
-        expected_cols = ['ACCESSION_NUM','NOTENAME','VISITTYPE','VISITDATE','DONEBY','DEPTNAME','NOTEDATA']
-        for c in expected_cols:
-            if c not in df.columns:
-                df[c] = None
-        return df[expected_cols]
-    except Exception:
-        return pd.DataFrame(columns=['ACCESSION_NUM','NOTENAME','VISITTYPE','VISITDATE','DONEBY','DEPTNAME','NOTEDATA'])
-
-def build_report_label(row):
-    """Produce a friendly label for a report in multi-select: accession | name | date"""
-    acc = str(row.get('ACCESSION_NUM','')) if pd.notna(row.get('ACCESSION_NUM',None)) else ''
-    name = row.get('NOTENAME','') if pd.notna(row.get('NOTENAME',None)) else ''
-    date_val = row.get('VISITDATE',None)
-    if pd.isna(date_val) or date_val is None:
-        date_str = ''
-    else:
-        if isinstance(date_val, str):
-            date_str = date_val
-        elif isinstance(date_val, (datetime, pd.Timestamp)):
-            date_str = date_val.strftime('%Y-%m-%d')
-        else:
-            date_str = str(date_val)
-    label = f"{acc} | {name} | {date_str}"
-    return label
-
-def create_zip_of_reports(reports_df: pd.DataFrame, selected_accessions: list):
-    """Create a ZIP in-memory with one .html file per selected accession. Returns bytes."""
-    buf = io.BytesIO()
-    with zipfile.ZipFile(buf, mode='w', compression=zipfile.ZIP_DEFLATED) as zf:
-        for acc in selected_accessions:
-            row = reports_df[reports_df['ACCESSION_NUM'] == acc]
-            if row.empty:
-                continue
-            html_content = row.iloc[0].get('NOTEDATA', '') or ''
-            fname = f"{str(acc)}.html"
-            zf.writestr(fname, html_content)
-    buf.seek(0)
-    return buf.read()
-
-# Surgery Details Functions
-def load_surgery_metrics(from_date, to_date, dept_name, surgeon_id):
-    surg_dept_filter = "1=1" if dept_name in (None, "", "All") else f"D.DEPTNAME = '{safe_sql(dept_name)}'"
-    
-    # Fixed hospital filter
-    if selected_hospital in (None, "", "All Hospitals"):
-        surg_hosp_filter = "1=1"
-    else:
-        surg_hosp_filter = f"S.HOSPITALID = '{safe_sql(selected_hospital)}'"
-    
-    surg_date_cond = f"S.SURGERYDATE BETWEEN TO_DATE('{from_date}', 'YYYY-MM-DD') AND TO_DATE('{to_date}', 'YYYY-MM-DD')"
 
-    # total surgeries
-    try:
-        total_q = (
-            "SELECT COUNT(*) AS CNT FROM SURGERY S JOIN DEPARTMENT D ON S.DEPTCODE = D.DEPTCODE AND S.HOSPITALID = D.HOSPITALID "
-            f"WHERE {surg_date_cond} AND {surg_dept_filter} AND {surg_hosp_filter}"
-        )
-        total = int(pd.read_sql(total_q, conn)["CNT"].iloc[0])
-    except Exception:
-        total = 0
+# -------------------------
+# Data access (queries live in sssihms.analytics)
+# -------------------------
+def show_timeout(message, error):
+    """Timed-out state for a panel whose query ran past its time budget"""
+    st.warning(f"⏱️ {message}: timed out after {error.budget_ms / 1000:g} s and was stopped. "
+               "Narrow the date range or filters, or try again shortly.")
 
-    # by surgeon
-    if surgeon_id:
-        try:
-            bydoc_q = (
-                "SELECT COUNT(*) AS CNT FROM SURGERY S JOIN DEPARTMENT D ON S.DEPTCODE = D.DEPTCODE AND S.HOSPITALID = D.HOSPITALID "
-                f"WHERE {surg_date_cond} AND {surg_dept_filter} AND {surg_hosp_filter} AND S.SURGEONID = '{safe_sql(surgeon_id)}'"
-            )
-            bydoc = int(pd.read_sql(bydoc_q, conn)["CNT"].iloc[0])
-        except Exception:
-            bydoc = 0
-    else:
-        bydoc = None
 
-    # top surgery type
+def report_errors(message, fallback, func, *args, **kwargs):
+    """Run an analytics call; if it fails, show `message: error` and return `fallback`"""
     try:
-        top_q = (
-            "SELECT NVL(SURGERYTYPE,'UNKNOWN') AS SURGERYTYPE, COUNT(*) AS CNT "
-            "FROM SURGERY S JOIN DEPARTMENT D ON S.DEPTCODE = D.DEPTCODE AND S.HOSPITALID = D.HOSPITALID "
-            f"WHERE {surg_date_cond} AND {surg_dept_filter} AND {surg_hosp_filter} "
-            "GROUP BY NVL(SURGERYTYPE,'UNKNOWN') ORDER BY CNT DESC"
-        )
-        top_df = pd.read_sql(top_q, conn)
-        top_type = top_df["SURGERYTYPE"].iloc[0] if not top_df.empty else "N/A"
-    except Exception:
-        top_type = "N/A"
-
-    days = (to_date - from_date).days + 1
-    daily_avg = (total / days) if days > 0 else 0.0
-
-    return {"total": total, "bydoc": bydoc, "top_type": top_type, "daily_avg": daily_avg}
-
-# ========================================
-# CUSTOM METRICS MANAGER
-# ========================================
-class CustomMetricsManager:
-    def __init__(self, config_dir="custom_metrics"):
-        """Initialize the custom metrics manager"""
-        self.config_dir = Path(config_dir)
-        self.config_dir.mkdir(exist_ok=True)
-        self.metrics_file = self.config_dir / "saved_metrics.json"
-        self.templates_dir = self.config_dir / "templates"
-        self.templates_dir.mkdir(exist_ok=True)
-        
-    def parse_metric_file(self, file_content):
-        """Parse a metric definition file"""
-        lines = file_content.strip().split('\n')
-        metric_def = {
-            'name': '',
-            'icon': '📊',
-            'color': 'kpi-grad-1',
-            'description': '',
-            'query': '',
-            'type': 'single_value',  # NEW: default type
-            'created_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        }
-        
-        query_started = False
-        query_lines = []
-        
-        for line in lines:
-            line = line.strip()
-            
-            if query_started:
-                query_lines.append(line)
-            elif line.startswith('METRIC_NAME:'):
-                metric_def['name'] = line.split('METRIC_NAME:', 1)[1].strip()
-            elif line.startswith('METRIC_ICON:'):
-                metric_def['icon'] = line.split('METRIC_ICON:', 1)[1].strip()
-            elif line.startswith('METRIC_COLOR:'):
-                metric_def['color'] = line.split('METRIC_COLOR:', 1)[1].strip()
-            elif line.startswith('METRIC_TYPE:'):  # NEW: optional type specification
-                metric_def['type'] = line.split('METRIC_TYPE:', 1)[1].strip().lower()
-            elif line.startswith('DESCRIPTION:'):
-                metric_def['description'] = line.split('DESCRIPTION:', 1)[1].strip()
-            elif line.startswith('QUERY:'):
-                query_started = True
-        
-        metric_def['query'] = '\n'.join(query_lines).strip()
-        
-        if not metric_def['name']:
-            raise ValueError("METRIC_NAME is required")
-        if not metric_def['query']:
-            raise ValueError("QUERY is required")
-            
-        return metric_def
-    
-    def save_metric(self, metric_def):
-        """Save a metric definition to persistent storage"""
-        metrics = self.load_saved_metrics()
-        metric_id = metric_def['name'].lower().replace(' ', '_')
-        metrics[metric_id] = metric_def
-        
-        with open(self.metrics_file, 'w') as f:
-            json.dump(metrics, f, indent=2)
-        
-        return metric_id
-    
-    def load_saved_metrics(self):
-        """Load all saved metrics from storage"""
-        if not self.metrics_file.exists():
-            return {}
-        
-        try:
-            with open(self.metrics_file, 'r') as f:
-                return json.load(f)
-        except Exception:
-            return {}
-    
-    def delete_metric(self, metric_id):
-        """Delete a saved metric"""
-        metrics = self.load_saved_metrics()
-        if metric_id in metrics:
-            del metrics[metric_id]
-            with open(self.metrics_file, 'w') as f:
-                json.dump(metrics, f, indent=2)
-            return True
-        return False
-    
-    def execute_metric_query(self, query, conn, from_date=None, to_date=None, 
-                            selected_hospital=None, selected_dept=None):
-        """
-        FIXED: Execute a metric query with parameter substitution
-        Now supports both single values and tables
-        """
-        if from_date:
-            query = query.replace('{from_date}', str(from_date))
-        if to_date:
-            query = query.replace('{to_date}', str(to_date))
-        if selected_hospital:
-            query = query.replace('{hospital}', str(selected_hospital))
-        if selected_dept:
-            query = query.replace('{dept}', str(selected_dept))
-        
-        try:
-            result = pd.read_sql(query, conn)
-            
-            # FIXED: Check if this is a table result (multiple rows or columns)
-            if len(result) > 1 or len(result.columns) > 1:
-                return result  # Return DataFrame for tables
-            
-            # Single value result
-            if 'VALUE' in result.columns:
-                return result['VALUE'].iloc[0]
-            else:
-                return result.iloc[0, 0]
-        except Exception as e:
-            raise Exception(f"Query execution failed: {str(e)}")
-    
-    def create_sample_template(self):
-        """FIXED: Create a sample metric template file with both types"""
-        sample = """METRIC_NAME: Total Active Patients
-                    METRIC_ICON: 👥
-                    METRIC_COLOR: kpi-grad-1
-                    METRIC_TYPE: single_value
-                    DESCRIPTION: Count of all active patients in the system
-                    QUERY:
-                        SELECT COUNT(*) as VALUE
-                        FROM PATIENT
-                        WHERE STATUS = 'A'
-                        ---
-
-                    Example for TABLE metric:
-
-                    METRIC_NAME: Top Departments by Patient Count
-                    METRIC_ICON: 🏥
-                    METRIC_COLOR: kpi-grad-2
-                    METRIC_TYPE: table
-                    DESCRIPTION: Shows patient distribution across departments
-                    QUERY:
-                        SELECT 
-                            DEPTNAME as Department,
-                            COUNT(*) as Patient_Count,
-                            ROUND(COUNT(*) * 100.0 / SUM(COUNT(*)) OVER (), 2) as Percentage
-                        FROM INPATIENT i
-                        JOIN DEPARTMENT d ON i.DEPTCODE = d.DEPTCODE
-                        WHERE i.DOA BETWEEN TO_DATE('{from_date}', 'YYYY-MM-DD') 
-                                        AND TO_DATE('{to_date}', 'YYYY-MM-DD')
-                        GROUP BY DEPTNAME
-                        ORDER BY Patient_Count DESC
-                        FETCH FIRST 10 ROWS ONLY
-                        """
-        template_file = self.templates_dir / "sample_metric.txt"
-        with open(template_file, 'w') as f:
-            f.write(sample)
-        return template_file
+        return func(*args, **kwargs)
+    except QueryCancelled:
+        # this run has been replaced and stops at its next element
+        return fallback
+    except QueryTimeout as e:
+        show_timeout(message, e)
+        return fallback
+    except Exception as e:
+        st.error(f"{message}: {e}")
+        return fallback
 
 # ========================================
 # RENDER FUNCTION - FIXED FOR PERMISSIONS
@@ -1580,7 +550,11 @@ def render_custom_metrics_ui(conn, from_date, to_date, selected_hospital, select
     """
     #st.header("🎯 Custom Metrics Manager")
    
-    manager = CustomMetricsManager()
+    try:
+        manager = CustomMetricsManager()
+    except MetricSeedError as e:
+        st.error(f"❌ {e}. Fix or restore the file; it is imported again on the next load.")
+        return
     is_admin = st.session_state.get("role") == "admin"
    
     # FIXED: Show different tabs based on role
@@ -1601,7 +575,13 @@ def render_custom_metrics_ui(conn, from_date, to_date, selected_hospital, select
     
         st.subheader("Active Custom Metrics")
     
-        saved_metrics = manager.load_saved_metrics()
+        metric_tags = manager.store.tags()
+        selected_tag = None
+        if metric_tags:
+            tag_choice = st.selectbox("Filter by tag", ["All"] + metric_tags, key="metric_tag_filter")
+            selected_tag = None if tag_choice == "All" else tag_choice
+    
+        saved_metrics = manager.load_saved_metrics(tag=selected_tag)
     
         if not saved_metrics:
             if is_admin:
@@ -1640,7 +620,8 @@ def render_custom_metrics_ui(conn, from_date, to_date, selected_hospital, select
                                             from_date=from_date,
                                             to_date=to_date,
                                             selected_hospital=selected_hospital,
-                                            selected_dept=selected_dept
+                                            selected_dept=selected_dept,
+                                            metric_id=metric_id
                                         )
                                 
                                     # Check if result is a DataFrame (table) or single value
@@ -1661,6 +642,11 @@ def render_custom_metrics_ui(conn, from_date, to_date, selected_hospital, select
                                         st.metric(label=metric_def['name'], value=display_value)
                                         st.caption(metric_def['description'])
                                 
+                                except QueryCancelled:
+                                    st.stop()
+                                except QueryTimeout as e:
+                                    show_timeout(metric_def['name'], e)
+                                    st.caption(metric_def['description'])
                                 except Exception as e:
                                     st.error(f"Error: {str(e)}")
                                     st.caption(metric_def['description'])
@@ -1703,11 +689,14 @@ def render_custom_metrics_ui(conn, from_date, to_date, selected_hospital, select
                     st.json(metric_def)
                    
                     if st.button("💾 Save This Metric", key="save_uploaded"):
-                        metric_id = manager.save_metric(metric_def)
+                        metric_id = manager.save_metric(metric_def, owner=st.session_state.get("username"),
+                                                        create=True)
                         st.success(f"✅ Metric saved with ID: {metric_id}")
                         st.balloons()
                         st.rerun()
                        
+                except MetricConflictError as e:
+                    st.error(f"❌ {str(e)}")
                 except Exception as e:
                     st.error(f"❌ Error parsing file: {str(e)}")
            
@@ -1732,6 +721,7 @@ def render_custom_metrics_ui(conn, from_date, to_date, selected_hospital, select
                 )
                
                 metric_desc = st.text_area("Description", placeholder="What does this metric measure?")
+                metric_tags_input = st.text_input("Tags (comma-separated)", placeholder="e.g., cardiology, surgery")
                
                 if metric_type == "Single Value":
                     query_placeholder = """SELECT COUNT(*) as VALUE
@@ -1772,11 +762,13 @@ def render_custom_metrics_ui(conn, from_date, to_date, selected_hospital, select
                             'description': metric_desc,
                             'query': metric_query,
                             'type': metric_type.lower().replace(" ", "_"),
+                            'tags': metric_tags_input,
                             'created_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
                         }
                        
                         try:
-                            metric_id = manager.save_metric(metric_def)
+                            metric_id = manager.save_metric(metric_def, owner=st.session_state.get("username"),
+                                                            create=True)
                             st.success(f"✅ Metric '{metric_name}' saved successfully!")
                             st.balloons()
                             st.rerun()
@@ -1801,17 +793,42 @@ def render_custom_metrics_ui(conn, from_date, to_date, selected_hospital, select
         with tab3:
             st.subheader("⚙️ Manage Saved Metrics")
            
+            # Import / export (saved_metrics.json format)
+            with st.expander("📦 Import / Export Metrics (JSON)", expanded=False):
+                st.download_button(
+                    label="📤 Export all metrics (saved_metrics.json)",
+                    data=manager.export_json(),
+                    file_name="saved_metrics.json",
+                    mime="application/json",
+                    key="export_metrics_json"
+                )
+                json_upload = st.file_uploader("Import saved_metrics.json", type=['json'], key="import_metrics_json")
+                if json_upload and st.button("📥 Import Metrics", key="import_metrics_btn"):
+                    try:
+                        count = manager.import_json(json_upload.read().decode('utf-8'),
+                                                    owner=st.session_state.get("username"))
+                        st.success(f"✅ Imported {count} metrics")
+                        st.rerun()
+                    except Exception as e:
+                        st.error(f"❌ Import failed: {str(e)}")
+           
             saved_metrics = manager.load_saved_metrics()
+            metric_errors = manager.metric_errors()
            
             if not saved_metrics:
                 st.info("No metrics to manage.")
             else:
                 for metric_id, metric_def in saved_metrics.items():
                     with st.expander(f"{metric_def['icon']} {metric_def['name']}", expanded=False):
+                        if metric_id in metric_errors:
+                            st.warning(f"⚠️ {metric_errors[metric_id]}")
                         st.markdown(f"**ID:** `{metric_id}`")
                         st.markdown(f"**Type:** {metric_def.get('type', 'single_value').replace('_', ' ').title()}")
                         st.markdown(f"**Description:** {metric_def['description']}")
                         st.markdown(f"**Created:** {metric_def.get('created_date', 'N/A')}")
+                        st.markdown(f"**Version:** {metric_def.get('version', 1)} | **Owner:** {metric_def.get('owner') or 'N/A'}")
+                        if metric_def.get('tags'):
+                            st.markdown(f"**Tags:** {', '.join(metric_def['tags'])}")
                        
                         st.code(metric_def['query'], language='sql')
                        
@@ -1826,7 +843,8 @@ def render_custom_metrics_ui(conn, from_date, to_date, selected_hospital, select
                                         from_date=from_date,
                                         to_date=to_date,
                                         selected_hospital=selected_hospital,
-                                        selected_dept=selected_dept
+                                        selected_dept=selected_dept,
+                                        metric_id=metric_id
                                     )
                                    
                                     if isinstance(result, pd.DataFrame):
@@ -1834,6 +852,10 @@ def render_custom_metrics_ui(conn, from_date, to_date, selected_hospital, select
                                         st.dataframe(result)
                                     else:
                                         st.success(f"✅ Result: **{result}**")
+                                except QueryCancelled:
+                                    st.stop()
+                                except QueryTimeout as e:
+                                    show_timeout("Test query", e)
                                 except Exception as e:
                                     st.error(f"❌ Query failed: {str(e)}")
                        
@@ -1842,6 +864,7 @@ def render_custom_metrics_ui(conn, from_date, to_date, selected_hospital, select
                                             METRIC_ICON: {metric_def['icon']}
                                             METRIC_COLOR: {metric_def['color']}
                                             METRIC_TYPE: {metric_def.get('type', 'single_value')}
+                                            TAGS: {', '.join(metric_def.get('tags', []))}
                                             DESCRIPTION: {metric_def['description']}
                                             QUERY:
                                             {metric_def['query']}
@@ -1856,11 +879,29 @@ def render_custom_metrics_ui(conn, from_date, to_date, selected_hospital, select
                        
                         with col3:
                             if st.button("🗑️ Delete", key=f"delete_{metric_id}", type="secondary"):
-                                if manager.delete_metric(metric_id):
-                                    st.success(f"✅ Deleted {metric_def['name']}")
-                                    st.rerun()
+                                try:
+                                    deleted = manager.delete_metric(
+                                        metric_id,
+                                        deleted_by=st.session_state.get("username"),
+                                        expected_version=metric_def.get('version')
+                                    )
+                                except MetricConflictError as e:
+                                    st.error(f"❌ {str(e)}")
                                 else:
-                                    st.error("❌ Failed to delete")
+                                    if deleted:
+                                        st.success(f"✅ Deleted {metric_def['name']}")
+                                        st.rerun()
+                                    else:
+                                        st.error("❌ Failed to delete")
+                       
+                        history = manager.store.history(metric_id)
+                        if len(history) > 1:
+                            st.caption("🕘 Version history")
+                            st.dataframe(
+                                pd.DataFrame(history)[["version", "action", "saved_by", "saved_at"]],
+                                use_container_width=True,
+                                hide_index=True
+                            )
 
 # ========================================
 # DISPLAY FUNCTION - FIXED FOR TABLES
@@ -1870,7 +911,10 @@ def display_custom_metrics_row(conn, from_date, to_date, selected_hospital, sele
     FIXED: Display custom metrics in a row
     Now supports both single values and tables
     """
-    manager = CustomMetricsManager()
+    try:
+        manager = CustomMetricsManager()
+    except MetricSeedError:
+        return   # reported by the custom metrics panel
     saved_metrics = manager.load_saved_metrics()
     
     if saved_metrics:
@@ -1898,7 +942,8 @@ def display_custom_metrics_row(conn, from_date, to_date, selected_hospital, sele
                             from_date=from_date,
                             to_date=to_date,
                             selected_hospital=selected_hospital,
-                            selected_dept=selected_dept
+                            selected_dept=selected_dept,
+                            metric_id=metric_id
                         )
                         
                         # FIXED: Check if result is a DataFrame (table)
@@ -1938,6 +983,19 @@ def display_custom_metrics_row(conn, from_date, to_date, selected_hospital, sele
                                 unsafe_allow_html=True
                             )
                         
+                    except QueryCancelled:
+                        st.stop()
+                    except QueryTimeout as e:
+                        st.markdown(
+                            kpi_card_html(
+                                metric_def['name'],
+                                "Timed out",
+                                f"Stopped after {e.budget_ms / 1000:g} s",
+                                "kpi-grad-5",
+                                "⏱️"
+                            ),
+                            unsafe_allow_html=True
+                        )
                     except Exception as e:
                         st.markdown(
                             kpi_card_html(
@@ -1950,6 +1008,68 @@ def display_custom_metrics_row(conn, from_date, to_date, selected_hospital, sele
                             unsafe_allow_html=True
                         )
 
+def render_hospital_comparison(conn, from_date, to_date, selected_dept, hospitals):
+    """General KPIs of several hospitals side by side (one grouped query per metric family)"""
+    st.subheader("🏥 Hospital Comparison")
+    if len(hospitals) < 2:
+        st.info("Select at least two hospitals to compare.")
+        return
+    cmp = report_errors("Error loading hospital comparison", {}, analytics.hospital_comparison,
+                        conn, from_date, to_date, selected_dept, hospitals)
+    if not cmp:
+        return
+
+    kpis = cmp["kpis"].set_index("HOSPITALID")
+    occupancy = cmp["occupancy"].set_index("HOSPITALID")
+    surgery = cmp["surgery"].set_index("HOSPITALID")
+
+    def value(frame, hospital, column, default=0):
+        return frame.at[hospital, column] if hospital in frame.index else default
+
+    cols = st.columns(len(hospitals))
+    for col, hospital in zip(cols, hospitals):
+        with col:
+            st.markdown(f"#### {hospital}")
+            st.markdown(kpi_card_html("Inpatients", f"{int(value(kpis, hospital, 'INPATIENTS')):,}",
+                                      f"ALOS {value(kpis, hospital, 'ALOS'):.2f} days", "kpi-grad-1", "🏨"),
+                        unsafe_allow_html=True)
+            st.markdown(kpi_card_html("Outpatients", f"{int(value(kpis, hospital, 'OUTPATIENTS')):,}",
+                                      f"{from_date} → {to_date}", "kpi-grad-2", "🧍"),
+                        unsafe_allow_html=True)
+            st.markdown(kpi_card_html("Bed Occupancy", f"{value(occupancy, hospital, 'OCCUPANCY_RATE'):.1f}%",
+                                      f"{int(value(occupancy, hospital, 'TOTAL_BEDS'))} beds", "kpi-grad-3", "🛏️"),
+                        unsafe_allow_html=True)
+            st.markdown(kpi_card_html("Surgeries", f"{int(value(surgery, hospital, 'SURGERIES')):,}",
+                                      f"{value(surgery, hospital, 'DAILY_AVG'):.1f}/day", "kpi-grad-4", "🩺"),
+                        unsafe_allow_html=True)
+
+    table = kpis.join(occupancy, how="outer").join(surgery, how="outer").reindex(hospitals)
+    table = table.rename(columns={
+        "INPATIENTS": "Inpatients", "OUTPATIENTS": "Outpatients", "ALOS": "ALOS (days)",
+        "DEATHS": "Deaths", "MORTALITY_RATE": "Mortality %", "READMISSIONS": "Readmissions",
+        "READMISSION_RATE": "Readmission %", "MORBIDITY_COUNT": "Morbidity", "MORBIDITY_RATE": "Morbidity %",
+        "TOTAL_BEDS": "Beds", "AVG_CENSUS": "Avg Census", "OCCUPANCY_RATE": "Occupancy %",
+        "SURGERIES": "Surgeries", "DAILY_AVG": "Surgeries/Day", "TOP_TYPE": "Top Surgery Type",
+    })
+    with st.expander("📋 All comparison figures", expanded=False):
+        st.dataframe(table.T.astype(str), use_container_width=True)
+
+    categories = cmp["categories"]
+    if not categories.empty:
+        chart = alt.Chart(categories).mark_bar().encode(
+            x=alt.X("CATEGORY:N", title="Category", axis=alt.Axis(labelAngle=-45)),
+            xOffset=alt.XOffset("HOSPITALID:N"),
+            y=alt.Y("TOTAL:Q", title="Total Count"),
+            color=alt.Color("HOSPITALID:N", title="Hospital"),
+            tooltip=[
+                alt.Tooltip("HOSPITALID:N", title="Hospital"),
+                alt.Tooltip("CATEGORY:N", title="Category"),
+                alt.Tooltip("TOTAL:Q", title="Total", format=","),
+            ],
+        ).properties(height=400, title="Category totals by hospital")
+        st.altair_chart(chart, use_container_width=True)
+    st.markdown("---")
+
 # -------------------------
 # Tabs and rendering
 # -------------------------
@@ -1961,48 +1081,24 @@ tabs = st.tabs(["🏠 General KPIs", "⚡ Operational Efficiency", "💰 Financi
 # ---- TAB 0: General KPIs ----
 with tabs[0]:
     st.header("General KPIs")
-    in_df = load_inpatients(from_date, to_date, selected_dept)
-    out_df = load_outpatients(from_date, to_date, selected_dept)
+    if compare_hospitals:
+        render_hospital_comparison(conn, from_date, to_date, selected_dept, compare_hospitals)
+    in_df = report_errors("Error loading inpatients", pd.DataFrame(), analytics.load_inpatients,
+                          conn, from_date, to_date, selected_dept, hospital=selected_hospital)
+    out_df = report_errors("Error loading outpatients", pd.DataFrame(), analytics.load_outpatients,
+                           conn, from_date, to_date, selected_dept, hospital=selected_hospital)
 
     total_inpatients = len(in_df)
     total_outpatients = len(out_df)
 
-    try:
-        alos = float(in_df["DAYSCARED"].fillna(0).astype(float).mean()) if total_inpatients else 0.0
-    except Exception:
-        alos = 0.0
-
-    # mortality
-    try:
-        if not in_df.empty:
-            def died_in_range(d):
-                if pd.isna(d):
-                    return False
-                if isinstance(d, datetime):
-                    d = d.date()
-                return (from_date <= d <= to_date)
-            deaths = in_df["DEATHDATE"].apply(died_in_range).sum()
-        else:
-            deaths = 0
-    except Exception:
-        deaths = 0
-    mortality_rate = (deaths / total_inpatients * 100) if total_inpatients else 0.0
-
-    # readmission & morbidity
-    try:
-        readmissions = in_df["ADMISSIONTYPE"].isin(["READMISSION", "EMERGENCY READMISSION"]).sum() if total_inpatients else 0
-    except Exception:
-        readmissions = 0
-    readmission_rate = (readmissions / total_inpatients * 100) if total_inpatients else 0.0
-
-    try:
-        morbidity_count = (in_df["DAYSCARED"].fillna(0).astype(float) > 15).sum() if total_inpatients else 0
-    except Exception:
-        morbidity_count = 0
-    morbidity_rate = (morbidity_count / total_inpatients * 100) if total_inpatients else 0.0
+    kpis = analytics.inpatient_kpis(in_df, from_date, to_date)
+    alos = kpis["alos"]
+    deaths, mortality_rate = kpis["deaths"], kpis["mortality_rate"]
+    readmissions, readmission_rate = kpis["readmissions"], kpis["readmission_rate"]
+    morbidity_count, morbidity_rate = kpis["morbidity_count"], kpis["morbidity_rate"]
 
     # staff:patient - direct read (no formula)
-    spr_df = read_staff_patient_ratio()
+    spr_df = analytics.read_staff_patient_ratio(conn)
     if spr_df is not None and not spr_df.empty:
         spr_display = spr_df.to_dict(orient='records')[0]
         spr_value = ", ".join([f"{k}: {v}" for k, v in spr_display.items()])
@@ -2029,7 +1125,9 @@ with tabs[0]:
     p1, p2, p3, p4 = st.columns(4)
 
 # Calculate bed occupancy for the KPI card
-occupancy_rate, avg_census, total_beds, _ = calculate_bed_occupancy(from_date, to_date)
+occupancy_rate, avg_census, total_beds, _ = report_errors(
+    "Error calculating bed occupancy", (0.0, 0.0, 0, pd.DataFrame()),
+    analytics.calculate_bed_occupancy, conn, from_date, to_date)
 
 with p1:
     color = "kpi-grad-2"
@@ -2057,36 +1155,7 @@ with p2:
 with p3:
     # Calculate Surgery Wait Time - Match each surgery with closest preceding admission
     try:
-        wait_time_q = f"""
-        WITH SurgeryAdmission AS (
-            SELECT 
-                s.SURGERYID,
-                s.MRN,
-                s.SURGERYDATE,
-                i.DOA,
-                (s.SURGERYDATE - i.DOA) AS WAIT_DAYS,
-                ROW_NUMBER() OVER (
-                    PARTITION BY s.SURGERYID 
-                    ORDER BY ABS(s.SURGERYDATE - i.DOA)
-                ) AS rn
-            FROM SURGERY s
-            JOIN INPATIENT i ON s.MRN = i.MRN
-            WHERE s.SURGERYDATE BETWEEN TO_DATE('{from_date}', 'YYYY-MM-DD') 
-                                    AND TO_DATE('{to_date}', 'YYYY-MM-DD')
-              AND i.DOA IS NOT NULL
-              AND s.SURGERYDATE >= i.DOA
-              AND (s.SURGERYDATE - i.DOA) <= 365
-              AND (s.HOSPITALID = '{safe_sql(selected_hospital)}' OR '{selected_hospital}' = 'All Hospitals')
-        )
-        SELECT 
-            AVG(WAIT_DAYS) AS AVG_WAIT_DAYS,
-            COUNT(*) AS TOTAL_SURGERIES,
-            MIN(WAIT_DAYS) AS MIN_WAIT,
-            MAX(WAIT_DAYS) AS MAX_WAIT
-        FROM SurgeryAdmission
-        WHERE rn = 1 AND WAIT_DAYS >= 0
-        """
-        wait_df = pd.read_sql(wait_time_q, conn)
+        wait_df = analytics.surgery_wait_time(conn, from_date, to_date, selected_hospital)
         
         if not wait_df.empty and pd.notna(wait_df['AVG_WAIT_DAYS'].iloc[0]):
             avg_wait_days = float(wait_df['AVG_WAIT_DAYS'].iloc[0])
@@ -2164,7 +1233,9 @@ with tabs[1]:
     # LEVEL 1: CATEGORY VIEW
     # ============================================
     if st.session_state.view_level == 1:
-        category_metrics = get_category_metrics(from_date, to_date, selected_category, selected_ordering_dept)
+        category_metrics = analytics.get_category_metrics(
+            conn, from_date, to_date, selected_category, selected_ordering_dept, hospital=selected_hospital
+        )
         
         if not category_metrics:
             st.warning("No metrics found for selected filters.")
@@ -2190,8 +1261,9 @@ with tabs[1]:
             with col_right:
                 if st.button("Download PDF Report", use_container_width=True, type="primary"):
                     with st.spinner(f"Generating PDF for {selected_pdf_cat}..."):
-                        pdf_bytes = build_category_pdf(
-                            selected_pdf_cat, from_date, to_date, selected_ordering_dept
+                        pdf_bytes = analytics.build_category_pdf(
+                            conn, selected_pdf_cat, from_date, to_date, selected_ordering_dept,
+                            hospital=selected_hospital
                         )
                         st.download_button(
                             label="Click to Download PDF",
@@ -2229,6 +1301,13 @@ with tabs[1]:
                             st.session_state.nav_category = m['CATEGORY']
                             st.session_state.view_level = 2
                             st.rerun()
+
+            # Warm the likely next clicks (Level 2/3 of the biggest categories) in the background
+            pool = init_connection_pool()
+            analytics.prefetch_drilldowns(
+                get_prefetcher(), lambda: acquire(pool, "prefetch.acquire"),
+                category_metrics, from_date, to_date, selected_ordering_dept, hospital=selected_hospital
+            )
     
     # ============================================
     # LEVEL 2: SUBCATG VIEW
@@ -2238,7 +1317,9 @@ with tabs[1]:
         st.markdown(f"### 📂 Level 2: SUBCATG within '{category_name}'")
         st.info("👆 Click on any subcategory card to see detailed breakdown")
         
-        subcatg_metrics = get_subcatg_metrics(category_name, from_date, to_date, selected_ordering_dept)
+        subcatg_metrics = analytics.get_subcatg_metrics(
+            conn, category_name, from_date, to_date, selected_ordering_dept, hospital=selected_hospital
+        )
         
         if not subcatg_metrics:
             st.warning(f"No SUBCATG data available for {category_name}")
@@ -2295,8 +1376,9 @@ with tabs[1]:
         st.markdown(f"### 📄 Level 3: SUBCATGL2 Details")
         st.markdown(f"**Category:** {category_name} → **SUBCATG:** {subcatg_name}")
         
-        subcatgl2_metrics = get_subcatgl2_metrics(
-            category_name, subcatg_name, from_date, to_date, selected_ordering_dept
+        subcatgl2_metrics = analytics.get_subcatgl2_metrics(
+            conn, category_name, subcatg_name, from_date, to_date, selected_ordering_dept,
+            hospital=selected_hospital
         )
         
         if not subcatgl2_metrics:
@@ -2316,13 +1398,7 @@ with tabs[1]:
             st.markdown("---")
             
             # Display as enhanced dataframe
-            df_display = pd.DataFrame(subcatgl2_metrics)
-            df_display['AVG_PER_DAY'] = df_display['AVG_PER_DAY'].round(2)
-            df_display = df_display.sort_values('TOTAL', ascending=False).reset_index(drop=True)
-            
-            # Add ranking
-            if 'Rank' not in df_display.columns:
-                df_display.insert(0, 'Rank', range(1, len(df_display) + 1))
+            df_display = analytics.subcatgl2_table(subcatgl2_metrics)
             
             st.markdown("#### 📊 SUBCATGL2 Breakdown Table")
             st.dataframe(
@@ -2392,23 +1468,17 @@ with tabs[1]:
             
             st.markdown("---")
             
-            # Download section
-            st.markdown("#### 📥 Download Data")
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                csv = df_display.to_csv(index=False)
-                st.download_button(
-                    label="📄 Download as CSV",
-                    data=csv,
-                    file_name=f"{category_name}_{subcatg_name}_subcatgl2.csv",
-                    mime="text/csv",
-                    use_container_width=True
-                )
-            
-            with col2:
-                # Excel download would require openpyxl
-                st.info("💡 CSV format includes all data with rankings")
+            # Download section (built on demand)
+            export_data_options(
+                lambda: df_display,
+                f"{category_name}_{subcatg_name}_subcatgl2",
+                dataset="subcatgl2_breakdown",
+                filters={
+                    "category": category_name, "subcatg": subcatg_name,
+                    "from": str(from_date), "to": str(to_date),
+                    "hospital": selected_hospital, "ordering_dept": selected_ordering_dept
+                }
+            )
 
     st.markdown("---")
 
@@ -2417,8 +1487,7 @@ with tabs[2]:
     st.header("Financial")
     st.info("Financial tab placeholder. Add billing/invoice/ledger tables and queries to populate.")
     try:
-        fin_q = "SELECT * FROM FINANCIAL_SUMMARY FETCH FIRST 200 ROWS ONLY"
-        fin_df = pd.read_sql(fin_q, conn)
+        fin_df = analytics.load_financial_summary(conn)
         if not fin_df.empty:
             st.dataframe(fin_df)
         else:
@@ -2431,8 +1500,7 @@ with tabs[3]:
     st.header("Quality & Safety")
     st.info("Placeholder: Add infection rates, incident reports, audit logs, sentinel event tables, etc.")
     try:
-        q_q = "SELECT * FROM QUALITY_METRICS FETCH FIRST 200 ROWS ONLY"
-        q_df = pd.read_sql(q_q, conn)
+        q_df = analytics.load_quality_metrics(conn)
         if not q_df.empty:
             st.dataframe(q_df)
         else:
@@ -2448,7 +1516,7 @@ with tabs[4]:
     mrn_input = st.text_input("Enter MRN / partial MRN", "")
     suggestions = []
     if mrn_input.strip() != "":
-        suggestions = search_mrns(mrn_input.strip())
+        suggestions = analytics.search_mrns(conn, mrn_input.strip())
 
     if suggestions:
         sel_mrn = st.selectbox("Select MRN", suggestions)
@@ -2459,21 +1527,13 @@ with tabs[4]:
 
     if sel_mrn:
         st.success(f"MRN selected: {sel_mrn}")
-        reports_df = fetch_reports_for_mrn(sel_mrn)
+        reports_df = analytics.fetch_reports_for_mrn(conn, sel_mrn)
 
         if reports_df.empty:
             st.info("No reports for this MRN.")
         else:
-            def safe_clob(x):
-                if x is None:
-                    return ""
-                try:
-                    return x.read() if hasattr(x, "read") else str(x)
-                except:
-                    return str(x)
-
-            reports_df["NOTEDATA"] = reports_df["NOTEDATA"].apply(safe_clob)
-            reports_df["LABEL"] = reports_df.apply(build_report_label, axis=1)
+            reports_df["NOTEDATA"] = reports_df["NOTEDATA"].apply(analytics.safe_clob)
+            reports_df["LABEL"] = reports_df.apply(analytics.build_report_label, axis=1)
 
             st.subheader("🗂 Select Reports to View / Download")
             selected_labels = st.multiselect(
@@ -2485,15 +1545,12 @@ with tabs[4]:
                 sel_rows = reports_df[reports_df["LABEL"].isin(selected_labels)]
                 st.subheader("📄 Report Viewer")
 
-                CSS_WRAPPER_START = '<div style="background-color:white; padding:15px; color:black;">'
-                CSS_WRAPPER_END = "</div>"
-
                 for idx, row in sel_rows.iterrows():
                     st.markdown(f"### 📝 {row['NOTENAME']} ({row['ACCESSION_NUM']})")
                     html_data = row["NOTEDATA"]
                     if not html_data or html_data.strip() == "":
                         html_data = "<p>No data.</p>"
-                    wrapped_html = CSS_WRAPPER_START + html_data + CSS_WRAPPER_END
+                    wrapped_html = analytics.wrap_report_html(html_data)
                     components.html(wrapped_html, height=500, scrolling=True)
                     st.markdown("---")
 
@@ -2501,20 +1558,7 @@ with tabs[4]:
                 selected_accessions = sel_rows["ACCESSION_NUM"].dropna().tolist()
 
                 if selected_accessions:
-                    def create_zip_safe(df, accession_list):
-                        mem_zip = io.BytesIO()
-                        with zipfile.ZipFile(mem_zip, "w", zipfile.ZIP_DEFLATED) as zf:
-                            for _, r in df[df["ACCESSION_NUM"].isin(accession_list)].iterrows():
-                                fname = f"{r['ACCESSION_NUM']}_{r['NOTENAME'].replace(' ', '_')}.html"
-                                content = safe_clob(r["NOTEDATA"])
-                                if not isinstance(content, str):
-                                    content = str(content)
-                                html_wrapped = CSS_WRAPPER_START + content + CSS_WRAPPER_END
-                                zf.writestr(fname, html_wrapped)
-                        mem_zip.seek(0)
-                        return mem_zip.getvalue()
-
-                    zip_bytes = create_zip_safe(reports_df, selected_accessions)
+                    zip_bytes = analytics.create_zip_of_reports(reports_df, selected_accessions)
                     st.download_button(
                         label="📦 Download as ZIP",
                         data=zip_bytes,
@@ -2532,7 +1576,9 @@ with tabs[5]:
     st.subheader("🛏️ Bed Occupancy Analysis")
     
     # Calculate overall bed occupancy
-    occupancy_rate, avg_census, total_beds, _ = calculate_bed_occupancy(from_date, to_date)
+    occupancy_rate, avg_census, total_beds, trend_df = report_errors(
+        "Error calculating bed occupancy", (0.0, 0.0, 0, pd.DataFrame()),
+        analytics.calculate_bed_occupancy, conn, from_date, to_date)
     
     # Detailed breakdown tabs (NO KPI cards here)
     occ_tab1, occ_tab2, occ_tab3 = st.tabs(["📈 Daily Trend", "🏥 By Department", "📍 By Location"])
@@ -2541,22 +1587,9 @@ with tabs[5]:
 with occ_tab1:
     st.markdown("#### Daily Occupancy Trend")
     
-    # Get daily trend data
-    _, _, _, trend_df = calculate_bed_occupancy(from_date, to_date)
-    
     if not trend_df.empty:
         # Aggregate by date
-        daily_agg = trend_df.groupby('THEDATE').agg({
-            'OPBAL': 'sum',
-            'ADMIT': 'sum',
-            'DISCH': 'sum',
-            'TRIN': 'sum',
-            'TROUT': 'sum',
-            'DEATH': 'sum',
-            'DAILY_OCCUPANCY': 'sum'
-        }).reset_index()
-        
-        daily_agg['OCCUPANCY_PCT'] = (daily_agg['DAILY_OCCUPANCY'] / total_beds * 100).round(2)
+        daily_agg = analytics.daily_occupancy(trend_df, total_beds)
         
         # Summary metrics
         col1, col2, col3, col4 = st.columns(4)
@@ -2573,13 +1606,17 @@ with occ_tab1:
             low_pct = (low / total_beds * 100)
             st.metric("📉 Lowest Occupancy", f"{int(low)} ({low_pct:.1f}%)")
         
-        # Chart
-        chart_data = daily_agg[['THEDATE', 'OCCUPANCY_PCT', 'DAILY_OCCUPANCY', 'ADMIT', 'DISCH']].copy()
+        # Chart: long ranges are downsampled (LTTB) to a bounded number of days
+        chart_data = chartdata.downsample(
+            daily_agg[['THEDATE', 'OCCUPANCY_PCT', 'DAILY_OCCUPANCY', 'ADMIT', 'DISCH']], 'THEDATE', 'OCCUPANCY_PCT')
+        if len(chart_data) < len(daily_agg):
+            st.caption(f"Chart shows {len(chart_data):,} of {len(daily_agg):,} days, chosen to keep the trend's "
+                       "peaks and troughs; the table below lists every day.")
         
         # Line chart for occupancy
         line = alt.Chart(chart_data).mark_line(point=True, color='#00d4aa', strokeWidth=3).encode(
             x=alt.X('THEDATE:T', title='Date'),
-            y=alt.Y('OCCUPANCY_PCT:Q', title='Occupancy %', scale=alt.Scale(domain=[0, max(100, chart_data['OCCUPANCY_PCT'].max() + 10)])),
+            y=alt.Y('OCCUPANCY_PCT:Q', title='Occupancy %', scale=alt.Scale(domain=[0, max(100, daily_agg['OCCUPANCY_PCT'].max() + 10)])),
             tooltip=[
                 alt.Tooltip('THEDATE:T', title='Date', format='%d-%b-%Y'),
                 alt.Tooltip('DAILY_OCCUPANCY:Q', title='Census', format='.0f'),
@@ -2637,7 +1674,8 @@ with occ_tab1:
     with occ_tab2:
         st.markdown("#### 🏥 Department-wise Bed Occupancy")
         
-        dept_breakdown = get_department_occupancy_breakdown(from_date, to_date)
+        dept_breakdown = report_errors("Error getting department breakdown", pd.DataFrame(),
+                                       analytics.get_department_occupancy_breakdown, conn, from_date, to_date)
         
         if not dept_breakdown.empty:
             # Summary
@@ -2686,14 +1724,15 @@ with occ_tab1:
         st.markdown("#### 📍 Location-wise Bed Occupancy (Ward/ICU Level)")
         
         # Option to filter by department
-        if not get_department_occupancy_breakdown(from_date, to_date).empty:
-            dept_filter_list = ["All"] + get_department_occupancy_breakdown(from_date, to_date)['DEPARTMENT'].tolist()
+        if not dept_breakdown.empty:
+            dept_filter_list = ["All"] + dept_breakdown['DEPARTMENT'].tolist()
             selected_dept_filter = st.selectbox("Filter by Department", dept_filter_list, key="loc_dept_filter")
         else:
             selected_dept_filter = "All"
         
         dept_param = None if selected_dept_filter == "All" else selected_dept_filter
-        loc_breakdown = get_location_occupancy_breakdown(from_date, to_date, dept_param)
+        loc_breakdown = report_errors("Error getting location breakdown", pd.DataFrame(),
+                                      analytics.get_location_occupancy_breakdown, conn, from_date, to_date, dept_param)
         
         if not loc_breakdown.empty:
             # Summary
@@ -2707,8 +1746,15 @@ with occ_tab1:
                 lowest = loc_breakdown.loc[loc_breakdown['OCCUPANCY_RATE'].idxmin()]
                 st.metric("📉 Lowest", f"{lowest['LOCATION']}", f"{lowest['OCCUPANCY_RATE']:.1f}%")
             
-            # Chart
-            chart = alt.Chart(loc_breakdown).mark_bar().encode(
+            # Chart: the largest locations by beds, the rest folded into one bar
+            other_label = f"Other ({loc_breakdown['LOCATION'].nunique() - chartdata.TOP_N} locations)"
+            chart_loc = chartdata.fold_top_n(loc_breakdown, 'LOCATION', 'TOTAL_BEDS', sums=['AVG_CENSUS'],
+                                             label=other_label)
+            folded = chart_loc['LOCATION'] == other_label
+            if folded.any():
+                chart_loc.loc[folded, 'OCCUPANCY_RATE'] = (
+                    chart_loc.loc[folded, 'AVG_CENSUS'] / chart_loc.loc[folded, 'TOTAL_BEDS'] * 100).round(2)
+            chart = alt.Chart(chart_loc).mark_bar().encode(
                 y=alt.Y('LOCATION:N', sort='-x', title='Location'),
                 x=alt.X('OCCUPANCY_RATE:Q', title='Occupancy Rate (%)', scale=alt.Scale(domain=[0, 100])),
                 color=alt.Color('DEPARTMENT:N', legend=alt.Legend(title='Department')),
@@ -2719,7 +1765,7 @@ with occ_tab1:
                     alt.Tooltip('AVG_CENSUS:Q', title='Avg Census', format='.1f'),
                     alt.Tooltip('OCCUPANCY_RATE:Q', title='Occupancy %', format='.2f')
                 ]
-            ).properties(height=max(400, len(loc_breakdown) * 30))
+            ).properties(height=max(400, len(chart_loc) * 30))
             
             st.altair_chart(chart, use_container_width=True)
             
@@ -2745,7 +1791,7 @@ with occ_tab1:
     st.markdown("---")
     
     # Continue with existing age distribution, admission type, state-wise metrics...
-    avg_age, age_dist = compute_age_distribution()
+    avg_age, age_dist = analytics.compute_age_distribution(conn)
     st.subheader("Age Distribution")
     # ... rest of your existing stats tab code ...
     if not age_dist.empty:
@@ -2760,7 +1806,7 @@ with occ_tab1:
     else:
         st.info("No age data available.")
 
-    adm_type = admission_type_breakdown(from_date, to_date, selected_dept)
+    adm_type = analytics.admission_type_breakdown(conn, from_date, to_date, selected_dept, hospital=selected_hospital)
     st.subheader("Admission Type Breakdown")
     if not adm_type.empty:
         chart2 = alt.Chart(adm_type).mark_bar().encode(
@@ -2773,12 +1819,12 @@ with occ_tab1:
         st.info("No admission type data available.")
 
     st.subheader("State-wise Metrics")
-    stats_hosp_list = ["All Hospitals"] + (hosp_df["HOSPITALID"].dropna().tolist() if 'hosp_df' in globals() else [])
+    stats_hosp_list = ["All Hospitals"] + hosp_df["HOSPITALID"].dropna().tolist()
     stats_selected_hosp = st.selectbox(
         "Hospital", stats_hosp_list, index=0, key="stats_hosp_selectbox"
     )
 
-    stats_dept_list = ["All"] + (dept_df["DEPTCODE"].dropna().tolist() if 'dept_df' in globals() else [])
+    stats_dept_list = ["All"] + dept_df["DEPTCODE"].dropna().tolist()
     stats_selected_dept = st.selectbox(
         "Department", stats_dept_list, index=0, key="stats_dept_selectbox"
     )
@@ -2803,27 +1849,9 @@ with occ_tab1:
             "End Month", list(range(1,13)), index=today.month-1, key="stats_end_month_selectbox"
         )
 
-    where_clauses = []
-    if stats_selected_hosp not in (None, "", "All Hospitals"):
-        where_clauses.append(f"HOSPITALID = '{safe_sql(stats_selected_hosp)}'")
-    if stats_selected_dept not in (None, "", "All"):
-        where_clauses.append(f"DEPTCODE = '{safe_sql(stats_selected_dept)}'")
     start_ym = start_year*100 + start_month
     end_ym = end_year*100 + end_month
-    where_clauses.append(f"(YR*100 + MNTH) BETWEEN {start_ym} AND {end_ym}")
-    where_sql = " AND ".join(where_clauses) if where_clauses else "1=1"
-
-    stats_q = f"""
-        SELECT STATE, SUM(CNT) AS CNT, YR, MNTH
-        FROM STATESTATS
-        WHERE {where_sql}
-        GROUP BY STATE, YR, MNTH
-        ORDER BY YR, MNTH, STATE
-    """
-    try:
-        stats_df = pd.read_sql(stats_q, conn)
-    except Exception:
-        stats_df = pd.DataFrame(columns=["STATE","CNT","YR","MNTH"])
+    stats_df = analytics.state_trend(conn, start_ym, end_ym, stats_selected_hosp, stats_selected_dept)
 
     if stats_df.empty:
         st.info("No state-wise data available for selected filters.")
@@ -2839,7 +1867,10 @@ with occ_tab1:
 
         st.markdown("**State-wise Trend Over Time**")
         stats_df["DATE"] = pd.to_datetime(stats_df["YR"].astype(str) + "-" + stats_df["MNTH"].astype(str) + "-01")
-        chart_trend = alt.Chart(stats_df).mark_line(point=True).encode(
+        # top states by total as their own lines, the rest as one "Other" line
+        trend_df = chartdata.fold_top_n(stats_df, "STATE", "CNT", by=["DATE"])
+        trend_df = chartdata.downsample(trend_df, "DATE", "CNT", by="STATE")
+        chart_trend = alt.Chart(trend_df).mark_line(point=True).encode(
             x="DATE:T",
             y="CNT",
             color="STATE",
@@ -2875,6 +1906,7 @@ with tabs[6]:
         except Exception as db_e:
             st.error(f"Cannot reconnect to database: {db_e}")
             st.stop()
+    st.session_state.dashboard_conn = conn
     try:
         render_custom_metrics_ui(
             conn=conn,
@@ -2892,116 +1924,47 @@ with tabs[7]:
     st.header("Surgery Details")
 
     # ============================================
-    # BUILD DEPARTMENT FILTER USING DEPTCODE
+    # DEPARTMENT FILTER USING DEPTCODE
     # ============================================
-    dept_filter = ""
+    dept_code = None  # every department
     if selected_dept and selected_dept not in (None, "", "All"):
         try:
-            # Get DEPTCODE for selected department name
-            dept_code_q = f"SELECT DEPTCODE FROM DEPARTMENT WHERE DEPTNAME = '{safe_sql(selected_dept)}' AND ROWNUM = 1"
-            dept_code_df = pd.read_sql(dept_code_q, conn)
-            
-            if not dept_code_df.empty and dept_code_df['DEPTCODE'].iloc[0] is not None:
-                dept_code = dept_code_df['DEPTCODE'].iloc[0]
-                dept_filter = f"AND s.DEPTCODE = '{safe_sql(dept_code)}'"
+            dept_code = analytics.department_code(conn, selected_dept, name="surgery.dept_code")
+            if dept_code is not None:
                 st.info(f"🏥 Filtering for Department: {selected_dept} (Code: {dept_code})")
             else:
                 st.warning(f"⚠️ Department '{selected_dept}' not found in DEPARTMENT table")
-                dept_filter = "AND 1=0"  # Return no results if dept not found
+                dept_code = ""  # Return no results if dept not found
         except Exception as e:
             st.error(f"Error getting department code: {e}")
-            dept_filter = ""
-    
-    # Build surgeon filter (if any)
-    surgeon_filter = ""
+            dept_code = None
+
     if selected_surgeon_id:
-        surgeon_filter = f"AND EXISTS (SELECT 1 FROM SURGERY_PERSONNEL sp WHERE sp.SURGERYID = s.SURGERYID AND sp.STAFFROLE = 'SURGEON' AND sp.STAFFID = '{safe_sql(selected_surgeon_id)}')"
         st.info(f"👨‍⚕️ Filtering for Surgeon: {selected_surgeon_name}")
 
     # Hospital filter
     if selected_hospital not in (None, "", "All Hospitals"):
         st.info(f"🏥 Filtering for Hospital: {selected_hospital}")
 
-    # COMPLETE QUERY with DEPTCODE filter
-    surgery_q = f"""
-    WITH RankedPersonnel AS (
-        SELECT 
-            sp.SURGERYID,
-            sp.STAFFID,
-            sp.STAFFROLE,
-            NVL(sm.STAFFNAME, sp.STAFFID) AS STAFFNAME,
-            ROW_NUMBER() OVER (PARTITION BY sp.SURGERYID, sp.STAFFROLE ORDER BY sp.STAFFID) AS rn
-        FROM SURGERY_PERSONNEL sp
-        LEFT JOIN STAFFMASTER sm ON sp.STAFFID = sm.STAFFID
-        WHERE UPPER(sp.STAFFID) != 'MIGRATED'
-    )
-    SELECT
-        s.SURGERYID,
-        s.MRN,
-        s.SURGERYDATE,
-        s.OTNUMBER,
-        s.ANAESTHESIA,
-        s.SURGERYTYPE,
-        s.DEPTCODE,
-        NVL(d.DEPTNAME, s.DEPTCODE) AS DEPTNAME,
-        NVL(sd.SURGERYNAME, 'Procedure Name Not Found') AS PROCEDURE_NAME,
-        NVL(sd.CATEGORY, 'Uncategorized') AS PROC_CATEGORY,
-        NVL(sd.SUBCATEGORY, '-') AS PROC_SUBCATEGORY,
-        -- Main roles
-        NVL(surgeon.STAFFNAME, 'Unknown Surgeon') AS SURGEON_NAME,
-        NVL(anaesthetist.STAFFNAME, 'Not Recorded') AS ANAESTHETIST_NAME,
-        NVL(asst_surgeon.STAFFNAME, '-') AS ASST_SURGEON_NAME,
-        NVL(asst_anes.STAFFNAME, '-') AS ASST_ANAESTHETIST_NAME,
-        NVL(perfusionist.STAFFNAME, '-') AS PERFUSIONIST_NAME,
-        NVL(rnurse.STAFFNAME, '-') AS RNURSE_NAME,
-        NVL(scnurse.STAFFNAME, '-') AS SCNURSE_NAME,
-        -- Additional roles
-        NVL(nurse.STAFFNAME, '-') AS NURSE_NAME,
-        NVL(techcath.STAFFNAME, '-') AS TECHCATH_NAME,
-        NVL(physiciancath.STAFFNAME, '-') AS PHYSICIANCATH_NAME,
-        NVL(technician.STAFFNAME, '-') AS TECHNICIAN_NAME,
-        NVL(asstphycath.STAFFNAME, '-') AS ASSTPHYCATH_NAME,
-        NVL(iomtech.STAFFNAME, '-') AS IOMTECH_NAME,
-        NVL(circnurse.STAFFNAME, '-') AS CIRCNURSE_NAME,
-        NVL(asstnurse.STAFFNAME, '-') AS ASSTNURSE_NAME,
-        NVL(wardnurse.STAFFNAME, '-') AS WARDNURSE_NAME
-    FROM SURGERY s
-    LEFT JOIN DEPARTMENT d ON s.DEPTCODE = d.DEPTCODE AND s.HOSPITALID = d.HOSPITALID
-    LEFT JOIN SURGERY_DETAILS sd 
-      ON s.SURGERYID = sd.SURGERYID
-     AND s.HOSPITALID = sd.HOSPITALID
-    -- Main roles (7)
-    LEFT JOIN RankedPersonnel surgeon ON s.SURGERYID = surgeon.SURGERYID AND surgeon.STAFFROLE = 'SURGEON' AND surgeon.rn = 1
-    LEFT JOIN RankedPersonnel anaesthetist ON s.SURGERYID = anaesthetist.SURGERYID AND anaesthetist.STAFFROLE = 'ANAESTHETIST' AND anaesthetist.rn = 1
-    LEFT JOIN RankedPersonnel asst_surgeon ON s.SURGERYID = asst_surgeon.SURGERYID AND asst_surgeon.STAFFROLE = 'ASSISTING SURGEON' AND asst_surgeon.rn = 1
-    LEFT JOIN RankedPersonnel asst_anes ON s.SURGERYID = asst_anes.SURGERYID AND asst_anes.STAFFROLE = 'ASSISTING ANAESTHETIST' AND asst_anes.rn = 1
-    LEFT JOIN RankedPersonnel perfusionist ON s.SURGERYID = perfusionist.SURGERYID AND perfusionist.STAFFROLE = 'PERFUSIONIST' AND perfusionist.rn = 1
-    LEFT JOIN RankedPersonnel rnurse ON s.SURGERYID = rnurse.SURGERYID AND rnurse.STAFFROLE = 'RNURSE' AND rnurse.rn = 1
-    LEFT JOIN RankedPersonnel scnurse ON s.SURGERYID = scnurse.SURGERYID AND scnurse.STAFFROLE = 'SCNURSE' AND scnurse.rn = 1
-    -- Additional roles (9)
-    LEFT JOIN RankedPersonnel nurse ON s.SURGERYID = nurse.SURGERYID AND nurse.STAFFROLE = 'NURSE' AND nurse.rn = 1
-    LEFT JOIN RankedPersonnel techcath ON s.SURGERYID = techcath.SURGERYID AND techcath.STAFFROLE = 'TECHCATH' AND techcath.rn = 1
-    LEFT JOIN RankedPersonnel physiciancath ON s.SURGERYID = physiciancath.SURGERYID AND physiciancath.STAFFROLE = 'PHYSICIANCATH' AND physiciancath.rn = 1
-    LEFT JOIN RankedPersonnel technician ON s.SURGERYID = technician.SURGERYID AND technician.STAFFROLE = 'TECHNICIAN' AND technician.rn = 1
-    LEFT JOIN RankedPersonnel asstphycath ON s.SURGERYID = asstphycath.SURGERYID AND asstphycath.STAFFROLE = 'ASSTPHYCATH' AND asstphycath.rn = 1
-    LEFT JOIN RankedPersonnel iomtech ON s.SURGERYID = iomtech.SURGERYID AND iomtech.STAFFROLE = 'IOMTECH' AND iomtech.rn = 1
-    LEFT JOIN RankedPersonnel circnurse ON s.SURGERYID = circnurse.SURGERYID AND circnurse.STAFFROLE = 'CIRCNURSE' AND circnurse.rn = 1
-    LEFT JOIN RankedPersonnel asstnurse ON s.SURGERYID = asstnurse.SURGERYID AND asstnurse.STAFFROLE = 'ASSTNURSE' AND asstnurse.rn = 1
-    LEFT JOIN RankedPersonnel wardnurse ON s.SURGERYID = wardnurse.SURGERYID AND wardnurse.STAFFROLE = 'WARDNURSE' AND wardnurse.rn = 1
-    WHERE s.SURGERYDATE BETWEEN TO_DATE('{from_date}', 'YYYY-MM-DD')
-                           AND TO_DATE('{to_date}', 'YYYY-MM-DD') + 0.99999
-      AND (s.HOSPITALID = '{safe_sql(selected_hospital)}' OR '{selected_hospital}' = 'All Hospitals')
-      {dept_filter}
-      {surgeon_filter}
-    ORDER BY s.SURGERYDATE DESC
-    """
-
     try:
-        df = pd.read_sql(surgery_q, conn)
+        df = analytics.load_surgery_register(
+            conn, from_date, to_date, selected_hospital, dept_code, selected_surgeon_id
+        )
+    except QueryCancelled:
+        st.stop()
+    except QueryTimeout as e:
+        show_timeout("Surgery register", e)
+        st.stop()
+    except FrameTooLarge as e:
+        st.warning(f"⚠️ Too many surgeries to load at once ({e}). "
+                   "Narrow the date range, or filter by department or surgeon.")
+        st.stop()
     except Exception as e:
         st.error(f"❌ Query failed: {e}")
         with st.expander("🔍 Show SQL Query for Debugging"):
-            st.code(surgery_q, language="sql")
+            st.code(analytics.surgery_register_sql(
+                from_date, to_date, selected_hospital, dept_code, selected_surgeon_id
+            ), language="sql")
         df = pd.DataFrame()
 
     if df.empty:
@@ -3023,6 +1986,19 @@ Query Filters Applied:
             """)
         st.stop()
 
+    # Close to the frame cap: the next widening of the range may be refused
+    # (only streamed frames, longer than one chunk, can come near it)
+    register_bytes = frame_bytes(df, deep=True) or 0 if len(df) >= STREAM_CHUNK_ROWS else 0
+    if FRAME_CAP and register_bytes > 0.75 * FRAME_CAP:
+        st.caption(f"ℹ️ The loaded surgeries use {register_bytes / 2**20:,.0f} MB of the "
+                   f"{FRAME_CAP / 2**20:,.0f} MB allowed per load; narrow the filters for a larger range.")
+
+    # Identifies this tab's data for the on-demand export cache
+    surgery_export_filters = {
+        "from": str(from_date), "to": str(to_date), "hospital": selected_hospital,
+        "dept": selected_dept, "surgeon": selected_surgeon_id
+    }
+
     total_surgeries = len(df)
     days = (to_date - from_date).days + 1
     daily_avg = round(total_surgeries / days, 1)
@@ -3046,8 +2022,7 @@ Query Filters Applied:
 
     # Show department breakdown if "All" is selected
     if selected_dept in (None, "", "All"):
-        dept_breakdown = df.groupby('DEPTNAME').size().reset_index(name='Count')
-        dept_breakdown = dept_breakdown.sort_values('Count', ascending=False)
+        dept_breakdown = analytics.department_breakdown(df)
         
         with st.expander("🏥 View Breakdown by Department"):
             col1, col2 = st.columns([2, 1])
@@ -3063,8 +2038,7 @@ Query Filters Applied:
 
     # === 1. TOP PROCEDURES ===
     st.subheader("📊 Top 20 Procedures Performed")
-    proc = df["PROCEDURE_NAME"].value_counts().head(20).reset_index()
-    proc.columns = ["Procedure", "Count"]
+    proc = analytics.top_procedures(df)
 
     col1, col2 = st.columns([3, 1])
     with col1:
@@ -3082,9 +2056,8 @@ Query Filters Applied:
 
     # === 2. FULL PROCEDURE LIST ===
     with st.expander("📋 Complete Procedure Master List (All Performed)", expanded=False):
-        full_proc = df["PROCEDURE_NAME"].value_counts().reset_index()
+        full_proc = analytics.top_procedures(df, n=None)
         full_proc.columns = ["Procedure Name", "Times Performed"]
-        full_proc = full_proc.sort_values("Times Performed", ascending=False).reset_index(drop=True)
         full_proc.insert(0, "Rank", range(1, len(full_proc)+1))
 
         search = st.text_input("🔍 Search procedure", key="proc_search_tab4")
@@ -3092,9 +2065,12 @@ Query Filters Applied:
 
         st.dataframe(display.style.format({"Times Performed": "{:,}"}), use_container_width=True, height=500)
 
-        csv = full_proc.to_csv(index=False).encode()
-        st.download_button("📥 Download Full List (CSV)", data=csv,
-                           file_name=f"Procedures_{from_date}_to_{to_date}.csv", mime="text/csv")
+        deferred_download_button(
+            "Full List (CSV)", "procedure_list", surgery_export_filters, "csv",
+            build=lambda: create_csv_download(full_proc),
+            file_name=f"Procedures_{from_date}_to_{to_date}.csv",
+            key="procedure_list_csv"
+        )
 
     st.markdown("---")
 
@@ -3115,48 +2091,30 @@ Query Filters Applied:
         "📡 More Roles"
     ])
 
-    # Define role configurations (main 8)
-    roles_config = [
-        {"col": "SURGEON_NAME", "title": "Surgeon", "color": "#ff6b6b", "exclude": ["Unknown Surgeon"]},
-        {"col": "ANAESTHETIST_NAME", "title": "Anaesthetist", "color": "#4ecdc4", "exclude": ["Not Recorded"]},
-        {"col": "ASST_SURGEON_NAME", "title": "Assisting Surgeon", "color": "#f39c12", "exclude": ["-"]},
-        {"col": "ASST_ANAESTHETIST_NAME", "title": "Assisting Anaesthetist", "color": "#9b59b6", "exclude": ["-"]},
-        {"col": "PERFUSIONIST_NAME", "title": "Perfusionist", "color": "#e74c3c", "exclude": ["-"]},
-        {"col": "RNURSE_NAME", "title": "R Nurse", "color": "#1abc9c", "exclude": ["-"]},
-        {"col": "SCNURSE_NAME", "title": "SC Nurse", "color": "#3498db", "exclude": ["-"]},
-        {"col": "NURSE_NAME", "title": "Nurse", "color": "#16a085", "exclude": ["-"]},
-        {"col": "TECHNICIAN_NAME", "title": "Technician", "color": "#34495e", "exclude": ["-"]}
-    ]
+    boards = analytics.leaderboards(df)
 
     # Render first 9 tabs
-    for i, (tab, config) in enumerate(zip(tab_roles[:9], roles_config)):
+    for tab, role in zip(tab_roles[:9], analytics.MAIN_ROLES):
         with tab:
-            filtered_df = df[
-                df[config["col"]].notna() & 
-                (~df[config["col"]].isin(config["exclude"]))
-            ]
+            role_count = boards[role["col"]]
             
-            if filtered_df.empty:
-                st.info(f"No {config['title']} data available for this period.")
+            if role_count.empty:
+                st.info(f"No {role['title']} data available for this period.")
                 continue
             
-            role_count = filtered_df[config["col"]].value_counts().head(25).reset_index()
-            role_count.columns = [config["title"], "Cases"]
-            
             col1, col2, col3 = st.columns(3)
             with col1:
-                st.metric(f"Total {config['title']}s", len(role_count))
+                st.metric(f"Total {role['title']}s", len(role_count))
             with col2:
                 st.metric("Total Cases", role_count["Cases"].sum())
             with col3:
-                if not role_count.empty:
-                    st.metric("Top Performer", role_count.iloc[0][config["title"]], f"{role_count.iloc[0]['Cases']:,} cases")
+                st.metric("Top Performer", role_count.iloc[0][role["title"]], f"{role_count.iloc[0]['Cases']:,} cases")
             
             st.altair_chart(
-                alt.Chart(role_count).mark_bar(color=config["color"]).encode(
-                    y=alt.Y(f"{config['title']}:N", sort="-x"),
+                alt.Chart(role_count).mark_bar(color=ROLE_COLORS[role["col"]]).encode(
+                    y=alt.Y(f"{role['title']}:N", sort="-x"),
                     x="Cases:Q",
-                    tooltip=[config["title"], "Cases"]
+                    tooltip=[role["title"], "Cases"]
                 ).properties(height=min(600, len(role_count) * 30 + 100)), 
                 use_container_width=True
             )
@@ -3167,69 +2125,92 @@ Query Filters Applied:
     with tab_roles[9]:
         st.markdown("#### Additional Specialized Roles")
         
-        additional_roles = [
-            ("TECHCATH_NAME", "Cath Lab Technician"),
-            ("PHYSICIANCATH_NAME", "Cath Lab Physician"),
-            ("ASSTPHYCATH_NAME", "Assisting Cath Physician"),
-            ("IOMTECH_NAME", "IOM Technician"),
-            ("CIRCNURSE_NAME", "Circulating Nurse"),
-            ("ASSTNURSE_NAME", "Assistant Nurse"),
-            ("WARDNURSE_NAME", "Ward Nurse")
-        ]
-        
-        for col_name, role_title in additional_roles:
-            filtered_df = df[df[col_name].notna() & (df[col_name] != "-")]
+        for col_name, role_title in analytics.ADDITIONAL_ROLES:
+            role_count = boards[col_name]
             
-            if not filtered_df.empty:
-                role_count = filtered_df[col_name].value_counts().head(10).reset_index()
-                role_count.columns = [role_title, "Cases"]
-                
+            if not role_count.empty:
                 with st.expander(f"📊 {role_title} ({len(role_count)} staff)", expanded=False):
                     st.dataframe(role_count.style.format({"Cases": "{:,}"}), use_container_width=True)
 
     st.markdown("---")
 
     # === 5. FULL SURGERY REGISTER ===
+    register_columns = {
+        "SURGERYDATE": "Date",
+        "MRN": "Patient",
+        "DEPTNAME": "Department",
+        "PROCEDURE_NAME": "Procedure",
+        "PROC_CATEGORY": "Category",
+        "PROC_SUBCATEGORY": "Subcategory",
+        "SURGEON_NAME": "Surgeon",
+        "ANAESTHETIST_NAME": "Anaesthetist",
+        "ASST_SURGEON_NAME": "Asst Surgeon",
+        "ASST_ANAESTHETIST_NAME": "Asst Anaesthetist",
+        "PERFUSIONIST_NAME": "Perfusionist",
+        "RNURSE_NAME": "R Nurse",
+        "SCNURSE_NAME": "SC Nurse",
+        "NURSE_NAME": "Nurse",
+        "OTNUMBER": "OT",
+        "ANAESTHESIA": "Anaesthesia Type"
+    }
+
+    def register_view(frame):
+        view = frame[list(register_columns)].copy()
+        view["SURGERYDATE"] = pd.to_datetime(view["SURGERYDATE"]).dt.strftime("%d-%b-%Y")
+        return view.rename(columns=register_columns)
+
     with st.expander("📄 View Full Surgery Register (All Details)", expanded=False):
-        reg = df[[
-            "SURGERYDATE", "MRN", "DEPTNAME", "PROCEDURE_NAME", "PROC_CATEGORY", "PROC_SUBCATEGORY",
-            "SURGEON_NAME", "ANAESTHETIST_NAME", "ASST_SURGEON_NAME", "ASST_ANAESTHETIST_NAME",
-            "PERFUSIONIST_NAME", "RNURSE_NAME", "SCNURSE_NAME", "NURSE_NAME", 
-            "OTNUMBER", "ANAESTHESIA"
-        ]].copy()
-        
-        reg["SURGERYDATE"] = pd.to_datetime(reg["SURGERYDATE"]).dt.strftime("%d-%b-%Y")
-        reg.rename(columns={
-            "SURGERYDATE": "Date",
-            "MRN": "Patient",
-            "DEPTNAME": "Department",
-            "PROCEDURE_NAME": "Procedure",
-            "PROC_CATEGORY": "Category",
-            "PROC_SUBCATEGORY": "Subcategory",
-            "SURGEON_NAME": "Surgeon",
-            "ANAESTHETIST_NAME": "Anaesthetist",
-            "ASST_SURGEON_NAME": "Asst Surgeon",
-            "ASST_ANAESTHETIST_NAME": "Asst Anaesthetist",
-            "PERFUSIONIST_NAME": "Perfusionist",
-            "RNURSE_NAME": "R Nurse",
-            "SCNURSE_NAME": "SC Nurse",
-            "NURSE_NAME": "Nurse",
-            "OTNUMBER": "OT",
-            "ANAESTHESIA": "Anaesthesia Type"
-        }, inplace=True)
-        
-        st.dataframe(reg, use_container_width=True, height=500)
-        
-        csv_reg = reg.to_csv(index=False).encode()
-        st.download_button(
-            "📥 Download Full Register (CSV)",
-            data=csv_reg,
-            file_name=f"Surgery_Register_{from_date}_to_{to_date}.csv",
-            mime="text/csv"
+        # One page at a time from the database (keyset on SURGERYDATE, SURGERYID),
+        # so only the visible rows are fetched and sent to the browser
+        r1, r2, r3, r4 = st.columns(4)
+        reg_order = r1.selectbox("Order", ["Newest first", "Oldest first"], key="reg_order")
+        reg_mrn = r2.text_input("Patient MRN starts with", key="reg_mrn")
+        reg_proc = r3.text_input("Procedure contains", key="reg_proc")
+        reg_cat = r4.selectbox("Category", ["All"] + sorted(df["PROC_CATEGORY"].dropna().unique()), key="reg_cat")
+
+        reg_query = (str(from_date), str(to_date), selected_hospital, dept_code, selected_surgeon_id,
+                     reg_order, reg_mrn.strip(), reg_proc.strip(), reg_cat)
+        if st.session_state.get("reg_query") != reg_query:
+            st.session_state.reg_query = reg_query
+            st.session_state.reg_cursors = [None]
+        reg_cursors = st.session_state.reg_cursors
+
+        reg_page, reg_more = report_errors(
+            "Error loading the surgery register", (pd.DataFrame(), False), analytics.surgery_register_page,
+            conn, from_date, to_date, selected_hospital, dept_code, selected_surgeon_id,
+            mrn=reg_mrn, procedure=reg_proc, category=None if reg_cat == "All" else reg_cat,
+            newest_first=reg_order == "Newest first", after=reg_cursors[-1])
+
+        if reg_page.empty:
+            st.info("No surgeries match these register filters.")
+        else:
+            st.dataframe(register_view(reg_page), use_container_width=True, hide_index=True)
+        first = (len(reg_cursors) - 1) * analytics.REGISTER_PAGE_SIZE + 1
+        g1, g2, g3 = st.columns([1, 3, 1])
+        if g1.button("⬅️ Previous", use_container_width=True, disabled=len(reg_cursors) == 1, key="reg_prev"):
+            reg_cursors.pop()
+            st.rerun()
+        if not reg_page.empty:
+            narrowed = reg_mrn.strip() or reg_proc.strip() or reg_cat != "All"
+            g2.caption(f"Page {len(reg_cursors)} · rows {first:,}–{first + len(reg_page) - 1:,} "
+                       + ("matching the register filters" if narrowed else f"of {total_surgeries:,} surgeries"))
+        if g3.button("Next ➡️", use_container_width=True, disabled=not reg_more, key="reg_next"):
+            reg_cursors.append(analytics.register_cursor(reg_page))
+            st.rerun()
+
+        # exports are built on request from the full register
+        export_data_options(
+            lambda: register_view(df),
+            f"Surgery_Register_{from_date}_to_{to_date}",
+            dataset="surgery_register",
+            filters=surgery_export_filters
         )
 
 # Close DB connection
 try:
     conn.close()
 except Exception:
-    pass
\ No newline at end of file
+    pass
+st.session_state.pop("dashboard_conn", None)
+
+page_timer.finish()
\ No newline at end of file
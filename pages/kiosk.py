@@ -0,0 +1,101 @@
+"""
+Kiosk mode for wall-mounted ward and OT displays
+
+    /kiosk?hospital=PSN        (hospital omitted: all hospitals)
+
+Shows the General KPIs and bed occupancy of one hospital, month to date,
+without a sidebar. Displays do not query the database: every one of them
+reads the snapshot the process-wide refresher (sssihms.kiosk) publishes, so
+adding screens adds no database load. Displays need ?token= with the
+KIOSK_TOKEN value; with no KIOSK_TOKEN set the page refuses to render.
+"""
+import hmac
+import html
+import os
+
+import streamlit as st
+
+from sssihms import analytics, assets
+from sssihms.instrumentation import set_context
+from sssihms.kiosk import get_publisher
+
+st.set_page_config(
+    page_title="🏥 SSSIHMS Ward Display",
+    page_icon="🏥",
+    layout="wide",
+    initial_sidebar_state="collapsed"
+)
+set_context(page="kiosk")
+
+static_serving = st.get_option("server.enableStaticServing")
+st.markdown(assets.stylesheet("dashboard.css", static_serving), unsafe_allow_html=True)
+st.markdown(assets.stylesheet("kiosk.css", static_serving), unsafe_allow_html=True)
+
+kiosk_token = os.getenv("KIOSK_TOKEN")
+if not kiosk_token:
+    st.error("🔒 Kiosk displays are disabled: no KIOSK_TOKEN is configured.")
+    st.stop()
+if not hmac.compare_digest(st.query_params.get("token", "").encode(), kiosk_token.encode()):
+    st.error("🔒 This display link is missing its access token.")
+    st.stop()
+
+hospital = st.query_params.get("hospital") or analytics.ALL_HOSPITALS
+try:
+    known = get_publisher().is_known(hospital)
+except Exception as e:
+    st.error(f"Could not load the hospital list: {e}")
+    st.stop()
+if not known:
+    st.error("Unknown hospital in this display link; use one of the HOSPITALID codes.")
+    st.stop()
+# how often a display looks for a newer snapshot (reads memory only)
+POLL_SECONDS = float(os.getenv("KIOSK_POLL_SECONDS", "15"))
+
+
+def tile(title, value, subtext, grad_class, icon):
+    return f"""
+    <div class="kpi-card {grad_class}">
+        <div class="kpi-icon">{icon}</div>
+        <div class="kpi-title">{title}</div>
+        <div class="kpi-value">{value}</div>
+        <div class="kpi-sub">{subtext}</div>
+    </div>
+    """
+
+
+@st.fragment(run_every=POLL_SECONDS)
+def display():
+    snapshot = get_publisher().latest(hospital)
+    st.markdown(f"<div class='kiosk-title'>🏥 {html.escape(hospital)}</div>", unsafe_allow_html=True)
+    if snapshot is None or snapshot.from_date is None:
+        st.markdown("<div class='kiosk-sub'>Preparing the display…</div>", unsafe_allow_html=True)
+        if snapshot is not None and snapshot.error:
+            st.error(f"Could not load figures: {snapshot.error}")
+        return
+
+    st.markdown(
+        f"<div class='kiosk-sub'>{snapshot.from_date:%d %b} → {snapshot.to_date:%d %b %Y} · "
+        f"updated {snapshot.computed_at:%H:%M:%S}</div>",
+        unsafe_allow_html=True
+    )
+    k, occ = snapshot.kpis, snapshot.occupancy
+    r1 = st.columns(3)
+    r1[0].markdown(tile("Inpatients", f"{k['inpatients']:,}", "Admissions this month", "kpi-grad-1", "🏨"),
+                   unsafe_allow_html=True)
+    r1[1].markdown(tile("Outpatients", f"{k['outpatients']:,}", "Visits this month", "kpi-grad-2", "🧍"),
+                   unsafe_allow_html=True)
+    r1[2].markdown(tile("Bed Occupancy", f"{occ['occupancy_rate']:.1f}%",
+                        f"{occ['avg_daily_census']:.0f} of {occ['total_beds']} beds on average",
+                        "kpi-grad-3", "🛏️"), unsafe_allow_html=True)
+    r2 = st.columns(3)
+    r2[0].markdown(tile("Avg Length of Stay", f"{k['alos']:.2f} days", "Mean of DAYSCARED", "kpi-grad-5", "⏱️"),
+                   unsafe_allow_html=True)
+    r2[1].markdown(tile("Mortality Rate", f"{k['mortality_rate']:.2f}%", f"{k['deaths']} deaths",
+                        "kpi-grad-4", "⚰️"), unsafe_allow_html=True)
+    r2[2].markdown(tile("Readmission Rate", f"{k['readmission_rate']:.2f}%", f"{k['readmissions']} readmissions",
+                        "kpi-grad-6", "🔁"), unsafe_allow_html=True)
+    if snapshot.error:
+        st.caption(f"⚠️ Last refresh failed, showing figures from {snapshot.computed_at:%H:%M}: {snapshot.error}")
+
+
+display()
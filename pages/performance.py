@@ -0,0 +1,234 @@
+from datetime import datetime
+
+import streamlit as st
+import pandas as pd
+import altair as alt
+from dotenv import load_dotenv
+
+from sssihms.db import acquire, create_pool
+from sssihms.instrumentation import recorder, timed, percentile, set_context, QUERY, PAGE, POOL, CACHE
+from sssihms.daycache import get_day_cache
+from sssihms.prefetch import get_prefetcher
+from sssihms.singleflight import get_single_flight
+from sssihms.cancellation import get_query_watch
+
+# =====================================================
+# STREAMLIT CONFIG
+# =====================================================
+st.set_page_config(
+    page_title="⚡ Performance - Admin",
+    page_icon="⚡",
+    layout="wide"
+)
+
+st.markdown("""
+    <style>
+    /* Hide Streamlit page navigation */
+    [data-testid="stSidebarNav"] {
+        display: none;
+    }
+    </style>
+""", unsafe_allow_html=True)
+
+load_dotenv()
+
+@st.cache_resource
+def get_pool():
+    """Session pool for this page (the stand-in database's with STANDIN_DB set)"""
+    return create_pool()
+
+
+def get_connection():
+    return acquire(get_pool(), "performance.acquire")
+
+# =====================================================
+# AUTH CHECK (RESTRICT TO ADMIN ONLY)
+# =====================================================
+if "authenticated" not in st.session_state or not st.session_state.authenticated:
+    st.warning("🔒 Please log in first.")
+    st.stop()
+
+set_context(page="performance", user=st.session_state.get("username"))
+
+def fetch_role(staffid: str):
+    try:
+        conn = get_connection()
+        cur = conn.cursor()
+        with timed("performance.fetch_role") as t:
+            cur.execute("""
+                SELECT ACCESS_ROLE
+                FROM STAFFMASTER
+                WHERE STAFFID = :id
+            """, {"id": staffid})
+            row = cur.fetchone()
+            t.rows = int(row is not None)
+        cur.close()
+        conn.close()
+        return row[0] if row else None
+    except Exception:
+        return None
+
+if fetch_role(st.session_state.username) != "A":
+    st.error("🚫 Access denied. Only administrators can access this page.")
+    st.stop()
+
+# =====================================================
+# SIDEBAR NAVIGATION BUTTONS
+# =====================================================
+st.sidebar.title("🎛️ Navigation")
+
+col1, col2 = st.sidebar.columns(2)
+with col1:
+    if st.button("🏠 Dashboard", use_container_width=True, key="nav_dashboard"):
+        st.switch_page("pages/dashboard.py")
+    if st.button("⚙️ Admin", use_container_width=True, key="nav_admin"):
+        st.switch_page("pages/admin_panel.py")
+
+with col2:
+    if st.button("🔒 Logout", use_container_width=True, key="nav_logout"):
+        st.switch_page("app.py")
+    st.button("⚡ Perf", use_container_width=True, disabled=True, key="nav_performance_current")
+
+st.sidebar.markdown("---")
+st.sidebar.info(f"👤 **{st.session_state.get('staffname', 'Admin')}**\n🏥 {st.session_state.get('hospitalid', 'N/A')}")
+
+# =====================================================
+# UI — PERFORMANCE
+# =====================================================
+st.title("⚡ Query & Page Performance")
+st.caption("Collected in-process since the server started; every Streamlit session on this server is included.")
+
+WINDOWS = {"Last 15 minutes": 900, "Last hour": 3600, "Last 6 hours": 6 * 3600, "Last 24 hours": 24 * 3600}
+
+c1, c2, c3 = st.columns([2, 1, 1])
+window_label = c1.selectbox("Window", list(WINDOWS), index=1)
+top_n = c2.number_input("Show top", min_value=5, max_value=100, value=20, step=5)
+with c3:
+    st.write("")
+    if st.button("🔄 Refresh", use_container_width=True):
+        st.rerun()
+
+window = WINDOWS[window_label]
+
+def as_frame(rows, key):
+    df = pd.DataFrame(rows)
+    if df.empty:
+        return df
+    for col in ["p50_ms", "p95_ms", "p99_ms", "max_ms", "total_ms", "avg_rows", "avg_pool_wait_ms"]:
+        df[col] = pd.to_numeric(df[col], errors="coerce").round(1)
+    df["total_kb"] = (df.pop("total_bytes") / 1024).round(1)
+    return df.set_index(key)
+
+query_rows = recorder.summary(QUERY, window)
+page_rows = recorder.summary(PAGE, window)
+pool_rows = recorder.summary(POOL, window)
+cache_rows = recorder.summary(CACHE, window)
+query_events = recorder.events(window, QUERY)
+
+# KPIs
+k1, k2, k3, k4 = st.columns(4)
+k1.metric("Queries", f"{len(query_events):,}")
+all_times = sorted(e.elapsed_ms for e in query_events)
+k2.metric("Query p95", f"{percentile(all_times, 95):.0f} ms" if all_times else "—")
+k3.metric("Errors", sum(1 for e in query_events if e.error))
+pool_events = recorder.events(window, POOL)
+k4.metric("Avg pool/connect wait", f"{sum(e.elapsed_ms for e in pool_events) / len(pool_events):.0f} ms" if pool_events else "—")
+
+st.markdown("---")
+
+# ===============================
+# SLOWEST QUERIES
+# ===============================
+st.subheader("🐢 Slowest Queries (by p95)")
+if query_rows:
+    qdf = as_frame(query_rows[:int(top_n)], "name")
+    chart = alt.Chart(qdf.reset_index()).mark_bar(color="#e74c3c").encode(
+        x=alt.X("p95_ms:Q", title="p95 (ms)"),
+        y=alt.Y("name:N", sort="-x", title=None),
+        tooltip=["name", "count", "p50_ms", "p95_ms", "p99_ms", "max_ms", "avg_rows", "errors"]
+    ).properties(height=max(200, 22 * len(qdf)))
+    st.altair_chart(chart, use_container_width=True)
+    st.dataframe(qdf, use_container_width=True)
+else:
+    st.info("No queries recorded in this window.")
+
+# ===============================
+# SLOWEST PAGES
+# ===============================
+st.subheader("📄 Slowest Pages (full script run)")
+if page_rows:
+    pdf = as_frame(page_rows[:int(top_n)], "name")
+    st.dataframe(pdf[["count", "p50_ms", "p95_ms", "p99_ms", "max_ms"]], use_container_width=True)
+
+    # Where the time goes: query time grouped by the page that issued it
+    per_page = recorder.summary(QUERY, window, by="page")
+    if per_page:
+        st.caption("Query time by page")
+        st.dataframe(as_frame(per_page, "page")[["count", "total_ms", "p95_ms", "total_kb"]], use_container_width=True)
+else:
+    st.info("No page renders recorded in this window.")
+
+# ===============================
+# POOL / CACHE
+# ===============================
+c1, c2 = st.columns(2)
+with c1:
+    st.subheader("🔌 Connection Waits")
+    if pool_rows:
+        st.dataframe(as_frame(pool_rows, "name")[["count", "p50_ms", "p95_ms", "max_ms"]], use_container_width=True)
+    else:
+        st.info("No pool acquisitions recorded.")
+with c2:
+    st.subheader("🗃️ Cache Hit Ratio")
+    if cache_rows:
+        cdf = as_frame(cache_rows, "name")
+        cdf["cache_hit_ratio"] = (cdf["cache_hit_ratio"] * 100).round(1)
+        st.dataframe(cdf[["count", "cache_hit_ratio"]].rename(columns={"cache_hit_ratio": "hit %"}),
+                     use_container_width=True)
+    else:
+        st.info("No cache lookups recorded.")
+    day_cache = get_day_cache().stats()
+    st.caption(f"Day-partition cache: {day_cache['queries']} queries, {day_cache['days']:,} days "
+               f"({day_cache['closed_days']:,} closed), {day_cache['bytes'] / (1024 * 1024):.1f} MB")
+    prefetch = get_prefetcher().stats()
+    st.caption(f"Drill-down prefetch: {prefetch['done']} warmed, {prefetch['expired']} dropped at the time "
+               f"budget, {prefetch['failed']} failed, {prefetch['pending']} pending")
+    flights = get_single_flight().stats()
+    st.caption(f"In-flight coalescing: {flights['executed']:,} queries executed, {flights['joined']:,} "
+               f"callers served by an identical running query, {flights['in_flight']} running now")
+    watch = get_query_watch().stats()
+    st.caption(f"Superseded runs: {watch['cancelled']:,} of {watch['tracked']:,} watched queries cancelled, "
+               f"{watch['running']} running now")
+
+# ===============================
+# SLOWEST EXECUTIONS / ERRORS
+# ===============================
+st.subheader("⏱️ Slowest Individual Executions")
+slowest = sorted(query_events, key=lambda e: e.elapsed_ms, reverse=True)[:int(top_n)]
+if slowest:
+    st.dataframe(pd.DataFrame([{
+        "time": datetime.fromtimestamp(e.ts).strftime("%H:%M:%S"),
+        "name": e.name,
+        "elapsed_ms": round(e.elapsed_ms, 1),
+        "rows": e.rows,
+        "kb": round(e.bytes / 1024, 1) if e.bytes else None,
+        "page": e.page,
+        "user": e.user,
+        "error": e.error,
+    } for e in slowest]), use_container_width=True, hide_index=True)
+
+errors = [e for e in query_events if e.error]
+if errors:
+    with st.expander(f"❌ Failed queries ({len(errors)})"):
+        st.dataframe(pd.DataFrame([{
+            "time": datetime.fromtimestamp(e.ts).strftime("%H:%M:%S"),
+            "name": e.name,
+            "page": e.page,
+            "user": e.user,
+            "error": e.error,
+        } for e in errors[-200:]]), use_container_width=True, hide_index=True)
+
+st.markdown("---")
+if st.button("🧹 Clear collected metrics"):
+    recorder.clear()
+    st.rerun()
@@ -0,0 +1,6 @@
+"""
+SSSIHMS Dashboard support package
+
+Shared building blocks used by the Streamlit pages (app.py, pages/*).
+Nothing in here talks to Streamlit directly unless the module says so.
+"""
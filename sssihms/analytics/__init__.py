@@ -0,0 +1,48 @@
+"""
+Dashboard analytics: the queries and computations behind pages/dashboard.py
+
+Every function takes the connection and the filter values (dates, hospital,
+department, ...) as parameters; nothing reads page globals or imports
+Streamlit, so the same code serves the dashboard, background workers,
+schedulers, an API or the benchmarks.
+
+Functions whose failure the dashboard reports to the user raise; the ones
+the page always treated as optional return an empty result instead, as
+their docstrings say.
+"""
+from sssihms.analytics.filters import (
+    ALL, ALL_HOSPITALS, safe_sql, is_all, is_all_hospitals, build_hospital_where,
+    hospital_filter, department_code, whole_days, days_in_range,
+)
+from sssihms.analytics.lookups import (
+    load_departments, load_hospitals, load_categories, load_surgeons, surgeon_surgery_count,
+)
+from sssihms.analytics.patients import (
+    load_inpatients, load_outpatients, inpatient_kpis, compute_age_distribution,
+    admission_type_breakdown, state_stats_aggregate, state_trend,
+)
+from sssihms.analytics.kpis import (
+    read_staff_patient_ratio, surgery_wait_time, load_financial_summary, load_quality_metrics,
+)
+from sssihms.analytics.categories import (
+    get_category_metrics, get_subcatg_metrics, get_subcatgl2_metrics, subcatgl2_table, build_category_pdf,
+    prefetch_drilldowns,
+)
+from sssihms.analytics.beds import (
+    calculate_bed_occupancy, daily_occupancy, get_department_occupancy_breakdown,
+    get_location_occupancy_breakdown,
+)
+from sssihms.analytics.reports import (
+    REPORT_COLUMNS, search_mrns, fetch_reports_for_mrn, safe_clob, build_report_label,
+    wrap_report_html, create_zip_of_reports,
+)
+from sssihms.analytics.surgery import (
+    MAIN_ROLES, ADDITIONAL_ROLES, REGISTER_PAGE_SIZE, REGISTER_CATEGORICAL, load_surgery_metrics, surgery_register_sql, load_surgery_register,
+    surgery_register_page, register_cursor,
+    top_procedures, role_leaderboard, leaderboards, department_breakdown,
+)
+from sssihms.analytics.comparison import (
+    compare_patient_kpis, compare_occupancy, compare_surgery_volumes, compare_category_totals,
+    hospital_comparison,
+)
+from sssihms.analytics.custom_metrics import CustomMetricsManager
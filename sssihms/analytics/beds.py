@@ -0,0 +1,162 @@
+"""
+Bed occupancy from BEDMASTER (bed strength) and CENSUSDATA (daily census)
+
+BEDMASTER.SPECIALITY is the department and BEDMASTER.LOCATION the ward;
+CENSUSDATA.SPECIALITY matches BEDMASTER.LOCATION.
+"""
+import pandas as pd
+
+from sssihms.db import read_sql
+from sssihms.daycache import get_day_cache
+from sssihms.summaries import routed
+from sssihms.analytics.filters import safe_sql, is_all, days_in_range, whole_days
+
+CENSUS_COLUMNS = ['OPBAL', 'ADMIT', 'DISCH', 'TRIN', 'TROUT', 'DEATH', 'DAILY_OCCUPANCY']
+
+
+def calculate_bed_occupancy(conn, from_date, to_date, dept_name=None, location_filter=None):
+    """
+    (occupancy %, average daily census, total beds, census detail frame).
+    Raises on query failure.
+    """
+    bed_query = """
+            SELECT
+                SPECIALITY,
+                LOCATION,
+                NVL(BEDSTRENGTH, 0) AS BEDSTRENGTH
+            FROM BEDMASTER
+            WHERE STATUS = 'A'
+        """
+
+    bed_conditions = []
+    if dept_name and not is_all(dept_name):
+        bed_conditions.append(f"SPECIALITY = '{safe_sql(dept_name)}'")
+    if location_filter and not is_all(location_filter):
+        bed_conditions.append(f"LOCATION = '{safe_sql(location_filter)}'")
+    if bed_conditions:
+        bed_query += " AND " + " AND ".join(bed_conditions)
+
+    bed_df = read_sql(bed_query, conn, name="beds.occupancy", profile="lookup")
+    total_beds = int(bed_df['BEDSTRENGTH'].sum()) if not bed_df.empty else 0
+
+    if total_beds == 0:
+        return 0.0, 0.0, 0, pd.DataFrame()
+
+    census_conditions = []
+    if location_filter and not is_all(location_filter):
+        census_conditions.append(f"SPECIALITY = '{safe_sql(location_filter)}'")
+    elif dept_name and not is_all(dept_name):
+        # All wards of this department
+        dept_locations = bed_df[bed_df['SPECIALITY'] == dept_name]['LOCATION'].tolist()
+        if dept_locations:
+            location_list = "', '".join([safe_sql(loc) for loc in dept_locations])
+            census_conditions.append(f"SPECIALITY IN ('{location_list}')")
+
+    census_where = "".join(f" AND {c}" for c in census_conditions)
+
+    def from_base(first, last):
+        census_query = f"""
+            SELECT
+                THEDATE,
+                SPECIALITY,
+                NVL(OPBAL, 0) AS OPBAL,
+                NVL(ADMIT, 0) AS ADMIT,
+                NVL(DISCH, 0) AS DISCH,
+                NVL(TRIN, 0) AS TRIN,
+                NVL(TROUT, 0) AS TROUT,
+                NVL(DEATH, 0) AS DEATH,
+                (NVL(OPBAL, 0) + NVL(ADMIT, 0) - NVL(DISCH, 0) + NVL(TRIN, 0) - NVL(TROUT, 0) - NVL(DEATH, 0)) AS DAILY_OCCUPANCY
+            FROM CENSUSDATA
+            WHERE {whole_days('THEDATE', first, last)}{census_where}
+            ORDER BY THEDATE, SPECIALITY
+        """
+        return read_sql(census_query, conn, name="beds.census", profile="bulk")
+
+    def from_summary(table, first, last):
+        census_query = f"""
+            SELECT THEDATE, SPECIALITY, OPBAL, ADMIT, DISCH, TRIN, TROUT, DEATH, DAILY_OCCUPANCY
+            FROM {table}
+            WHERE {whole_days('THEDATE', first, last)}{census_where}
+            ORDER BY THEDATE, SPECIALITY
+        """
+        return read_sql(census_query, conn, name="beds.census.summary", profile="bulk")
+
+    def fetch(first, last):
+        return routed(conn, "census", first, last, from_summary, from_base)
+
+    census_df = get_day_cache().get_range(conn, "beds.census", tuple(census_conditions),
+                                          from_date, to_date, fetch, "THEDATE")
+
+    if census_df.empty:
+        return 0.0, 0.0, total_beds, pd.DataFrame()
+
+    total_patient_days = census_df['DAILY_OCCUPANCY'].sum()
+    days_in_period = days_in_range(from_date, to_date)
+    available_bed_days = total_beds * days_in_period
+
+    occupancy_rate = (total_patient_days / available_bed_days * 100) if available_bed_days > 0 else 0.0
+    avg_daily_census = total_patient_days / days_in_period if days_in_period > 0 else 0.0
+
+    return round(occupancy_rate, 2), round(avg_daily_census, 1), total_beds, census_df
+
+
+def daily_occupancy(census_df, total_beds):
+    """Census detail summed per day, with OCCUPANCY_PCT of the total beds"""
+    daily_agg = census_df.groupby('THEDATE').agg({c: 'sum' for c in CENSUS_COLUMNS}).reset_index()
+    daily_agg['OCCUPANCY_PCT'] = (daily_agg['DAILY_OCCUPANCY'] / total_beds * 100).round(2)
+    return daily_agg
+
+
+def get_department_occupancy_breakdown(conn, from_date, to_date):
+    """Bed occupancy per department (raises on query failure)"""
+    dept_query = """
+            SELECT DISTINCT SPECIALITY
+            FROM BEDMASTER
+            WHERE STATUS = 'A' AND SPECIALITY IS NOT NULL
+            ORDER BY SPECIALITY
+        """
+    dept_df = read_sql(dept_query, conn, name="beds.by_department", profile="lookup")
+
+    results = []
+    for dept in dept_df['SPECIALITY']:
+        rate, avg_census, beds, _ = calculate_bed_occupancy(conn, from_date, to_date, dept_name=dept)
+        results.append({
+            'DEPARTMENT': dept,
+            'TOTAL_BEDS': beds,
+            'AVG_CENSUS': avg_census,
+            'OCCUPANCY_RATE': rate
+        })
+    return pd.DataFrame(results)
+
+
+def get_location_occupancy_breakdown(conn, from_date, to_date, dept_name=None):
+    """Bed occupancy per location (ward/ICU level); raises on query failure"""
+    loc_query = """
+            SELECT
+                SPECIALITY AS DEPARTMENT,
+                LOCATION,
+                BEDSTRENGTH
+            FROM BEDMASTER
+            WHERE STATUS = 'A'
+        """
+    if dept_name and not is_all(dept_name):
+        loc_query += f" AND SPECIALITY = '{safe_sql(dept_name)}'"
+    loc_query += " ORDER BY SPECIALITY, LOCATION"
+
+    loc_df = read_sql(loc_query, conn, name="beds.by_location", profile="lookup")
+
+    results = []
+    for _, row in loc_df.iterrows():
+        rate, avg_census, beds, _ = calculate_bed_occupancy(
+            conn, from_date, to_date,
+            dept_name=row['DEPARTMENT'],
+            location_filter=row['LOCATION']
+        )
+        results.append({
+            'DEPARTMENT': row['DEPARTMENT'],
+            'LOCATION': row['LOCATION'],
+            'TOTAL_BEDS': row['BEDSTRENGTH'],
+            'AVG_CENSUS': avg_census,
+            'OCCUPANCY_RATE': rate
+        })
+    return pd.DataFrame(results)
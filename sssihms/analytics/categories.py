@@ -0,0 +1,297 @@
+"""
+Operational-efficiency category hierarchy from STATS_DETAILS:
+CATEGORY (level 1) -> SUBCATG (level 2) -> SUBCATGL2 (level 3), plus the
+per-category PDF report built from levels 2 and 3
+
+Each level is one GROUP BY THEDATE query cached per day (sssihms.daycache);
+range totals are summed from the daily rows, and MAX_ENTRY is the largest
+daily maximum.
+"""
+import io
+import time
+from datetime import datetime
+
+import pandas as pd
+from reportlab.lib.pagesizes import A4
+from reportlab.lib import colors
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.enums import TA_CENTER, TA_RIGHT
+
+from sssihms.db import read_sql
+from sssihms.daycache import get_day_cache
+from sssihms.summaries import routed
+from sssihms.analytics.filters import (
+    safe_sql, is_all, is_all_hospitals, department_code, days_in_range, whole_days,
+)
+
+PREFETCH_TOP = 3   # categories whose drill-downs are warmed after Level 1 renders
+
+
+def _conditions(conn, hospital, ordering_dept, level):
+    """Hospital and ordering-department conditions on STATS_DETAILS SD"""
+    sd_hosp_cond = "1=1" if is_all_hospitals(hospital) else f"SD.HOSPITALID = '{safe_sql(hospital)}'"
+
+    sd_ordering_cond = "1=1"
+    if not is_all(ordering_dept):
+        # ORDERING_DEPT holds either the department name or its code
+        try:
+            deptcode_val = department_code(conn, ordering_dept, name=f"{level}.mapping")
+        except Exception:
+            deptcode_val = None
+        if deptcode_val is not None:
+            sd_ordering_cond = f"(SD.ORDERING_DEPT = '{safe_sql(ordering_dept)}' OR SD.ORDERING_DEPT = '{safe_sql(deptcode_val)}')"
+        else:
+            sd_ordering_cond = f"SD.ORDERING_DEPT = '{safe_sql(ordering_dept)}'"
+    return sd_hosp_cond, sd_ordering_cond
+
+
+def _daily_totals(conn, name, group_col, conditions, from_date, to_date, with_max=True):
+    """
+    Per-day SUM (and MAX) of THEVALUE by `group_col` under `conditions`,
+    assembled from the day-partition cache; days the STATS_DETAILS summary
+    covers are read from it
+    """
+    where = " AND ".join(conditions)
+
+    def from_base(first, last):
+        max_col = ", MAX(NVL(THEVALUE,0)) AS MAX_ENTRY" if with_max else ""
+        q = (
+            f"SELECT THEDATE, {group_col}, SUM(NVL(THEVALUE,0)) AS TOTAL_CNT{max_col} "
+            "FROM STATS_DETAILS SD "
+            f"WHERE {whole_days('THEDATE', first, last)} AND {where} "
+            f"AND {group_col} IS NOT NULL "
+            f"GROUP BY THEDATE, {group_col}"
+        )
+        return read_sql(q, conn, name=name, profile="bulk")
+
+    def from_summary(table, first, last):
+        max_col = ", MAX(MAX_ENTRY) AS MAX_ENTRY" if with_max else ""
+        q = (
+            f"SELECT THEDATE, {group_col}, SUM(TOTAL_CNT) AS TOTAL_CNT{max_col} "
+            f"FROM {table} SD "
+            f"WHERE {whole_days('THEDATE', first, last)} AND {where} "
+            f"AND {group_col} IS NOT NULL "
+            f"GROUP BY THEDATE, {group_col}"
+        )
+        return read_sql(q, conn, name=f"{name}.summary", profile="bulk")
+
+    def fetch(first, last):
+        return routed(conn, "stats", first, last, from_summary, from_base)
+
+    return get_day_cache().get_range(conn, name, tuple(conditions), from_date, to_date, fetch, "THEDATE")
+
+
+def _range_totals(daily, group_col, with_max=True):
+    """Collapse per-day totals into one row per `group_col` over the range"""
+    aggs = {"TOTAL_CNT": "sum"}
+    if with_max:
+        aggs["MAX_ENTRY"] = "max"
+    return daily.groupby(group_col, as_index=False).agg(aggs)
+
+
+def get_category_metrics(conn, from_date, to_date, category_filter, ordering_dept, hospital=None):
+    """
+    Level 1: Get metrics for each CATEGORY.
+    Returns list of dicts with CATEGORY, TOTAL, AVG_PER_DAY, MAX_ENTRY
+    """
+    sd_hosp_cond, sd_ordering_cond = _conditions(conn, hospital, ordering_dept, "category")
+
+    try:
+        daily = _daily_totals(conn, "category.metrics", "CATEGORY",
+                              [sd_hosp_cond, sd_ordering_cond], from_date, to_date)
+    except Exception:
+        return []
+    if not is_all(category_filter):
+        daily = daily[daily["CATEGORY"] == category_filter]
+    if daily.empty:
+        return []
+
+    totals = _range_totals(daily, "CATEGORY").sort_values("CATEGORY")
+    days_range = days_in_range(from_date, to_date)
+    metrics = []
+    for row in totals.itertuples(index=False):
+        total_cnt = int(row.TOTAL_CNT)
+        metrics.append({
+            "CATEGORY": row.CATEGORY,
+            "TOTAL": total_cnt,
+            "AVG_PER_DAY": (total_cnt / days_range) if days_range > 0 else 0.0,
+            "MAX_ENTRY": int(row.MAX_ENTRY)
+        })
+
+    return metrics
+
+
+def get_subcatg_metrics(conn, category, from_date, to_date, ordering_dept, hospital=None):
+    """
+    Level 2: Get SUBCATG breakdown for a specific CATEGORY.
+    Returns list of dicts with SUBCATG, TOTAL, AVG_PER_DAY, MAX_ENTRY
+    """
+    sd_hosp_cond, sd_ordering_cond = _conditions(conn, hospital, ordering_dept, "subcatg")
+
+    try:
+        daily = _daily_totals(conn, "subcatg.metrics", "SUBCATG",
+                              [f"SD.CATEGORY = '{safe_sql(category)}'", sd_hosp_cond, sd_ordering_cond],
+                              from_date, to_date)
+        if daily.empty:
+            return []
+        totals = _range_totals(daily, "SUBCATG").sort_values("TOTAL_CNT", ascending=False)
+
+        days_range = days_in_range(from_date, to_date)
+        metrics = []
+        for row in totals.itertuples(index=False):
+            total = int(row.TOTAL_CNT)
+            metrics.append({
+                "SUBCATG": row.SUBCATG,
+                "TOTAL": total,
+                "AVG_PER_DAY": (total / days_range) if days_range > 0 else 0.0,
+                "MAX_ENTRY": int(row.MAX_ENTRY)
+            })
+        return metrics
+    except Exception:
+        return []
+
+
+def get_subcatgl2_metrics(conn, category, subcatg, from_date, to_date, ordering_dept, hospital=None):
+    """
+    Level 3: Get SUBCATGL2 breakdown for a specific CATEGORY and SUBCATG.
+    Returns list of dicts with SUBCATGL2, TOTAL, AVG_PER_DAY
+    """
+    sd_hosp_cond, sd_ordering_cond = _conditions(conn, hospital, ordering_dept, "subcatgl2")
+
+    try:
+        daily = _daily_totals(conn, "subcatgl2.metrics", "SUBCATGL2",
+                              [f"SD.CATEGORY = '{safe_sql(category)}'", f"SD.SUBCATG = '{safe_sql(subcatg)}'",
+                               sd_hosp_cond, sd_ordering_cond],
+                              from_date, to_date, with_max=False)
+        if daily.empty:
+            return []
+        totals = _range_totals(daily, "SUBCATGL2", with_max=False).sort_values("TOTAL_CNT", ascending=False)
+
+        days_range = days_in_range(from_date, to_date)
+        metrics = []
+        for row in totals.itertuples(index=False):
+            total = int(row.TOTAL_CNT)
+            metrics.append({
+                "SUBCATGL2": row.SUBCATGL2,
+                "TOTAL": total,
+                "AVG_PER_DAY": (total / days_range) if days_range > 0 else 0.0
+            })
+        return metrics
+    except Exception:
+        return []
+
+
+def prefetch_drilldowns(prefetcher, connect, category_metrics, from_date, to_date, ordering_dept,
+                        hospital=None, top_n=PREFETCH_TOP):
+    """
+    Warm Level 2, and Level 3 of its largest SUBCATG, for the top_n
+    categories by TOTAL in the background (sssihms.prefetch), so the drill-down
+    clicks read the day cache. `connect()` returns a connection of its own
+    for each task, closed when the task ends. Returns the categories queued.
+    """
+    if not get_day_cache().enabled:
+        return []
+    deadline = prefetcher.deadline()
+    top = sorted(category_metrics, key=lambda m: m["TOTAL"], reverse=True)[:top_n]
+
+    def warm(category):
+        conn = connect()
+        try:
+            subcatg_metrics = get_subcatg_metrics(conn, category, from_date, to_date, ordering_dept, hospital)
+            if subcatg_metrics and time.monotonic() < deadline:
+                get_subcatgl2_metrics(conn, category, subcatg_metrics[0]["SUBCATG"], from_date, to_date,
+                                      ordering_dept, hospital)
+        finally:
+            conn.close()
+
+    queued = []
+    for m in top:
+        key = ("category.drilldown", m["CATEGORY"], str(from_date), str(to_date), ordering_dept, hospital)
+        if prefetcher.submit(key, lambda category=m["CATEGORY"]: warm(category), deadline):
+            queued.append(m["CATEGORY"])
+    return queued
+
+
+def subcatgl2_table(subcatgl2_metrics):
+    """Level 3 metrics as a ranked frame (Rank, SUBCATGL2, TOTAL, AVG_PER_DAY)"""
+    df = pd.DataFrame(subcatgl2_metrics)
+    df['AVG_PER_DAY'] = df['AVG_PER_DAY'].round(2)
+    df = df.sort_values('TOTAL', ascending=False).reset_index(drop=True)
+    df.insert(0, 'Rank', range(1, len(df) + 1))
+    return df
+
+
+def build_category_pdf(conn, category, from_date, to_date, ordering_dept, hospital=None):
+    """Generate multi-page PDF: one section per SUBCATG with full SUBCATGL2 table"""
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, leftMargin=0.6*inch, rightMargin=0.6*inch,
+                            topMargin=0.8*inch, bottomMargin=0.8*inch)
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle(name='Center', alignment=TA_CENTER, fontSize=16, leading=18, spaceAfter=12))
+    styles.add(ParagraphStyle(name='SubHeader', fontSize=12, leading=14, spaceBefore=10, spaceAfter=6))
+    styles.add(ParagraphStyle(name='Right', alignment=TA_RIGHT, fontSize=10))
+
+    elements = []
+
+    # Title
+    title = Paragraph(f"<b>Operational Efficiency Report – CATEGORY: {category}</b>", styles['Center'])
+    subtitle = Paragraph(f"<b>Date Range:</b> {from_date} to {to_date} | <b>Generated:</b> {datetime.now().strftime('%Y-%m-%d %H:%M')}", styles['Normal'])
+    elements.extend([title, subtitle, Spacer(1, 0.3*inch)])
+
+    # Get SUBCATG list
+    subcatg_metrics = get_subcatg_metrics(conn, category, from_date, to_date, ordering_dept, hospital)
+    if not subcatg_metrics:
+        elements.append(Paragraph("No data available for this category.", styles['Normal']))
+    else:
+        for idx, sub in enumerate(subcatg_metrics):
+            subcatg_name = sub['SUBCATG']
+
+            # SUBCATG Header
+            elements.append(Paragraph(f"<b>SUBCATG:</b> {subcatg_name}", styles['SubHeader']))
+            elements.append(Paragraph(f"Total: <b>{sub['TOTAL']:,}</b> | Avg/Day: <b>{sub['AVG_PER_DAY']:.2f}</b>", styles['Normal']))
+            elements.append(Spacer(1, 0.15*inch))
+
+            # SUBCATGL2 Table
+            subcatgl2 = get_subcatgl2_metrics(conn, category, subcatg_name, from_date, to_date, ordering_dept, hospital)
+            if not subcatgl2:
+                elements.append(Paragraph("<i>No SUBCATGL2 details available.</i>", styles['Normal']))
+            else:
+                df_sub = subcatgl2_table(subcatgl2)
+
+                data = [['Rank', 'SUBCATGL2', 'Total', 'Avg/Day']]
+                for _, row in df_sub.iterrows():
+                    data.append([
+                        str(row['Rank']),
+                        str(row['SUBCATGL2']),
+                        f"{row['TOTAL']:,}",
+                        f"{row['AVG_PER_DAY']:.2f}"
+                    ])
+
+                table = Table(data, colWidths=[0.6*inch, 2.8*inch, 1.0*inch, 1.0*inch])
+                table.setStyle(TableStyle([
+                    ('BACKGROUND', (0,0), (-1,0), colors.HexColor('#0ea77c')),
+                    ('TEXTCOLOR', (0,0), (-1,0), colors.white),
+                    ('ALIGN', (0,0), (-1,-1), 'CENTER'),
+                    ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+                    ('GRID', (0,0), (-1,-1), 0.5, colors.lightgrey),
+                    ('FONTSIZE', (0,0), (-1,-1), 9),
+                ]))
+                elements.append(table)
+
+            # Page break (except last)
+            if idx < len(subcatg_metrics) - 1:
+                elements.append(PageBreak())
+
+    # Footer: Page Numbers
+    def add_page_number(canvas, doc):
+        canvas.saveState()
+        page_num = Paragraph(f"Page {doc.page}", styles['Right'])
+        page_num.wrap(doc.width, doc.bottomMargin)
+        page_num.drawOn(canvas, doc.leftMargin, 0.4*inch)
+        canvas.restoreState()
+
+    doc.build(elements, onFirstPage=add_page_number, onLaterPages=add_page_number)
+    buffer.seek(0)
+    return buffer.getvalue()
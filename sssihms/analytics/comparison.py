@@ -0,0 +1,179 @@
+"""
+Hospital comparison: the headline figures of several hospitals side by side
+
+Each metric family is one query grouped by HOSPITALID, so comparing N
+hospitals costs the same as loading one instead of N dashboard reloads.
+`hospitals` restricts the comparison to some HOSPITALIDs (None: all of them).
+"""
+import pandas as pd
+
+from sssihms.db import read_sql
+from sssihms.summaries import routed
+from sssihms.analytics.filters import (
+    ALL, safe_sql, is_all, build_hospital_where, whole_days, days_in_range,
+)
+from sssihms.analytics.patients import (
+    READMISSION_TYPES, MORBIDITY_DAYS, _inpatient_dept_filter,
+)
+
+KPI_COLUMNS = ["HOSPITALID", "INPATIENTS", "OUTPATIENTS", "ALOS", "DEATHS", "MORTALITY_RATE",
+               "READMISSIONS", "READMISSION_RATE", "MORBIDITY_COUNT", "MORBIDITY_RATE"]
+OCCUPANCY_COLUMNS = ["HOSPITALID", "TOTAL_BEDS", "AVG_CENSUS", "OCCUPANCY_RATE"]
+SURGERY_COLUMNS = ["HOSPITALID", "SURGERIES", "DAILY_AVG", "TOP_TYPE"]
+
+
+def _rate(part, whole):
+    return (part / whole * 100).where(whole > 0, 0.0)
+
+
+def compare_patient_kpis(conn, from_date, to_date, dept_name=ALL, hospitals=None):
+    """General KPIs per hospital (the figures of inpatient_kpis plus visit counts)"""
+    in_dept = _inpatient_dept_filter(conn, dept_name, "comparison.dept_code")
+    out_dept = "1=1" if is_all(dept_name) else f"O.DEPTNAME = '{safe_sql(dept_name)}'"
+    readmission_types = ", ".join(f"'{t}'" for t in READMISSION_TYPES)
+    q = f"""
+        SELECT HOSPITALID,
+               SUM(IS_IP) AS INPATIENTS, SUM(IS_OP) AS OUTPATIENTS, SUM(DAYSCARED) AS CARED_DAYS,
+               SUM(DIED) AS DEATHS, SUM(READMIT) AS READMISSIONS, SUM(MORBID) AS MORBIDITY_COUNT
+        FROM (
+            SELECT I.HOSPITALID, 1 AS IS_IP, 0 AS IS_OP, NVL(I.DAYSCARED, 0) AS DAYSCARED,
+                   CASE WHEN {whole_days('P.DEATHDATE', from_date, to_date)} THEN 1 ELSE 0 END AS DIED,
+                   CASE WHEN I.ADMISSIONTYPE IN ({readmission_types}) THEN 1 ELSE 0 END AS READMIT,
+                   CASE WHEN NVL(I.DAYSCARED, 0) > {MORBIDITY_DAYS} THEN 1 ELSE 0 END AS MORBID
+            FROM INPATIENT I
+            JOIN PATIENT P ON I.MRN = P.MRN
+            WHERE {whole_days('I.DOA', from_date, to_date)}
+              AND {in_dept} AND {build_hospital_where(hospitals, ['I'])}
+            UNION ALL
+            SELECT O.HOSPITALID, 0, 1, 0, 0, 0, 0
+            FROM OUTPATIENT O
+            WHERE {whole_days('O.DOV', from_date, to_date)}
+              AND {out_dept} AND {build_hospital_where(hospitals, ['O'])}
+        ) T
+        GROUP BY HOSPITALID
+        ORDER BY HOSPITALID
+    """
+    df = read_sql(q, conn, name="comparison.kpis", profile="lookup")
+    if df.empty:
+        return pd.DataFrame(columns=KPI_COLUMNS)
+    inpatients = df["INPATIENTS"].astype(float)
+    df["ALOS"] = (df["CARED_DAYS"] / inpatients).where(inpatients > 0, 0.0)
+    df["MORTALITY_RATE"] = _rate(df["DEATHS"], inpatients)
+    df["READMISSION_RATE"] = _rate(df["READMISSIONS"], inpatients)
+    df["MORBIDITY_RATE"] = _rate(df["MORBIDITY_COUNT"], inpatients)
+    return df[KPI_COLUMNS]
+
+
+def compare_occupancy(conn, from_date, to_date, hospitals=None):
+    """
+    Bed occupancy per hospital: active bed strength from BEDMASTER, census
+    of each active ward attributed to one hospital, the one with the most
+    active beds at that LOCATION (so a ward listed twice is counted once)
+    """
+    q = f"""
+        SELECT B.HOSPITALID, B.TOTAL_BEDS, NVL(C.PATIENT_DAYS, 0) AS PATIENT_DAYS
+        FROM (
+            SELECT BM.HOSPITALID, SUM(NVL(BM.BEDSTRENGTH, 0)) AS TOTAL_BEDS
+            FROM BEDMASTER BM
+            WHERE BM.STATUS = 'A' AND {build_hospital_where(hospitals, ['BM'])}
+            GROUP BY BM.HOSPITALID
+        ) B
+        LEFT JOIN (
+            SELECT W.HOSPITALID,
+                   SUM(NVL(CD.OPBAL, 0) + NVL(CD.ADMIT, 0) - NVL(CD.DISCH, 0) + NVL(CD.TRIN, 0)
+                       - NVL(CD.TROUT, 0) - NVL(CD.DEATH, 0)) AS PATIENT_DAYS
+            FROM CENSUSDATA CD
+            JOIN (
+                SELECT LOCATION, HOSPITALID FROM (
+                    SELECT LOCATION, HOSPITALID,
+                           ROW_NUMBER() OVER (PARTITION BY LOCATION
+                                              ORDER BY SUM(NVL(BEDSTRENGTH, 0)) DESC, HOSPITALID) AS RN
+                    FROM BEDMASTER
+                    WHERE STATUS = 'A'
+                    GROUP BY LOCATION, HOSPITALID
+                ) WHERE RN = 1
+            ) W ON CD.SPECIALITY = W.LOCATION
+            WHERE {whole_days('CD.THEDATE', from_date, to_date)}
+            GROUP BY W.HOSPITALID
+        ) C ON C.HOSPITALID = B.HOSPITALID
+        ORDER BY B.HOSPITALID
+    """
+    df = read_sql(q, conn, name="comparison.occupancy", profile="lookup")
+    if df.empty:
+        return pd.DataFrame(columns=OCCUPANCY_COLUMNS)
+    days = days_in_range(from_date, to_date)
+    bed_days = df["TOTAL_BEDS"].astype(float) * days
+    df["OCCUPANCY_RATE"] = _rate(df["PATIENT_DAYS"], bed_days).round(2)
+    df["AVG_CENSUS"] = (df["PATIENT_DAYS"] / days).round(1) if days > 0 else 0.0
+    return df[OCCUPANCY_COLUMNS]
+
+
+def compare_surgery_volumes(conn, from_date, to_date, hospitals=None):
+    """Surgeries, daily average and most frequent SURGERYTYPE per hospital"""
+    hosp_where = build_hospital_where(hospitals, ["S"])
+
+    def from_base(first, last):
+        q = (
+            "SELECT S.HOSPITALID, NVL(S.SURGERYTYPE,'UNKNOWN') AS SURGERYTYPE, COUNT(*) AS CNT "
+            f"FROM SURGERY S WHERE {whole_days('S.SURGERYDATE', first, last)} AND {hosp_where} "
+            "GROUP BY S.HOSPITALID, NVL(S.SURGERYTYPE,'UNKNOWN')"
+        )
+        return read_sql(q, conn, name="comparison.surgery", profile="lookup")
+
+    def from_summary(table, first, last):
+        q = (
+            "SELECT S.HOSPITALID, S.SURGERYTYPE, SUM(S.CNT) AS CNT "
+            f"FROM {table} S WHERE {whole_days('S.THEDATE', first, last)} AND {hosp_where} "
+            "GROUP BY S.HOSPITALID, S.SURGERYTYPE"
+        )
+        return read_sql(q, conn, name="comparison.surgery.summary", profile="lookup")
+
+    counts = routed(conn, "surgery", from_date, to_date, from_summary, from_base)
+    if counts.empty:
+        return pd.DataFrame(columns=SURGERY_COLUMNS)
+    by_type = counts.groupby(["HOSPITALID", "SURGERYTYPE"], as_index=False)["CNT"].sum()
+    top = by_type.sort_values(["HOSPITALID", "CNT"], ascending=[True, False]).drop_duplicates("HOSPITALID")
+    df = by_type.groupby("HOSPITALID", as_index=False)["CNT"].sum().rename(columns={"CNT": "SURGERIES"})
+    df = df.merge(top[["HOSPITALID", "SURGERYTYPE"]].rename(columns={"SURGERYTYPE": "TOP_TYPE"}), on="HOSPITALID")
+    days = days_in_range(from_date, to_date)
+    df["DAILY_AVG"] = df["SURGERIES"] / days if days > 0 else 0.0
+    return df[SURGERY_COLUMNS]
+
+
+def compare_category_totals(conn, from_date, to_date, hospitals=None):
+    """STATS_DETAILS total per hospital and CATEGORY (long format)"""
+    hosp_where = build_hospital_where(hospitals, ["SD"])
+
+    def from_base(first, last):
+        q = (
+            "SELECT SD.HOSPITALID, SD.CATEGORY, SUM(NVL(SD.THEVALUE,0)) AS TOTAL "
+            f"FROM STATS_DETAILS SD WHERE {whole_days('SD.THEDATE', first, last)} "
+            f"AND SD.CATEGORY IS NOT NULL AND {hosp_where} "
+            "GROUP BY SD.HOSPITALID, SD.CATEGORY"
+        )
+        return read_sql(q, conn, name="comparison.categories", profile="lookup")
+
+    def from_summary(table, first, last):
+        q = (
+            "SELECT SD.HOSPITALID, SD.CATEGORY, SUM(SD.TOTAL_CNT) AS TOTAL "
+            f"FROM {table} SD WHERE {whole_days('SD.THEDATE', first, last)} "
+            f"AND SD.CATEGORY IS NOT NULL AND {hosp_where} "
+            "GROUP BY SD.HOSPITALID, SD.CATEGORY"
+        )
+        return read_sql(q, conn, name="comparison.categories.summary", profile="lookup")
+
+    totals = routed(conn, "stats", from_date, to_date, from_summary, from_base)
+    if totals.empty:
+        return pd.DataFrame(columns=["HOSPITALID", "CATEGORY", "TOTAL"])
+    return (totals.groupby(["HOSPITALID", "CATEGORY"], as_index=False)["TOTAL"].sum()
+            .sort_values(["CATEGORY", "HOSPITALID"], ignore_index=True))
+
+
+def hospital_comparison(conn, from_date, to_date, dept_name=ALL, hospitals=None):
+    """All four families: {"kpis", "occupancy", "surgery", "categories"} -> frame (raises on failure)"""
+    return {
+        "kpis": compare_patient_kpis(conn, from_date, to_date, dept_name, hospitals),
+        "occupancy": compare_occupancy(conn, from_date, to_date, hospitals),
+        "surgery": compare_surgery_volumes(conn, from_date, to_date, hospitals),
+        "categories": compare_category_totals(conn, from_date, to_date, hospitals),
+    }
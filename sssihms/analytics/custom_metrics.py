@@ -0,0 +1,181 @@
+"""
+Custom metrics: parse, store and run user-defined metric queries
+
+Definitions live in the metric store (sssihms.metric_store); queries are
+compiled to bind variables by sssihms.metric_registry and run through
+sssihms.db.read_sql under the name custom_metric.<metric_id>.
+"""
+import json
+from datetime import datetime
+from pathlib import Path
+
+from sssihms.cancellation import QueryInterrupted
+from sssihms.db import read_sql
+from sssihms.metric_registry import get_registry, compile_query, validate_query
+from sssihms.metric_store import check_import, get_store
+
+
+class CustomMetricsManager:
+    def __init__(self, config_dir="custom_metrics"):
+        """Initialize the custom metrics manager"""
+        self.config_dir = Path(config_dir)
+        self.config_dir.mkdir(exist_ok=True)
+        self.metrics_file = self.config_dir / "saved_metrics.json"
+        self.templates_dir = self.config_dir / "templates"
+        self.templates_dir.mkdir(exist_ok=True)
+        # SQLite store is the source of truth; saved_metrics.json is import/export only
+        self.store = get_store(self.config_dir / "metrics.db", seed_json=self.metrics_file)
+        self.registry = get_registry(self.store)
+
+    def parse_metric_file(self, file_content):
+        """Parse a metric definition file"""
+        lines = file_content.strip().split('\n')
+        metric_def = {
+            'name': '',
+            'icon': '📊',
+            'color': 'kpi-grad-1',
+            'description': '',
+            'query': '',
+            'type': 'single_value',  # NEW: default type
+            'tags': [],
+            'created_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+        query_started = False
+        query_lines = []
+
+        for line in lines:
+            line = line.strip()
+
+            if query_started:
+                query_lines.append(line)
+            elif line.startswith('METRIC_NAME:'):
+                metric_def['name'] = line.split('METRIC_NAME:', 1)[1].strip()
+            elif line.startswith('METRIC_ICON:'):
+                metric_def['icon'] = line.split('METRIC_ICON:', 1)[1].strip()
+            elif line.startswith('METRIC_COLOR:'):
+                metric_def['color'] = line.split('METRIC_COLOR:', 1)[1].strip()
+            elif line.startswith('METRIC_TYPE:'):  # NEW: optional type specification
+                metric_def['type'] = line.split('METRIC_TYPE:', 1)[1].strip().lower()
+            elif line.startswith('TAGS:'):
+                metric_def['tags'] = [t.strip() for t in line.split('TAGS:', 1)[1].split(',') if t.strip()]
+            elif line.startswith('DESCRIPTION:'):
+                metric_def['description'] = line.split('DESCRIPTION:', 1)[1].strip()
+            elif line.startswith('QUERY:'):
+                query_started = True
+
+        metric_def['query'] = '\n'.join(query_lines).strip()
+
+        if not metric_def['name']:
+            raise ValueError("METRIC_NAME is required")
+        if not metric_def['query']:
+            raise ValueError("QUERY is required")
+        validate_query(metric_def['query'])
+
+        return metric_def
+
+    def save_metric(self, metric_def, owner=None, expected_version=None, create=False):
+        """
+        Save (upsert) one metric definition; returns its metric_id.
+        create=True (a new metric) raises MetricConflictError when a metric of
+        that name already exists; edits pass the expected_version they loaded.
+        """
+        validate_query(metric_def['query'])
+        metric_id, _ = self.store.upsert(metric_def, owner=owner, expected_version=expected_version,
+                                         create=create)
+        return metric_id
+
+    def load_saved_metrics(self, tag=None, owner=None):
+        """Load saved metrics (cached by the registry until the store changes)"""
+        if tag or owner:
+            return self.store.list(tag=tag, owner=owner)
+        return self.registry.definitions()
+
+    def metric_errors(self):
+        """Return {metric_id: message} for saved metrics with unknown placeholders"""
+        return self.registry.errors()
+
+    def delete_metric(self, metric_id, deleted_by=None, expected_version=None):
+        """Delete a saved metric"""
+        return self.store.delete(metric_id, deleted_by=deleted_by, expected_version=expected_version)
+
+    def export_json(self):
+        """All metric definitions in saved_metrics.json format (bytes)"""
+        return json.dumps(self.store.export_dict(), indent=2).encode('utf-8')
+
+    def import_json(self, file_content, owner=None):
+        """Import a saved_metrics.json export; returns number of metrics imported"""
+        metrics = json.loads(file_content)
+        check_import(metrics)
+        for metric_def in metrics.values():
+            validate_query(metric_def.get('query', ''))
+        return self.store.import_json(metrics, owner=owner)
+
+    def execute_metric_query(self, query, conn, from_date=None, to_date=None,
+                            selected_hospital=None, selected_dept=None, metric_id=None):
+        """
+        Execute a metric query with bind variables.
+        Placeholders are compiled once per query text, so the SQL sent to
+        Oracle is identical across filter changes and hits the statement cache.
+        Supports both single values and tables.
+        """
+        compiled = compile_query(query)
+        if compiled.unknown:
+            raise ValueError(compiled.error)
+        binds = compiled.bind_values(from_date, to_date, selected_hospital, selected_dept)
+
+        try:
+            result = read_sql(compiled.sql, conn, params=binds or None, name=f"custom_metric.{metric_id or 'adhoc'}")
+
+            # FIXED: Check if this is a table result (multiple rows or columns)
+            if len(result) > 1 or len(result.columns) > 1:
+                return result  # Return DataFrame for tables
+
+            # Single value result
+            if 'VALUE' in result.columns:
+                return result['VALUE'].iloc[0]
+            else:
+                return result.iloc[0, 0]
+        except QueryInterrupted:
+            raise   # cancelled or timed out: the page handles these itself
+        except Exception as e:
+            raise Exception(f"Query execution failed: {str(e)}")
+
+    def create_sample_template(self):
+        """FIXED: Create a sample metric template file with both types"""
+        sample = """METRIC_NAME: Total Active Patients
+                    METRIC_ICON: 👥
+                    METRIC_COLOR: kpi-grad-1
+                    METRIC_TYPE: single_value
+                    TAGS: patients, census
+                    DESCRIPTION: Count of all active patients in the system
+                    QUERY:
+                        SELECT COUNT(*) as VALUE
+                        FROM PATIENT
+                        WHERE STATUS = 'A'
+                        ---
+
+                    Example for TABLE metric:
+
+                    METRIC_NAME: Top Departments by Patient Count
+                    METRIC_ICON: 🏥
+                    METRIC_COLOR: kpi-grad-2
+                    METRIC_TYPE: table
+                    DESCRIPTION: Shows patient distribution across departments
+                    QUERY:
+                        SELECT
+                            DEPTNAME as Department,
+                            COUNT(*) as Patient_Count,
+                            ROUND(COUNT(*) * 100.0 / SUM(COUNT(*)) OVER (), 2) as Percentage
+                        FROM INPATIENT i
+                        JOIN DEPARTMENT d ON i.DEPTCODE = d.DEPTCODE
+                        WHERE i.DOA BETWEEN TO_DATE('{from_date}', 'YYYY-MM-DD')
+                                        AND TO_DATE('{to_date}', 'YYYY-MM-DD') + 0.99999
+                        GROUP BY DEPTNAME
+                        ORDER BY Patient_Count DESC
+                        FETCH FIRST 10 ROWS ONLY
+                        """
+        template_file = self.templates_dir / "sample_metric.txt"
+        with open(template_file, 'w') as f:
+            f.write(sample)
+        return template_file
@@ -0,0 +1,62 @@
+"""
+Filter helpers shared by the analytics queries
+"""
+from sssihms.db import read_sql
+
+ALL_HOSPITALS = "All Hospitals"
+ALL = "All"
+
+
+def safe_sql(v):
+    if v is None:
+        return ""
+    return str(v).replace("'", "''")
+
+
+def is_all_hospitals(hospital):
+    return hospital in (None, "", ALL_HOSPITALS)
+
+
+def is_all(value):
+    return value in (None, "", ALL)
+
+
+def build_hospital_where(hospital, alias_list):
+    """
+    HOSPITALID condition on any of the aliased tables (bare HOSPITALID when
+    there are no aliases; a bare column next to aliased joins is ambiguous).
+    `hospital` is one HOSPITALID or a list of them; All Hospitals -> 1=1
+    """
+    hospitals = [hospital] if isinstance(hospital, str) or hospital is None else list(hospital)
+    if not hospitals or any(is_all_hospitals(h) for h in hospitals):
+        return "1=1"
+    values = ", ".join(f"'{safe_sql(h)}'" for h in hospitals)
+    cond = f"= {values}" if len(hospitals) == 1 else f"IN ({values})"
+    parts = [f"{a}.HOSPITALID {cond}" for a in alias_list] or [f"HOSPITALID {cond}"]
+    return "(" + " OR ".join(parts) + ")"
+
+
+def hospital_filter(hospital, column):
+    """`column = 'hospital'`, or 1=1 for all hospitals"""
+    if is_all_hospitals(hospital):
+        return "1=1"
+    return f"{column} = '{safe_sql(hospital)}'"
+
+
+def department_code(conn, dept_name, name="department.code"):
+    """DEPTCODE for a department name, or None if there is no such department"""
+    q = f"SELECT DEPTCODE FROM DEPARTMENT WHERE DEPTNAME = '{safe_sql(dept_name)}' AND ROWNUM = 1"
+    df = read_sql(q, conn, name=name, profile="scalar")
+    if df.empty or df['DEPTCODE'].iloc[0] is None:
+        return None
+    return df['DEPTCODE'].iloc[0]
+
+
+def whole_days(column, from_date, to_date):
+    """`column` on any day from from_date to to_date, times of day included"""
+    return (f"{column} BETWEEN TO_DATE('{from_date}', 'YYYY-MM-DD') "
+            f"AND TO_DATE('{to_date}', 'YYYY-MM-DD') + 0.99999")
+
+
+def days_in_range(from_date, to_date):
+    return (to_date - from_date).days + 1
@@ -0,0 +1,71 @@
+"""
+Single-figure KPIs and the optional summary tables (staff ratio, surgery wait
+time, financial, quality)
+"""
+from sssihms.db import read_sql
+from sssihms.analytics.filters import safe_sql
+
+STAFF_RATIO_TABLES = ["STAFF_PATIENT_RATIO", "STAFF_PATIENT"]
+
+
+def read_staff_patient_ratio(conn):
+    """First row of the staff:patient table, or None if neither table exists"""
+    for tab in STAFF_RATIO_TABLES:
+        try:
+            q = f"SELECT * FROM {tab} FETCH FIRST 1 ROWS ONLY"
+            df = read_sql(q, conn, name="staff_ratio.load", profile="scalar")
+            if not df.empty:
+                return df
+        except Exception:
+            continue
+    return None
+
+
+def surgery_wait_time(conn, from_date, to_date, hospital):
+    """
+    Days from admission to surgery, matching each surgery with its closest
+    preceding admission. Returns AVG_WAIT_DAYS/TOTAL_SURGERIES/MIN_WAIT/MAX_WAIT
+    (raises on query failure).
+    """
+    wait_time_q = f"""
+        WITH SurgeryAdmission AS (
+            SELECT
+                s.SURGERYID,
+                s.MRN,
+                s.SURGERYDATE,
+                i.DOA,
+                (s.SURGERYDATE - i.DOA) AS WAIT_DAYS,
+                ROW_NUMBER() OVER (
+                    PARTITION BY s.SURGERYID
+                    ORDER BY ABS(s.SURGERYDATE - i.DOA)
+                ) AS rn
+            FROM SURGERY s
+            JOIN INPATIENT i ON s.MRN = i.MRN
+            WHERE s.SURGERYDATE BETWEEN TO_DATE('{from_date}', 'YYYY-MM-DD')
+                                    AND TO_DATE('{to_date}', 'YYYY-MM-DD')
+              AND i.DOA IS NOT NULL
+              AND s.SURGERYDATE >= i.DOA
+              AND (s.SURGERYDATE - i.DOA) <= 365
+              AND (s.HOSPITALID = '{safe_sql(hospital)}' OR '{hospital}' = 'All Hospitals')
+        )
+        SELECT
+            AVG(WAIT_DAYS) AS AVG_WAIT_DAYS,
+            COUNT(*) AS TOTAL_SURGERIES,
+            MIN(WAIT_DAYS) AS MIN_WAIT,
+            MAX(WAIT_DAYS) AS MAX_WAIT
+        FROM SurgeryAdmission
+        WHERE rn = 1 AND WAIT_DAYS >= 0
+        """
+    return read_sql(wait_time_q, conn, name="wait_time.load", profile="scalar")
+
+
+def load_financial_summary(conn, limit=200):
+    """FINANCIAL_SUMMARY rows (raises if the table is not there)"""
+    return read_sql(f"SELECT * FROM FINANCIAL_SUMMARY FETCH FIRST {limit} ROWS ONLY", conn,
+                    name="financial.load", profile="lookup")
+
+
+def load_quality_metrics(conn, limit=200):
+    """QUALITY_METRICS rows (raises if the table is not there)"""
+    return read_sql(f"SELECT * FROM QUALITY_METRICS FETCH FIRST {limit} ROWS ONLY", conn,
+                    name="quality.load", profile="lookup")
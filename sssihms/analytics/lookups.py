@@ -0,0 +1,78 @@
+"""
+Option lists for the dashboard filters (departments, hospitals, categories,
+surgeons)
+"""
+from sssihms.db import read_sql
+from sssihms.analytics.filters import safe_sql
+
+
+def load_departments(conn):
+    return read_sql("SELECT DISTINCT DEPTNAME, DEPTCODE, HOSPITALID FROM DEPARTMENT ORDER BY DEPTNAME", conn,
+                    name="sidebar.departments", profile="lookup")
+
+
+def load_hospitals(conn):
+    return read_sql("SELECT DISTINCT HOSPITALID FROM DEPARTMENT ORDER BY HOSPITALID", conn,
+                    name="sidebar.hospitals", profile="lookup")
+
+
+def load_categories(conn):
+    category_base_q = "SELECT DISTINCT CATEGORY FROM STATS_DETAILS WHERE CATEGORY IS NOT NULL ORDER BY CATEGORY"
+    return read_sql(category_base_q, conn, name="sidebar.categories", profile="lookup")
+
+
+def load_surgeons(conn, hospital, from_date=None, to_date=None, lifetime=True):
+    """
+    Surgeons with at least one surgery, busiest first: STAFFID, STAFFNAME,
+    TOTAL_SURGERIES. `lifetime=False` counts only surgeries in the date range.
+    """
+    hospital_condition = "1=1"
+    if hospital and hospital not in ("", "All Hospitals"):
+        hospital_condition = f"sp.HOSPITALID = '{safe_sql(hospital)}'"
+
+    if lifetime:
+        surgeon_q = f"""
+    SELECT
+        sp.STAFFID,
+        NVL(sm.STAFFNAME, sp.STAFFID || ' (Name Missing)') AS STAFFNAME,
+        COUNT(*) AS TOTAL_SURGERIES
+    FROM SURGERY_PERSONNEL sp
+    LEFT JOIN STAFFMASTER sm ON sp.STAFFID = sm.STAFFID
+    WHERE sp.STAFFROLE = 'SURGEON'
+      AND {hospital_condition}
+    GROUP BY sp.STAFFID, sm.STAFFNAME
+    HAVING COUNT(*) > 0
+    ORDER BY TOTAL_SURGERIES DESC, STAFFNAME
+    """
+    else:
+        surgeon_q = f"""
+    SELECT
+        sp.STAFFID,
+        NVL(sm.STAFFNAME, sp.STAFFID || ' (Name Missing)') AS STAFFNAME,
+        COUNT(*) AS TOTAL_SURGERIES
+    FROM SURGERY_PERSONNEL sp
+    LEFT JOIN STAFFMASTER sm ON sp.STAFFID = sm.STAFFID
+    JOIN SURGERY s ON sp.SURGERYID = s.SURGERYID
+    WHERE sp.STAFFROLE = 'SURGEON'
+      AND s.SURGERYDATE BETWEEN TO_DATE('{from_date}', 'YYYY-MM-DD')
+                            AND TO_DATE('{to_date}', 'YYYY-MM-DD') + 0.99999
+      AND {hospital_condition}
+    GROUP BY sp.STAFFID, sm.STAFFNAME
+    HAVING COUNT(*) > 0
+    ORDER BY TOTAL_SURGERIES DESC, STAFFNAME
+    """
+    return read_sql(surgeon_q, conn, name="sidebar.surgeons", profile="lookup")
+
+
+def surgeon_surgery_count(conn, surgeon_id, from_date, to_date, hospital):
+    """Surgeries a surgeon performed in the date range"""
+    cnt_q = f"""
+        SELECT COUNT(*) FROM SURGERY s
+        JOIN SURGERY_PERSONNEL sp ON s.SURGERYID = sp.SURGERYID
+        WHERE sp.STAFFROLE = 'SURGEON'
+          AND sp.STAFFID = '{safe_sql(surgeon_id)}'
+          AND s.SURGERYDATE BETWEEN TO_DATE('{from_date}', 'YYYY-MM-DD')
+                                AND TO_DATE('{to_date}', 'YYYY-MM-DD') + 0.99999
+          AND (s.HOSPITALID = '{safe_sql(hospital)}' OR '{hospital}' = 'All Hospitals')
+        """
+    return read_sql(cnt_q, conn, name="sidebar.patient_count", profile="scalar").iloc[0, 0]
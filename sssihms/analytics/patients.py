@@ -0,0 +1,232 @@
+"""
+Inpatient / outpatient loads and the patient statistics built on them
+"""
+from datetime import date, datetime
+
+import pandas as pd
+
+from sssihms.db import read_sql
+from sssihms.daycache import get_day_cache, month_end
+from sssihms.summaries import routed
+from sssihms.analytics.filters import safe_sql, is_all, is_all_hospitals, department_code, whole_days
+
+AGE_BINS = [0, 20, 40, 60, 80, 200]
+AGE_LABELS = ['0-19', '20-39', '40-59', '60-79', '80+']
+READMISSION_TYPES = ["READMISSION", "EMERGENCY READMISSION"]
+MORBIDITY_DAYS = 15
+
+
+def _inpatient_dept_filter(conn, dept_name, name):
+    if is_all(dept_name):
+        return "1=1"
+    # INPATIENT carries DEPTCODE, the filter carries DEPTNAME
+    try:
+        dept_code = department_code(conn, dept_name, name=name)
+    except Exception:
+        return "1=1"
+    if dept_code is None:
+        return "1=1"  # If dept not found, show all
+    return f"I.DEPTCODE = '{safe_sql(dept_code)}'"
+
+
+def load_inpatients(conn, from_date, to_date, dept_name, hospital=None):
+    """Admissions in the date range, by day of DOA (raises on query failure)"""
+    dept_filter = _inpatient_dept_filter(conn, dept_name, "inpatients.dept_code")
+    hosp_filter = "1=1" if is_all_hospitals(hospital) else f"I.HOSPITALID = '{safe_sql(hospital)}'"
+
+    def fetch(first, last):
+        q = (
+            "SELECT I.INPATIENTID, I.MRN, I.DAYSCARED, I.ADMISSIONTYPE, I.DOA, P.DEATHDATE, I.DEPTCODE, I.HOSPITALID "
+            "FROM INPATIENT I "
+            "JOIN PATIENT P ON I.MRN = P.MRN "
+            f"WHERE {dept_filter} AND {hosp_filter} "
+            f"AND {whole_days('I.DOA', first, last)}"
+        )
+        return read_sql(q, conn, name="inpatients.load", profile="bulk")
+
+    return get_day_cache().get_range(conn, "inpatients.load", (dept_filter, hosp_filter),
+                                     from_date, to_date, fetch, "DOA")
+
+
+def load_outpatients(conn, from_date, to_date, dept_name, hospital=None):
+    """Outpatient visits in the date range, by day of DOV (raises on query failure)"""
+    dept_filter = "1=1" if is_all(dept_name) else f"O.DEPTNAME = '{safe_sql(dept_name)}'"
+    hosp_filter = "1=1" if is_all_hospitals(hospital) else f"O.HOSPITALID = '{safe_sql(hospital)}'"
+
+    def fetch(first, last):
+        q = (
+            "SELECT O.OUTPATIENTID, O.MRN, O.DOV, O.DEPTNAME, O.HOSPITALID "
+            "FROM OUTPATIENT O "
+            f"WHERE {dept_filter} AND {hosp_filter} "
+            f"AND {whole_days('O.DOV', first, last)}"
+        )
+        return read_sql(q, conn, name="outpatients.load", profile="bulk")
+
+    return get_day_cache().get_range(conn, "outpatients.load", (dept_filter, hosp_filter),
+                                     from_date, to_date, fetch, "DOV")
+
+
+def inpatient_kpis(in_df, from_date, to_date):
+    """
+    General KPI figures from an inpatient frame: alos, deaths, mortality_rate,
+    readmissions, readmission_rate, morbidity_count, morbidity_rate
+    """
+    total = len(in_df)
+
+    try:
+        alos = float(in_df["DAYSCARED"].fillna(0).astype(float).mean()) if total else 0.0
+    except Exception:
+        alos = 0.0
+
+    try:
+        if not in_df.empty:
+            def died_in_range(d):
+                if pd.isna(d):
+                    return False
+                if isinstance(d, datetime):
+                    d = d.date()
+                return (from_date <= d <= to_date)
+            deaths = in_df["DEATHDATE"].apply(died_in_range).sum()
+        else:
+            deaths = 0
+    except Exception:
+        deaths = 0
+
+    try:
+        readmissions = in_df["ADMISSIONTYPE"].isin(READMISSION_TYPES).sum() if total else 0
+    except Exception:
+        readmissions = 0
+
+    try:
+        morbidity_count = (in_df["DAYSCARED"].fillna(0).astype(float) > MORBIDITY_DAYS).sum() if total else 0
+    except Exception:
+        morbidity_count = 0
+
+    return {
+        "alos": alos,
+        "deaths": deaths,
+        "mortality_rate": (deaths / total * 100) if total else 0.0,
+        "readmissions": readmissions,
+        "readmission_rate": (readmissions / total * 100) if total else 0.0,
+        "morbidity_count": morbidity_count,
+        "morbidity_rate": (morbidity_count / total * 100) if total else 0.0,
+    }
+
+
+def compute_age_distribution(conn):
+    """(average age, AGE_GROUP/CNT frame) over all patients"""
+    try:
+        q = "SELECT TRUNC(MONTHS_BETWEEN(SYSDATE, DOB) / 12) AS AGE FROM PATIENT WHERE DOB IS NOT NULL"
+        df = read_sql(q, conn, name="demographics.age", profile="bulk")
+        if df.empty:
+            return None, pd.DataFrame(columns=['AGE_GROUP', 'CNT'])
+        avg_age = df['AGE'].mean()
+        df['AGE_GROUP'] = pd.cut(df['AGE'], bins=AGE_BINS, labels=AGE_LABELS, right=False)
+        age_dist = df.groupby('AGE_GROUP').size().reset_index(name='CNT')
+        return avg_age, age_dist
+    except Exception:
+        return None, pd.DataFrame(columns=['AGE_GROUP', 'CNT'])
+
+
+def admission_type_breakdown(conn, from_date, to_date, dept_name, hospital=None):
+    dept_filter = _inpatient_dept_filter(conn, dept_name, "admission_type.dept_code")
+    hosp_filter = "1=1" if is_all_hospitals(hospital) else f"I.HOSPITALID = '{safe_sql(hospital)}'"
+
+    q = (
+        "SELECT NVL(ADMISSIONTYPE,'UNKNOWN') AS ADMISSIONTYPE, COUNT(*) AS CNT "
+        "FROM INPATIENT I "
+        f"WHERE {dept_filter} AND {hosp_filter} "
+        f"AND {whole_days('I.DOA', from_date, to_date)} "
+        "GROUP BY NVL(ADMISSIONTYPE,'UNKNOWN') ORDER BY CNT DESC"
+    )
+    try:
+        return read_sql(q, conn, name="admission_type.load", profile="lookup")
+    except Exception:
+        return pd.DataFrame(columns=['ADMISSIONTYPE', 'CNT'])
+
+
+def _month_bounds(year_col, month_col, first, last):
+    """
+    WHERE clause for the months whose first day falls in first..last (the
+    month-grain fetch contract), or None when there is no such month
+    """
+    lo = (first.year, first.month) if first.day == 1 else \
+        ((first.year, first.month + 1) if first.month < 12 else (first.year + 1, 1))
+    hi = (last.year, last.month)
+    if lo > hi:
+        return None
+    return (f"{year_col} BETWEEN {lo[0]} AND {hi[0]} "
+            f"AND ({year_col} > {lo[0]} OR {month_col} >= {lo[1]}) "
+            f"AND ({year_col} < {hi[0]} OR {month_col} <= {hi[1]})")
+
+
+def _monthly_states(conn, name, year_col, month_col, conditions, from_date, to_date):
+    """
+    STATESTATS counts per month and STATE, cached per month (closed months
+    are kept for good) and read from the monthly summary where it has them:
+    YEAR_COL, MONTH_COL, STATE, CNT, MONTHSTART
+    """
+    columns = [year_col, month_col, "STATE", "CNT", "MONTHSTART"]
+
+    def query(table, query_name, first, last):
+        months = _month_bounds(year_col, month_col, first, last)
+        if months is None:
+            return pd.DataFrame(columns=columns)
+        q = (
+            f"SELECT {year_col}, {month_col}, STATE, SUM(CNT) AS CNT FROM {table} "
+            f"WHERE {' AND '.join(conditions + [months])} "
+            f"GROUP BY {year_col}, {month_col}, STATE ORDER BY {year_col}, {month_col}, STATE"
+        )
+        df = read_sql(q, conn, name=query_name, profile="bulk")
+        df["MONTHSTART"] = pd.to_datetime(
+            df[year_col].astype(int).astype(str) + "-" + df[month_col].astype(int).astype(str) + "-01"
+        ) if not df.empty else pd.Series(dtype="datetime64[ns]")
+        return df
+
+    def fetch(first, last):
+        return routed(conn, "states", first, last,
+                      lambda table, a, b: query(table, f"{name}.summary", a, b),
+                      lambda a, b: query("STATESTATS", name, a, b))
+
+    return get_day_cache().get_range(conn, name, tuple(conditions), from_date, to_date, fetch,
+                                     "MONTHSTART", grain="month")
+
+
+def state_stats_aggregate(conn, from_date, to_date, hospital=None, use_year_month=False, sel_year=None, sel_month=None):
+    """Patients per STATE for one year/month, or for the months inside a date range"""
+    conditions = []
+    if not is_all_hospitals(hospital):
+        conditions.append(f"HOSPITALID = '{safe_sql(hospital)}'")
+    if use_year_month:
+        from_date = date(int(sel_year), int(sel_month), 1)
+        to_date = month_end(from_date)
+
+    try:
+        ss_df = _monthly_states(conn, "state_stats.load", "THEYR", "THEMNTH", conditions, from_date, to_date)
+        if ss_df.empty:
+            return pd.DataFrame(columns=['STATE', 'CNT'])
+        return ss_df.groupby('STATE', as_index=False)['CNT'].sum().sort_values('CNT', ascending=False)
+    except Exception:
+        return pd.DataFrame(columns=['STATE', 'CNT'])
+
+
+def state_trend(conn, start_ym, end_ym, hospital=None, dept_code=None):
+    """
+    STATE/CNT/YR/MNTH per month between two YYYYMM values, for the
+    State-wise Metrics section (its own hospital and DEPTCODE selectors)
+    """
+    conditions = []
+    if not is_all_hospitals(hospital):
+        conditions.append(f"HOSPITALID = '{safe_sql(hospital)}'")
+    if not is_all(dept_code):
+        conditions.append(f"DEPTCODE = '{safe_sql(dept_code)}'")
+    if start_ym > end_ym:
+        return pd.DataFrame(columns=["STATE", "CNT", "YR", "MNTH"])
+
+    try:
+        df = _monthly_states(conn, "surgery.stats", "YR", "MNTH", conditions,
+                             date(start_ym // 100, start_ym % 100, 1),
+                             month_end(date(end_ym // 100, end_ym % 100, 1)))
+        return df[["STATE", "CNT", "YR", "MNTH"]]
+    except Exception:
+        return pd.DataFrame(columns=["STATE", "CNT", "YR", "MNTH"])
@@ -0,0 +1,96 @@
+"""
+Patient reports (NOTESDATA): MRN search, report fetch and ZIP packaging
+"""
+import io
+import zipfile
+from datetime import datetime
+
+import pandas as pd
+
+from sssihms.db import read_sql
+from sssihms.analytics.filters import safe_sql
+
+REPORT_COLUMNS = ['ACCESSION_NUM', 'NOTENAME', 'VISITTYPE', 'VISITDATE', 'DONEBY', 'DEPTNAME', 'NOTEDATA']
+HTML_WRAPPER_START = '<div style="background-color:white; padding:15px; color:black;">'
+HTML_WRAPPER_END = "</div>"
+
+
+def search_mrns(conn, prefix: str, limit: int = 100):
+    """Return up to `limit` MRNs from NOTESDATA that match the prefix (case-insensitive)."""
+    if prefix is None:
+        return []
+    safe_prefix = safe_sql(prefix.strip())
+    if safe_prefix == "":
+        return []
+    like_val = f"%{safe_prefix}%"
+    q = f"SELECT DISTINCT MRN FROM NOTESDATA WHERE MRN LIKE '{like_val}' AND ROWNUM <= {limit} ORDER BY MRN"
+    try:
+        df = read_sql(q, conn, name="reports.search_mrns", profile="lookup")
+        return df['MRN'].dropna().tolist() if not df.empty else []
+    except Exception:
+        return []
+
+
+def fetch_reports_for_mrn(conn, mrn: str):
+    """Return DataFrame of reports for a given MRN."""
+    if not mrn:
+        return pd.DataFrame()
+    safe_mrn = safe_sql(mrn)
+    q = (
+        "SELECT ACCESSION_NUM, NOTENAME, VISITTYPE, VISITDATE, DONEBY, DEPTNAME, NOTEDATA "
+        "FROM NOTESDATA "
+        f"WHERE MRN = '{safe_mrn}' "
+        "ORDER BY NVL(VISITDATE, TO_DATE('1900-01-01','YYYY-MM-DD')) DESC"
+    )
+    try:
+        df = read_sql(q, conn, name="reports.fetch_for_mrn", profile="lob")
+        for c in REPORT_COLUMNS:
+            if c not in df.columns:
+                df[c] = None
+        return df[REPORT_COLUMNS]
+    except Exception:
+        return pd.DataFrame(columns=REPORT_COLUMNS)
+
+
+def safe_clob(x):
+    """CLOB / LOB locator / None -> str"""
+    if x is None:
+        return ""
+    try:
+        return x.read() if hasattr(x, "read") else str(x)
+    except Exception:
+        return str(x)
+
+
+def build_report_label(row):
+    """Produce a friendly label for a report in multi-select: accession | name | date"""
+    acc = str(row.get('ACCESSION_NUM', '')) if pd.notna(row.get('ACCESSION_NUM', None)) else ''
+    name = row.get('NOTENAME', '') if pd.notna(row.get('NOTENAME', None)) else ''
+    date_val = row.get('VISITDATE', None)
+    if pd.isna(date_val) or date_val is None:
+        date_str = ''
+    elif isinstance(date_val, str):
+        date_str = date_val
+    elif isinstance(date_val, (datetime, pd.Timestamp)):
+        date_str = date_val.strftime('%Y-%m-%d')
+    else:
+        date_str = str(date_val)
+    return f"{acc} | {name} | {date_str}"
+
+
+def wrap_report_html(html_data):
+    return HTML_WRAPPER_START + html_data + HTML_WRAPPER_END
+
+
+def create_zip_of_reports(reports_df: pd.DataFrame, selected_accessions: list):
+    """ZIP (bytes) with one wrapped .html file per selected accession"""
+    mem_zip = io.BytesIO()
+    with zipfile.ZipFile(mem_zip, "w", zipfile.ZIP_DEFLATED) as zf:
+        for _, r in reports_df[reports_df["ACCESSION_NUM"].isin(selected_accessions)].iterrows():
+            fname = f"{r['ACCESSION_NUM']}_{r['NOTENAME'].replace(' ', '_')}.html"
+            content = safe_clob(r["NOTEDATA"])
+            if not isinstance(content, str):
+                content = str(content)
+            zf.writestr(fname, wrap_report_html(content))
+    mem_zip.seek(0)
+    return mem_zip.getvalue()
@@ -0,0 +1,323 @@
+"""
+Surgery analytics: summary counts, the surgery register (one row per surgery
+with the first person recorded in each of 16 theatre roles) and the
+per-role leaderboards built from it
+
+The register viewer pages with keyset queries (surgery_register_page) that
+walk SURGERY in (SURGERYDATE, SURGERYID) order. On Oracle that needs an
+index on both columns, or every page sorts the whole date range first:
+
+    CREATE INDEX SURGERY_DATE_ID_IX ON SURGERY (SURGERYDATE, SURGERYID);
+"""
+import pandas as pd
+
+from sssihms.db import FRAME_CAP, read_sql
+from sssihms.daycache import get_day_cache
+from sssihms.summaries import routed
+from sssihms.analytics.filters import safe_sql, is_all, is_all_hospitals, days_in_range, whole_days
+
+# Leaderboard roles: register column, display title, placeholder values that
+# mean "nobody recorded"
+MAIN_ROLES = [
+    {"col": "SURGEON_NAME", "title": "Surgeon", "exclude": ["Unknown Surgeon"]},
+    {"col": "ANAESTHETIST_NAME", "title": "Anaesthetist", "exclude": ["Not Recorded"]},
+    {"col": "ASST_SURGEON_NAME", "title": "Assisting Surgeon", "exclude": ["-"]},
+    {"col": "ASST_ANAESTHETIST_NAME", "title": "Assisting Anaesthetist", "exclude": ["-"]},
+    {"col": "PERFUSIONIST_NAME", "title": "Perfusionist", "exclude": ["-"]},
+    {"col": "RNURSE_NAME", "title": "R Nurse", "exclude": ["-"]},
+    {"col": "SCNURSE_NAME", "title": "SC Nurse", "exclude": ["-"]},
+    {"col": "NURSE_NAME", "title": "Nurse", "exclude": ["-"]},
+    {"col": "TECHNICIAN_NAME", "title": "Technician", "exclude": ["-"]},
+]
+ADDITIONAL_ROLES = [
+    ("TECHCATH_NAME", "Cath Lab Technician"),
+    ("PHYSICIANCATH_NAME", "Cath Lab Physician"),
+    ("ASSTPHYCATH_NAME", "Assisting Cath Physician"),
+    ("IOMTECH_NAME", "IOM Technician"),
+    ("CIRCNURSE_NAME", "Circulating Nurse"),
+    ("ASSTNURSE_NAME", "Assistant Nurse"),
+    ("WARDNURSE_NAME", "Ward Nurse"),
+]
+MAIN_ROLE_TOP = 25
+ADDITIONAL_ROLE_TOP = 10
+PROCEDURE_TOP = 20
+REGISTER_PAGE_SIZE = 50
+# Register columns of few distinct, often repeated values: held as categoricals
+REGISTER_CATEGORICAL = [
+    "OTNUMBER", "ANAESTHESIA", "SURGERYTYPE", "DEPTCODE", "DEPTNAME", "PROCEDURE_NAME", "PROC_CATEGORY",
+    "PROC_SUBCATEGORY", *(role["col"] for role in MAIN_ROLES), *(col for col, _ in ADDITIONAL_ROLES),
+]
+
+
+def load_surgery_metrics(conn, from_date, to_date, dept_name, surgeon_id, hospital=None):
+    """
+    Surgery summary figures: total, bydoc (the surgeon's share, None without
+    a surgeon), top_type and daily_avg, from one count per type and surgeon
+    """
+    surg_dept_filter = "1=1" if is_all(dept_name) else f"D.DEPTNAME = '{safe_sql(dept_name)}'"
+    surg_hosp_filter = "1=1" if is_all_hospitals(hospital) else f"S.HOSPITALID = '{safe_sql(hospital)}'"
+    dept_join = "JOIN DEPARTMENT D ON S.DEPTCODE = D.DEPTCODE AND S.HOSPITALID = D.HOSPITALID"
+
+    def from_base(first, last):
+        q = (
+            "SELECT NVL(S.SURGERYTYPE,'UNKNOWN') AS SURGERYTYPE, S.SURGEONID, COUNT(*) AS CNT "
+            f"FROM SURGERY S {dept_join} "
+            f"WHERE {whole_days('S.SURGERYDATE', first, last)} AND {surg_dept_filter} AND {surg_hosp_filter} "
+            "GROUP BY NVL(S.SURGERYTYPE,'UNKNOWN'), S.SURGEONID"
+        )
+        return read_sql(q, conn, name="surgery_metrics.counts", profile="lookup")
+
+    def from_summary(table, first, last):
+        q = (
+            "SELECT S.SURGERYTYPE, S.SURGEONID, SUM(S.CNT) AS CNT "
+            f"FROM {table} S {dept_join} "
+            f"WHERE {whole_days('S.THEDATE', first, last)} AND {surg_dept_filter} AND {surg_hosp_filter} "
+            "GROUP BY S.SURGERYTYPE, S.SURGEONID"
+        )
+        return read_sql(q, conn, name="surgery_metrics.counts.summary", profile="lookup")
+
+    try:
+        counts = routed(conn, "surgery", from_date, to_date, from_summary, from_base)
+    except Exception:
+        counts = pd.DataFrame(columns=["SURGERYTYPE", "SURGEONID", "CNT"])
+
+    total = int(counts["CNT"].sum()) if not counts.empty else 0
+    bydoc = int(counts.loc[counts["SURGEONID"] == surgeon_id, "CNT"].sum()) if surgeon_id else None
+    if counts.empty:
+        top_type = "N/A"
+    else:
+        by_type = counts.groupby("SURGERYTYPE")["CNT"].sum()
+        top_type = by_type.idxmax()
+
+    days = days_in_range(from_date, to_date)
+    daily_avg = (total / days) if days > 0 else 0.0
+
+    return {"total": total, "bydoc": bydoc, "top_type": top_type, "daily_avg": daily_avg}
+
+
+def _ranked_personnel(scope=""):
+    """CTE ranking the people recorded per surgery and role (rn = 1: the one shown)"""
+    return f"""
+    RankedPersonnel AS (
+        SELECT
+            sp.SURGERYID,
+            sp.STAFFID,
+            sp.STAFFROLE,
+            NVL(sm.STAFFNAME, sp.STAFFID) AS STAFFNAME,
+            ROW_NUMBER() OVER (PARTITION BY sp.SURGERYID, sp.STAFFROLE ORDER BY sp.STAFFID) AS rn
+        FROM SURGERY_PERSONNEL sp
+        LEFT JOIN STAFFMASTER sm ON sp.STAFFID = sm.STAFFID
+        WHERE UPPER(sp.STAFFID) != 'MIGRATED'{scope}
+    )"""
+
+
+# Register columns over SURGERY s and the joins below
+_REGISTER_COLUMNS = """        s.SURGERYID,
+        s.MRN,
+        s.SURGERYDATE,
+        s.OTNUMBER,
+        s.ANAESTHESIA,
+        s.SURGERYTYPE,
+        s.DEPTCODE,
+        NVL(d.DEPTNAME, s.DEPTCODE) AS DEPTNAME,
+        NVL(sd.SURGERYNAME, 'Procedure Name Not Found') AS PROCEDURE_NAME,
+        NVL(sd.CATEGORY, 'Uncategorized') AS PROC_CATEGORY,
+        NVL(sd.SUBCATEGORY, '-') AS PROC_SUBCATEGORY,
+        -- Main roles
+        NVL(surgeon.STAFFNAME, 'Unknown Surgeon') AS SURGEON_NAME,
+        NVL(anaesthetist.STAFFNAME, 'Not Recorded') AS ANAESTHETIST_NAME,
+        NVL(asst_surgeon.STAFFNAME, '-') AS ASST_SURGEON_NAME,
+        NVL(asst_anes.STAFFNAME, '-') AS ASST_ANAESTHETIST_NAME,
+        NVL(perfusionist.STAFFNAME, '-') AS PERFUSIONIST_NAME,
+        NVL(rnurse.STAFFNAME, '-') AS RNURSE_NAME,
+        NVL(scnurse.STAFFNAME, '-') AS SCNURSE_NAME,
+        -- Additional roles
+        NVL(nurse.STAFFNAME, '-') AS NURSE_NAME,
+        NVL(techcath.STAFFNAME, '-') AS TECHCATH_NAME,
+        NVL(physiciancath.STAFFNAME, '-') AS PHYSICIANCATH_NAME,
+        NVL(technician.STAFFNAME, '-') AS TECHNICIAN_NAME,
+        NVL(asstphycath.STAFFNAME, '-') AS ASSTPHYCATH_NAME,
+        NVL(iomtech.STAFFNAME, '-') AS IOMTECH_NAME,
+        NVL(circnurse.STAFFNAME, '-') AS CIRCNURSE_NAME,
+        NVL(asstnurse.STAFFNAME, '-') AS ASSTNURSE_NAME,
+        NVL(wardnurse.STAFFNAME, '-') AS WARDNURSE_NAME
+"""
+
+_REGISTER_JOINS = """    LEFT JOIN DEPARTMENT d ON s.DEPTCODE = d.DEPTCODE AND s.HOSPITALID = d.HOSPITALID
+    LEFT JOIN SURGERY_DETAILS sd
+      ON s.SURGERYID = sd.SURGERYID
+     AND s.HOSPITALID = sd.HOSPITALID
+    -- Main roles (7)
+    LEFT JOIN RankedPersonnel surgeon ON s.SURGERYID = surgeon.SURGERYID AND surgeon.STAFFROLE = 'SURGEON' AND surgeon.rn = 1
+    LEFT JOIN RankedPersonnel anaesthetist ON s.SURGERYID = anaesthetist.SURGERYID AND anaesthetist.STAFFROLE = 'ANAESTHETIST' AND anaesthetist.rn = 1
+    LEFT JOIN RankedPersonnel asst_surgeon ON s.SURGERYID = asst_surgeon.SURGERYID AND asst_surgeon.STAFFROLE = 'ASSISTING SURGEON' AND asst_surgeon.rn = 1
+    LEFT JOIN RankedPersonnel asst_anes ON s.SURGERYID = asst_anes.SURGERYID AND asst_anes.STAFFROLE = 'ASSISTING ANAESTHETIST' AND asst_anes.rn = 1
+    LEFT JOIN RankedPersonnel perfusionist ON s.SURGERYID = perfusionist.SURGERYID AND perfusionist.STAFFROLE = 'PERFUSIONIST' AND perfusionist.rn = 1
+    LEFT JOIN RankedPersonnel rnurse ON s.SURGERYID = rnurse.SURGERYID AND rnurse.STAFFROLE = 'RNURSE' AND rnurse.rn = 1
+    LEFT JOIN RankedPersonnel scnurse ON s.SURGERYID = scnurse.SURGERYID AND scnurse.STAFFROLE = 'SCNURSE' AND scnurse.rn = 1
+    -- Additional roles (9)
+    LEFT JOIN RankedPersonnel nurse ON s.SURGERYID = nurse.SURGERYID AND nurse.STAFFROLE = 'NURSE' AND nurse.rn = 1
+    LEFT JOIN RankedPersonnel techcath ON s.SURGERYID = techcath.SURGERYID AND techcath.STAFFROLE = 'TECHCATH' AND techcath.rn = 1
+    LEFT JOIN RankedPersonnel physiciancath ON s.SURGERYID = physiciancath.SURGERYID AND physiciancath.STAFFROLE = 'PHYSICIANCATH' AND physiciancath.rn = 1
+    LEFT JOIN RankedPersonnel technician ON s.SURGERYID = technician.SURGERYID AND technician.STAFFROLE = 'TECHNICIAN' AND technician.rn = 1
+    LEFT JOIN RankedPersonnel asstphycath ON s.SURGERYID = asstphycath.SURGERYID AND asstphycath.STAFFROLE = 'ASSTPHYCATH' AND asstphycath.rn = 1
+    LEFT JOIN RankedPersonnel iomtech ON s.SURGERYID = iomtech.SURGERYID AND iomtech.STAFFROLE = 'IOMTECH' AND iomtech.rn = 1
+    LEFT JOIN RankedPersonnel circnurse ON s.SURGERYID = circnurse.SURGERYID AND circnurse.STAFFROLE = 'CIRCNURSE' AND circnurse.rn = 1
+    LEFT JOIN RankedPersonnel asstnurse ON s.SURGERYID = asstnurse.SURGERYID AND asstnurse.STAFFROLE = 'ASSTNURSE' AND asstnurse.rn = 1
+    LEFT JOIN RankedPersonnel wardnurse ON s.SURGERYID = wardnurse.SURGERYID AND wardnurse.STAFFROLE = 'WARDNURSE' AND wardnurse.rn = 1
+"""
+
+
+def _register_where(from_date, to_date, hospital, dept_code=None, surgeon_id=None):
+    """Register conditions on SURGERY s (dept_code as in surgery_register_sql)"""
+    dept_filter = ""
+    if dept_code == "":
+        dept_filter = "AND 1=0"
+    elif dept_code is not None:
+        dept_filter = f"AND s.DEPTCODE = '{safe_sql(dept_code)}'"
+
+    surgeon_filter = ""
+    if surgeon_id:
+        surgeon_filter = f"AND EXISTS (SELECT 1 FROM SURGERY_PERSONNEL sp WHERE sp.SURGERYID = s.SURGERYID AND sp.STAFFROLE = 'SURGEON' AND sp.STAFFID = '{safe_sql(surgeon_id)}')"
+
+    return f"""s.SURGERYDATE BETWEEN TO_DATE('{from_date}', 'YYYY-MM-DD')
+                           AND TO_DATE('{to_date}', 'YYYY-MM-DD') + 0.99999
+      AND (s.HOSPITALID = '{safe_sql(hospital)}' OR '{safe_sql(hospital)}' = 'All Hospitals')
+      {dept_filter}
+      {surgeon_filter}"""
+
+
+def surgery_register_sql(from_date, to_date, hospital, dept_code=None, surgeon_id=None):
+    """
+    The register query. `dept_code` None means every department; an empty
+    string means the selected department has no DEPTCODE, so nothing matches.
+    """
+    return f"""
+    WITH {_ranked_personnel()}
+    SELECT
+{_REGISTER_COLUMNS}    FROM SURGERY s
+{_REGISTER_JOINS}    WHERE {_register_where(from_date, to_date, hospital, dept_code, surgeon_id)}
+    ORDER BY s.SURGERYDATE DESC
+    """
+
+
+def load_surgery_register(conn, from_date, to_date, hospital, dept_code=None, surgeon_id=None,
+                          max_bytes=FRAME_CAP):
+    """
+    One row per surgery in the range, newest first (raises on query failure).
+    Cached per day of SURGERYDATE, so extending the range fetches only the new days.
+
+    Long ranges are streamed in chunks with the name and category columns
+    (REGISTER_CATEGORICAL) as categoricals; FrameTooLarge is raised when a
+    fetch would pass max_bytes (FRAME_CAP_MB; None: no cap).
+    """
+    def fetch(first, last):
+        sql = surgery_register_sql(first, last, hospital, dept_code, surgeon_id)
+        return read_sql(sql, conn, name="surgery.register", profile="bulk",
+                        categorical=REGISTER_CATEGORICAL, max_bytes=max_bytes)
+
+    df = get_day_cache().get_range(conn, "surgery.register", (hospital, dept_code, surgeon_id),
+                                   from_date, to_date, fetch, "SURGERYDATE")
+    return df.sort_values("SURGERYDATE", ascending=False, kind="stable", ignore_index=True) if not df.empty else df
+
+
+def _like(text, contains=False):
+    # a literal pattern: LIKE wildcards typed by the user match themselves
+    escaped = text.strip().upper().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return ("%" if contains else "") + escaped + "%"
+
+
+def surgery_register_page(conn, from_date, to_date, hospital, dept_code=None, surgeon_id=None, *,
+                          mrn=None, procedure=None, category=None, newest_first=True, after=None,
+                          page_size=REGISTER_PAGE_SIZE):
+    """
+    (page, has_more): up to page_size register rows in (SURGERYDATE,
+    SURGERYID) order, newest or oldest first, starting after the keyset
+    `after` (register_cursor() of the previous page), and whether more follow.
+
+    The page's surgeries are picked first, walking the (SURGERYDATE,
+    SURGERYID) index (see the module docstring) from the keyset and stopping after page_size + 1 rows;
+    names and roles are then joined for those rows only, so a page costs the
+    same for a day or a decade. mrn (prefix), procedure (substring) and
+    category narrow the rows on the server.
+    """
+    conditions, binds = [], {}
+    if mrn and mrn.strip():
+        conditions.append("UPPER(s.MRN) LIKE :mrn ESCAPE '\\'")
+        binds["mrn"] = _like(mrn)
+    if procedure and procedure.strip():
+        conditions.append("UPPER(sd.SURGERYNAME) LIKE :procedure ESCAPE '\\'")
+        binds["procedure"] = _like(procedure, contains=True)
+    if category:
+        conditions.append("NVL(sd.CATEGORY, 'Uncategorized') = :category")
+        binds["category"] = category
+    direction, before = ("DESC", "<") if newest_first else ("ASC", ">")
+    if after is not None:
+        conditions.append(f"(s.SURGERYDATE {before} :after_key "
+                          f"OR (s.SURGERYDATE = :after_key AND s.SURGERYID {before} :after_id))")
+        binds["after_key"], binds["after_id"] = after
+    details_join = ("LEFT JOIN SURGERY_DETAILS sd ON s.SURGERYID = sd.SURGERYID AND s.HOSPITALID = sd.HOSPITALID"
+                    if procedure or category else "")
+    extra = "".join(f"\n      AND {c}" for c in conditions)
+
+    # PAGE_KEY is SURGERYDATE exactly as stored, bound back as is for the next page
+    q = f"""
+    WITH PageIds AS (
+        SELECT s.SURGERYID, s.SURGERYDATE AS PAGE_KEY
+        FROM SURGERY s
+        {details_join}
+        WHERE {_register_where(from_date, to_date, hospital, dept_code, surgeon_id)}{extra}
+        ORDER BY s.SURGERYDATE {direction}, s.SURGERYID {direction}
+        FETCH FIRST {int(page_size) + 1} ROWS ONLY
+    ),
+    {_ranked_personnel(" AND sp.SURGERYID IN (SELECT SURGERYID FROM PageIds)")}
+    SELECT
+        p.PAGE_KEY,
+{_REGISTER_COLUMNS}    FROM PageIds p
+    JOIN SURGERY s ON s.SURGERYID = p.SURGERYID
+{_REGISTER_JOINS}    ORDER BY p.PAGE_KEY {direction}, s.SURGERYID {direction}
+    """
+    df = read_sql(q, conn, params=binds, name="surgery.register_page", profile="lookup")
+    return df.head(page_size), len(df) > page_size
+
+
+def register_cursor(page):
+    """Keyset (PAGE_KEY, SURGERYID) of a register page's last row, as Python values to bind"""
+    last = page.iloc[-1]
+    key = last["PAGE_KEY"]
+    key = key.to_pydatetime() if isinstance(key, pd.Timestamp) else key.item() if hasattr(key, "item") else key
+    surgery_id = last["SURGERYID"]
+    return key, surgery_id.item() if hasattr(surgery_id, "item") else surgery_id
+
+
+def top_procedures(df, n=PROCEDURE_TOP):
+    """Procedure/Count, most performed first (n=None for the full list)"""
+    counts = df["PROCEDURE_NAME"].value_counts()
+    counts = counts[counts > 0]   # categorical columns also count categories with no rows
+    proc = (counts if n is None else counts.head(n)).reset_index()
+    proc.columns = ["Procedure", "Count"]
+    return proc
+
+
+def role_leaderboard(df, col, title, exclude=("-",), top=MAIN_ROLE_TOP):
+    """<title>/Cases for one role column, busiest first"""
+    filtered = df[df[col].notna() & (~df[col].isin(list(exclude)))]
+    counts = filtered[col].value_counts()
+    role_count = counts[counts > 0].head(top).reset_index()
+    role_count.columns = [title, "Cases"]
+    return role_count
+
+
+def leaderboards(df):
+    """{register column: leaderboard frame} for every main and additional role"""
+    boards = {}
+    for role in MAIN_ROLES:
+        boards[role["col"]] = role_leaderboard(df, role["col"], role["title"], role["exclude"])
+    for col, title in ADDITIONAL_ROLES:
+        boards[col] = role_leaderboard(df, col, title, top=ADDITIONAL_ROLE_TOP)
+    return boards
+
+
+def department_breakdown(df):
+    """Surgeries per DEPTNAME, busiest first"""
+    return df.groupby('DEPTNAME', observed=True).size().reset_index(name='Count').sort_values('Count', ascending=False)
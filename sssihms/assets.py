@@ -0,0 +1,62 @@
+"""
+Static assets (stylesheets, logo) served by Streamlit's static file server
+
+Files in static/ next to app.py are served at app/static/<name> when
+server.enableStaticServing is on (.streamlit/config.toml). Pages reference
+them with a content-hash query string, so the browser caches each file
+until its contents change and a rerun only carries a one-line <link> or
+<img> tag instead of the whole stylesheet or a base64 image.
+
+With static serving switched off the same helpers fall back to inlining
+the asset. Either way the file is read, hashed and encoded once per
+process, not on every rerun.
+"""
+import base64
+import hashlib
+import mimetypes
+from functools import lru_cache
+from pathlib import Path
+
+STATIC_DIR = Path(__file__).resolve().parent.parent / "static"
+STATIC_URL = "app/static"
+HASH_LENGTH = 12
+
+
+@lru_cache(maxsize=None)
+def _read(name):
+    return (STATIC_DIR / name).read_bytes()
+
+
+@lru_cache(maxsize=None)
+def fingerprint(name):
+    """Short content hash of a static file (its cache-busting version)"""
+    return hashlib.sha256(_read(name)).hexdigest()[:HASH_LENGTH]
+
+
+def static_url(name):
+    """Hash-versioned URL of a file in static/"""
+    return f"{STATIC_URL}/{name}?v={fingerprint(name)}"
+
+
+@lru_cache(maxsize=None)
+def data_uri(name):
+    """The file as a base64 data: URI (encoded once per process)"""
+    mime = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    return f"data:{mime};base64,{base64.b64encode(_read(name)).decode()}"
+
+
+@lru_cache(maxsize=None)
+def _inline_style(name):
+    return f"<style>\n{_read(name).decode('utf-8')}</style>"
+
+
+def stylesheet(name, static_serving=True):
+    """HTML that applies static/<name>: a <link> tag, or an inline <style> block"""
+    if static_serving:
+        return f'<link rel="stylesheet" href="{static_url(name)}">'
+    return _inline_style(name)
+
+
+def image_src(name, static_serving=True):
+    """src= value for an <img> of static/<name>"""
+    return static_url(name) if static_serving else data_uri(name)
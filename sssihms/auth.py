@@ -0,0 +1,116 @@
+"""
+Login path: staff lookup on a small dedicated session pool
+
+Logins come in bursts (hundreds within minutes at the 07:00 and 19:00 shift
+change). Opening a new connection per attempt made every login pay the
+listener handshake and session creation, and the bursts choked the listener.
+Here every login borrows a session from a pool kept only for authentication
+(LOGIN_POOL_MIN / LOGIN_POOL_MAX sessions, default 1 / 4), so a storm costs
+at most LOGIN_POOL_MAX connects and then queues for free sessions, up to
+LOGIN_POOL_WAIT_MS (default 10000) per attempt.
+
+The lookup is one statement whose text never changes (the staff ID and
+password hash are binds), so each session parses it once and then finds it
+in its statement cache, and it is fetched with the "scalar" profile: the
+row comes back with the execute, one round trip per login.
+"""
+import hashlib
+import os
+import threading
+
+from sssihms.db import FETCH_PROFILES, acquire, configure_cursor, init_oracle_client
+from sssihms.instrumentation import timed
+
+try:
+    import oracledb
+except ImportError:  # the stand-in database does not need the driver
+    oracledb = None
+
+LOGIN_SQL = """
+    SELECT STAFFNAME, LOGINOK, ACCESS_ROLE, HOSPITALID
+    FROM STAFFMASTER
+    WHERE STAFFID = :staffid
+      AND TXTPASSWD = :pwd
+"""
+
+NOT_ACTIVE = "NOT_ACTIVE"
+
+
+def hash_password(password):
+    return hashlib.sha256(password.encode()).hexdigest().lower()
+
+
+def pool_settings():
+    """(min, max, wait_timeout_ms) of the login pool from the environment"""
+    return (int(os.getenv("LOGIN_POOL_MIN", "1")),
+            int(os.getenv("LOGIN_POOL_MAX", "4")),
+            int(os.getenv("LOGIN_POOL_WAIT_MS", "10000")))
+
+
+def create_login_pool():
+    """Session pool for the login lookup (the stand-in database with STANDIN_DB set)"""
+    pool_min, pool_max, wait_ms = pool_settings()
+    if os.getenv("STANDIN_DB"):
+        from sssihms.standin import StandInPool
+        return StandInPool(os.getenv("STANDIN_DB"), max=pool_max, min=pool_min, wait_timeout=wait_ms)
+    init_oracle_client()
+    return oracledb.create_pool(
+        user=os.getenv("DB_USER", "hisapp"),
+        password=os.getenv("DB_PASSWORD", "his@2025"),
+        dsn=os.getenv("DB_DSN", "192.168.21.6:1521/hisdb"),
+        min=pool_min,
+        max=pool_max,
+        increment=1,
+        getmode=oracledb.POOL_GETMODE_TIMEDWAIT,
+        wait_timeout=wait_ms,
+        stmtcachesize=int(os.getenv("LOGIN_STMT_CACHE_SIZE", "4")),
+    )
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_login_pool():
+    """Process-wide login pool shared by all sessions (created on first login)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = create_login_pool()
+        return _pool
+
+
+def lookup_staff(conn, staffid, password):
+    """(STAFFNAME, LOGINOK, ACCESS_ROLE, HOSPITALID) for matching credentials, or None"""
+    cur = configure_cursor(conn.cursor(), FETCH_PROFILES["scalar"])
+    try:
+        with timed("login.verify_user_from_db") as t:
+            cur.execute(LOGIN_SQL, {"staffid": staffid, "pwd": hash_password(password)})
+            row = cur.fetchone()
+            t.rows = int(row is not None)
+    finally:
+        cur.close()
+    return row
+
+
+def verify_user(pool, staffid, password):
+    """
+    {"staffname", "role", "hospitalid"} for a valid active login, NOT_ACTIVE
+    for a valid login not yet activated, None for wrong credentials.
+    Database errors (including no free session in time) propagate.
+    """
+    conn = acquire(pool, "login.acquire")
+    try:
+        row = lookup_staff(conn, staffid, password)
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    staffname, loginok, access_role, hospitalid = row
+    if loginok != "Y":
+        return NOT_ACTIVE
+    return {
+        "staffname": staffname,
+        "role": "admin" if access_role == "A" else "staff",
+        "hospitalid": hospitalid,
+    }
@@ -0,0 +1,190 @@
+"""
+Cancelling superseded queries, and time budgets per query
+
+Changing a filter while the dashboard is still loading makes Streamlit
+rerun the page, but the old run only stops at its next st.* call: a query
+already sent keeps running on the database, and keeps its pool session,
+until it returns. Pages call watch_session() at the top of each run; every
+read_sql() (sssihms.db) on that thread is then tracked, and one QueryWatch
+thread per process cancels (connection.cancel()) the tracked queries whose
+session has a newer run waiting. The old run stops straight away and its
+session goes back to the pool.
+
+Every fetch profile also carries a time budget, applied as the connection's
+call_timeout, after which the driver stops the call. Both outcomes surface
+as QueryInterrupted subclasses so pages can tell them from real failures:
+QueryTimeout gets a "timed out" notice, QueryCancelled needs none (nobody
+is looking at that run any more).
+"""
+import os
+import threading
+from contextlib import contextmanager
+
+POLL_SECONDS = float(os.getenv("QUERY_CANCEL_POLL_MS", "250")) / 1000
+
+# call timeout exceeded: thick driver, thin driver, server side
+TIMEOUT_CODES = ("DPI-1067", "DPY-4024", "ORA-03156")
+# user requested cancel of current operation
+CANCEL_CODES = ("ORA-01013",)
+
+
+class QueryInterrupted(Exception):
+    """A query stopped before it finished"""
+
+
+class QueryCancelled(QueryInterrupted):
+    """Cancelled because the session that started it has moved on"""
+
+
+class QueryTimeout(QueryInterrupted):
+    """Stopped by the driver at its time budget"""
+
+    def __init__(self, name, budget_ms):
+        super().__init__(f"'{name}' ran past its {budget_ms / 1000:g} s time budget")
+        self.name = name
+        self.budget_ms = budget_ms
+
+
+def interruption(error, name, budget_ms, cancelled=False):
+    """The QueryInterrupted a driver error stands for (None for any other failure)"""
+    text = str(error)
+    if cancelled or any(code in text for code in CANCEL_CODES):
+        return QueryCancelled(f"'{name}' was cancelled: a newer run of its page replaced it")
+    if any(code in text for code in TIMEOUT_CODES):
+        return QueryTimeout(name, budget_ms)
+    return None
+
+
+# -------------------------
+# Session context
+# -------------------------
+_context = threading.local()
+
+
+def watch_session(superseded):
+    """
+    Track this thread's queries from now on; `superseded()` returns True once
+    the run that issued them has been replaced (None stops tracking)
+    """
+    _context.superseded = superseded
+
+
+def current_superseded():
+    return getattr(_context, "superseded", None)
+
+
+def streamlit_superseded():
+    """
+    Predicate for the current Streamlit script run: True once a rerun that
+    would interrupt it (or a stop) is pending for the session. None outside
+    a script run.
+    """
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        from streamlit.runtime.scriptrunner_utils.script_requests import (
+            ScriptRequestType, _fragment_run_should_not_preempt_script)
+    except ImportError:
+        return None
+    ctx = get_script_run_ctx()
+    requests = getattr(ctx, "script_requests", None)
+    if requests is None:
+        return None
+
+    def superseded():
+        # read without the lock, as ScriptRequests' own fast path does
+        state = getattr(requests, "_state", None)
+        if state is ScriptRequestType.STOP:
+            return True
+        if state is ScriptRequestType.RERUN:
+            rerun = requests._rerun_data
+            # fragment reruns do not interrupt the full run
+            return not _fragment_run_should_not_preempt_script(rerun.fragment_id_queue,
+                                                               rerun.is_fragment_scoped_rerun)
+        return False
+
+    return superseded
+
+
+# -------------------------
+# Watcher
+# -------------------------
+class _Tracked:
+    __slots__ = ("conn", "superseded", "cancelled")
+
+    def __init__(self, conn, superseded):
+        self.conn = conn
+        self.superseded = superseded
+        self.cancelled = False
+
+
+class QueryWatch:
+    """Cancels running queries whose session has moved on"""
+
+    def __init__(self, poll_seconds=POLL_SECONDS):
+        self.poll_seconds = poll_seconds
+        self._running = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._counts = {"tracked": 0, "cancelled": 0}
+
+    @contextmanager
+    def track(self, conn):
+        """Watch a query on conn for as long as the block runs (when this thread is watched)"""
+        superseded = current_superseded()
+        if superseded is None:
+            yield None
+            return
+        entry = _Tracked(conn, superseded)
+        with self._lock:
+            self._running[id(entry)] = entry
+            self._counts["tracked"] += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="query-watch", daemon=True)
+                self._thread.start()
+        self._wake.set()
+        try:
+            yield entry
+        finally:
+            # under the lock, so a cancel never reaches the connection once it is handed back
+            with self._lock:
+                del self._running[id(entry)]
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            while True:
+                with self._lock:
+                    if not self._running:
+                        break
+                    for entry in self._running.values():
+                        if entry.cancelled:
+                            continue
+                        try:
+                            if not entry.superseded():
+                                continue
+                            entry.cancelled = True
+                            entry.conn.cancel()
+                        except Exception:
+                            continue
+                        self._counts["cancelled"] += 1
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counts, running=len(self._running))
+
+
+_query_watch = None
+_query_watch_lock = threading.Lock()
+
+
+def get_query_watch():
+    """Process-wide QueryWatch shared by every session"""
+    global _query_watch
+    with _query_watch_lock:
+        if _query_watch is None:
+            _query_watch = QueryWatch()
+        return _query_watch
@@ -0,0 +1,95 @@
+"""
+Chart data reduction before rendering
+
+st.altair_chart embeds the chart's rows in the Vega spec sent to the
+browser, so a multi-year daily series or every state x month goes over the
+wire and into the page whole. The dashboard passes chart frames through
+here first:
+
+  - downsample() keeps at most CHART_MAX_POINTS (default 500) points of a
+    series with Largest-Triangle-Three-Buckets, which picks the point of
+    each bucket that best preserves the line's shape (peaks and troughs
+    survive, unlike every-nth sampling or bucket means);
+  - fold_top_n() keeps the CHART_TOP_N (default 10) largest categories and
+    sums the rest into one "Other" row, so a legend or bar list has a fixed
+    length.
+
+Only what is drawn is reduced; summary figures and tables use full data.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "500"))
+TOP_N = int(os.getenv("CHART_TOP_N", "10"))
+OTHER = "Other"
+
+
+def lttb_indices(x, y, threshold):
+    """Positions of the points LTTB keeps out of (x, y), first and last included"""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype="float64")
+    y = np.nan_to_num(np.asarray(y, dtype="float64"))
+    every = (n - 2) / (threshold - 2)
+    keep = np.empty(threshold, dtype="int64")
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        # triangle with the previous pick and the next bucket's average
+        avg_x, avg_y = x[end:next_end].mean(), y[end:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        keep[i + 1] = a
+    return keep
+
+
+def _numeric(values):
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.astype("int64").to_numpy()
+    return pd.to_numeric(values, errors="coerce").to_numpy()
+
+
+def downsample(df, x, y, max_points=MAX_POINTS, by=None):
+    """
+    df's rows sorted by x and reduced to at most max_points per series
+    (one series per value of `by`) with LTTB on column y
+    """
+    if by is not None:
+        parts = [downsample(part, x, y, max_points) for _, part in df.groupby(by, sort=False)]
+        return pd.concat(parts, ignore_index=True) if parts else df
+    df = df.sort_values(x)
+    if len(df) <= max_points:
+        return df.reset_index(drop=True)
+    keep = lttb_indices(_numeric(df[x]), _numeric(df[y]), max_points)
+    return df.iloc[keep].reset_index(drop=True)
+
+
+def fold_top_n(df, key, rank_by, n=TOP_N, sums=(), by=(), label=OTHER):
+    """
+    The n rows of df whose key has the largest total rank_by, with every
+    other key folded into `label`: the columns in `sums` (rank_by included)
+    are added up per `by` group (e.g. per month of a trend), other columns
+    are filled with `label` where they are text and left empty otherwise.
+    """
+    by = list(by)
+    sums = list(dict.fromkeys([rank_by, *sums]))
+    totals = df.groupby(key)[rank_by].sum()
+    if len(totals) <= n:
+        return df
+    top = totals.nlargest(n).index
+    kept = df[df[key].isin(top)]
+    rest = df[~df[key].isin(top)]
+    if by:
+        other = rest.groupby(by, as_index=False)[sums].sum()
+    else:
+        other = rest[sums].sum().to_frame().T
+    for column in df.columns.difference(other.columns):
+        other[column] = label if df[column].dtype == object or pd.api.types.is_string_dtype(df[column]) else np.nan
+    return pd.concat([kept, other[df.columns]], ignore_index=True)
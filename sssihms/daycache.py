@@ -0,0 +1,280 @@
+"""
+Day-partitioned result cache for date-filtered queries
+
+Dashboard queries filter on a From/To window. Moving To forward a day, or
+widening the window, used to re-run every query over the whole range. Here
+a query's result is kept as one partition per day, keyed by the database,
+the query name and its non-date filters. A request for a range is assembled
+from the cached days, and only the missing days are fetched, one query per
+contiguous run of missing days. A "month to date" visit costs one new day.
+
+Days are either closed or open. A day is closed once it is more than
+`settle_days` old (DAYCACHE_SETTLE_DAYS, default 2): late entries and
+corrections have landed and its rows no longer change. Closed days are
+kept for good, in memory and on disk under DAYCACHE_DIR, so browsing past
+months costs nothing after the first visit, across sessions and restarts.
+Open days (the settle window, today and later) are reused for
+`open_ttl` seconds (DAYCACHE_OPEN_TTL, default 300) and then fetched again.
+
+fetch(a, b) must return every row whose `day_column` falls on days a..b
+inclusive (whole days, as the surgery register's `+ 0.99999` bound does),
+so each row lands in exactly one partition. Assembled results are ordered
+by day; callers that need another order sort afterwards.
+
+Monthly tables put each month's rows on the month's first day and pass
+grain="month": such a partition only closes once its whole month has.
+"""
+import hashlib
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+from pathlib import Path
+
+import pandas as pd
+
+from sssihms.db import source_id, frame_bytes, concat_frames
+from sssihms.instrumentation import record_cache
+
+SETTLE_DAYS = int(os.getenv("DAYCACHE_SETTLE_DAYS", "2"))
+OPEN_TTL = float(os.getenv("DAYCACHE_OPEN_TTL", "300"))
+# set DAYCACHE_DIR to an empty value to keep closed days in memory only
+CACHE_DIR = os.getenv("DAYCACHE_DIR", str(Path(__file__).resolve().parent.parent / ".cache" / "daycache"))
+
+
+def day_range(from_date, to_date):
+    """Every date from from_date to to_date inclusive"""
+    return [from_date + timedelta(days=i) for i in range((to_date - from_date).days + 1)]
+
+
+def contiguous_runs(days):
+    """Group sorted dates into (first, last) runs of consecutive days"""
+    runs = []
+    for d in days:
+        if runs and d == runs[-1][1] + timedelta(days=1):
+            runs[-1][1] = d
+        else:
+            runs.append([d, d])
+    return [tuple(r) for r in runs]
+
+
+def month_end(d):
+    """Last day of d's month"""
+    first_of_next = date(d.year + d.month // 12, d.month % 12 + 1, 1)
+    return first_of_next - timedelta(days=1)
+
+
+DAY = "_DAY"   # partition day of each cached row (datetime64, midnight)
+
+
+def _with_day(df, day_column):
+    out = df.copy()
+    out[DAY] = pd.to_datetime(df[day_column]).dt.normalize() if not df.empty else pd.Series(dtype="datetime64[ns]")
+    return out
+
+
+def _timestamps(days):
+    return pd.DatetimeIndex([pd.Timestamp(d) for d in days])
+
+
+class _Entry:
+    __slots__ = ("frame", "days", "months", "size")
+
+    def __init__(self):
+        self.frame = None     # cached rows of every covered day, sorted by DAY
+        self.days = {}        # covered day -> None if closed, else when it was fetched (monotonic)
+        self.months = set()   # (year, month) already looked up on disk
+        self.size = 0
+
+    def fresh(self, day, now, ttl):
+        if day not in self.days:
+            return False
+        fetched_at = self.days[day]
+        return fetched_at is None or now - fetched_at < ttl
+
+    def put(self, frame, days, fetched_at):
+        """Replace the rows of `days` with `frame`; fetched_at=None marks the days closed"""
+        kept = self.frame
+        if kept is not None and not kept.empty and any(d in self.days for d in days):
+            kept = kept[~kept[DAY].isin(_timestamps(days))]
+        frames = [f for f in (kept, frame) if f is not None and not f.empty]
+        if frames:
+            # categorical columns (streamed frames) stay categorical across partitions
+            merged = concat_frames(frames) if len(frames) > 1 else frames[0]
+            self.frame = merged.sort_values(DAY, kind="stable", ignore_index=True)
+        elif kept is not None:
+            self.frame = kept
+        else:
+            self.frame = frame
+        for d in days:
+            self.days[d] = fetched_at
+        self.size = frame_bytes(self.frame) or 0
+
+    def rows(self, first, last):
+        """Cached rows from first to last inclusive"""
+        if self.frame is None or self.frame.empty:
+            return self.frame
+        day = self.frame[DAY].to_numpy()
+        lo = day.searchsorted(pd.Timestamp(first).to_datetime64(), side="left")
+        hi = day.searchsorted(pd.Timestamp(last).to_datetime64(), side="right")
+        return self.frame.iloc[lo:hi]
+
+    def closed_month(self, year, month):
+        """(closed days, their rows) of one calendar month, for writing to disk"""
+        days = sorted(d for d, t in self.days.items() if t is None and (d.year, d.month) == (year, month))
+        frame = self.rows(date(year, month, 1), month_end(date(year, month, 1)))
+        if frame is not None and not frame.empty:
+            frame = frame[frame[DAY].isin(_timestamps(days))]
+        return days, frame
+
+
+class DayPartitionCache:
+    """Bounded LRU of per-day result partitions, shared by all sessions"""
+
+    def __init__(self, max_bytes=512 * 1024 * 1024, settle_days=SETTLE_DAYS, open_ttl=OPEN_TTL,
+                 directory=CACHE_DIR):
+        self.max_bytes = max_bytes
+        self.settle_days = settle_days
+        self.open_ttl = open_ttl
+        self.directory = Path(directory) if directory else None
+        self.enabled = True
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self):
+        total = sum(e.size for e in self._entries.values())
+        while total > self.max_bytes and len(self._entries) > 1:
+            _key, entry = self._entries.popitem(last=False)
+            total -= entry.size
+
+    # ---- closed months on disk ----
+
+    def _month_path(self, full_key, year, month):
+        digest = hashlib.sha256(repr(full_key).encode("utf-8")).hexdigest()[:24]
+        return self.directory / digest / f"{year:04d}-{month:02d}.pkl"
+
+    def _load_month(self, full_key, year, month):
+        """(days, frame) stored for one month, or None"""
+        try:
+            with open(self._month_path(full_key, year, month), "rb") as f:
+                stored = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            return None   # unreadable file: fetch the days again and overwrite it
+        if stored.get("key") != repr(full_key):
+            return None
+        return stored["days"], stored["frame"]
+
+    def _save_month(self, full_key, year, month, days, frame):
+        path = self._month_path(full_key, year, month)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump({"key": repr(full_key), "days": days, "frame": frame}, f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except OSError:
+            pass   # the disk copy is an optimisation; the memory copy is still good
+
+    # ---- lookups ----
+
+    def get_range(self, conn, name, key, from_date, to_date, fetch, day_column, today=None, grain="day"):
+        """
+        Rows for from_date..to_date from cached day partitions, fetching only
+        the missing days. `key` holds the query's non-date filters.
+        """
+        if not self.enabled:
+            return fetch(from_date, to_date)
+
+        today = today or date.today()
+        days = day_range(from_date, to_date)
+        if not days:
+            return fetch(from_date, to_date)
+        cutoff = today - timedelta(days=self.settle_days)
+
+        def closed(d):
+            return (month_end(d) if grain == "month" else d) < cutoff
+
+        full_key = (source_id(conn), name, key)
+        start = time.perf_counter()
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(full_key)
+            if entry is None:
+                entry = self._entries[full_key] = _Entry()
+            self._entries.move_to_end(full_key)
+            missing = [d for d in days if not entry.fresh(d, now, self.open_ttl)]
+            months = sorted({(d.year, d.month) for d in missing if closed(d)} - entry.months)
+
+        # closed days another session or an earlier process already fetched
+        if months and self.directory is not None:
+            loaded = [stored for stored in (self._load_month(full_key, y, m) for y, m in months) if stored]
+            with self._lock:
+                entry.months.update(months)
+                for stored_days, frame in loaded:
+                    new = [d for d in stored_days if entry.days.get(d, 0) is not None]
+                    if new:
+                        entry.put(frame[frame[DAY].isin(_timestamps(new))] if not frame.empty else frame,
+                                  new, None)
+                missing = [d for d in days if not entry.fresh(d, now, self.open_ttl)]
+
+        # one query per run of consecutive missing days
+        fetched = [(day_range(*run), _with_day(fetch(*run), day_column)) for run in contiguous_runs(missing)]
+        written = set()
+        with self._lock:
+            for run_days, df in fetched:
+                settled = [d for d in run_days if closed(d)]
+                unsettled = [d for d in run_days if not closed(d)]
+                if settled:
+                    entry.put(df[df[DAY].isin(_timestamps(settled))] if not df.empty else df, settled, None)
+                    written.update((d.year, d.month) for d in settled)
+                if unsettled:
+                    entry.put(df[df[DAY].isin(_timestamps(unsettled))] if not df.empty else df, unsettled, now)
+            self._evict()
+            to_write = [(y, m, *entry.closed_month(y, m)) for y, m in sorted(written)] \
+                if self.directory is not None else []
+            result = entry.rows(from_date, to_date)
+
+        for year, month, month_days, frame in to_write:
+            self._save_month(full_key, year, month, month_days, frame)
+        record_cache(name, hit=not missing, elapsed_ms=(time.perf_counter() - start) * 1000)
+
+        if result is None:
+            return fetch(from_date, to_date)
+        return result.drop(columns=DAY).reset_index(drop=True)
+
+    def clear(self, disk=False):
+        """Drop the in-memory partitions (and the on-disk closed days with disk=True)"""
+        with self._lock:
+            self._entries.clear()
+        if disk and self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queries": len(self._entries),
+                "days": sum(len(e.days) for e in self._entries.values()),
+                "closed_days": sum(sum(1 for t in e.days.values() if t is None) for e in self._entries.values()),
+                "bytes": sum(e.size for e in self._entries.values()),
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_day_cache():
+    """Process-wide day-partition cache shared by all sessions"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = DayPartitionCache()
+        return _cache
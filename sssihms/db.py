@@ -0,0 +1,336 @@
+"""
+Database helpers shared by the pages
+
+read_sql() is the single entry point for dashboard queries: it takes a query
+name and records timing, row count and fetched bytes for it (see
+sssihms.instrumentation) around the fetch.
+
+A query may also name a fetch profile. Profiles set the cursor's arraysize
+(rows per fetch round trip) and prefetchrows (rows returned with the execute
+itself), so single-row lookups finish in one round trip and bulk pulls move
+thousands of rows per trip instead of the driver default of 100.
+
+Each profile also has a time budget (call_timeout) after which the driver
+stops the call, and queries of a page run that has been replaced are
+cancelled (sssihms.cancellation); both raise QueryInterrupted subclasses.
+
+Wide row-level pulls can be streamed instead: read_sql(..., categorical=...,
+max_bytes=...) fetches STREAM_CHUNK_ROWS rows at a time. A result that fits
+in the first chunk is built as usual; a longer one has the named columns
+(repeated names and categories) turned into categorical dtype chunk by
+chunk, and FrameTooLarge is raised as soon as the frame passes max_bytes,
+so an oversized range is refused before it can exhaust the worker's memory.
+The cap (FRAME_CAP_MB) bounds each fetched frame on its own; frames kept by
+a session or the shared day cache are not added up.
+
+Identical queries already running for another session (same database, SQL,
+binds and profile) are not sent again: the caller waits for that result
+(sssihms.singleflight).
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+import pandas as pd
+
+from sssihms.instrumentation import timed, record_cache, record_pool_wait
+from sssihms import singleflight
+from sssihms.cancellation import get_query_watch, interruption
+
+try:
+    import oracledb
+except ImportError:  # the stand-in database does not need the driver
+    oracledb = None
+
+
+_client_lock = threading.Lock()
+_client_lib_dir = None
+
+
+def init_oracle_client(lib_dir=None):
+    """
+    Switch the driver to thick mode once per process. Streamlit re-runs a
+    page's script on every interaction, so the call cannot sit at module
+    scope. lib_dir defaults to ORACLE_CLIENT_PATH; without either the driver
+    stays in thin mode. Returns True when thick mode is on.
+    """
+    global _client_lib_dir
+    lib_dir = lib_dir or os.getenv("ORACLE_CLIENT_PATH")
+    if oracledb is None or not lib_dir:
+        return _client_lib_dir is not None
+    with _client_lock:
+        if _client_lib_dir is None:
+            oracledb.init_oracle_client(lib_dir=lib_dir)
+            _client_lib_dir = lib_dir
+    return True
+
+
+@dataclass(frozen=True)
+class FetchProfile:
+    name: str
+    arraysize: int
+    prefetchrows: int
+    lobs_inline: bool = False   # fetch CLOB/BLOB as str/bytes, not LOB locators
+    call_timeout: int = 0       # time budget per database call in ms (0: none)
+
+
+def _budget(profile, default_ms):
+    """Time budget of a profile in ms: QUERY_BUDGET_<PROFILE>_MS or the default"""
+    return int(os.getenv(f"QUERY_BUDGET_{profile.upper()}_MS", default_ms))
+
+
+FETCH_PROFILES = {
+    # One row (COUNT(*), ROWNUM = 1 lookups): the row comes back with the
+    # execute and the extra prefetch slot tells the driver there is no more
+    "scalar": FetchProfile("scalar", arraysize=1, prefetchrows=2, call_timeout=_budget("scalar", 15_000)),
+    # Filter option lists and top-N tables: a few hundred rows at most
+    "lookup": FetchProfile("lookup", arraysize=500, prefetchrows=501, call_timeout=_budget("lookup", 30_000)),
+    # Row-level pulls (registers, census windows, patient lists)
+    "bulk": FetchProfile("bulk", arraysize=5000, prefetchrows=5000, call_timeout=_budget("bulk", 120_000)),
+    # Rows carrying CLOB/BLOB columns: LOB data is fetched inline with the row
+    # instead of one extra round trip per locator read
+    "lob": FetchProfile("lob", arraysize=100, prefetchrows=100, lobs_inline=True,
+                        call_timeout=_budget("lob", 60_000)),
+}
+
+# budget of queries without a profile (driver fetch defaults)
+DEFAULT_CALL_TIMEOUT = _budget("default", 60_000)
+
+# Streaming fetches: rows per chunk, and the most one fetched frame may hold
+STREAM_CHUNK_ROWS = int(os.getenv("STREAM_CHUNK_ROWS", "20000"))
+FRAME_CAP = int(float(os.getenv("FRAME_CAP_MB", "512")) * 1024 * 1024)
+
+
+class FrameTooLarge(Exception):
+    """A streamed frame passed its memory cap; the caller should ask for a narrower range"""
+
+    def __init__(self, name, max_bytes, rows):
+        super().__init__(f"'{name}' needs more than {max_bytes / (1024 * 1024):,.0f} MB "
+                         f"(stopped after {rows:,} rows)")
+        self.name = name
+        self.max_bytes = max_bytes
+        self.rows = rows
+
+
+def get_profile(profile):
+    """Resolve a profile name (or FetchProfile, or None for driver defaults)"""
+    if profile is None or isinstance(profile, FetchProfile):
+        return profile
+    try:
+        return FETCH_PROFILES[profile]
+    except KeyError:
+        raise ValueError(f"Unknown fetch profile '{profile}'. Available: {', '.join(FETCH_PROFILES)}")
+
+
+def _inline_lobs(cursor, metadata):
+    if oracledb is None:
+        return None
+    if metadata.type_code is oracledb.DB_TYPE_CLOB:
+        return cursor.var(oracledb.DB_TYPE_LONG, arraysize=cursor.arraysize)
+    if metadata.type_code is oracledb.DB_TYPE_NCLOB:
+        return cursor.var(oracledb.DB_TYPE_LONG_NVARCHAR, arraysize=cursor.arraysize)
+    if metadata.type_code is oracledb.DB_TYPE_BLOB:
+        return cursor.var(oracledb.DB_TYPE_LONG_RAW, arraysize=cursor.arraysize)
+    return None
+
+
+def configure_cursor(cur, profile):
+    """Apply a FetchProfile to a DB-API cursor (before execute)"""
+    cur.arraysize = profile.arraysize
+    if hasattr(cur, "prefetchrows"):
+        cur.prefetchrows = profile.prefetchrows
+    if profile.lobs_inline and hasattr(cur, "outputtypehandler"):
+        cur.outputtypehandler = _inline_lobs
+    return cur
+
+
+@contextmanager
+def call_budget(conn, ms):
+    """Set the connection's call_timeout (ms) for the block, then restore it"""
+    previous = getattr(conn, "call_timeout", None)
+    if previous is None or previous == ms:
+        yield
+        return
+    conn.call_timeout = ms
+    try:
+        yield
+    finally:
+        try:
+            conn.call_timeout = previous
+        except Exception:
+            pass   # connection broken by the timeout; the pool drops it
+
+
+def as_categorical(df, columns):
+    """df with the given columns (those present) as categorical dtype"""
+    present = [c for c in columns if c in df.columns]
+    return df.astype({c: "category" for c in present}) if present else df
+
+
+def concat_frames(frames):
+    """
+    pd.concat keeping categorical columns categorical: categories are merged
+    first (plain concat falls back to object when they differ)
+    """
+    frames = [f for f in frames if f is not None]
+    if len(frames) <= 1:
+        return frames[0].reset_index(drop=True) if frames else pd.DataFrame()
+    shared = [c for c in frames[0].columns
+              if all(c in f.columns and isinstance(f[c].dtype, pd.CategoricalDtype) for f in frames)]
+    if shared:
+        union = {c: pd.api.types.union_categoricals([f[c] for f in frames], ignore_order=True).categories
+                 for c in shared}
+        frames = [f.assign(**{c: f[c].cat.set_categories(union[c]) for c in shared}) for f in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
+def fetch_frame(sql, conn, params=None, profile=None, categorical=None, max_bytes=None, name="query"):
+    """
+    Execute on a tuned cursor and build the DataFrame the way pandas.read_sql
+    does; with categorical or max_bytes, stream results longer than one chunk
+    (see read_sql)
+    """
+    profile = get_profile(profile)
+    if profile is None and not (categorical or max_bytes):
+        return pd.read_sql(sql, conn, params=params)
+
+    cur = conn.cursor()
+    if profile is not None:
+        configure_cursor(cur, profile)
+    try:
+        if params:
+            cur.execute(sql, params)
+        else:
+            cur.execute(sql)
+        columns = [d[0] for d in cur.description]
+        if not (categorical or max_bytes):
+            return pd.DataFrame.from_records(cur.fetchall(), columns=columns, coerce_float=True)
+
+        batch = cur.fetchmany(STREAM_CHUNK_ROWS)
+        if len(batch) < STREAM_CHUNK_ROWS:
+            # the whole result in one chunk: small enough to keep as fetched
+            return pd.DataFrame.from_records(batch, columns=columns, coerce_float=True)
+
+        chunks, rows, size = [], 0, 0
+        while batch:
+            chunk = as_categorical(pd.DataFrame.from_records(batch, columns=columns, coerce_float=True),
+                                   categorical or ())
+            del batch
+            chunks.append(chunk)
+            rows += len(chunk)
+            size += frame_bytes(chunk, deep=True) or 0
+            if max_bytes and size > max_bytes:
+                raise FrameTooLarge(name, max_bytes, rows)
+            batch = cur.fetchmany(STREAM_CHUNK_ROWS)
+    finally:
+        cur.close()
+    return concat_frames(chunks)
+
+
+def frame_bytes(df, deep=False):
+    """In-memory size of a fetched frame (shallow; deep=True counts string contents too)"""
+    try:
+        return int(df.memory_usage(index=False, deep=deep).sum())
+    except Exception:
+        return None
+
+
+def read_sql(sql, conn, params=None, *, name, profile=None, categorical=None, max_bytes=None):
+    """
+    pandas.read_sql with per-query instrumentation under `name`.
+    `profile` is one of FETCH_PROFILES ("scalar", "lookup", "bulk", "lob");
+    None keeps the driver defaults. Raises QueryTimeout past the profile's
+    time budget and QueryCancelled when the page run was replaced.
+
+    With `categorical` (column names) or `max_bytes`, a result longer than
+    STREAM_CHUNK_ROWS is streamed in chunks of that size, those columns
+    become categorical as each chunk arrives, and FrameTooLarge is raised
+    once the frame passes max_bytes.
+    """
+    resolved = get_profile(profile)
+    budget = resolved.call_timeout if resolved else DEFAULT_CALL_TIMEOUT
+
+    def execute():
+        with timed(name) as t, get_query_watch().track(conn) as tracked, call_budget(conn, budget):
+            try:
+                df = fetch_frame(sql, conn, params=params, profile=resolved, categorical=categorical,
+                                 max_bytes=max_bytes, name=name)
+            except Exception as e:
+                stopped = interruption(e, name, budget, cancelled=tracked is not None and tracked.cancelled)
+                if stopped is None:
+                    raise
+                raise stopped from e
+            t.rows = len(df)
+            t.bytes = frame_bytes(df)
+        return df
+
+    if not singleflight.ENABLED:
+        return execute()
+    start = time.perf_counter()
+    key = query_key(sql, conn, params, profile) + (tuple(categorical or ()), max_bytes)
+    df, shared = singleflight.get_single_flight().do(key, execute)
+    if not shared:
+        return df
+    record_cache(f"{name} (in flight)", hit=True, elapsed_ms=(time.perf_counter() - start) * 1000)
+    # each caller gets its own data: pandas before 3.0 has no copy-on-write, so a
+    # shallow copy would let one session's in-place edit show in the others'
+    return df.copy()
+
+
+def query_key(sql, conn, params=None, profile=None):
+    """Identity of a query for coalescing: database, SQL text, binds and fetch profile"""
+    if isinstance(params, dict):
+        binds = tuple(sorted((k, repr(v)) for k, v in params.items()))
+    else:
+        binds = tuple(repr(v) for v in params or ())
+    profile = get_profile(profile)
+    return source_id(conn), sql, binds, profile.name if profile else None
+
+
+def is_standin(conn):
+    """True for connections to the SQLite stand-in (sssihms.standin)"""
+    return bool(getattr(conn, "source_path", None))
+
+
+def source_id(conn):
+    """
+    Identifies the database behind a connection, so process-wide result
+    caches never serve one database's rows for another
+    """
+    if is_standin(conn):
+        return f"standin:{conn.source_path}@{getattr(conn, 'source_version', 0)}"
+    return f"oracle:{getattr(conn, 'username', '')}@{getattr(conn, 'dsn', '')}"
+
+
+def create_pool():
+    """
+    Session pool for dashboard queries: the stand-in database's pool with
+    STANDIN_DB set, else an oracledb pool sized by DB_POOL_MIN/MAX/INCREMENT
+    """
+    pool_min = int(os.getenv("DB_POOL_MIN", "2"))
+    pool_max = int(os.getenv("DB_POOL_MAX", "10"))
+    if os.getenv("STANDIN_DB"):
+        # Offline runs against the synthetic stand-in database (sssihms.synthetic)
+        from sssihms.standin import StandInPool
+        return StandInPool(os.getenv("STANDIN_DB"), max=pool_max)
+    init_oracle_client()
+    return oracledb.create_pool(
+        user=os.getenv("DB_USER", "hisapp"),
+        password=os.getenv("DB_PASSWORD", "his@2025"),
+        dsn=os.getenv("DB_DSN", "192.168.21.6:1521/hisdb"),
+        min=pool_min,
+        max=pool_max,
+        increment=int(os.getenv("DB_POOL_INCREMENT", "1")),
+        getmode=oracledb.POOL_GETMODE_WAIT,
+        stmtcachesize=int(os.getenv("DB_STMT_CACHE_SIZE", "40"))
+    )
+
+
+def acquire(pool, name="pool.acquire"):
+    """pool.acquire() with the time spent waiting for a session recorded"""
+    start = time.perf_counter()
+    conn = pool.acquire()
+    record_pool_wait(name, (time.perf_counter() - start) * 1000)
+    return conn
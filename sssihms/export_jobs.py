@@ -0,0 +1,151 @@
+"""
+Deferred export jobs
+
+Download buttons used to serialize CSV/Excel bytes on every rerun, whether or
+not anybody clicked. Exports are now jobs: nothing is built until the user asks
+for the file, the work runs on a small background pool, and the finished
+artifact is cached by (dataset, filters, format) so the next request for the
+same export (from any session) is served immediately.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+MIME_TYPES = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "pdf": "application/pdf",
+    "zip": "application/zip",
+}
+
+
+def export_key(dataset, filters, fmt):
+    """Stable cache key for one export artifact"""
+    payload = json.dumps({"dataset": dataset, "filters": filters or {}, "format": fmt},
+                         sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class ExportJob:
+    key: str
+    dataset: str
+    fmt: str
+    status: str = PENDING
+    data: bytes = None
+    error: str = None
+    submitted_at: float = field(default_factory=time.time)
+    finished_at: float = None
+    _done: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def size(self):
+        return len(self.data) if self.data else 0
+
+    @property
+    def mime(self):
+        return MIME_TYPES.get(self.fmt, "application/octet-stream")
+
+    def wait(self, timeout=None):
+        """Block until the job finishes (or timeout); returns True if finished"""
+        return self._done.wait(timeout)
+
+
+class ExportJobManager:
+    """Background builder + bounded LRU cache of finished export artifacts"""
+
+    def __init__(self, max_workers=2, max_bytes=256 * 1024 * 1024, ttl_seconds=900):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="export")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expired(self, job):
+        return job.finished_at is not None and time.time() - job.finished_at > self.ttl_seconds
+
+    def _evict(self):
+        """Drop expired/failed jobs, then oldest finished ones until under max_bytes"""
+        for key in [k for k, j in self._jobs.items() if self._expired(j)]:
+            del self._jobs[key]
+        total = sum(j.size for j in self._jobs.values())
+        for key in list(self._jobs):
+            if total <= self.max_bytes:
+                break
+            job = self._jobs[key]
+            if job.status in (DONE, FAILED):
+                total -= job.size
+                del self._jobs[key]
+
+    def get(self, key):
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None or self._expired(job):
+                self._jobs.pop(key, None)
+                return None
+            self._jobs.move_to_end(key)
+            return job
+
+    def submit(self, dataset, filters, fmt, build):
+        """
+        Start building an export unless it is already cached or in flight.
+        `build` is a zero-argument callable returning bytes.
+        """
+        key = export_key(dataset, filters, fmt)
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and job.status != FAILED and not self._expired(job):
+                self._jobs.move_to_end(key)
+                return job
+            job = self._jobs[key] = ExportJob(key=key, dataset=dataset, fmt=fmt)
+            self._evict()
+
+        self._executor.submit(self._run, job, build)
+        return job
+
+    def _run(self, job, build):
+        job.status = RUNNING
+        try:
+            data = build()
+            if hasattr(data, "read"):
+                data = data.read()
+            job.data = data
+            job.status = DONE
+        except Exception as e:
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+            job._done.set()
+            with self._lock:
+                self._evict()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "jobs": len(self._jobs),
+                "bytes": sum(j.size for j in self._jobs.values()),
+                "running": sum(1 for j in self._jobs.values() if j.status in (PENDING, RUNNING)),
+            }
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_export_manager():
+    """Process-wide export manager shared by all sessions"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = ExportJobManager()
+        return _manager
@@ -0,0 +1,211 @@
+"""
+Query and page instrumentation
+
+Every database call is given a name and recorded as an event with elapsed
+time, rows, fetched bytes, pool wait and cache hit/miss. Events are:
+  - written as one JSON object per line to the `sssihms.perf` logger
+    (set PERF_LOG_FILE to also append them to a file), and
+  - kept in a bounded in-process ring buffer that the admin Performance page
+    aggregates into p50/p95/p99 per query name and per page.
+
+Streamlit runs every session in the same process, so the buffer covers all
+users of this server.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+
+QUERY = "query"
+PAGE = "page"
+POOL = "pool"
+CACHE = "cache"
+
+logger = logging.getLogger("sssihms.perf")
+
+_log_file = os.getenv("PERF_LOG_FILE")
+if _log_file and not logger.handlers:
+    _handler = logging.FileHandler(_log_file, encoding="utf-8")
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+
+
+@dataclass
+class PerfEvent:
+    kind: str
+    name: str
+    ts: float
+    elapsed_ms: float = 0.0
+    rows: int = None
+    bytes: int = None
+    pool_wait_ms: float = None
+    cache: str = None          # "hit" / "miss"
+    error: str = None
+    page: str = None
+    user: str = None
+
+
+# Per-thread context: Streamlit runs each session's script on its own thread
+_context = threading.local()
+
+
+def set_context(page=None, user=None):
+    """Tag subsequent events from this thread with the page and user"""
+    _context.page = page
+    _context.user = user
+
+
+def _ctx(attr):
+    return getattr(_context, attr, None)
+
+
+class Recorder:
+    """Bounded ring buffer of PerfEvents with percentile summaries"""
+
+    def __init__(self, maxlen=50000):
+        self._events = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def record(self, event):
+        if event.page is None:
+            event.page = _ctx("page")
+        if event.user is None:
+            event.user = _ctx("user")
+        with self._lock:
+            self._events.append(event)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({k: v for k, v in asdict(event).items() if v is not None}, default=str))
+        return event
+
+    def events(self, window_seconds=3600, kind=None):
+        cutoff = time.time() - window_seconds
+        with self._lock:
+            snapshot = list(self._events)
+        return [e for e in snapshot if e.ts >= cutoff and (kind is None or e.kind == kind)]
+
+    def summary(self, kind=QUERY, window_seconds=3600, by="name"):
+        """
+        Aggregate events into one row per `by` key (name or page), sorted by p95
+        descending: count, p50/p95/p99/max ms, rows, bytes, pool wait, cache hit ratio, errors.
+        """
+        groups = {}
+        for e in self.events(window_seconds, kind):
+            groups.setdefault(getattr(e, by) or "-", []).append(e)
+
+        rows = []
+        for key, evs in groups.items():
+            times = sorted(e.elapsed_ms for e in evs)
+            cache_evs = [e for e in evs if e.cache]
+            pool_waits = [e.pool_wait_ms for e in evs if e.pool_wait_ms is not None]
+            rows.append({
+                by: key,
+                "count": len(evs),
+                "p50_ms": percentile(times, 50),
+                "p95_ms": percentile(times, 95),
+                "p99_ms": percentile(times, 99),
+                "max_ms": times[-1],
+                "total_ms": sum(times),
+                "avg_rows": _avg([e.rows for e in evs if e.rows is not None]),
+                "total_bytes": sum(e.bytes or 0 for e in evs),
+                "avg_pool_wait_ms": _avg(pool_waits),
+                "cache_hit_ratio": (sum(1 for e in cache_evs if e.cache == "hit") / len(cache_evs)) if cache_evs else None,
+                "errors": sum(1 for e in evs if e.error),
+            })
+        rows.sort(key=lambda r: r["p95_ms"], reverse=True)
+        return rows
+
+    def clear(self):
+        with self._lock:
+            self._events.clear()
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))  # ceil
+    return sorted_values[int(rank) - 1]
+
+
+def _avg(values):
+    return (sum(values) / len(values)) if values else None
+
+
+recorder = Recorder()
+
+
+# -------------------------
+# Recording helpers
+# -------------------------
+class _Timing:
+    """Mutable handle yielded by timed(); set rows/bytes/cache before exit"""
+
+    def __init__(self):
+        self.rows = None
+        self.bytes = None
+        self.cache = None
+        self.pool_wait_ms = None
+
+
+@contextmanager
+def timed(name, kind=QUERY):
+    """
+    Time a block and record it:
+
+        with timed("admin.fetch_all_staff") as t:
+            cur.execute(...)
+            rows = cur.fetchall()
+            t.rows = len(rows)
+    """
+    handle = _Timing()
+    start = time.perf_counter()
+    error = None
+    try:
+        yield handle
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"[:300]
+        raise
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if kind == POOL and handle.pool_wait_ms is None:
+            handle.pool_wait_ms = elapsed_ms
+        recorder.record(PerfEvent(
+            kind=kind,
+            name=name,
+            ts=time.time(),
+            elapsed_ms=elapsed_ms,
+            rows=handle.rows,
+            bytes=handle.bytes,
+            pool_wait_ms=handle.pool_wait_ms,
+            cache=handle.cache,
+            error=error,
+        ))
+
+
+def record_cache(name, hit, elapsed_ms=0.0):
+    """Record a cache lookup outcome for a named query/result"""
+    recorder.record(PerfEvent(kind=CACHE, name=name, ts=time.time(),
+                              elapsed_ms=elapsed_ms, cache="hit" if hit else "miss"))
+
+
+def record_pool_wait(name, wait_ms):
+    recorder.record(PerfEvent(kind=POOL, name=name, ts=time.time(),
+                              elapsed_ms=wait_ms, pool_wait_ms=wait_ms))
+
+
+class PageTimer:
+    """Measures one script run of a page; call finish() at the end of the script"""
+
+    def __init__(self, page, user=None):
+        self.page = page
+        self.start = time.perf_counter()
+        set_context(page=page, user=user)
+
+    def finish(self):
+        recorder.record(PerfEvent(kind=PAGE, name=self.page, ts=time.time(),
+                                  elapsed_ms=(time.perf_counter() - self.start) * 1000))
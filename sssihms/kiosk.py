@@ -0,0 +1,196 @@
+"""
+Kiosk snapshots: one refresher for every wall-mounted display
+
+Ward and OT displays show the same General KPIs and bed occupancy all day.
+Run as ordinary dashboard sessions, each display re-ran every query on its
+own timer, so database load grew with the number of screens. Here a single
+background thread per process computes one snapshot per hospital every
+KIOSK_REFRESH_SECONDS (default 60) and publishes it; displays (pages/kiosk.py)
+only read the latest published snapshot, which costs no query at all.
+
+A hospital is refreshed only while some display is subscribed to it: every
+read renews the subscription, and one not renewed for KIOSK_IDLE_SECONDS
+(default 300) lapses. The first subscriber for a hospital wakes the
+refresher so its snapshot appears without waiting a full interval. If a
+refresh fails, the previous snapshot stays published with the error noted.
+Only hospitals in the HOSPITALID list (re-read every KIOSK_IDLE_SECONDS) can
+be subscribed to, so made-up ?hospital= values never add refresh queries.
+"""
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime
+
+from sssihms import analytics, payloads
+from sssihms.db import acquire, create_pool
+from sssihms.instrumentation import set_context
+
+REFRESH_SECONDS = float(os.getenv("KIOSK_REFRESH_SECONDS", "60"))
+IDLE_SECONDS = float(os.getenv("KIOSK_IDLE_SECONDS", "300"))
+
+
+@dataclass
+class Snapshot:
+    hospital: str
+    version: int
+    computed_at: datetime
+    from_date: date
+    to_date: date
+    kpis: dict = field(default_factory=dict)
+    occupancy: dict = field(default_factory=dict)
+    error: str = None
+
+
+def build_snapshot(conn, hospital, today=None):
+    """(from_date, to_date, kpis, occupancy) for the month to date, as the dashboard opens"""
+    today = today or date.today()
+    f = payloads.Filters(from_date=date(today.year, today.month, 1), to_date=today, hospital=hospital)
+    kpis = payloads.kpis(conn, f)
+    if analytics.is_all_hospitals(hospital):
+        rate, avg_census, total_beds, _ = analytics.calculate_bed_occupancy(conn, f.from_date, f.to_date)
+    else:
+        # the hospital's own wards (BEDMASTER.HOSPITALID), as in the hospital comparison
+        occ = analytics.compare_occupancy(conn, f.from_date, f.to_date, hospitals=[hospital])
+        rate, avg_census, total_beds = (occ.iloc[0][["OCCUPANCY_RATE", "AVG_CENSUS", "TOTAL_BEDS"]]
+                                        if not occ.empty else (0.0, 0.0, 0))
+    occupancy = {
+        "occupancy_rate": payloads.plain(rate),
+        "avg_daily_census": payloads.plain(avg_census),
+        "total_beds": payloads.plain(total_beds),
+    }
+    return f.from_date, f.to_date, kpis, occupancy
+
+
+class SnapshotPublisher:
+    """Background refresher publishing per-hospital snapshots to any number of displays"""
+
+    def __init__(self, connect, refresh_seconds=REFRESH_SECONDS, idle_seconds=IDLE_SECONDS):
+        self._connect = connect
+        self.refresh_seconds = refresh_seconds
+        self.idle_seconds = idle_seconds
+        self._snapshots = {}       # hospital -> latest Snapshot
+        self._subscribers = {}     # hospital -> monotonic time of the last read
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._hospitals = None     # known HOSPITALIDs, and when they were read
+        self._hospitals_at = 0.0
+        self._counts = {"refreshes": 0, "failures": 0, "reads": 0}
+
+    def known_hospitals(self):
+        """HOSPITALIDs displays may subscribe to (read on first use, then every idle_seconds)"""
+        with self._lock:
+            if self._hospitals is not None and time.monotonic() - self._hospitals_at < self.idle_seconds:
+                return self._hospitals
+        try:
+            conn = self._connect()
+            try:
+                ids = analytics.load_hospitals(conn)["HOSPITALID"].dropna().astype(str)
+            finally:
+                conn.close()
+        except Exception:
+            if self._hospitals is None:
+                raise
+            return self._hospitals   # keep the last list until the database answers again
+        with self._lock:
+            self._hospitals, self._hospitals_at = frozenset(ids), time.monotonic()
+            return self._hospitals
+
+    def is_known(self, hospital):
+        return analytics.is_all_hospitals(hospital) or hospital in self.known_hospitals()
+
+    def latest(self, hospital):
+        """
+        The latest snapshot for hospital (None until the first one), renewing
+        the subscription. Raises ValueError for a hospital not in the HOSPITALID list.
+        """
+        if not self.is_known(hospital):
+            raise ValueError(f"Unknown hospital '{hospital}'")
+        with self._lock:
+            first = hospital not in self._subscribers
+            self._subscribers[hospital] = time.monotonic()
+            self._counts["reads"] += 1
+            snapshot = self._snapshots.get(hospital)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="kiosk-refresher", daemon=True)
+                self._thread.start()
+        if first:
+            self._wake.set()
+        return snapshot
+
+    def _active(self):
+        now = time.monotonic()
+        with self._lock:
+            for hospital in [h for h, seen in self._subscribers.items() if now - seen > self.idle_seconds]:
+                del self._subscribers[hospital]
+                self._snapshots.pop(hospital, None)
+            return list(self._subscribers)
+
+    def refresh(self, hospitals):
+        """Compute and publish snapshots for hospitals, on one connection"""
+        if not hospitals:
+            return
+        conn = self._connect()
+        try:
+            for hospital in hospitals:
+                self._refresh_one(conn, hospital)
+        finally:
+            conn.close()
+
+    def _refresh_one(self, conn, hospital):
+        with self._lock:
+            previous = self._snapshots.get(hospital)
+        version = previous.version + 1 if previous else 1
+        try:
+            from_date, to_date, kpis, occupancy = build_snapshot(conn, hospital)
+            snapshot = Snapshot(hospital, version, datetime.now(), from_date, to_date, kpis, occupancy)
+            outcome = "refreshes"
+        except Exception as e:
+            if previous is None:
+                snapshot = Snapshot(hospital, version, datetime.now(), None, None, error=str(e))
+            else:
+                snapshot = Snapshot(hospital, previous.version, previous.computed_at, previous.from_date,
+                                    previous.to_date, previous.kpis, previous.occupancy, error=str(e))
+            outcome = "failures"
+        with self._lock:
+            if hospital in self._subscribers:
+                self._snapshots[hospital] = snapshot
+            self._counts[outcome] += 1
+
+    def _run(self):
+        set_context(page="kiosk")
+        next_round = 0.0
+        while True:
+            self._wake.clear()
+            active = self._active()
+            if time.monotonic() >= next_round:
+                due = active
+                next_round = time.monotonic() + self.refresh_seconds
+            else:
+                # woken by a new subscriber: only hospitals without a snapshot yet
+                with self._lock:
+                    due = [h for h in active if h not in self._snapshots]
+            try:
+                self.refresh(due)
+            except Exception:
+                pass   # no connection this round; try again at the next one
+            self._wake.wait(max(0.0, next_round - time.monotonic()))
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counts, hospitals=len(self._subscribers))
+
+
+_publisher = None
+_publisher_lock = threading.Lock()
+
+
+def get_publisher():
+    """Process-wide publisher shared by every kiosk session (on its own session pool)"""
+    global _publisher
+    with _publisher_lock:
+        if _publisher is None:
+            pool = create_pool()
+            _publisher = SnapshotPublisher(lambda: acquire(pool, "kiosk.acquire"))
+        return _publisher
@@ -0,0 +1,208 @@
+"""
+Compiled custom-metric registry
+
+Custom metric queries are written with `{from_date}`, `{to_date}`, `{hospital}`
+and `{dept}` placeholders. Instead of pasting filter values into the SQL text
+(a new statement for every filter combination), each query is compiled once
+into Oracle named bind variables, so the statement text stays stable and the
+driver's statement cache can reuse it.
+
+The registry keeps the parsed definitions in memory and only reloads them when
+its source reports a change: the metric store's revision counter, or the
+modification time/size of a plain saved_metrics.json file.
+"""
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+
+# Placeholder name -> description shown in the UI
+KNOWN_PLACEHOLDERS = {
+    "from_date": "Start date from filters (YYYY-MM-DD)",
+    "to_date": "End date from filters (YYYY-MM-DD)",
+    "hospital": "Selected hospital",
+    "dept": "Selected department",
+}
+
+PLACEHOLDER_RE = re.compile(r"\{(\w+)\}")
+
+# String literals ('' escapes), line/block comments, or a bare placeholder
+_TOKEN_RE = re.compile(r"'(?:[^']|'')*'|--[^\n]*|/\*.*?\*/|\{(\w+)\}", re.S)
+
+
+@dataclass(frozen=True)
+class CompiledQuery:
+    """A metric query rewritten to use named bind variables"""
+    source: str
+    sql: str
+    bind_names: tuple = ()
+    unknown: tuple = ()
+
+    @property
+    def error(self):
+        if not self.unknown:
+            return None
+        names = ", ".join("{" + n + "}" for n in self.unknown)
+        return f"Unknown placeholder(s): {names}. Allowed: " + \
+            ", ".join("{" + n + "}" for n in KNOWN_PLACEHOLDERS)
+
+    def bind_values(self, from_date=None, to_date=None, hospital=None, dept=None):
+        """Build the bind dict for this statement (only the names it uses)"""
+        values = {
+            "from_date": from_date,
+            "to_date": to_date,
+            "hospital": hospital,
+            "dept": dept,
+        }
+        return {name: (str(values[name]) if values[name] else None) for name in self.bind_names}
+
+
+def _compile_literal(body, names, unknown):
+    """Split a string literal around its placeholders: 'a{x}b' -> 'a' || :x || 'b'"""
+    parts = PLACEHOLDER_RE.split(body)
+    if len(parts) == 1:
+        return f"'{body}'"
+
+    pieces = []
+    for idx, part in enumerate(parts):
+        if idx % 2 == 0:
+            if part:
+                pieces.append(f"'{part}'")
+        else:
+            pieces.append(_bind(part, names, unknown))
+    return " || ".join(pieces)
+
+
+def _bind(name, names, unknown):
+    if name not in KNOWN_PLACEHOLDERS:
+        if name not in unknown:
+            unknown.append(name)
+        return "{" + name + "}"
+    if name not in names:
+        names.append(name)
+    return f":{name}"
+
+
+@lru_cache(maxsize=256)
+def compile_query(query):
+    """Compile placeholder SQL into bind-variable SQL (cached by query text)"""
+    names = []
+    unknown = []
+
+    def replace(match):
+        token = match.group(0)
+        if match.group(1) is not None:
+            return _bind(match.group(1), names, unknown)
+        if token.startswith("'"):
+            return _compile_literal(token[1:-1], names, unknown)
+        return token  # comment
+
+    sql = _TOKEN_RE.sub(replace, query.strip().rstrip(";"))
+    return CompiledQuery(source=query, sql=sql, bind_names=tuple(names), unknown=tuple(unknown))
+
+
+def validate_query(query):
+    """Raise ValueError if the query uses placeholders we cannot bind"""
+    compiled = compile_query(query)
+    if compiled.unknown:
+        raise ValueError(compiled.error)
+    return compiled
+
+
+@dataclass
+class _Snapshot:
+    signature: object = None
+    definitions: dict = field(default_factory=dict)
+    compiled: dict = field(default_factory=dict)
+
+
+class JsonMetricSource:
+    """Registry source backed by a saved_metrics.json file"""
+
+    def __init__(self, metrics_file):
+        self.metrics_file = Path(metrics_file)
+        self.key = f"json:{self.metrics_file.resolve()}"
+
+    def signature(self):
+        try:
+            st = os.stat(self.metrics_file)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def load_definitions(self):
+        try:
+            with open(self.metrics_file, "r") as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+
+class MetricRegistry:
+    """
+    In-memory view of metric definitions, reloaded only when the source changes.
+    A source provides signature() (cheap change marker) and load_definitions().
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self._lock = threading.Lock()
+        self._snapshot = _Snapshot()
+
+    def _load(self, signature):
+        definitions = self.source.load_definitions()
+        compiled = {
+            metric_id: compile_query(metric_def.get("query", ""))
+            for metric_id, metric_def in definitions.items()
+        }
+        return _Snapshot(signature=signature, definitions=definitions, compiled=compiled)
+
+    def refresh(self):
+        """Reload if the source changed; returns the current snapshot"""
+        signature = self.source.signature()
+        snapshot = self._snapshot
+        if signature == snapshot.signature:
+            return snapshot
+
+        with self._lock:
+            if signature != self._snapshot.signature:
+                self._snapshot = self._load(signature)
+            return self._snapshot
+
+    def invalidate(self):
+        """Force a reload on next access (e.g. right after a write)"""
+        with self._lock:
+            self._snapshot = _Snapshot(signature=object())
+
+    def definitions(self):
+        """Return {metric_id: metric_def} (shallow copy, safe to mutate)"""
+        return dict(self.refresh().definitions)
+
+    def compiled(self, metric_id):
+        return self.refresh().compiled.get(metric_id)
+
+    def errors(self):
+        """Return {metric_id: message} for metrics with invalid placeholders"""
+        return {
+            metric_id: cq.error
+            for metric_id, cq in self.refresh().compiled.items()
+            if cq.unknown
+        }
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(source):
+    """Process-wide registry per source (shared by all sessions)"""
+    if isinstance(source, (str, Path)):
+        source = JsonMetricSource(source)
+    with _registries_lock:
+        registry = _registries.get(source.key)
+        if registry is None:
+            registry = _registries[source.key] = MetricRegistry(source)
+        return registry
@@ -0,0 +1,397 @@
+"""
+Transactional storage for custom metric definitions
+
+Definitions live in an embedded SQLite database (custom_metrics/metrics.db).
+Each save is a single-row upsert inside its own IMMEDIATE transaction, so two
+admins saving different metrics at the same time never overwrite each other,
+and saving the same metric with a stale version is rejected instead of lost.
+
+Every change is kept in metric_versions, metrics are indexed by owner and tag,
+and a store-wide revision counter lets readers (MetricRegistry) reload only
+when something actually changed.
+
+saved_metrics.json stays as the import/export format: it is imported once on
+first use and can be exported/imported from the Manage tab.
+"""
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime
+from pathlib import Path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS metrics (
+    metric_id    TEXT PRIMARY KEY,
+    name         TEXT NOT NULL,
+    metric_type  TEXT NOT NULL DEFAULT 'single_value',
+    owner        TEXT,
+    version      INTEGER NOT NULL,
+    definition   TEXT NOT NULL,
+    created_date TEXT,
+    updated_date TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_metrics_owner ON metrics(owner);
+
+CREATE TABLE IF NOT EXISTS metric_tags (
+    metric_id TEXT NOT NULL REFERENCES metrics(metric_id) ON DELETE CASCADE,
+    tag       TEXT NOT NULL,
+    PRIMARY KEY (metric_id, tag)
+);
+CREATE INDEX IF NOT EXISTS idx_metric_tags_tag ON metric_tags(tag);
+
+CREATE TABLE IF NOT EXISTS metric_versions (
+    metric_id  TEXT NOT NULL,
+    version    INTEGER NOT NULL,
+    definition TEXT,
+    saved_by   TEXT,
+    saved_at   TEXT NOT NULL,
+    action     TEXT NOT NULL,
+    PRIMARY KEY (metric_id, version)
+);
+
+CREATE TABLE IF NOT EXISTS store_meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Keys kept in their own columns/tables rather than in the definition JSON
+_STORE_KEYS = ("version", "owner", "tags")
+
+
+class MetricConflictError(Exception):
+    """Raised when a metric was changed by someone else since it was loaded"""
+
+
+class MetricSeedError(Exception):
+    """Raised when the legacy saved_metrics.json could not be imported (retried on the next open)"""
+
+
+def metric_id_for(name):
+    return name.lower().replace(' ', '_')
+
+
+def check_import(source):
+    """Raise ValueError unless source is a saved_metrics.json layout: {metric_id: {"name": ..., ...}}"""
+    if not isinstance(source, dict):
+        raise ValueError(f"expected an object of metrics by id, got {type(source).__name__}")
+    for metric_id, metric_def in source.items():
+        if not isinstance(metric_def, dict):
+            raise ValueError(f"metric '{metric_id}' is not an object")
+        if not isinstance(metric_def.get("name"), str) or not metric_def["name"].strip():
+            raise ValueError(f"metric '{metric_id}' has no name")
+
+
+def normalize_tags(tags):
+    if not tags:
+        return []
+    if isinstance(tags, str):
+        tags = tags.split(",")
+    return sorted({t.strip().lower() for t in tags if t and t.strip()})
+
+
+class MetricStore:
+    """SQLite-backed metric definitions with versioning and owner/tag indexes"""
+
+    def __init__(self, db_path, seed_json=None):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.key = f"sqlite:{self.db_path.resolve()}"
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+        if seed_json is not None:
+            self._seed_from_json(seed_json)
+
+    # -------------------------
+    # Connections / transactions
+    # -------------------------
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=15, isolation_level=None)
+        conn.execute("PRAGMA foreign_keys=ON")
+        return _Closing(conn)
+
+    def _bump_revision(self, conn):
+        conn.execute(
+            "INSERT INTO store_meta(key, value) VALUES('revision', '1') "
+            "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+        )
+
+    # -------------------------
+    # Registry source protocol
+    # -------------------------
+    def signature(self):
+        """Cheap change marker: bumps on every committed write"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM store_meta WHERE key = 'revision'").fetchone()
+        return int(row[0]) if row else 0
+
+    def load_definitions(self):
+        """Return {metric_id: metric_def} with version/owner/tags filled in"""
+        return {m["metric_id"]: m["definition"] for m in self._select()}
+
+    # -------------------------
+    # Queries
+    # -------------------------
+    def _select(self, where="1=1", params=()):
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT m.metric_id, m.owner, m.version, m.definition, "
+                "       (SELECT GROUP_CONCAT(t.tag, ',') FROM metric_tags t WHERE t.metric_id = m.metric_id) "
+                f"FROM metrics m WHERE {where} ORDER BY m.name",
+                params,
+            ).fetchall()
+
+        result = []
+        for metric_id, owner, version, definition, tags in rows:
+            metric_def = json.loads(definition)
+            metric_def["version"] = version
+            metric_def["owner"] = owner
+            metric_def["tags"] = sorted(tags.split(",")) if tags else []
+            result.append({"metric_id": metric_id, "definition": metric_def})
+        return result
+
+    def get(self, metric_id):
+        rows = self._select("m.metric_id = ?", (metric_id,))
+        return rows[0]["definition"] if rows else None
+
+    def list(self, tag=None, owner=None):
+        """Return {metric_id: metric_def}, optionally filtered by tag and/or owner"""
+        clauses, params = [], []
+        if tag:
+            clauses.append("m.metric_id IN (SELECT metric_id FROM metric_tags WHERE tag = ?)")
+            params.append(tag.strip().lower())
+        if owner:
+            clauses.append("m.owner = ?")
+            params.append(owner)
+        where = " AND ".join(clauses) if clauses else "1=1"
+        return {m["metric_id"]: m["definition"] for m in self._select(where, params)}
+
+    def tags(self):
+        with self._connect() as conn:
+            return [r[0] for r in conn.execute("SELECT DISTINCT tag FROM metric_tags ORDER BY tag")]
+
+    def owners(self):
+        with self._connect() as conn:
+            return [r[0] for r in conn.execute(
+                "SELECT DISTINCT owner FROM metrics WHERE owner IS NOT NULL ORDER BY owner"
+            )]
+
+    def history(self, metric_id):
+        """Return all saved versions of a metric, newest first"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT version, action, saved_by, saved_at, definition FROM metric_versions "
+                "WHERE metric_id = ? ORDER BY version DESC",
+                (metric_id,),
+            ).fetchall()
+        return [
+            {
+                "version": version,
+                "action": action,
+                "saved_by": saved_by,
+                "saved_at": saved_at,
+                "definition": json.loads(definition) if definition else None,
+            }
+            for version, action, saved_by, saved_at, definition in rows
+        ]
+
+    # -------------------------
+    # Writes
+    # -------------------------
+    def upsert(self, metric_def, owner=None, expected_version=None, metric_id=None, create=False):
+        """
+        Insert or update one metric atomically; returns (metric_id, version).
+        If expected_version is given and the stored version differs, or
+        create is set and the metric already exists, raises
+        MetricConflictError instead of overwriting the other admin's change.
+        """
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                saved = self._write(conn, metric_def, owner, expected_version, metric_id, create)
+                self._bump_revision(conn)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return saved
+
+    def _write(self, conn, metric_def, owner=None, expected_version=None, metric_id=None, create=False):
+        """upsert() inside the caller's transaction"""
+        metric_id = metric_id or metric_id_for(metric_def["name"])
+        tags = normalize_tags(metric_def.get("tags"))
+        definition = {k: v for k, v in metric_def.items() if k not in _STORE_KEYS}
+        payload = json.dumps(definition, ensure_ascii=False)
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+        row = conn.execute(
+            "SELECT version, owner FROM metrics WHERE metric_id = ?", (metric_id,)
+        ).fetchone()
+        current_version = row[0] if row else None
+        if create and row is not None:
+            raise MetricConflictError(
+                f"A metric '{metric_id}' already exists (owner {row[1] or 'unknown'}). "
+                "Choose another name, or edit that metric instead."
+            )
+        if expected_version is not None and current_version != expected_version:
+            raise MetricConflictError(
+                f"Metric '{metric_id}' was changed by someone else "
+                f"(version {current_version}, you edited {expected_version}). Reload and retry."
+            )
+
+        last = conn.execute(
+            "SELECT MAX(version) FROM metric_versions WHERE metric_id = ?", (metric_id,)
+        ).fetchone()[0]
+        version = (last or 0) + 1
+        stored_owner = owner or (row[1] if row else None)
+
+        conn.execute(
+            "INSERT INTO metrics(metric_id, name, metric_type, owner, version, definition, created_date, updated_date) "
+            "VALUES(?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(metric_id) DO UPDATE SET name = excluded.name, metric_type = excluded.metric_type, "
+            "owner = excluded.owner, version = excluded.version, definition = excluded.definition, "
+            "updated_date = excluded.updated_date",
+            (metric_id, definition["name"], definition.get("type", "single_value"), stored_owner,
+             version, payload, definition.get("created_date", now), now),
+        )
+        if "tags" in metric_def or row is None:
+            conn.execute("DELETE FROM metric_tags WHERE metric_id = ?", (metric_id,))
+            conn.executemany(
+                "INSERT INTO metric_tags(metric_id, tag) VALUES(?, ?)",
+                [(metric_id, tag) for tag in tags],
+            )
+        conn.execute(
+            "INSERT INTO metric_versions(metric_id, version, definition, saved_by, saved_at, action) "
+            "VALUES(?, ?, ?, ?, ?, ?)",
+            (metric_id, version, payload, owner, now, "update" if row else "create"),
+        )
+        return metric_id, version
+
+    def delete(self, metric_id, deleted_by=None, expected_version=None):
+        """Delete one metric (history is kept); returns True if it existed"""
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT version FROM metrics WHERE metric_id = ?", (metric_id,)
+                ).fetchone()
+                if row is None:
+                    conn.execute("ROLLBACK")
+                    return False
+                if expected_version is not None and row[0] != expected_version:
+                    raise MetricConflictError(
+                        f"Metric '{metric_id}' was changed by someone else; reload before deleting."
+                    )
+                conn.execute("DELETE FROM metrics WHERE metric_id = ?", (metric_id,))
+                conn.execute(
+                    "INSERT INTO metric_versions(metric_id, version, definition, saved_by, saved_at, action) "
+                    "VALUES(?, ?, NULL, ?, ?, 'delete')",
+                    (metric_id, row[0] + 1, deleted_by, now),
+                )
+                self._bump_revision(conn)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return True
+
+    # -------------------------
+    # JSON import / export
+    # -------------------------
+    def import_json(self, source, owner=None, overwrite=True):
+        """
+        Import a saved_metrics.json-style dict or file in one transaction (all
+        metrics or none); returns number imported. Raises ValueError for a
+        malformed file.
+        """
+        if isinstance(source, (str, Path)):
+            with open(source, "r", encoding="utf-8") as f:
+                source = json.load(f)
+        check_import(source)
+
+        count = 0
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                existing = set() if overwrite else {r[0] for r in conn.execute("SELECT metric_id FROM metrics")}
+                for metric_id, metric_def in source.items():
+                    if metric_id in existing:
+                        continue
+                    self._write(conn, metric_def, owner=owner or metric_def.get("owner"), metric_id=metric_id)
+                    count += 1
+                if count:
+                    self._bump_revision(conn)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return count
+
+    def export_dict(self):
+        """Definitions in the saved_metrics.json layout"""
+        return self.load_definitions()
+
+    def export_json(self, path):
+        """Write saved_metrics.json atomically (temp file + rename)"""
+        path = Path(path)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self.export_dict(), f, indent=2)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        return path
+
+    def _seed_from_json(self, json_path):
+        """
+        One-time import of the legacy JSON file into the store. The store is
+        only marked seeded once the import succeeded; a failed import raises
+        MetricSeedError and is tried again the next time the store is opened.
+        """
+        json_path = Path(json_path)
+        with self._connect() as conn:
+            if conn.execute("SELECT 1 FROM store_meta WHERE key = 'seeded'").fetchone():
+                return
+        if json_path.exists():
+            try:
+                # ids already in the store are kept, so a repeated or concurrent seeding never overwrites edits
+                self.import_json(json_path, overwrite=False)
+            except (ValueError, OSError) as e:
+                raise MetricSeedError(f"Could not import saved metrics from {json_path}: {e}") from e
+        with self._connect() as conn:
+            conn.execute("INSERT OR IGNORE INTO store_meta(key, value) VALUES('seeded', ?)", (str(json_path),))
+
+
+class _Closing:
+    """Context manager that closes (not just commits) a sqlite3 connection"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self.conn
+
+    def __exit__(self, *exc):
+        self.conn.close()
+        return False
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(db_path, seed_json=None):
+    """Process-wide MetricStore per database file"""
+    key = str(Path(db_path).resolve())
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = MetricStore(db_path, seed_json=seed_json)
+        return store
@@ -0,0 +1,123 @@
+"""
+JSON-ready dashboard figures for consumers outside the Streamlit pages
+
+Each builder takes a connection and a Filters value and returns plain
+dicts/lists (no numpy scalars, dates as ISO strings), computed by the same
+sssihms.analytics functions the dashboard uses, so figures match the pages
+and come from the same day-partition cache (sssihms.daycache).
+"""
+import json
+from dataclasses import dataclass, asdict
+from datetime import date, timedelta
+
+from sssihms import analytics
+from sssihms.daycache import SETTLE_DAYS
+
+
+@dataclass(frozen=True)
+class Filters:
+    from_date: date
+    to_date: date
+    hospital: str = analytics.ALL_HOSPITALS
+    dept: str = analytics.ALL
+    ordering_dept: str = analytics.ALL
+    category: str = None
+    subcatg: str = None
+    surgeon: str = None
+
+    def as_dict(self):
+        return {k: (v.isoformat() if isinstance(v, date) else v) for k, v in asdict(self).items()}
+
+    def settled(self, today=None):
+        """True when every day in the range is past the settle window (its figures no longer change)"""
+        return self.to_date < (today or date.today()) - timedelta(days=SETTLE_DAYS)
+
+
+def plain(value):
+    """numpy scalar -> Python scalar (JSON-serialisable)"""
+    return value.item() if hasattr(value, "item") else value
+
+
+def records(df):
+    """DataFrame -> list of row dicts, dates as ISO strings"""
+    if df is None or df.empty:
+        return []
+    return json.loads(df.to_json(orient="records", date_format="iso"))
+
+
+def kpis(conn, f):
+    """General KPIs: patient counts, ALOS, mortality, readmission and morbidity rates"""
+    in_df = analytics.load_inpatients(conn, f.from_date, f.to_date, f.dept, hospital=f.hospital)
+    out_df = analytics.load_outpatients(conn, f.from_date, f.to_date, f.dept, hospital=f.hospital)
+    figures = analytics.inpatient_kpis(in_df, f.from_date, f.to_date)
+    return {
+        "inpatients": len(in_df),
+        "outpatients": len(out_df),
+        **{k: plain(v) for k, v in figures.items()},
+    }
+
+
+def occupancy(conn, f):
+    """
+    Bed occupancy with its daily series, and per department when no department
+    is selected. For one hospital, the figures of its own wards (as in the
+    hospital comparison) without the series; raises ValueError when a
+    department is selected too.
+    """
+    if not analytics.is_all_hospitals(f.hospital):
+        if not analytics.is_all(f.dept):
+            raise ValueError("occupancy is by hospital or by department, not both")
+        occ = analytics.compare_occupancy(conn, f.from_date, f.to_date, hospitals=[f.hospital])
+        row = occ.iloc[0] if not occ.empty else {"OCCUPANCY_RATE": 0.0, "AVG_CENSUS": 0.0, "TOTAL_BEDS": 0}
+        return {
+            "occupancy_rate": plain(row["OCCUPANCY_RATE"]),
+            "avg_daily_census": plain(row["AVG_CENSUS"]),
+            "total_beds": plain(row["TOTAL_BEDS"]),
+        }
+    rate, avg_census, total_beds, census_df = analytics.calculate_bed_occupancy(
+        conn, f.from_date, f.to_date, dept_name=f.dept)
+    daily = analytics.daily_occupancy(census_df, total_beds) if not census_df.empty else None
+    payload = {
+        "occupancy_rate": plain(rate),
+        "avg_daily_census": plain(avg_census),
+        "total_beds": plain(total_beds),
+        "daily": records(daily[["THEDATE", "DAILY_OCCUPANCY", "OCCUPANCY_PCT"]]) if daily is not None else [],
+    }
+    if analytics.is_all(f.dept):
+        payload["departments"] = records(
+            analytics.get_department_occupancy_breakdown(conn, f.from_date, f.to_date))
+    return payload
+
+
+def categories(conn, f):
+    """Category hierarchy: CATEGORY totals, SUBCATG of f.category, SUBCATGL2 of f.category/f.subcatg"""
+    if f.category and f.subcatg:
+        level, rows = 3, analytics.get_subcatgl2_metrics(
+            conn, f.category, f.subcatg, f.from_date, f.to_date, f.ordering_dept, hospital=f.hospital)
+    elif f.category:
+        level, rows = 2, analytics.get_subcatg_metrics(
+            conn, f.category, f.from_date, f.to_date, f.ordering_dept, hospital=f.hospital)
+    else:
+        level, rows = 1, analytics.get_category_metrics(
+            conn, f.from_date, f.to_date, analytics.ALL, f.ordering_dept, hospital=f.hospital)
+    return {"level": level, "rows": [{k: plain(v) for k, v in row.items()} for row in rows]}
+
+
+def states(conn, f):
+    """Patients per STATE over the months in the range"""
+    return {"rows": records(analytics.state_stats_aggregate(conn, f.from_date, f.to_date, hospital=f.hospital))}
+
+
+def surgery(conn, f):
+    """Surgery totals, daily average, most frequent type (and f.surgeon's share)"""
+    metrics = analytics.load_surgery_metrics(conn, f.from_date, f.to_date, f.dept, f.surgeon, hospital=f.hospital)
+    return {k: plain(v) for k, v in metrics.items()}
+
+
+BUILDERS = {
+    "kpis": kpis,
+    "occupancy": occupancy,
+    "categories": categories,
+    "states": states,
+    "surgery": surgery,
+}
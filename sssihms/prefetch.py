@@ -0,0 +1,99 @@
+"""
+Speculative prefetch of likely next views
+
+After a page renders, the views a user is most likely to open next can be
+computed in the background so the click finds their data already in the
+result caches (sssihms.daycache). Prefetch is strictly best effort:
+
+  - at most `max_workers` tasks run at once, each on its own pooled
+    connection, so prefetch never takes more than that many sessions;
+  - every batch gets a time budget; tasks still queued when it runs out are
+    dropped rather than started late;
+  - a task key queued, running or finished within `repeat_after` seconds is
+    not queued again, so reruns of the same page do not pile up work;
+  - failures are counted and otherwise ignored.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sssihms.instrumentation import set_context
+
+MAX_WORKERS = int(os.getenv("PREFETCH_WORKERS", "2"))
+BUDGET_SECONDS = float(os.getenv("PREFETCH_BUDGET_SECONDS", "10"))
+
+
+class Prefetcher:
+    """Small background pool for speculative cache warm-up tasks"""
+
+    def __init__(self, max_workers=MAX_WORKERS, budget_seconds=BUDGET_SECONDS, repeat_after=60.0,
+                 max_pending=32):
+        self.budget_seconds = budget_seconds
+        self.repeat_after = repeat_after
+        self.max_pending = max_pending
+        self.enabled = max_workers > 0
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="prefetch")
+        self._pending = set()      # keys queued or running
+        self._finished = {}        # key -> monotonic time it finished
+        self._counts = {"queued": 0, "done": 0, "expired": 0, "failed": 0}
+        self._lock = threading.Lock()
+
+    def deadline(self):
+        """Deadline for a batch submitted now"""
+        return time.monotonic() + self.budget_seconds
+
+    def submit(self, key, task, deadline):
+        """
+        Queue task() unless the same key is pending or recently done; returns
+        True when queued. The task is skipped if it has not started by deadline.
+        """
+        if not self.enabled:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            finished = self._finished.get(key)
+            if key in self._pending or (finished is not None and now - finished < self.repeat_after):
+                return False
+            if len(self._pending) >= self.max_pending:
+                return False
+            self._pending.add(key)
+            self._counts["queued"] += 1
+            if len(self._finished) > 1024:
+                self._finished = {k: t for k, t in self._finished.items() if now - t < self.repeat_after}
+        self._executor.submit(self._run, key, task, deadline)
+        return True
+
+    def _run(self, key, task, deadline):
+        outcome = "done"
+        try:
+            if time.monotonic() > deadline:
+                outcome = "expired"
+                return
+            set_context(page="prefetch")
+            task()
+        except Exception:
+            outcome = "failed"
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+                self._counts[outcome] += 1
+                if outcome == "done":
+                    self._finished[key] = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counts, pending=len(self._pending))
+
+
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+
+def get_prefetcher():
+    """Process-wide prefetcher shared by all sessions"""
+    global _prefetcher
+    with _prefetcher_lock:
+        if _prefetcher is None:
+            _prefetcher = Prefetcher()
+        return _prefetcher
@@ -0,0 +1,96 @@
+"""
+Single-flight coalescing of identical in-flight queries
+
+When a ward round starts, many users open the dashboard within seconds with
+the same defaults and fire the same queries before any cache is warm. Every
+read_sql() call (sssihms.db) goes through one process-wide SingleFlight keyed
+by database, SQL text, binds and fetch profile: the first caller executes
+the query, and callers arriving while it runs wait for that result instead
+of sending their own copy to the database. Nothing is kept once the query
+finishes; reusing results afterwards is the caches' job (sssihms.daycache,
+st.cache_data).
+
+If the query fails, every caller waiting on it gets the same exception.
+If it was cancelled because the page run that started it was replaced
+(sssihms.cancellation), the waiters start it again under a new leader; a
+waiter whose own run is replaced stops waiting.
+Set QUERY_COALESCE=0 to execute every call on its own.
+"""
+import copy
+import os
+import threading
+
+from sssihms.cancellation import POLL_SECONDS, QueryCancelled, current_superseded
+
+ENABLED = os.getenv("QUERY_COALESCE", "1") != "0"
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Runs one call per key at a time; concurrent callers of the same key share its outcome"""
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._counts = {"executed": 0, "joined": 0}
+
+    def do(self, key, fn):
+        """(fn() or the in-flight call's result for key, True when it was shared)"""
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight()
+                    self._counts["executed"] += 1
+                else:
+                    flight.waiters += 1
+                    self._counts["joined"] += 1
+            if leader:
+                break
+
+            superseded = current_superseded()
+            while not flight.done.wait(POLL_SECONDS):
+                if superseded is not None and superseded():
+                    raise QueryCancelled("a newer run of this page replaced it while waiting")
+            if isinstance(flight.error, QueryCancelled):
+                continue   # its leader's run was replaced, not ours: run it again
+            if flight.error is not None:
+                # a copy per waiter: raising one instance from many threads would splice their tracebacks
+                raise copy.copy(flight.error) from flight.error
+            return flight.result, True
+
+        try:
+            flight.result = fn()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result, False
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counts, in_flight=len(self._flights))
+
+
+_single_flight = None
+_single_flight_lock = threading.Lock()
+
+
+def get_single_flight():
+    """Process-wide SingleFlight shared by every session"""
+    global _single_flight
+    with _single_flight_lock:
+        if _single_flight is None:
+            _single_flight = SingleFlight()
+        return _single_flight
@@ -0,0 +1,302 @@
+"""
+STAFFMASTER queries for the admin panel
+
+The admin page used to pull every staff row on each rerun and fill a
+selectbox with every STAFFID. Here the grid is read one page at a time with
+keyset pagination: rows are ordered by STAFFID and a page starts after the
+last STAFFID of the previous one (`STAFFID > :after`), so every page is an
+index range scan on the primary key however deep the admin pages, instead
+of an OFFSET that re-reads the rows before it. Filters and the name prefix
+are bind variables, so each filter combination is one cached statement.
+
+For the name prefix on Oracle, an index on UPPER(STAFFNAME) keeps the
+type-ahead lookups off full scans:
+
+    CREATE INDEX STAFFMASTER_UNAME_IX ON STAFFMASTER (UPPER(STAFFNAME));
+
+Bulk operations (activate/deactivate/role change for many staff, CSV
+import) send all their rows as one executemany batch and commit once. Rows
+that fail do not stop the batch: Oracle reports them through batch errors,
+and each comes back in BulkResult.errors with its STAFFID or CSV line.
+"""
+import io
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+from sssihms.auth import hash_password
+from sssihms.db import read_sql, is_standin
+from sssihms.instrumentation import timed
+
+STAFF_COLUMNS = ["STAFFID", "STAFFNAME", "DEPTNAME", "DESIGNATION",
+                 "HOSPITALID", "DEPTCODE", "ATHMAID", "LOGINOK", "ACCESS_ROLE"]
+PAGE_SIZE = 50
+SEARCH_LIMIT = 20
+
+
+@dataclass(frozen=True)
+class StaffFilter:
+    """Grid filters; None (or "") leaves a column unfiltered"""
+    hospital: str = None
+    dept: str = None
+    role: str = None           # ACCESS_ROLE, 'A' or 'U'
+    loginok: str = None        # 'Y' or 'N'
+    name_prefix: str = None    # case-insensitive STAFFNAME prefix
+
+
+def staff_where(filters):
+    """(WHERE conditions, binds) for a StaffFilter"""
+    conditions, binds = ["1=1"], {}
+    for column, bind, value in (("HOSPITALID", "hosp", filters.hospital), ("DEPTNAME", "dept", filters.dept),
+                                ("ACCESS_ROLE", "role", filters.role), ("LOGINOK", "loginok", filters.loginok)):
+        if value:
+            conditions.append(f"{column} = :{bind}")
+            binds[bind] = value
+    if filters.name_prefix and filters.name_prefix.strip():
+        conditions.append("UPPER(STAFFNAME) LIKE :prefix ESCAPE '\\'")
+        binds["prefix"] = _like_prefix(filters.name_prefix)
+    return " AND ".join(conditions), binds
+
+
+def _like_prefix(text):
+    # a literal prefix: LIKE wildcards typed by the user match themselves
+    escaped = text.strip().upper().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped + "%"
+
+
+def fetch_staff_page(conn, filters=StaffFilter(), after=None, page_size=PAGE_SIZE):
+    """
+    (page, has_more): up to page_size staff rows with STAFFID > after in
+    STAFFID order, and whether more rows follow
+    """
+    where, binds = staff_where(filters)
+    if after is not None:
+        where += " AND STAFFID > :after"
+        binds["after"] = after
+    q = f"""
+        SELECT {", ".join(STAFF_COLUMNS)}
+        FROM STAFFMASTER
+        WHERE {where}
+        ORDER BY STAFFID
+        FETCH FIRST {int(page_size) + 1} ROWS ONLY
+    """
+    df = read_sql(q, conn, params=binds, name="admin.staff_page", profile="lookup")
+    return df.head(page_size), len(df) > page_size
+
+
+def count_staff(conn, filters=StaffFilter()):
+    """Staff rows matching the filters"""
+    where, binds = staff_where(filters)
+    q = f"SELECT COUNT(*) AS N FROM STAFFMASTER WHERE {where}"
+    return int(read_sql(q, conn, params=binds, name="admin.staff_count", profile="scalar").iloc[0, 0])
+
+
+def staff_filter_options(conn):
+    """{"hospitals": [...], "depts": [...]} for the grid's filter selectboxes"""
+    hospitals = read_sql("SELECT DISTINCT HOSPITALID FROM STAFFMASTER WHERE HOSPITALID IS NOT NULL "
+                         "ORDER BY HOSPITALID", conn, name="admin.staff_hospitals", profile="lookup")
+    depts = read_sql("SELECT DISTINCT DEPTNAME FROM STAFFMASTER WHERE DEPTNAME IS NOT NULL ORDER BY DEPTNAME",
+                     conn, name="admin.staff_depts", profile="lookup")
+    return {"hospitals": hospitals["HOSPITALID"].tolist(), "depts": depts["DEPTNAME"].tolist()}
+
+
+def search_staff(conn, text, limit=SEARCH_LIMIT):
+    """
+    Type-ahead lookup: staff whose STAFFID or name starts with `text`
+    (case-insensitive), exact STAFFID first, at most `limit` rows
+    """
+    if not text or not text.strip():
+        return pd.DataFrame(columns=STAFF_COLUMNS)
+    prefix = _like_prefix(text)
+    q = f"""
+        SELECT {", ".join(STAFF_COLUMNS)}
+        FROM STAFFMASTER
+        WHERE UPPER(STAFFID) LIKE :prefix ESCAPE '\\' OR UPPER(STAFFNAME) LIKE :prefix ESCAPE '\\'
+        ORDER BY CASE WHEN UPPER(STAFFID) = :exact THEN 0 ELSE 1 END, STAFFID
+        FETCH FIRST {int(limit)} ROWS ONLY
+    """
+    return read_sql(q, conn, params={"prefix": prefix, "exact": text.strip().upper()},
+                    name="admin.staff_search", profile="lookup")
+
+
+def fetch_staff(conn, staffid):
+    """One staff row as a dict, or None"""
+    q = f"SELECT {', '.join(STAFF_COLUMNS)} FROM STAFFMASTER WHERE STAFFID = :sid"
+    df = read_sql(q, conn, params={"sid": staffid}, name="admin.staff_row", profile="scalar")
+    return df.iloc[0].to_dict() if not df.empty else None
+
+
+def staff_ids(conn, filters=StaffFilter()):
+    """Every STAFFID matching the filters (for bulk actions on a whole filter)"""
+    where, binds = staff_where(filters)
+    q = f"SELECT STAFFID FROM STAFFMASTER WHERE {where} ORDER BY STAFFID"
+    return read_sql(q, conn, params=binds, name="admin.staff_ids", profile="bulk")["STAFFID"].tolist()
+
+
+# -------------------------
+# Bulk DML
+# -------------------------
+BULK_COLUMNS = {"LOGINOK": ("Y", "N"), "ACCESS_ROLE": ("A", "U")}
+
+CSV_COLUMNS = ["STAFFID", "STAFFNAME", "DEPTNAME", "DESIGNATION", "HOSPITALID",
+               "DEPTCODE", "ATHMAID", "PASSWORD", "LOGINOK", "ACCESS_ROLE"]
+CSV_REQUIRED = ["STAFFID", "STAFFNAME", "PASSWORD"]
+
+INSERT_SQL = """
+    INSERT INTO STAFFMASTER
+    (STAFFID, STAFFNAME, DEPTNAME, DESIGNATION, HOSPITALID,
+     DEPTCODE, ATHMAID, TXTPASSWD, LOGINOK, ACCESS_ROLE)
+    VALUES (:sid, :sname, :dname, :desig, :hid, :dcode, :ath, :pwd, :loginok, :acc_role)
+"""
+
+
+@dataclass
+class BulkResult:
+    operation: str
+    attempted: int
+    applied: int = 0
+    committed: bool = False
+    errors: list = field(default_factory=list)   # (STAFFID or "line N", message)
+
+    def error_frame(self):
+        return pd.DataFrame(self.errors, columns=["ROW", "ERROR"])
+
+
+def execute_batch(conn, sql, rows):
+    """
+    Run one DML statement for every bind dict in `rows` as a single batch.
+    Returns (rowcounts, {row index: error message}); nothing is committed.
+    """
+    cur = conn.cursor()
+    try:
+        if is_standin(conn):
+            # SQLite has no batch errors; rows run one by one in-process (no round trips)
+            counts, errors = [], {}
+            for i, row in enumerate(rows):
+                try:
+                    cur.execute(sql, row)
+                    counts.append(cur.rowcount)
+                except Exception as e:
+                    counts.append(0)
+                    errors[i] = str(e)
+            return counts, errors
+        cur.executemany(sql, rows, batcherrors=True, arraydmlrowcounts=True)
+        errors = {e.offset: e.message for e in cur.getbatcherrors()}
+        counts = cur.getarraydmlrowcounts()
+        return counts, errors
+    finally:
+        cur.close()
+
+
+def _finish(conn, result, all_or_nothing):
+    if result.errors and all_or_nothing:
+        conn.rollback()
+        result.applied = 0
+    else:
+        conn.commit()
+        result.committed = True
+    return result
+
+
+def bulk_set(conn, staffids, column, value, all_or_nothing=False):
+    """
+    Set LOGINOK or ACCESS_ROLE to `value` for every STAFFID in one batch and
+    one transaction. Unknown STAFFIDs are reported as errors; with
+    all_or_nothing any error rolls the whole batch back.
+    """
+    if value not in BULK_COLUMNS.get(column, ()):
+        raise ValueError(f"Cannot bulk-set {column} to {value!r}")
+    staffids = list(dict.fromkeys(staffids))
+    result = BulkResult(f"set {column}={value}", attempted=len(staffids))
+    if not staffids:
+        return result
+    sql = f"UPDATE STAFFMASTER SET {column} = :val WHERE STAFFID = :sid"
+    with timed(f"admin.bulk_{column.lower()}") as t:
+        counts, errors = execute_batch(conn, sql, [{"val": value, "sid": sid} for sid in staffids])
+        for i, sid in enumerate(staffids):
+            if i in errors:
+                result.errors.append((sid, errors[i]))
+            elif counts[i] == 0:
+                result.errors.append((sid, "STAFFID not found"))
+            else:
+                result.applied += 1
+        _finish(conn, result, all_or_nothing)
+        t.rows = result.applied
+    return result
+
+
+def read_staff_csv(data):
+    """Uploaded CSV (bytes or file-like) -> text frame with CSV_COLUMNS (missing optional columns empty)"""
+    if isinstance(data, (bytes, bytearray)):
+        data = io.BytesIO(data)
+    df = pd.read_csv(data, dtype=str, keep_default_na=False)
+    df.columns = [str(c).strip().upper() for c in df.columns]
+    missing = [c for c in CSV_REQUIRED if c not in df.columns]
+    if missing:
+        raise ValueError(f"CSV is missing column(s): {', '.join(missing)}")
+    for c in CSV_COLUMNS:
+        if c not in df.columns:
+            df[c] = ""
+    return df[CSV_COLUMNS].apply(lambda col: col.str.strip())
+
+
+def csv_template():
+    """Header-only CSV for the import"""
+    return (",".join(CSV_COLUMNS) + "\n").encode("utf-8")
+
+
+def _import_row(row):
+    """Bind dict for one CSV row, or raise ValueError with the reason it is rejected"""
+    for c in CSV_REQUIRED:
+        if not row[c]:
+            raise ValueError(f"{c} is required")
+    loginok = (row["LOGINOK"] or "N").upper()
+    access_role = (row["ACCESS_ROLE"] or "U").upper()
+    if loginok not in BULK_COLUMNS["LOGINOK"]:
+        raise ValueError(f"LOGINOK must be Y or N, not {row['LOGINOK']!r}")
+    if access_role not in BULK_COLUMNS["ACCESS_ROLE"]:
+        raise ValueError(f"ACCESS_ROLE must be A or U, not {row['ACCESS_ROLE']!r}")
+    return {
+        "sid": row["STAFFID"], "sname": row["STAFFNAME"],
+        "dname": row["DEPTNAME"] or None, "desig": row["DESIGNATION"] or None,
+        "hid": row["HOSPITALID"] or None, "dcode": row["DEPTCODE"] or None,
+        "ath": row["ATHMAID"] or None, "pwd": hash_password(row["PASSWORD"]),
+        "loginok": loginok, "acc_role": access_role,
+    }
+
+
+def import_staff(conn, frame, all_or_nothing=False):
+    """
+    Insert the staff in a read_staff_csv frame as one batch in one
+    transaction. Rows failing validation are not sent; rows the database
+    rejects (e.g. an existing STAFFID) are reported with their CSV line.
+    """
+    result = BulkResult("import", attempted=len(frame))
+    rows, lines = [], []
+    seen = set()
+    for i, row in enumerate(frame.to_dict("records")):
+        line = f"line {i + 2}"   # the header is line 1
+        try:
+            bind = _import_row(row)
+        except ValueError as e:
+            result.errors.append((line, str(e)))
+            continue
+        if bind["sid"] in seen:
+            result.errors.append((line, f"duplicate STAFFID {bind['sid']} in the file"))
+            continue
+        seen.add(bind["sid"])
+        rows.append(bind)
+        lines.append(f"{line} ({bind['sid']})")
+    if not rows or (result.errors and all_or_nothing):
+        result.applied = 0
+        return result
+    with timed("admin.bulk_import") as t:
+        counts, errors = execute_batch(conn, INSERT_SQL, rows)
+        for i, line in enumerate(lines):
+            if i in errors:
+                result.errors.append((line, errors[i]))
+            else:
+                result.applied += 1
+        _finish(conn, result, all_or_nothing)
+        t.rows = result.applied
+    return result
@@ -0,0 +1,396 @@
+"""
+Local stand-in for the HIS Oracle database
+
+A SQLite file (see sssihms.synthetic for the generator) plus a thin
+compatibility layer so the dashboard's Oracle SQL runs unchanged:
+
+  - TO_DATE('YYYY-MM-DD', ...) / SYSDATE  -> julianday(...)
+  - NVL                                   -> IFNULL
+  - FETCH FIRST n ROWS ONLY, ROWNUM <= n  -> LIMIT n
+  - TRUNC, MONTHS_BETWEEN, MOD, TO_CHAR   -> registered Python functions
+
+Dates are stored as Julian day numbers, so Oracle date arithmetic
+(`DATE + 0.99999`, `DATE1 - DATE2` in days) behaves the same. Date columns
+are converted back to datetime on fetch, and column names are upper-cased
+like Oracle's, so DataFrames look the same as the ones from the real DB.
+
+Connections are sqlite3.Connection subclasses, so pandas.read_sql and the
+fetch profiles in sssihms.db work on them directly.
+"""
+import math
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
+from pathlib import Path
+
+# Columns holding Oracle DATE values (stored as Julian days here)
+DATE_COLUMNS = frozenset({
+    "DOB", "DEATHDATE", "DOA", "DOD", "DOV", "SURGERYDATE", "THEDATE",
+    "VISITDATE", "CREATED_DATE", "UPDATED_DATE", "LAST_REFRESH_DATE",
+})
+
+_JD_UNIX_EPOCH = 2440587.5
+_EPOCH = datetime(1970, 1, 1)
+
+_TO_DATE_RE = re.compile(r"TO_DATE\(\s*('[^']*')\s*,\s*'[^']*'\s*\)", re.I)
+_TO_DATE_BIND_RE = re.compile(r"TO_DATE\(\s*(:\w+)\s*,\s*'[^']*'\s*\)", re.I)
+_SYSDATE_RE = re.compile(r"\bSYSDATE\b", re.I)
+_NVL_RE = re.compile(r"\bNVL\s*\(", re.I)
+_FETCH_FIRST_RE = re.compile(r"\bFETCH\s+FIRST\s+(\d+)\s+ROWS?\s+ONLY\b", re.I)
+_ROWNUM_AND_RE = re.compile(r"\s+AND\s+ROWNUM\s*(<=|=|<)\s*(\d+)", re.I)
+_ROWNUM_WHERE_RE = re.compile(r"\bWHERE\s+ROWNUM\s*(<=|=|<)\s*(\d+)(\s+AND\b)?", re.I)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+
+
+def jd_to_datetime(value):
+    """Julian day number -> naive datetime (to the second)"""
+    if value is None or isinstance(value, datetime):
+        return value
+    seconds = round((float(value) - _JD_UNIX_EPOCH) * 86400)
+    return _EPOCH + timedelta(seconds=seconds)
+
+
+def to_jd(value):
+    """date/datetime/ISO string -> Julian day number"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    return (value - _EPOCH).total_seconds() / 86400 + _JD_UNIX_EPOCH
+
+
+def _rownum_limit(op, n):
+    n = int(n)
+    return n - 1 if op == "<" else n
+
+
+def _outside_strings(sql, func):
+    """Apply func to the parts of sql that are not string literals"""
+    out = []
+    pos = 0
+    for m in _STRING_RE.finditer(sql):
+        out.append(func(sql[pos:m.start()]))
+        out.append(m.group(0))
+        pos = m.end()
+    out.append(func(sql[pos:]))
+    return "".join(out)
+
+
+@lru_cache(maxsize=1024)
+def translate(sql):
+    """Rewrite the Oracle-specific constructs the dashboard uses into SQLite"""
+    sql = sql.strip().rstrip(";")
+    # TO_DATE takes a string literal, so handle it before masking strings
+    sql = _TO_DATE_RE.sub(r"julianday(\1)", sql)
+    sql = _TO_DATE_BIND_RE.sub(r"julianday(\1)", sql)
+
+    limit = []
+
+    def rewrite(part):
+        part = _SYSDATE_RE.sub("julianday('now', 'localtime')", part)
+        part = _NVL_RE.sub("IFNULL(", part)
+
+        def fetch_first(m):
+            # in place: it may close a subquery, where a trailing LIMIT would not reach
+            return f"LIMIT {int(m.group(1))}"
+
+        def rownum_and(m):
+            limit.append(_rownum_limit(m.group(1), m.group(2)))
+            return ""
+
+        def rownum_where(m):
+            limit.append(_rownum_limit(m.group(1), m.group(2)))
+            return "WHERE" if m.group(3) else "WHERE 1=1"
+
+        part = _FETCH_FIRST_RE.sub(fetch_first, part)
+        part = _ROWNUM_AND_RE.sub(rownum_and, part)
+        part = _ROWNUM_WHERE_RE.sub(rownum_where, part)
+        return part
+
+    sql = _outside_strings(sql, rewrite).rstrip()
+    if limit:
+        sql += f" LIMIT {min(limit)}"
+    return sql
+
+
+# -------------------------
+# Oracle functions
+# -------------------------
+def _trunc(value, fmt=None):
+    if value is None:
+        return None
+    if fmt is not None:
+        # TRUNC(date[, fmt]) on a Julian day: drop the time of day
+        return math.floor(value - 0.5) + 0.5
+    return float(math.trunc(value)) if isinstance(value, float) else value
+
+
+def _months_between(a, b):
+    if a is None or b is None:
+        return None
+    da, db = jd_to_datetime(a), jd_to_datetime(b)
+    months = (da.year - db.year) * 12 + (da.month - db.month)
+    return months + (da.day - db.day) / 31
+
+
+def _mod(a, b):
+    if a is None or b is None:
+        return None
+    if b == 0:
+        return a
+    return math.fmod(a, b) if isinstance(a, float) or isinstance(b, float) else int(math.fmod(a, b))
+
+
+_TO_CHAR_FORMATS = [("YYYY", "%Y"), ("MON", "%b"), ("MM", "%m"), ("DD", "%d"),
+                    ("HH24", "%H"), ("MI", "%M"), ("SS", "%S")]
+
+
+def _to_char(value, fmt=None):
+    if value is None:
+        return None
+    if fmt is None:
+        return str(value)
+    fmt = fmt.upper()
+    if fmt.startswith("FM") or "0" in fmt or "9" in fmt:
+        return str(int(value)).zfill(fmt.count("0")) if fmt.count("0") else str(value)
+    py_fmt = fmt
+    for ora, py in _TO_CHAR_FORMATS:
+        py_fmt = py_fmt.replace(ora, py)
+    return jd_to_datetime(value).strftime(py_fmt)
+
+
+def _register_functions(conn):
+    conn.create_function("TRUNC", 1, _trunc, deterministic=True)
+    conn.create_function("TRUNC", 2, _trunc, deterministic=True)
+    conn.create_function("MONTHS_BETWEEN", 2, _months_between, deterministic=True)
+    conn.create_function("MOD", 2, _mod, deterministic=True)
+    conn.create_function("TO_CHAR", 1, _to_char, deterministic=True)
+    conn.create_function("TO_CHAR", 2, _to_char, deterministic=True)
+
+
+# -------------------------
+# DB-API wrappers
+# -------------------------
+def _bind_value(value):
+    if isinstance(value, datetime) or (hasattr(value, "year") and hasattr(value, "month") and not isinstance(value, str)):
+        return to_jd(value)
+    return value
+
+
+def _bind_params(params):
+    if params is None:
+        return ()
+    if isinstance(params, dict):
+        return {k: _bind_value(v) for k, v in params.items()}
+    return [_bind_value(v) for v in params]
+
+
+class StandInCursor(sqlite3.Cursor):
+    """Cursor that accepts Oracle SQL and returns Oracle-shaped rows"""
+
+    prefetchrows = 2     # accepted and ignored, like the fetch-profile attributes
+    callTimeout = 0
+
+    def _call(self, method, *args):
+        """One database call, under the connection's call_timeout, with Oracle's stop errors"""
+        conn = self.connection
+        conn._begin_call()
+        try:
+            return method(*args)
+        except sqlite3.OperationalError as e:
+            if str(e) != "interrupted":
+                raise
+            if conn._timed_out:
+                raise sqlite3.OperationalError(f"DPI-1067: call timeout of {conn.call_timeout} ms exceeded") from e
+            raise sqlite3.OperationalError("ORA-01013: user requested cancel of current operation") from e
+
+    def execute(self, sql, params=None, **kwargs):
+        if kwargs and params is None:
+            params = kwargs
+        self._call(super().execute, translate(sql), _bind_params(params))
+        self._date_idx = [i for i, d in enumerate(super().description or ()) if d[0].upper() in DATE_COLUMNS]
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._call(super().executemany, translate(sql), (_bind_params(p) for p in seq_of_params))
+        self._date_idx = []
+        return self
+
+    @property
+    def description(self):
+        desc = super().description
+        if desc is None:
+            return None
+        return tuple((d[0].upper(),) + tuple(d[1:]) for d in desc)
+
+    def _convert(self, row):
+        if row is None or not getattr(self, "_date_idx", None):
+            return row
+        row = list(row)
+        for i in self._date_idx:
+            row[i] = jd_to_datetime(row[i])
+        return tuple(row)
+
+    def fetchone(self):
+        return self._convert(self._call(super().fetchone))
+
+    def fetchmany(self, size=None):
+        rows = self._call(super().fetchmany, self.arraysize if size is None else size)
+        return [self._convert(r) for r in rows] if getattr(self, "_date_idx", None) else rows
+
+    def fetchall(self):
+        rows = self._call(super().fetchall)
+        return [self._convert(r) for r in rows] if getattr(self, "_date_idx", None) else rows
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        row = self.fetchone()
+        if row is None:
+            raise StopIteration
+        return row
+
+
+class StandInConnection(sqlite3.Connection):
+    """sqlite3 connection with the Oracle shim installed"""
+
+    def cursor(self, factory=StandInCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=None):
+        return self.cursor().execute(sql, params)
+
+    def cancel(self):
+        self.interrupt()
+
+    # oracledb's Connection.call_timeout (ms, 0: none): a progress handler
+    # stops any statement still running that long after its call started
+    @property
+    def call_timeout(self):
+        return getattr(self, "_call_timeout", 0)
+
+    @call_timeout.setter
+    def call_timeout(self, ms):
+        self._call_timeout = ms
+        self.set_progress_handler(self._past_deadline if ms else None, 10_000)
+
+    def _begin_call(self):
+        self._timed_out = False
+        self._deadline = time.monotonic() + self.call_timeout / 1000
+
+    def _past_deadline(self):
+        if time.monotonic() < self._deadline:
+            return 0
+        self._timed_out = True
+        return 1
+
+    def close(self):
+        if getattr(self, "_released", False):
+            return   # already back in its pool
+        # pooled connections go back to their StandInPool instead of closing
+        pool, self._pool = getattr(self, "_pool", None), None
+        if pool is not None:
+            pool._put_back(self)
+        else:
+            super().close()
+
+    @property
+    def closed(self):
+        if getattr(self, "_released", False):
+            return True
+        try:
+            self.total_changes
+            return False
+        except sqlite3.ProgrammingError:
+            return True
+
+
+def connect(db_path, read_only=False):
+    """Open the stand-in database"""
+    if read_only:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, factory=StandInConnection,
+                               check_same_thread=False)
+    else:
+        conn = sqlite3.connect(str(db_path), factory=StandInConnection, check_same_thread=False)
+    conn.source_path = str(Path(db_path).resolve())
+    # regenerating the file must not revive rows cached for the old one
+    conn.source_version = Path(db_path).stat().st_mtime_ns
+    _register_functions(conn)
+    conn.execute("PRAGMA cache_size = -65536")
+    return conn
+
+
+class StandInPool:
+    """
+    Minimal stand-in for oracledb's ConnectionPool (acquire/release/close).
+    Released connections stay open and are handed out again, like pooled
+    sessions; `opened` and `busy` mirror the oracledb attributes.
+    """
+
+    def __init__(self, db_path, max=10, min=0, wait_timeout=None, opener=None):
+        self.db_path = db_path
+        self.max = max
+        self.min = min
+        self.wait_timeout = wait_timeout     # ms to wait for a free session (None: forever)
+        self._opener = opener or connect
+        self._slots = threading.BoundedSemaphore(max)
+        self._idle = []
+        self._lock = threading.Lock()
+        self.opened = 0
+        for _ in range(min):
+            self._idle.append(self._open())
+
+    def _open(self):
+        conn = self._opener(self.db_path)
+        with self._lock:
+            self.opened += 1
+        return conn
+
+    @property
+    def busy(self):
+        with self._lock:
+            return self.opened - len(self._idle)
+
+    def acquire(self):
+        timeout = None if self.wait_timeout is None else self.wait_timeout / 1000
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError(f"no pooled session became free within {self.wait_timeout} ms")
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            try:
+                conn = self._open()
+            except Exception:
+                self._slots.release()
+                raise
+        conn._pool = self
+        conn._released = False
+        return conn
+
+    def _put_back(self, conn):
+        try:
+            conn.rollback()
+            conn._released = True
+            with self._lock:
+                self._idle.append(conn)
+        except sqlite3.Error:
+            sqlite3.Connection.close(conn)
+            with self._lock:
+                self.opened -= 1
+        self._slots.release()
+
+    def release(self, conn):
+        conn.close()
+
+    def close(self, force=False):
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self.opened -= len(idle)
+        for conn in idle:
+            sqlite3.Connection.close(conn)
@@ -0,0 +1,344 @@
+"""
+Summary objects for the dashboard's heavy aggregates
+
+Four pre-aggregated copies of the tables the dashboard scans hardest:
+
+  stats    STATS_DETAILS per day / hospital / ordering dept / category level
+  census   CENSUSDATA per day and location (SPECIALITY)
+  surgery  SURGERY counts per day / hospital / dept / surgeon / surgery type
+  states   STATESTATS per month
+
+On Oracle they are materialized views with a scheduled complete refresh
+(nightly at SUMMARY_REFRESH_HOUR, default 02:00). On the stand-in database
+they are plain tables built from the same SELECT, with a USER_MVIEWS table
+standing in for the data dictionary, so the routing below behaves the same
+on both. The stand-in has no scheduler: run `refresh` from cron.
+
+    python -m sssihms.summaries provision [--standin bench/his_100000.db]
+    python -m sssihms.summaries refresh | status | drop
+    python -m sssihms.summaries ddl        # Oracle DDL for the DBA, not executed
+
+Routing: a summary is used when USER_MVIEWS lists it and its last refresh
+is younger than SUMMARY_MAX_AGE_HOURS (default 36). It covers every day
+before the day it was refreshed; a query range is split there, the covered
+part read from the summary and the rest (recent days) from the base table.
+Without the summaries, or when they are stale, everything reads the base
+tables as before.
+"""
+import argparse
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+from sssihms.db import read_sql, source_id, is_standin, init_oracle_client
+
+REFRESH_HOUR = int(os.getenv("SUMMARY_REFRESH_HOUR", "2"))
+MAX_AGE_HOURS = float(os.getenv("SUMMARY_MAX_AGE_HOURS", "36"))
+CATALOG_TTL = 60.0   # seconds between USER_MVIEWS lookups per database
+
+
+@dataclass(frozen=True)
+class Summary:
+    key: str
+    name: str           # materialized view (Oracle) / table (stand-in)
+    base: str
+    select: str         # defining query; runs unchanged on the stand-in
+    indexes: tuple = ()
+    grain: str = "day"  # "month": rows cover whole months
+
+
+SUMMARIES = {s.key: s for s in (
+    Summary(
+        "stats", "DASH_STATS_DAY_MV", "STATS_DETAILS",
+        "SELECT TRUNC(THEDATE, 'DD') AS THEDATE, HOSPITALID, ORDERING_DEPT, CATEGORY, SUBCATG, SUBCATGL2, "
+        "SUM(NVL(THEVALUE, 0)) AS TOTAL_CNT, MAX(NVL(THEVALUE, 0)) AS MAX_ENTRY, COUNT(*) AS ENTRIES "
+        "FROM STATS_DETAILS "
+        "GROUP BY TRUNC(THEDATE, 'DD'), HOSPITALID, ORDERING_DEPT, CATEGORY, SUBCATG, SUBCATGL2",
+        indexes=("THEDATE, CATEGORY",),
+    ),
+    Summary(
+        "census", "DASH_CENSUS_DAY_MV", "CENSUSDATA",
+        "SELECT TRUNC(THEDATE, 'DD') AS THEDATE, SPECIALITY, "
+        "SUM(NVL(OPBAL, 0)) AS OPBAL, SUM(NVL(ADMIT, 0)) AS ADMIT, SUM(NVL(DISCH, 0)) AS DISCH, "
+        "SUM(NVL(TRIN, 0)) AS TRIN, SUM(NVL(TROUT, 0)) AS TROUT, SUM(NVL(DEATH, 0)) AS DEATH, "
+        "SUM(NVL(OPBAL, 0) + NVL(ADMIT, 0) - NVL(DISCH, 0) + NVL(TRIN, 0) - NVL(TROUT, 0) - NVL(DEATH, 0)) "
+        "AS DAILY_OCCUPANCY "
+        "FROM CENSUSDATA "
+        "GROUP BY TRUNC(THEDATE, 'DD'), SPECIALITY",
+        indexes=("THEDATE, SPECIALITY",),
+    ),
+    Summary(
+        "surgery", "DASH_SURGERY_DAY_MV", "SURGERY",
+        "SELECT TRUNC(SURGERYDATE, 'DD') AS THEDATE, HOSPITALID, DEPTCODE, SURGEONID, "
+        "NVL(SURGERYTYPE, 'UNKNOWN') AS SURGERYTYPE, COUNT(*) AS CNT "
+        "FROM SURGERY "
+        "GROUP BY TRUNC(SURGERYDATE, 'DD'), HOSPITALID, DEPTCODE, SURGEONID, NVL(SURGERYTYPE, 'UNKNOWN')",
+        indexes=("THEDATE",),
+    ),
+    Summary(
+        "states", "DASH_STATES_MONTH_MV", "STATESTATS",
+        "SELECT HOSPITALID, DEPTCODE, THEYR, THEMNTH, YR, MNTH, STATE, SUM(CNT) AS CNT "
+        "FROM STATESTATS "
+        "GROUP BY HOSPITALID, DEPTCODE, THEYR, THEMNTH, YR, MNTH, STATE",
+        indexes=("THEYR, THEMNTH", "YR, MNTH"),
+        grain="month",
+    ),
+)}
+
+
+# -------------------------
+# Routing
+# -------------------------
+def catalog_rows(conn):
+    """USER_MVIEWS rows of the dashboard's summaries (empty when there are none)"""
+    names = ", ".join(f"'{s.name}'" for s in SUMMARIES.values())
+    try:
+        return read_sql(
+            "SELECT MVIEW_NAME, LAST_REFRESH_DATE, STALENESS FROM USER_MVIEWS "
+            f"WHERE MVIEW_NAME IN ({names})",
+            conn, name="summaries.catalog", profile="lookup",
+        )
+    except Exception:
+        # no summaries (or no dictionary access): base tables only
+        return pd.DataFrame(columns=["MVIEW_NAME", "LAST_REFRESH_DATE", "STALENESS"])
+
+
+class SummaryRouter:
+    """Which summaries a database has, and how far each one reaches"""
+
+    def __init__(self, max_age_hours=MAX_AGE_HOURS, catalog_ttl=CATALOG_TTL):
+        self.max_age = timedelta(hours=max_age_hours)
+        self.catalog_ttl = catalog_ttl
+        self.enabled = True
+        self._catalogs = {}   # source id -> (checked at, {name: last refresh})
+        self._lock = threading.Lock()
+
+    def _catalog(self, conn):
+        sid = source_id(conn)
+        with self._lock:
+            cached = self._catalogs.get(sid)
+        if cached and time.monotonic() - cached[0] < self.catalog_ttl:
+            return cached[1]
+        df = catalog_rows(conn)
+        catalog = {
+            row.MVIEW_NAME: pd.Timestamp(row.LAST_REFRESH_DATE).to_pydatetime()
+            for row in df.itertuples(index=False)
+            if pd.notna(row.LAST_REFRESH_DATE) and row.STALENESS != "UNUSABLE"
+        }
+        with self._lock:
+            self._catalogs[sid] = (time.monotonic(), catalog)
+        return catalog
+
+    def covered_through(self, conn, key, now=None):
+        """Last day the summary `key` holds complete, or None when it must not be used"""
+        if not self.enabled:
+            return None
+        refreshed = self._catalog(conn).get(SUMMARIES[key].name)
+        if refreshed is None or (now or datetime.now()) - refreshed > self.max_age:
+            return None
+        through = refreshed.date() - timedelta(days=1)
+        if SUMMARIES[key].grain == "month":
+            # only months that had ended before the refresh are complete
+            first_of_month = date(refreshed.year, refreshed.month, 1)
+            through = first_of_month - timedelta(days=1)
+        return through
+
+    def split(self, conn, key, first, last):
+        """(summary range or None, base-table range or None) for days first..last"""
+        through = self.covered_through(conn, key)
+        if through is None or through < first:
+            return None, (first, last)
+        if through >= last:
+            return (first, last), None
+        return (first, through), (through + timedelta(days=1), last)
+
+    def invalidate(self):
+        with self._lock:
+            self._catalogs.clear()
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    """Process-wide summary router"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = SummaryRouter()
+        return _router
+
+
+def routed(conn, key, first, last, from_summary, from_base):
+    """
+    Rows for first..last: from_summary(table, a, b) for the days summary
+    `key` covers, from_base(a, b) for the rest, concatenated in that order
+    """
+    summary_part, base_part = get_router().split(conn, key, first, last)
+    frames = []
+    if summary_part:
+        frames.append(from_summary(SUMMARIES[key].name, *summary_part))
+    if base_part:
+        frames.append(from_base(*base_part))
+    rows = [f for f in frames if not f.empty]
+    if len(rows) > 1:
+        return pd.concat(rows, ignore_index=True)
+    return rows[0] if rows else frames[0]
+
+
+# -------------------------
+# Provisioning
+# -------------------------
+def refresh_schedule(hour=REFRESH_HOUR):
+    """START WITH / NEXT expression of the nightly refresh"""
+    return f"TRUNC(SYSDATE) + 1 + {hour}/24"
+
+
+def oracle_ddl(summary, hour=REFRESH_HOUR):
+    """CREATE MATERIALIZED VIEW (and index) statements for one summary"""
+    schedule = refresh_schedule(hour)
+    statements = [
+        f"CREATE MATERIALIZED VIEW {summary.name}\n"
+        "  BUILD IMMEDIATE\n"
+        f"  REFRESH COMPLETE START WITH {schedule} NEXT {schedule}\n"
+        f"AS {summary.select}"
+    ]
+    statements += [f"CREATE INDEX {summary.name}_IX{i} ON {summary.name} ({cols})"
+                   for i, cols in enumerate(summary.indexes, 1)]
+    return statements
+
+
+def _mark_refreshed(cur, summary):
+    cur.execute("DELETE FROM USER_MVIEWS WHERE MVIEW_NAME = ?", (summary.name,))
+    cur.execute("INSERT INTO USER_MVIEWS (MVIEW_NAME, LAST_REFRESH_DATE, STALENESS) VALUES (?, SYSDATE, 'FRESH')",
+                (summary.name,))
+
+
+def provision(conn, keys=None, hour=REFRESH_HOUR):
+    """Create the summaries (skipping existing ones); returns the names created"""
+    created = []
+    existing = set(catalog_rows(conn)["MVIEW_NAME"])
+    cur = conn.cursor()
+    if is_standin(conn):
+        cur.execute("CREATE TABLE IF NOT EXISTS USER_MVIEWS "
+                    "(MVIEW_NAME TEXT PRIMARY KEY, LAST_REFRESH_DATE REAL, STALENESS TEXT)")
+    for summary in _selected(keys):
+        if summary.name in existing:
+            continue
+        if is_standin(conn):
+            cur.execute(f"CREATE TABLE {summary.name} AS {summary.select}")
+            for i, cols in enumerate(summary.indexes, 1):
+                cur.execute(f"CREATE INDEX {summary.name}_IX{i} ON {summary.name} ({cols})")
+            _mark_refreshed(cur, summary)
+        else:
+            for statement in oracle_ddl(summary, hour):
+                cur.execute(statement)
+        created.append(summary.name)
+    conn.commit()
+    get_router().invalidate()
+    return created
+
+
+def refresh(conn, keys=None):
+    """Complete refresh of the summaries now"""
+    cur = conn.cursor()
+    for summary in _selected(keys):
+        if is_standin(conn):
+            cur.execute(f"DELETE FROM {summary.name}")
+            cur.execute(f"INSERT INTO {summary.name} {summary.select}")
+            _mark_refreshed(cur, summary)
+        else:
+            cur.callproc("DBMS_MVIEW.REFRESH", [summary.name, "C"])
+    conn.commit()
+    get_router().invalidate()
+
+
+def drop(conn, keys=None):
+    cur = conn.cursor()
+    present = set(catalog_rows(conn)["MVIEW_NAME"])
+    for summary in _selected(keys):
+        if summary.name not in present:
+            continue
+        if is_standin(conn):
+            cur.execute(f"DROP TABLE {summary.name}")
+            cur.execute("DELETE FROM USER_MVIEWS WHERE MVIEW_NAME = ?", (summary.name,))
+        else:
+            cur.execute(f"DROP MATERIALIZED VIEW {summary.name}")
+    conn.commit()
+    get_router().invalidate()
+
+
+def status(conn):
+    """One row per summary: KEY, NAME, EXISTS, LAST_REFRESH, COVERED_THROUGH"""
+    rows = catalog_rows(conn).set_index("MVIEW_NAME")
+    router = SummaryRouter(catalog_ttl=0)
+    return pd.DataFrame([{
+        "KEY": s.key,
+        "NAME": s.name,
+        "EXISTS": s.name in rows.index,
+        "LAST_REFRESH": rows["LAST_REFRESH_DATE"].get(s.name),
+        "COVERED_THROUGH": router.covered_through(conn, s.key),
+    } for s in SUMMARIES.values()])
+
+
+def _selected(keys):
+    if not keys:
+        return list(SUMMARIES.values())
+    unknown = [k for k in keys if k not in SUMMARIES]
+    if unknown:
+        raise ValueError(f"Unknown summary {', '.join(unknown)}. Available: {', '.join(SUMMARIES)}")
+    return [SUMMARIES[k] for k in keys]
+
+
+def _connect(standin_db):
+    if standin_db:
+        from sssihms import standin
+        return standin.connect(standin_db)
+    import oracledb
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    init_oracle_client()
+    return oracledb.connect(
+        user=os.getenv("DB_USER", "hisapp"),
+        password=os.getenv("DB_PASSWORD", "his@2025"),
+        dsn=os.getenv("DB_DSN", "192.168.21.6:1521/hisdb"),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Provision the dashboard's summary objects")
+    parser.add_argument("action", choices=["provision", "refresh", "status", "drop", "ddl"])
+    parser.add_argument("--only", nargs="+", metavar="KEY", help=f"summaries to act on ({', '.join(SUMMARIES)})")
+    parser.add_argument("--standin", default=os.getenv("STANDIN_DB"),
+                        help="stand-in database file (default: $STANDIN_DB, else Oracle from .env)")
+    parser.add_argument("--refresh-hour", type=int, default=REFRESH_HOUR)
+    args = parser.parse_args()
+
+    if args.action == "ddl":
+        for summary in _selected(args.only):
+            for statement in oracle_ddl(summary, args.refresh_hour):
+                print(statement + ";\n")
+        return
+
+    conn = _connect(args.standin)
+    try:
+        if args.action == "provision":
+            created = provision(conn, args.only, args.refresh_hour)
+            print(f"Created: {', '.join(created) or 'nothing (all present)'}")
+        elif args.action == "refresh":
+            refresh(conn, args.only)
+        elif args.action == "drop":
+            drop(conn, args.only)
+        print(status(conn).to_string(index=False))
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,556 @@
+"""
+Synthetic HIS dataset generator
+
+Creates a SQLite stand-in database (see sssihms.standin) with the 13 tables
+the dashboard reads, filled with synthetic but realistically shaped data:
+skewed department/category/surgeon popularity, admissions clustered on
+weekdays, multi-role surgical teams, daily census per ward, and HTML notes.
+
+`rows` is the approximate total row count across all tables (10k to 50M);
+each table gets a fixed share of it. Data is generated with numpy in chunks
+and bulk-inserted, so memory stays flat at any scale.
+
+    python -m sssihms.synthetic --rows 1000000 --db bench/his_1m.db
+
+The generated STAFFMASTER contains an active admin login BENCH / bench.
+"""
+import argparse
+import hashlib
+import os
+import sqlite3
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from sssihms.standin import to_jd
+
+CHUNK = 200_000
+
+SCHEMA = {
+    "DEPARTMENT": [("DEPTCODE", "TEXT"), ("DEPTNAME", "TEXT"), ("HOSPITALID", "TEXT")],
+    "STAFFMASTER": [("STAFFID", "TEXT PRIMARY KEY"), ("STAFFNAME", "TEXT"), ("DEPTNAME", "TEXT"),
+                    ("DESIGNATION", "TEXT"), ("HOSPITALID", "TEXT"), ("DEPTCODE", "TEXT"),
+                    ("ATHMAID", "TEXT"), ("TXTPASSWD", "TEXT"), ("LOGINOK", "TEXT"), ("ACCESS_ROLE", "TEXT")],
+    "PATIENT": [("MRN", "TEXT PRIMARY KEY"), ("PATIENTNAME", "TEXT"), ("GENDER", "TEXT"), ("DOB", "REAL"),
+                ("DEATHDATE", "REAL"), ("STATE", "TEXT"), ("STATUS", "TEXT"), ("HOSPITALID", "TEXT")],
+    "INPATIENT": [("INPATIENTID", "INTEGER PRIMARY KEY"), ("MRN", "TEXT"), ("DOA", "REAL"), ("DOD", "REAL"),
+                  ("DAYSCARED", "INTEGER"), ("ADMISSIONTYPE", "TEXT"), ("DEPTCODE", "TEXT"), ("HOSPITALID", "TEXT")],
+    "OUTPATIENT": [("OUTPATIENTID", "INTEGER PRIMARY KEY"), ("MRN", "TEXT"), ("DOV", "REAL"),
+                   ("DEPTNAME", "TEXT"), ("DEPTCODE", "TEXT"), ("HOSPITALID", "TEXT")],
+    "SURGERY": [("SURGERYID", "INTEGER PRIMARY KEY"), ("MRN", "TEXT"), ("SURGERYDATE", "REAL"),
+                ("OTNUMBER", "TEXT"), ("ANAESTHESIA", "TEXT"), ("SURGERYTYPE", "TEXT"), ("DEPTCODE", "TEXT"),
+                ("SURGEONID", "TEXT"), ("HOSPITALID", "TEXT")],
+    "SURGERY_DETAILS": [("SURGERYID", "INTEGER"), ("HOSPITALID", "TEXT"), ("SURGERYNAME", "TEXT"),
+                        ("CATEGORY", "TEXT"), ("SUBCATEGORY", "TEXT")],
+    "SURGERY_PERSONNEL": [("SURGERYID", "INTEGER"), ("STAFFID", "TEXT"), ("STAFFROLE", "TEXT"),
+                          ("HOSPITALID", "TEXT")],
+    "STATS_DETAILS": [("THEDATE", "REAL"), ("HOSPITALID", "TEXT"), ("CATEGORY", "TEXT"), ("SUBCATG", "TEXT"),
+                      ("SUBCATGL2", "TEXT"), ("ORDERING_DEPT", "TEXT"), ("THEVALUE", "INTEGER")],
+    "BEDMASTER": [("LOCATION", "TEXT"), ("SPECIALITY", "TEXT"), ("BEDSTRENGTH", "INTEGER"),
+                  ("STATUS", "TEXT"), ("HOSPITALID", "TEXT")],
+    "CENSUSDATA": [("THEDATE", "REAL"), ("SPECIALITY", "TEXT"), ("OPBAL", "INTEGER"), ("ADMIT", "INTEGER"),
+                   ("DISCH", "INTEGER"), ("TRIN", "INTEGER"), ("TROUT", "INTEGER"), ("DEATH", "INTEGER"),
+                   ("HOSPITALID", "TEXT")],
+    "STATESTATS": [("HOSPITALID", "TEXT"), ("DEPTCODE", "TEXT"), ("STATE", "TEXT"), ("THEYR", "INTEGER"),
+                   ("THEMNTH", "INTEGER"), ("YR", "INTEGER"), ("MNTH", "INTEGER"), ("CNT", "INTEGER")],
+    "NOTESDATA": [("ACCESSION_NUM", "TEXT"), ("MRN", "TEXT"), ("NOTENAME", "TEXT"), ("VISITTYPE", "TEXT"),
+                  ("VISITDATE", "REAL"), ("DONEBY", "TEXT"), ("DEPTNAME", "TEXT"), ("NOTEDATA", "TEXT")],
+}
+
+INDEXES = [
+    "CREATE INDEX IX_DEPARTMENT_NAME ON DEPARTMENT (DEPTNAME)",
+    "CREATE INDEX IX_INPATIENT_DOA ON INPATIENT (DOA)",
+    "CREATE INDEX IX_INPATIENT_MRN ON INPATIENT (MRN)",
+    "CREATE INDEX IX_OUTPATIENT_DOV ON OUTPATIENT (DOV)",
+    "CREATE INDEX IX_SURGERY_DATE ON SURGERY (SURGERYDATE, SURGERYID)",
+    "CREATE INDEX IX_SURGERY_DETAILS_ID ON SURGERY_DETAILS (SURGERYID)",
+    "CREATE INDEX IX_SURGERY_PERSONNEL_ID ON SURGERY_PERSONNEL (SURGERYID, STAFFROLE)",
+    "CREATE INDEX IX_SURGERY_PERSONNEL_STAFF ON SURGERY_PERSONNEL (STAFFROLE, STAFFID)",
+    "CREATE INDEX IX_STATS_DETAILS_DATE ON STATS_DETAILS (THEDATE)",
+    "CREATE INDEX IX_STATS_DETAILS_CATG ON STATS_DETAILS (CATEGORY, THEDATE)",
+    "CREATE INDEX IX_CENSUSDATA_DATE ON CENSUSDATA (THEDATE, SPECIALITY)",
+    "CREATE INDEX IX_STATESTATS_YM ON STATESTATS (THEYR, THEMNTH)",
+    "CREATE INDEX IX_NOTESDATA_MRN ON NOTESDATA (MRN)",
+]
+
+# Share of `rows` per table; the small reference tables are sized separately
+SHARES = {
+    "PATIENT": 0.14,
+    "INPATIENT": 0.08,
+    "OUTPATIENT": 0.30,
+    "SURGERY": 0.03,
+    "SURGERY_DETAILS": 0.03,
+    "SURGERY_PERSONNEL": 0.12,
+    "STATS_DETAILS": 0.20,
+    "CENSUSDATA": 0.02,
+    "STATESTATS": 0.02,
+    "NOTESDATA": 0.05,
+}
+
+HOSPITALS = ["PSN", "WFD"]
+
+DEPARTMENTS = [
+    ("CARD", "CARDIOLOGY"), ("CTVS", "CARDIOTHORACIC SURGERY"), ("NEUR", "NEUROLOGY"),
+    ("NSUR", "NEUROSURGERY"), ("ORTH", "ORTHOPAEDICS"), ("OPHT", "OPHTHALMOLOGY"),
+    ("UROL", "UROLOGY"), ("PLAS", "PLASTIC SURGERY"), ("GAST", "GASTROENTEROLOGY"),
+    ("NEPH", "NEPHROLOGY"), ("ANAE", "ANAESTHESIOLOGY"), ("RADI", "RADIOLOGY"),
+    ("LABM", "LABORATORY MEDICINE"), ("PAED", "PAEDIATRIC CARDIOLOGY"), ("ENTS", "ENT"),
+    ("GENM", "GENERAL MEDICINE"),
+]
+
+# CATEGORY -> SUBCATG -> SUBCATGL2 (generated as "<SUBCATG> - <variant>")
+CATEGORIES = {
+    "CT": ["CT BRAIN", "CT CHEST", "CT ABDOMEN", "CT ANGIO", "CT SPINE"],
+    "MRI": ["MRI BRAIN", "MRI SPINE", "MRI KNEE", "MRI CARDIAC", "MRI ABDOMEN"],
+    "X-RAY": ["CHEST PA", "SPINE", "EXTREMITIES", "ABDOMEN", "SKULL"],
+    "ULTRASOUND": ["USG ABDOMEN", "USG PELVIS", "DOPPLER", "ECHO", "USG THYROID"],
+    "LABORATORY": ["BIOCHEMISTRY", "HAEMATOLOGY", "MICROBIOLOGY", "PATHOLOGY", "SEROLOGY"],
+    "CATH LAB": ["ANGIOGRAPHY", "ANGIOPLASTY", "PACEMAKER", "VALVOTOMY", "DEVICE CLOSURE"],
+    "PHARMACY": ["INPATIENT ISSUE", "OUTPATIENT ISSUE", "RETURNS"],
+    "PHYSIOTHERAPY": ["NEURO REHAB", "ORTHO REHAB", "CARDIAC REHAB"],
+}
+VARIANTS = ["PLAIN", "CONTRAST", "FOLLOW UP", "EMERGENCY", "PAEDIATRIC", "REVIEW", "SCREENING", "PROTOCOL A"]
+
+SURGERY_CATEGORIES = {
+    "CARDIAC": ["CABG", "VALVE REPLACEMENT", "ASD CLOSURE", "VSD CLOSURE", "TOF REPAIR"],
+    "NEURO": ["CRANIOTOMY", "SPINAL FUSION", "VP SHUNT", "ANEURYSM CLIPPING"],
+    "ORTHO": ["TOTAL KNEE REPLACEMENT", "TOTAL HIP REPLACEMENT", "ARTHROSCOPY", "ORIF"],
+    "EYE": ["CATARACT", "VITRECTOMY", "KERATOPLASTY", "GLAUCOMA SURGERY"],
+    "URO": ["TURP", "PCNL", "URETEROSCOPY", "NEPHRECTOMY"],
+    "PLASTIC": ["CLEFT LIP REPAIR", "SKIN GRAFT", "FLAP SURGERY"],
+}
+
+STAFF_ROLES = ["SURGEON", "ANAESTHETIST", "ASSISTING SURGEON", "ASSISTING ANAESTHETIST", "PERFUSIONIST",
+               "RNURSE", "SCNURSE", "NURSE", "TECHCATH", "PHYSICIANCATH", "TECHNICIAN", "ASSTPHYCATH",
+               "IOMTECH", "CIRCNURSE", "ASSTNURSE", "WARDNURSE"]
+DESIGNATIONS = ["SURGEON", "ANAESTHETIST", "PHYSICIAN", "NURSE", "TECHNICIAN", "RESIDENT"]
+
+STATES = ["ANDHRA PRADESH", "KARNATAKA", "TAMIL NADU", "KERALA", "TELANGANA", "MAHARASHTRA", "ODISHA",
+          "WEST BENGAL", "BIHAR", "UTTAR PRADESH", "JHARKHAND", "ASSAM", "GUJARAT", "RAJASTHAN",
+          "MADHYA PRADESH", "CHHATTISGARH", "PUNJAB", "DELHI", "NEPAL", "BANGLADESH"]
+
+ADMISSION_TYPES = ["ELECTIVE", "EMERGENCY", "REFERRAL", "TRANSFER", None]
+ANAESTHESIA = ["GENERAL", "SPINAL", "LOCAL", "REGIONAL", "SEDATION"]
+SURGERY_TYPES = ["MAJOR", "MINOR", "EMERGENCY", "DAY CARE", None]
+NOTE_TYPES = ["DISCHARGE SUMMARY", "CT REPORT", "MRI REPORT", "ECHO REPORT", "OP NOTE", "LAB REPORT"]
+VISIT_TYPES = ["IP", "OP", "ER"]
+FIRST_NAMES = ["RAMESH", "SITA", "ARJUN", "LAKSHMI", "KIRAN", "PRIYA", "SURESH", "ANITA", "RAVI", "MEENA",
+               "VIJAY", "DEEPA", "MOHAN", "GEETHA", "ANIL", "KAVYA", "RAJU", "SUNITA", "GOPAL", "ASHA"]
+LAST_NAMES = ["RAO", "REDDY", "NAIR", "IYER", "SHARMA", "DAS", "PATEL", "SINGH", "KUMAR", "MENON",
+              "PILLAI", "GUPTA", "BOSE", "JOSHI", "MISHRA"]
+
+BENCH_LOGIN = ("BENCH", "bench")
+
+
+def table_sizes(rows):
+    """Row counts per generated table for an approximate total of `rows`"""
+    return {name: max(10, int(rows * share)) for name, share in SHARES.items()}
+
+
+def _zipf_choice(rng, n_items, size, a=1.3):
+    """Indices in [0, n_items) with a long-tailed (Zipf-like) popularity"""
+    weights = 1.0 / np.arange(1, n_items + 1) ** a
+    return rng.choice(n_items, size=size, p=weights / weights.sum())
+
+
+def _pick(values, idx):
+    arr = np.array(values, dtype=object)
+    return arr[idx]
+
+
+def _dates(rng, start_jd, n_days, size, weekday_bias=True, with_time=False):
+    """Julian days in the window; weekdays get ~3x the volume of Sundays"""
+    days = rng.integers(0, n_days, size=size)
+    if weekday_bias:
+        # Re-draw a share of Sunday values so weekends are quieter
+        sundays = ((start_jd + 1.5 + days).astype(np.int64) % 7) == 0
+        days[sundays] = rng.integers(0, n_days, size=int(sundays.sum()))
+    jd = start_jd + days.astype(np.float64)
+    if with_time:
+        jd += rng.uniform(7 / 24, 20 / 24, size=size)
+    return jd
+
+
+def _nullify(rng, arr, fraction):
+    arr = arr.astype(object)
+    arr[rng.random(len(arr)) < fraction] = None
+    return arr
+
+
+def _insert(conn, table, columns):
+    cols = [c for c, _ in SCHEMA[table]]
+    placeholders = ", ".join("?" * len(cols))
+    rows = zip(*(columns[c].tolist() if hasattr(columns[c], "tolist") else columns[c] for c in cols))
+    conn.executemany(f"INSERT INTO {table} VALUES ({placeholders})", rows)
+
+
+def _chunks(total):
+    for start in range(0, total, CHUNK):
+        yield start, min(CHUNK, total - start)
+
+
+class _Context:
+    """Reference data shared between table generators"""
+
+    def __init__(self, rng, start, end, sizes):
+        self.rng = rng
+        self.start_jd = to_jd(start)
+        self.n_days = (end - start).days + 1
+        self.start = start
+        self.end = end
+        self.sizes = sizes
+        self.departments = [(code, name, hosp) for hosp in HOSPITALS for code, name in DEPARTMENTS]
+        self.staff = []
+        self.surgeons = []
+        self.wards = []
+
+
+def _gen_departments(conn, ctx):
+    _insert(conn, "DEPARTMENT", {
+        "DEPTCODE": [d[0] for d in ctx.departments],
+        "DEPTNAME": [d[1] for d in ctx.departments],
+        "HOSPITALID": [d[2] for d in ctx.departments],
+    })
+    return len(ctx.departments)
+
+
+def _gen_staff(conn, ctx):
+    rng = ctx.rng
+    n = max(60, ctx.sizes["SURGERY"] // 40)
+    dept_idx = rng.integers(0, len(ctx.departments), size=n)
+    designation = _pick(DESIGNATIONS, rng.integers(0, len(DESIGNATIONS), size=n))
+    designation[: max(10, n // 6)] = "SURGEON"
+    designation[max(10, n // 6): max(20, n // 4)] = "ANAESTHETIST"
+    names = [f"DR. {FIRST_NAMES[i % len(FIRST_NAMES)]} {LAST_NAMES[(i // 7) % len(LAST_NAMES)]} {i}" for i in range(n)]
+    staff_ids = [f"S{i:05d}" for i in range(n)]
+    bench_id, bench_pw = BENCH_LOGIN
+    _insert(conn, "STAFFMASTER", {
+        "STAFFID": staff_ids + [bench_id],
+        "STAFFNAME": names + ["BENCHMARK ADMIN"],
+        "DEPTNAME": [ctx.departments[i][1] for i in dept_idx] + [None],
+        "DESIGNATION": list(designation) + ["ADMIN"],
+        "HOSPITALID": [ctx.departments[i][2] for i in dept_idx] + [HOSPITALS[0]],
+        "DEPTCODE": [ctx.departments[i][0] for i in dept_idx] + [None],
+        "ATHMAID": [f"ATH{i:05d}" for i in range(n)] + [None],
+        "TXTPASSWD": [hashlib.sha256(sid.lower().encode()).hexdigest() for sid in staff_ids]
+                     + [hashlib.sha256(bench_pw.encode()).hexdigest()],
+        "LOGINOK": ["Y"] * (n + 1),
+        "ACCESS_ROLE": ["U"] * n + ["A"],
+    })
+    ctx.staff = staff_ids
+    ctx.surgeons = [sid for sid, d in zip(staff_ids, designation) if d == "SURGEON"]
+    ctx.anaesthetists = [sid for sid, d in zip(staff_ids, designation) if d == "ANAESTHETIST"]
+    return n + 1
+
+
+def _gen_beds_and_census(conn, ctx):
+    rng = ctx.rng
+    beds = []
+    for code, name, hosp in ctx.departments:
+        for ward in ("WARD", "ICU", "STEPDOWN")[: rng.integers(1, 4)]:
+            beds.append((f"{code}-{ward}-{hosp}", name, int(rng.integers(6, 40)), hosp))
+    # Census is one row per ward per day, so small scales keep fewer wards
+    n_wards = int(np.clip(ctx.sizes["CENSUSDATA"] // ctx.n_days, 4, len(beds)))
+    beds = [beds[i] for i in sorted(rng.choice(len(beds), size=n_wards, replace=False))]
+    # A few inactive beds so the STATUS = 'A' filter matters
+    _insert(conn, "BEDMASTER", {
+        "LOCATION": [b[0] for b in beds],
+        "SPECIALITY": [b[1] for b in beds],
+        "BEDSTRENGTH": [b[2] for b in beds],
+        "STATUS": ["A" if rng.random() > 0.05 else "I" for _ in beds],
+        "HOSPITALID": [b[3] for b in beds],
+    })
+    ctx.wards = beds
+
+    # One census row per ward per day; occupancy follows a random walk
+    census = 0
+    for loc, _, strength, hosp in beds:
+        occ = rng.integers(strength // 2, strength + 1)
+        admit = rng.poisson(max(1, strength / 6), size=ctx.n_days)
+        disch = rng.poisson(max(1, strength / 6), size=ctx.n_days)
+        trin = rng.poisson(0.3, size=ctx.n_days)
+        trout = rng.poisson(0.3, size=ctx.n_days)
+        death = rng.poisson(0.02, size=ctx.n_days)
+        opbal = np.empty(ctx.n_days, dtype=np.int64)
+        for i in range(ctx.n_days):
+            opbal[i] = occ
+            occ = int(np.clip(occ + admit[i] - disch[i] + trin[i] - trout[i] - death[i], 0, strength))
+        _insert(conn, "CENSUSDATA", {
+            "THEDATE": ctx.start_jd + np.arange(ctx.n_days, dtype=np.float64),
+            "SPECIALITY": [loc] * ctx.n_days,
+            "OPBAL": opbal, "ADMIT": admit, "DISCH": disch, "TRIN": trin, "TROUT": trout, "DEATH": death,
+            "HOSPITALID": [hosp] * ctx.n_days,
+        })
+        census += ctx.n_days
+    return len(beds), census
+
+
+def _gen_patients(conn, ctx):
+    rng = ctx.rng
+    total = ctx.sizes["PATIENT"]
+    for start, n in _chunks(total):
+        ids = np.arange(start, start + n)
+        ages_days = rng.gamma(4.0, 3300, size=n).clip(0, 100 * 365)
+        dob = ctx.start_jd + ctx.n_days - ages_days.astype(np.int64)
+        death = np.where(rng.random(n) < 0.02, ctx.start_jd + rng.integers(0, ctx.n_days, size=n), np.nan)
+        _insert(conn, "PATIENT", {
+            "MRN": [f"MRN{i:09d}" for i in ids],
+            "PATIENTNAME": [f"{FIRST_NAMES[i % 20]} {LAST_NAMES[i % 15]}" for i in ids],
+            "GENDER": _pick(["M", "F"], rng.integers(0, 2, size=n)),
+            "DOB": _nullify(rng, dob.astype(np.float64), 0.01),
+            "DEATHDATE": [None if np.isnan(d) else float(d) for d in death],
+            "STATE": _pick(STATES, _zipf_choice(rng, len(STATES), n, a=0.9)),
+            "STATUS": _pick(["A", "I"], (rng.random(n) < 0.05).astype(int)),
+            "HOSPITALID": _pick(HOSPITALS, rng.integers(0, len(HOSPITALS), size=n)),
+        })
+    return total
+
+
+def _mrns(rng, ctx, n):
+    idx = _zipf_choice(rng, 1000, n, a=0.2) * (ctx.sizes["PATIENT"] // 1000 or 1) \
+        + rng.integers(0, max(1, ctx.sizes["PATIENT"] // 1000), size=n)
+    idx = np.minimum(idx, ctx.sizes["PATIENT"] - 1)
+    return [f"MRN{i:09d}" for i in idx]
+
+
+def _gen_inpatients(conn, ctx):
+    rng = ctx.rng
+    total = ctx.sizes["INPATIENT"]
+    for start, n in _chunks(total):
+        dept = _zipf_choice(rng, len(ctx.departments), n, a=0.8)
+        doa = _dates(rng, ctx.start_jd, ctx.n_days, n)
+        stay = rng.geometric(0.18, size=n)
+        _insert(conn, "INPATIENT", {
+            "INPATIENTID": np.arange(start + 1, start + n + 1),
+            "MRN": _mrns(rng, ctx, n),
+            "DOA": doa,
+            "DOD": doa + stay,
+            "DAYSCARED": stay,
+            "ADMISSIONTYPE": _pick(ADMISSION_TYPES, rng.choice(5, size=n, p=[0.55, 0.25, 0.1, 0.05, 0.05])),
+            "DEPTCODE": [ctx.departments[i][0] for i in dept],
+            "HOSPITALID": [ctx.departments[i][2] for i in dept],
+        })
+    return total
+
+
+def _gen_outpatients(conn, ctx):
+    rng = ctx.rng
+    total = ctx.sizes["OUTPATIENT"]
+    for start, n in _chunks(total):
+        dept = _zipf_choice(rng, len(ctx.departments), n, a=0.8)
+        _insert(conn, "OUTPATIENT", {
+            "OUTPATIENTID": np.arange(start + 1, start + n + 1),
+            "MRN": _mrns(rng, ctx, n),
+            "DOV": _dates(rng, ctx.start_jd, ctx.n_days, n, with_time=True),
+            "DEPTNAME": [ctx.departments[i][1] for i in dept],
+            "DEPTCODE": [ctx.departments[i][0] for i in dept],
+            "HOSPITALID": [ctx.departments[i][2] for i in dept],
+        })
+    return total
+
+
+def _gen_surgeries(conn, ctx):
+    rng = ctx.rng
+    total = ctx.sizes["SURGERY"]
+    procedures = [(cat, proc) for cat, procs in SURGERY_CATEGORIES.items() for proc in procs]
+    surgical = [i for i, d in enumerate(ctx.departments)
+                if d[0] in ("CTVS", "NSUR", "ORTH", "OPHT", "UROL", "PLAS", "PAED", "ENTS")]
+    personnel = 0
+    for start, n in _chunks(total):
+        ids = np.arange(start + 1, start + n + 1)
+        dept = np.array(surgical)[_zipf_choice(rng, len(surgical), n, a=0.6)]
+        proc = _zipf_choice(rng, len(procedures), n, a=1.0)
+        surgeon = _pick(ctx.surgeons, _zipf_choice(rng, len(ctx.surgeons), n, a=1.1))
+        hosp = [ctx.departments[i][2] for i in dept]
+        _insert(conn, "SURGERY", {
+            "SURGERYID": ids,
+            "MRN": _mrns(rng, ctx, n),
+            "SURGERYDATE": _dates(rng, ctx.start_jd, ctx.n_days, n, with_time=True),
+            "OTNUMBER": [f"OT{k}" for k in rng.integers(1, 13, size=n)],
+            "ANAESTHESIA": _pick(ANAESTHESIA, rng.integers(0, len(ANAESTHESIA), size=n)),
+            "SURGERYTYPE": _pick(SURGERY_TYPES, rng.choice(5, size=n, p=[0.5, 0.25, 0.1, 0.1, 0.05])),
+            "DEPTCODE": [ctx.departments[i][0] for i in dept],
+            "SURGEONID": surgeon,
+            "HOSPITALID": hosp,
+        })
+        _insert(conn, "SURGERY_DETAILS", {
+            "SURGERYID": ids,
+            "HOSPITALID": hosp,
+            "SURGERYNAME": [procedures[i][1] for i in proc],
+            "CATEGORY": [procedures[i][0] for i in proc],
+            "SUBCATEGORY": _pick(["PRIMARY", "REDO", "REVISION", None], rng.choice(4, size=n, p=[0.8, 0.08, 0.07, 0.05])),
+        })
+
+        # Surgical team: surgeon + anaesthetist always, plus ~2 other distinct roles
+        extra = rng.poisson(2.0, size=n).clip(0, len(STAFF_ROLES) - 2)
+        other_roles = np.array(STAFF_ROLES[2:], dtype=object)
+        role_order = np.argsort(rng.random((n, len(other_roles))), axis=1)
+        take = np.arange(len(other_roles))[None, :] < extra[:, None]
+        extra_rows, extra_cols = np.nonzero(take)
+        anaes = _pick(ctx.anaesthetists, rng.integers(0, len(ctx.anaesthetists), size=n))
+        hosp_arr = np.array(hosp, dtype=object)
+        team_ids = np.concatenate([ids, ids, ids[extra_rows]])
+        team_staff = np.concatenate([surgeon, anaes,
+                                     _pick(ctx.staff, rng.integers(0, len(ctx.staff), size=len(extra_rows)))])
+        team_roles = np.concatenate([np.full(n, "SURGEON", dtype=object), np.full(n, "ANAESTHETIST", dtype=object),
+                                     other_roles[role_order[extra_rows, extra_cols]]])
+        team_hosp = np.concatenate([hosp_arr, hosp_arr, hosp_arr[extra_rows]])
+        _insert(conn, "SURGERY_PERSONNEL", {
+            "SURGERYID": team_ids, "STAFFID": team_staff, "STAFFROLE": team_roles, "HOSPITALID": team_hosp,
+        })
+        personnel += len(team_ids)
+    return total, personnel
+
+
+def _gen_stats_details(conn, ctx):
+    rng = ctx.rng
+    total = ctx.sizes["STATS_DETAILS"]
+    leaves = [(cat, sub, f"{sub} - {v}") for cat, subs in CATEGORIES.items() for sub in subs for v in VARIANTS]
+    ordering = [d[1] for d in ctx.departments[: len(DEPARTMENTS)]] + [d[0] for d in DEPARTMENTS[:4]]
+    for start, n in _chunks(total):
+        leaf = _zipf_choice(rng, len(leaves), n, a=0.9)
+        _insert(conn, "STATS_DETAILS", {
+            "THEDATE": _dates(rng, ctx.start_jd, ctx.n_days, n),
+            "HOSPITALID": _pick(HOSPITALS, rng.integers(0, len(HOSPITALS), size=n)),
+            "CATEGORY": [leaves[i][0] for i in leaf],
+            "SUBCATG": [leaves[i][1] for i in leaf],
+            "SUBCATGL2": [leaves[i][2] for i in leaf],
+            "ORDERING_DEPT": _nullify(rng, _pick(ordering, _zipf_choice(rng, len(ordering), n)), 0.1),
+            "THEVALUE": rng.geometric(0.3, size=n),
+        })
+    return total
+
+
+def _gen_statestats(conn, ctx):
+    rng = ctx.rng
+    months = []
+    d = date(ctx.start.year, ctx.start.month, 1)
+    while d <= ctx.end:
+        months.append((d.year, d.month))
+        d = date(d.year + (d.month == 12), d.month % 12 + 1, 1)
+    combos = [(y, m, h, dc) for (y, m) in months for h in HOSPITALS for dc, _ in DEPARTMENTS]
+    per_combo = max(1, ctx.sizes["STATESTATS"] // max(1, len(combos)))
+    total = 0
+    batch = {c: [] for c, _ in SCHEMA["STATESTATS"]}
+    for y, m, h, dc in combos:
+        states = rng.choice(len(STATES), size=min(per_combo, len(STATES)), replace=False)
+        for s in states:
+            cnt = int(rng.geometric(0.05))
+            for col, val in (("HOSPITALID", h), ("DEPTCODE", dc), ("STATE", STATES[s]), ("THEYR", y),
+                             ("THEMNTH", m), ("YR", y), ("MNTH", m), ("CNT", cnt)):
+                batch[col].append(val)
+        total += len(states)
+        if len(batch["CNT"]) >= CHUNK:
+            _insert(conn, "STATESTATS", batch)
+            batch = {c: [] for c, _ in SCHEMA["STATESTATS"]}
+    if batch["CNT"]:
+        _insert(conn, "STATESTATS", batch)
+    return total
+
+
+def _gen_notes(conn, ctx):
+    rng = ctx.rng
+    total = ctx.sizes["NOTESDATA"]
+    for start, n in _chunks(total):
+        note = rng.integers(0, len(NOTE_TYPES), size=n)
+        dept = rng.integers(0, len(DEPARTMENTS), size=n)
+        mrns = _mrns(rng, ctx, n)
+        visit = _nullify(rng, _dates(rng, ctx.start_jd, ctx.n_days, n, with_time=True), 0.02)
+        body_len = rng.integers(2, 40, size=n)
+        _insert(conn, "NOTESDATA", {
+            "ACCESSION_NUM": [f"ACC{i:010d}" for i in range(start, start + n)],
+            "MRN": mrns,
+            "NOTENAME": [NOTE_TYPES[i] for i in note],
+            "VISITTYPE": _pick(VISIT_TYPES, rng.integers(0, 3, size=n)),
+            "VISITDATE": visit,
+            "DONEBY": [ctx.staff[i] for i in rng.integers(0, len(ctx.staff), size=n)],
+            "DEPTNAME": [DEPARTMENTS[i][1] for i in dept],
+            "NOTEDATA": [
+                f"<html><body><h3>{NOTE_TYPES[t]}</h3><p>Patient {m}.</p>"
+                + "<p>Findings within normal limits. Clinical correlation advised.</p>" * int(k)
+                + "</body></html>"
+                for t, m, k in zip(note, mrns, body_len)
+            ],
+        })
+    return total
+
+
+def create_schema(conn):
+    for table, cols in SCHEMA.items():
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+        conn.execute(f"CREATE TABLE {table} ({', '.join(f'{c} {t}' for c, t in cols)})")
+    conn.execute("DROP TABLE IF EXISTS DUAL")
+    conn.execute("CREATE TABLE DUAL (DUMMY TEXT)")
+    conn.execute("INSERT INTO DUAL VALUES ('X')")
+
+
+def generate(db_path, rows=100_000, seed=42, start=None, end=None, progress=print):
+    """
+    Build the stand-in database at `db_path` (replaced if it exists).
+    Returns {table: row_count}.
+    """
+    end = end or date.today()
+    start = start or (end - timedelta(days=3 * 365))
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+
+    ctx = _Context(np.random.default_rng(seed), start, end, table_sizes(rows))
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    create_schema(conn)
+
+    counts = {}
+    steps = [
+        ("DEPARTMENT", lambda: {"DEPARTMENT": _gen_departments(conn, ctx)}),
+        ("STAFFMASTER", lambda: {"STAFFMASTER": _gen_staff(conn, ctx)}),
+        ("BEDMASTER/CENSUSDATA", lambda: dict(zip(("BEDMASTER", "CENSUSDATA"), _gen_beds_and_census(conn, ctx)))),
+        ("PATIENT", lambda: {"PATIENT": _gen_patients(conn, ctx)}),
+        ("INPATIENT", lambda: {"INPATIENT": _gen_inpatients(conn, ctx)}),
+        ("OUTPATIENT", lambda: {"OUTPATIENT": _gen_outpatients(conn, ctx)}),
+        ("SURGERY*", lambda: dict(zip(("SURGERY", "SURGERY_PERSONNEL"), _gen_surgeries(conn, ctx)),
+                                  SURGERY_DETAILS=ctx.sizes["SURGERY"])),
+        ("STATS_DETAILS", lambda: {"STATS_DETAILS": _gen_stats_details(conn, ctx)}),
+        ("STATESTATS", lambda: {"STATESTATS": _gen_statestats(conn, ctx)}),
+        ("NOTESDATA", lambda: {"NOTESDATA": _gen_notes(conn, ctx)}),
+    ]
+    for label, step in steps:
+        t0 = time.perf_counter()
+        conn.execute("BEGIN")
+        counts.update(step())
+        conn.execute("COMMIT")
+        if progress:
+            progress(f"  {label:<22} {time.perf_counter() - t0:7.1f}s")
+
+    t0 = time.perf_counter()
+    for ddl in INDEXES:
+        conn.execute(ddl)
+    conn.execute("ANALYZE")
+    conn.close()
+    if progress:
+        progress(f"  {'indexes':<22} {time.perf_counter() - t0:7.1f}s")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the synthetic HIS stand-in database")
+    parser.add_argument("--rows", type=int, default=100_000, help="approximate total rows (10k .. 50M)")
+    parser.add_argument("--db", default="bench/his_synthetic.db")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--years", type=float, default=3.0, help="length of the generated date window")
+    args = parser.parse_args()
+
+    end = date.today()
+    start = end - timedelta(days=int(args.years * 365))
+    print(f"Generating ~{args.rows:,} rows into {args.db} ({start} .. {end})")
+    counts = generate(args.db, rows=args.rows, seed=args.seed, start=start, end=end)
+    for table, count in sorted(counts.items()):
+        print(f"  {table:<20} {count:>12,}")
+    print(f"  {'TOTAL':<20} {sum(counts.values()):>12,}")
+
+
+if __name__ == "__main__":
+    main()